@@ -0,0 +1,348 @@
+"""
+Online anomaly detection on per-dimension pipeline metrics.
+
+Each series (processing time per complexity, quality score per category)
+keeps a constant-size state, updated once per logged execution:
+
+- a slow EWMA of the value and an exponentially weighted variance (EWMV)
+  around it, the series' baseline;
+- a fast EWMA of the value, which follows the current level.
+
+An observation more than SPIKE_Z baseline deviations on the bad side is a
+spike. A fast EWMA more than SHIFT_Z of its own standard deviation
+(sd * sqrt(a / (2 - a)) for smoothing a) away from the baseline is a
+shift. That is how a gradual regression shows up long before any single
+request crosses a static threshold: the baseline's long memory lets it
+lag a slow ramp far enough for the shift test to see it. Values are
+clipped to the spike band before they update the state, so one outlier
+does not inflate the variance it is judged against. Latency is scored on
+a log scale. During the first WARMUP observations nothing is flagged, and
+until 1/n falls below the smoothing every value has equal weight.
+
+The defaults come from benchmarks/replay_anomalies.py: about one false
+alarm per 10,000 observations of noise, a 30% step caught within about
+ten observations, and a ramp to double the latency caught.
+
+A series opens an anomaly event when it turns anomalous and stays
+anomalous, without further events, until neither test fires. A series
+that stops receiving observations cannot recover on its own, so its
+status expires ACTIVE_SECONDS after its last observation: it is no longer
+reported active, and an anomaly on its next observation opens a new event.
+
+Settings come from the environment:
+
+    ANOMALY_ALPHA        baseline smoothing (default 0.005, about 200 observations)
+    ANOMALY_FAST_ALPHA   level smoothing (default 0.1, about 10 observations)
+    ANOMALY_SPIKE_Z      spike threshold in baseline deviations (default 4)
+    ANOMALY_SHIFT_Z      shift threshold in fast EWMA deviations (default 4)
+    ANOMALY_WARMUP       observations before anything is flagged (default 30)
+    ANOMALY_ACTIVE_SECONDS  how long an anomalous status outlives the series'
+                            last observation (default 3600)
+"""
+
+import math
+import os
+import time
+from collections import deque
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+ALPHA = float(os.environ.get('ANOMALY_ALPHA', '0.005'))
+FAST_ALPHA = float(os.environ.get('ANOMALY_FAST_ALPHA', '0.1'))
+SPIKE_Z = float(os.environ.get('ANOMALY_SPIKE_Z', '4'))
+SHIFT_Z = float(os.environ.get('ANOMALY_SHIFT_Z', '4'))
+WARMUP = int(os.environ.get('ANOMALY_WARMUP', '30'))
+ACTIVE_SECONDS = float(os.environ.get('ANOMALY_ACTIVE_SECONDS', '3600'))
+
+# (metric, log item attribute, dimension, the direction that is bad, scale).
+# Latency noise is multiplicative and skewed, so it is scored on a log
+# scale, where it is close to normal and a regression is a ratio.
+SERIES = (
+    ('processing_time', 'total_processing_time_ms', 'complexity', 'high', 'log'),
+    ('quality_score', 'quality_score', 'category', 'low', 'linear'),
+)
+SCALES = {metric: scale for metric, _, _, _, scale in SERIES}
+RECENT_EVENTS = 20
+
+# A standard deviation floor relative to the mean, so a flat series does
+# not flag its first tiny wobble
+MIN_RELATIVE_SD = 0.01
+
+
+def series_key(metric, dimension, value):
+    return f"{metric}|{dimension}={value}"
+
+
+def observations(item):
+    """
+    (series key, scaled value, bad direction) for each series a logged
+    execution feeds; untimed and unscored executions are left out
+    """
+    observed = []
+    for metric, attribute, dimension, direction, scale in SERIES:
+        value = float(item.get(attribute, 0) or 0)
+        if value > 0:
+            observed.append((series_key(metric, dimension, item.get(dimension) or 'unknown'),
+                             math.log(value) if scale == 'log' else value, direction))
+    return observed
+
+
+def unscaled(key, value):
+    """
+    A series value back in the metric's own units
+    """
+    metric = key.split('|', 1)[0]
+    return math.exp(value) if SCALES.get(metric) == 'log' else value
+
+
+def initial_state():
+    return {'n': 0, 'mean': 0.0, 'var': 0.0, 'fast': 0.0, 'status': 'normal'}
+
+
+def is_active(state, now, max_age_seconds=ACTIVE_SECONDS):
+    """
+    Whether a series is anomalous as of `now`: its status, unless its last
+    observation (`updated_at`, epoch seconds) is older than max_age_seconds
+    """
+    if state['status'] == 'normal':
+        return False
+    updated_at = state.get('updated_at')
+    return updated_at is None or now - updated_at <= max_age_seconds
+
+
+def expire(state, now, max_age_seconds=ACTIVE_SECONDS):
+    """
+    Reset a stale anomalous status before the series is observed again
+    """
+    if state['status'] != 'normal' and not is_active(state, now, max_age_seconds):
+        state['status'] = 'normal'
+        state['since'] = None
+
+
+class Detector:
+    """
+    Robust EWMA/EWMV with a fast EWMA for level shifts. Holds only the
+    settings; a series' state is a small dict it updates in place.
+    """
+
+    def __init__(self, alpha=ALPHA, fast_alpha=FAST_ALPHA, spike_z=SPIKE_Z, shift_z=SHIFT_Z, warmup=WARMUP):
+        self.alpha = alpha
+        self.fast_alpha = fast_alpha
+        self.spike_z = spike_z
+        self.shift_z = shift_z
+        self.warmup = warmup
+
+    def update(self, state, value, direction='high'):
+        """
+        Score `value` against the state, then fold it in. Returns
+        (kind, score) when the observation is anomalous, else None.
+        Time Complexity: O(1)
+        """
+        n = state['n']
+        mean, var, fast = state['mean'], state['var'], state['fast']
+        sign = 1 if direction == 'high' else -1
+        sd = max(math.sqrt(var), abs(mean) * MIN_RELATIVE_SD)
+
+        flagged = None
+        if n >= self.warmup and sd > 0:
+            spike = sign * (value - mean) / sd
+            shift = sign * (fast - mean) / (sd * math.sqrt(self.fast_alpha / (2 - self.fast_alpha)))
+            if spike > self.spike_z:
+                flagged = ('spike', spike)
+            elif shift > self.shift_z:
+                flagged = ('shift', shift)
+
+        # Equal weights until the smoothing takes over, then exponential
+        alpha = max(self.alpha, 1 / (n + 1))
+        fast_alpha = max(self.fast_alpha, 1 / (n + 1))
+        if n >= self.warmup and sd > 0:
+            value = min(max(value, mean - self.spike_z * sd), mean + self.spike_z * sd)
+        diff = value - mean
+        state['mean'] = mean + alpha * diff
+        state['var'] = (1 - alpha) * (var + alpha * diff * diff)
+        state['fast'] = fast + fast_alpha * (value - fast)
+        state['n'] = n + 1
+        return flagged
+
+    def observe(self, key, state, value, direction='high', at=None):
+        """
+        Update one series; returns an event when it turns anomalous
+        """
+        baseline = state['mean']
+        flagged = self.update(state, value, direction)
+        if flagged is None:
+            state['status'] = 'normal'
+            return None
+        kind, score = flagged
+        opened = state['status'] == 'normal'
+        state['status'] = kind
+        state['since'] = state.get('since') if not opened else at
+        if not opened:
+            return None
+        metric, dimension = key.split('|', 1)
+        return {
+            'series': key,
+            'metric': metric,
+            'dimension': dimension,
+            'kind': kind,
+            'value': round(unscaled(key, value), 3),
+            'baseline': round(unscaled(key, baseline), 3),
+            'score': round(score, 2),
+            'at': at
+        }
+
+
+class AnomalyMonitor:
+    """
+    Every series' state and the recent events, in memory. Used by the
+    replay harness and local runs.
+    """
+
+    def __init__(self, detector=None, recent=RECENT_EVENTS, max_age_seconds=ACTIVE_SECONDS, clock=time.time):
+        self.detector = detector or Detector()
+        self.states = {}
+        self.events = deque(maxlen=recent)
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+
+    def observe_item(self, item):
+        events = []
+        now = self.clock()
+        for key, value, direction in observations(item):
+            state = self.states.setdefault(key, initial_state())
+            expire(state, now, self.max_age_seconds)
+            event = self.detector.observe(key, state, value, direction, item.get('timestamp'))
+            state['updated_at'] = now
+            if event:
+                events.append(event)
+                self.events.append(event)
+        return events
+
+    def snapshot(self):
+        return anomaly_report(self.states, list(self.events), self.clock(), self.max_age_seconds)
+
+
+def anomaly_report(states, events, now=None, max_age_seconds=ACTIVE_SECONDS):
+    """
+    The /analytics `anomalies` block. Series whose anomalous status has
+    expired are left out of `active`.
+    """
+    now = time.time() if now is None else now
+    active = [
+        {
+            'series': key,
+            'kind': state['status'],
+            'since': state.get('since'),
+            'baseline': round(unscaled(key, float(state['mean'])), 3),
+            'level': round(unscaled(key, float(state['fast'])), 3)
+        }
+        for key, state in sorted(states.items()) if is_active(state, now, max_age_seconds)
+    ]
+    recent = sorted(events, key=lambda event: event.get('at') or '', reverse=True)[:RECENT_EVENTS]
+    return {'series': len(states), 'active': active, 'recent': recent}
+
+
+class DynamoDBAnomalyStore:
+    """
+    One item per series in a DynamoDB table keyed by `series`, holding the
+    detector state, a version and the series' recent events. Concurrent
+    stream batches update a series with a version-conditioned put and
+    retry from a fresh read when they lose.
+    """
+
+    def __init__(self, table, detector=None, max_attempts=3, max_age_seconds=ACTIVE_SECONDS, clock=time.time):
+        self.table = table
+        self.detector = detector or Detector()
+        self.max_attempts = max_attempts
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+
+    def observe_items(self, items):
+        """
+        Fold logged executions, in order, into their series. Returns the
+        events opened.
+        """
+        grouped = {}
+        for item in items:
+            for key, value, direction in observations(item):
+                grouped.setdefault(key, []).append((value, direction, item.get('timestamp')))
+
+        events = []
+        for key, values in grouped.items():
+            events.extend(self._observe_series(key, values))
+        return events
+
+    def _observe_series(self, key, values):
+        for attempt in range(self.max_attempts):
+            stored = self.table.get_item(Key={'series': key}, ConsistentRead=True).get('Item')
+            state = _plain_state(stored) if stored else initial_state()
+            version = int(stored['version']) if stored else 0
+            recent = list(stored.get('events', [])) if stored else []
+            now = self.clock()
+            expire(state, now, self.max_age_seconds)
+
+            opened = []
+            for value, direction, at in values:
+                event = self.detector.observe(key, state, value, direction, at)
+                if event:
+                    opened.append(event)
+            try:
+                self.table.put_item(
+                    Item=_stored_state(key, state, version + 1, (recent + opened)[-RECENT_EVENTS:], now),
+                    ConditionExpression='attribute_not_exists(series) OR version = :version',
+                    ExpressionAttributeValues={':version': version}
+                )
+                return opened
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                print(f"Anomaly state for {key} changed concurrently (attempt {attempt + 1})")
+        raise RuntimeError(f"Could not update anomaly state for {key}")
+
+    def snapshot(self):
+        states, events = {}, []
+        kwargs = {}
+        while True:
+            response = self.table.scan(**kwargs)
+            for item in response.get('Items', []):
+                states[item['series']] = _plain_state(item)
+                events.extend(_plain(event) for event in item.get('events', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return anomaly_report(states, events, self.clock(), self.max_age_seconds)
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: _plain(inner) for key, inner in value.items()}
+    if isinstance(value, list):
+        return [_plain(inner) for inner in value]
+    return value
+
+
+def _decimal(value):
+    if isinstance(value, float):
+        return Decimal(repr(value)) if math.isfinite(value) else Decimal(0)
+    if isinstance(value, dict):
+        return {key: _decimal(inner) for key, inner in value.items() if inner is not None}
+    if isinstance(value, list):
+        return [_decimal(inner) for inner in value]
+    return value
+
+
+def _plain_state(item):
+    state = {field: float(item[field]) for field in ('mean', 'var', 'fast')}
+    state.update({'n': int(item['n']), 'status': item.get('status', 'normal'), 'since': item.get('since')})
+    if 'updated_at' in item:
+        state['updated_at'] = int(item['updated_at'])
+    return state
+
+
+def _stored_state(key, state, version, events, now):
+    item = _decimal(dict(state, series=key, version=version, events=events))
+    item['updated_at'] = int(now)
+    return item
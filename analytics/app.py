@@ -1,14 +1,39 @@
 import json
-import boto3
 import os
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+from anomaly import DynamoDBAnomalyStore
+from aws_clients import lazy_table
+from cube import DIMENSIONS, DynamoDBCubeStore
+from downsample import downsample_timeseries
+from live import RECENT_LIMIT, recent_execution
+from timing import instrument_handler, phase, timed
+
+# The table is resolved on first use and reused across warm invocations
 table_name = os.environ.get('PIPELINE_LOG_TABLE', 'PipelineLogs')
+table = lazy_table(table_name)
+
+# Longest window a request may ask for, and the time series size limits
+MAX_HOURS = int(os.environ.get('ANALYTICS_MAX_HOURS', '720'))
+DEFAULT_MAX_POINTS = int(os.environ.get('ANALYTICS_DEFAULT_POINTS', '500'))
+MAX_POINTS_LIMIT = int(os.environ.get('ANALYTICS_MAX_POINTS', '2000'))
+
+# Pre-aggregated cube cells behind /analytics/cube; a loaded window is reused
+# by warm invocations for CUBE_CACHE_SECONDS, so drill-downs only roll it up
+cube_table_name = os.environ.get('CUBE_TABLE', 'PipelineCube')
+cube_table = lazy_table(cube_table_name)
+CUBE_CACHE_SECONDS = float(os.environ.get('CUBE_CACHE_SECONDS', '30'))
+CUBE_CACHE_WINDOWS = 16
+_cube_cache = {}
+
+# Online anomaly detector state, maintained by the live metrics function
+anomaly_table_name = os.environ.get('ANOMALY_TABLE', 'PipelineAnomalies')
+anomaly_table = lazy_table(anomaly_table_name)
 
 
+@instrument_handler('analytics')
 def lambda_handler(event, context):
     """
     Analytics API for AI Pipeline data with enhanced error handling
@@ -16,16 +41,14 @@ def lambda_handler(event, context):
     print(f"Analytics API called with table: {table_name}")
     print(f"Event: {json.dumps(event)}")
     
-    # Initialize table
-    table = dynamodb.Table(table_name)
-    
-    
-    table_info = table.table_status
-    print(f"Table status: {table_info}")
-        
     # Extract query parameters
     query_params = event.get('queryStringParameters') or {}
-    hours = int(query_params.get('hours', 24))
+    if is_cube_request(event):
+        return handle_cube_request(query_params)
+    try:
+        hours, max_points = parse_window(query_params)
+    except ValueError as e:
+        return create_error_response(400, str(e))
     
     print(f"Fetching data for last {hours} hours")
     
@@ -34,7 +57,8 @@ def lambda_handler(event, context):
     start_time = end_time - timedelta(hours=hours)
     
     # Query data
-    analytics_data = get_analytics_data(table, start_time, end_time)
+    analytics_data = get_analytics_data(table, start_time, end_time, max_points)
+    analytics_data['anomalies'] = get_anomalies()
     
     print(f"Found {analytics_data['summary']['total_executions']} executions")
     
@@ -50,36 +74,145 @@ def lambda_handler(event, context):
     }
 
 
-def get_analytics_data(table, start_time, end_time):
+def parse_window(query_params):
+    """
+    The `hours` window and `max_points` per time series, within their limits
+    """
+    try:
+        hours = int(query_params.get('hours', 24))
+        max_points = int(query_params.get('max_points', DEFAULT_MAX_POINTS))
+    except ValueError:
+        raise ValueError('hours and max_points must be integers') from None
+    if not 1 <= hours <= MAX_HOURS:
+        raise ValueError(f"hours must be between 1 and {MAX_HOURS}")
+    if not 3 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"max_points must be between 3 and {MAX_POINTS_LIMIT}")
+    return hours, max_points
+
+
+def get_anomalies():
+    """
+    Active and recent anomalies; the rest of the response does not depend on them
+    """
+    with phase('anomalies'):
+        try:
+            return DynamoDBAnomalyStore(anomaly_table).snapshot()
+        except Exception as e:
+            print(f"Failed to read anomaly state: {str(e)}")
+            return {'series': 0, 'active': [], 'recent': [], 'error': 'unavailable'}
+
+
+def is_cube_request(event):
     """
-    Fetch and analyze pipeline data with better error handling
+    Check whether an API Gateway event targets /analytics/cube
     """
-    # Try to scan the table (for now, since we might not have much data)
-    response = table.scan()
-    items = response.get('Items', [])
+    return (event.get('resource') == '/analytics/cube'
+            or str(event.get('path', '')).rstrip('/').endswith('/analytics/cube'))
+
+
+def parse_cube_query(query_params):
+    """
+    The `group_by` dimensions ("category,complexity") and `filter` values
+    ("error_type:timeout|none,category:technical") of a cube query
+    """
+    group_by = []
+    for name in (query_params.get('group_by') or '').split(','):
+        name = name.strip()
+        if name and name not in group_by:
+            group_by.append(name)
+
+    filters = {}
+    for clause in (query_params.get('filter') or '').split(','):
+        if not clause.strip():
+            continue
+        name, separator, values = clause.partition(':')
+        values = [value.strip() for value in values.split('|') if value.strip()]
+        if not separator or not values:
+            raise ValueError('filter must be dimension:value|value,...')
+        filters.setdefault(name.strip(), []).extend(values)
+
+    unknown = [name for name in group_by + list(filters) if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension: {unknown[0]} (expected one of {', '.join(DIMENSIONS)})")
+    return group_by, filters
+
+
+def handle_cube_request(query_params):
+    """
+    Group-by over the pre-aggregated cube for the last `hours` hours
+    """
+    try:
+        hours, _ = parse_window(query_params)
+        group_by, filters = parse_cube_query(query_params)
+    except ValueError as e:
+        return create_error_response(400, str(e))
+
+    end_time = datetime.utcnow()
+    start_hour = (end_time - timedelta(hours=hours)).strftime('%Y-%m-%dT%H')
+    end_hour = end_time.strftime('%Y-%m-%dT%H')
+    with phase('cube'):
+        cube = load_cube(start_hour, end_hour)
+    with phase('rollup'):
+        rows = cube.query(group_by, filters)
+
+    print(f"Cube query over {len(cube.cells)} cells returned {len(rows)} rows")
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'GET,OPTIONS'
+        },
+        'body': json.dumps({
+            'group_by': group_by,
+            'filters': filters,
+            'rows': rows,
+            'cells': len(cube.cells),
+            'time_window': {'start_hour': start_hour, 'end_hour': end_hour, 'hours': hours}
+        }, cls=DecimalEncoder)
+    }
+
+
+def load_cube(start_hour, end_hour):
+    """
+    Cube cells for whole hours start_hour..end_hour, cached per warm container
+    """
+    now = time.monotonic()
+    cached = _cube_cache.get((start_hour, end_hour))
+    if cached and now - cached[0] < CUBE_CACHE_SECONDS:
+        return cached[1]
+    cube = DynamoDBCubeStore(cube_table).load(start_hour, end_hour)
+    if len(_cube_cache) >= CUBE_CACHE_WINDOWS:
+        _cube_cache.clear()
+    _cube_cache[(start_hour, end_hour)] = (now, cube)
+    return cube
+
+
+def get_analytics_data(table, start_time, end_time, max_points=DEFAULT_MAX_POINTS):
+    """
+    Fetch and analyze pipeline data with better error handling.
+    The log table is read whole, page by page: the scan costs O(table),
+    whatever the window, which the cube endpoint avoids for long windows.
+    """
+    items = []
+    kwargs = {}
+    with phase('scan'):
+        # Pages stop at 1 MB, so a busy month of logs spans many
+        while True:
+            response = table.scan(**kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
     
     print(f"Raw items found: {len(items)}")
     
     # If no items, return empty analytics
     if not items:
-        return {
-            'summary': {
-                'total_executions': 0,
-                'successful_executions': 0,
-                'failed_executions': 0,
-                'success_rate': 0.0,
-                'average_processing_time': 0.0
-            },
-            'complexity_breakdown': {},
-            'category_breakdown': {},
-            'recent_executions': [],
-            'time_window': {
-                'start': start_time.isoformat(),
-                'end': end_time.isoformat(),
-                'hours': (end_time - start_time).total_seconds() / 3600
-            },
-            'message': 'No pipeline executions found. Try running a pipeline first.'
-        }
+        return empty_analytics(start_time, end_time, max_points,
+                               'No pipeline executions found. Try running a pipeline first.')
     
     # Filter items by time (if timestamp exists)
     filtered_items = []
@@ -95,24 +228,16 @@ def get_analytics_data(table, start_time, end_time):
     print(f"Filtered items: {len(filtered_items)}")
     
     # Analyze data
-    return analyze_pipeline_data(filtered_items, start_time, end_time)
+    return analyze_pipeline_data(filtered_items, start_time, end_time, max_points)
     
 
-def analyze_pipeline_data(items, start_time, end_time):
+@timed('aggregate')
+def analyze_pipeline_data(items, start_time, end_time, max_points=DEFAULT_MAX_POINTS):
     """
     Analyze pipeline execution data
     """
     if not items:
-        return {
-            'summary': {
-                'total_executions': 0,
-                'successful_executions': 0,
-                'failed_executions': 0,
-                'success_rate': 0.0,
-                'average_processing_time': 0.0
-            },
-            'message': 'No data in time window'
-        }
+        return empty_analytics(start_time, end_time, max_points, 'No data in time window')
     
     total_executions = len(items)
     successful_executions = sum(1 for item in items if item.get('success', True))
@@ -125,7 +250,8 @@ def analyze_pipeline_data(items, start_time, end_time):
         for item in items 
         if item.get('total_processing_time_ms', 0) > 0
     ]
-    avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
+    total_processing_time = sum(processing_times)
+    avg_processing_time = total_processing_time / len(processing_times) if processing_times else 0
     
     # Complexity breakdown
     complexity_breakdown = {}
@@ -140,18 +266,14 @@ def analyze_pipeline_data(items, start_time, end_time):
         category_breakdown[category] = category_breakdown.get(category, 0) + 1
     
     # Recent executions (last 10)
-    recent_executions = []
-    for item in sorted(items, key=lambda x: x.get('timestamp', ''), reverse=True)[:10]:
-        recent_executions.append({
-            'execution_id': item.get('execution_id', 'unknown'),
-            'timestamp': item.get('timestamp', ''),
-            'complexity': item.get('complexity', 'unknown'),
-            'category': item.get('category', 'general'),
-            'success': item.get('success', True),
-            'processing_time_ms': float(item.get('total_processing_time_ms', 0)),
-            'input_length': int(item.get('input_length', 0)),
-            'output_length': int(item.get('output_length', 0))
-        })
+    recent_executions = [
+        recent_execution(item)
+        for item in sorted(items, key=lambda x: x.get('timestamp', ''), reverse=True)[:RECENT_LIMIT]
+    ]
+    
+    # Time series capped at max_points however long the window
+    with phase('downsample'):
+        timeseries = downsample_timeseries(items, start_time, end_time, max_points)
     
     return {
         'summary': {
@@ -159,16 +281,48 @@ def analyze_pipeline_data(items, start_time, end_time):
             'successful_executions': successful_executions,
             'failed_executions': failed_executions,
             'success_rate': round(success_rate, 2),
-            'average_processing_time': round(avg_processing_time, 2)
+            'average_processing_time': round(avg_processing_time, 2),
+            # Sums the live feed's deltas add to
+            'timed_executions': len(processing_times),
+            'total_processing_time': round(total_processing_time, 2)
         },
         'complexity_breakdown': complexity_breakdown,
         'category_breakdown': category_breakdown,
         'recent_executions': recent_executions,
-        'time_window': {
-            'start': start_time.isoformat(),
-            'end': end_time.isoformat(),
-            'hours': round((end_time - start_time).total_seconds() / 3600, 1)
-        }
+        'timeseries': timeseries,
+        'time_window': time_window(start_time, end_time)
+    }
+
+
+def empty_analytics(start_time, end_time, max_points, message):
+    """
+    The analytics shape with nothing in it, so the dashboard renders an
+    empty window the same way whether the table or the window is empty
+    """
+    return {
+        'summary': {
+            'total_executions': 0,
+            'successful_executions': 0,
+            'failed_executions': 0,
+            'success_rate': 0.0,
+            'average_processing_time': 0.0,
+            'timed_executions': 0,
+            'total_processing_time': 0.0
+        },
+        'complexity_breakdown': {},
+        'category_breakdown': {},
+        'recent_executions': [],
+        'timeseries': downsample_timeseries([], start_time, end_time, max_points),
+        'time_window': time_window(start_time, end_time),
+        'message': message
+    }
+
+
+def time_window(start_time, end_time):
+    return {
+        'start': start_time.isoformat(),
+        'end': end_time.isoformat(),
+        'hours': round((end_time - start_time).total_seconds() / 3600, 1)
     }
 
 
@@ -0,0 +1,342 @@
+"""
+Pre-aggregated cube of logged executions for drill-down queries.
+
+Base cells are keyed by the full dimension tuple (category, complexity,
+error_type, hour) and hold additive measures. Deletes and updates
+therefore subtract cleanly, and cells from any source can be summed:
+
+    executions, failures, timed_executions, processing_time_ms,
+    quality_scored, quality_score
+
+A query names the dimensions to group by and the values to keep per
+dimension. It is answered from a roll-up (cuboid) over exactly the
+dimensions it uses. A cuboid is built once from the finest one already
+held, and from then on add() keeps it current along with the base cells.
+Repeated drill-downs therefore cost one pass over a few grouped cells,
+never a pass over raw log items.
+
+Cells are persisted in the cube table by the log table stream consumer
+(live.py), one ADD per changed cell per batch, and loaded by /analytics/cube.
+Each ADD is written in a transaction with a marker item per stream record
+behind it, so a retried or bisected batch counts every record once.
+"""
+
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+DIMENSIONS = ('category', 'complexity', 'error_type', 'hour')
+MEASURES = ('executions', 'failures', 'timed_executions', 'processing_time_ms',
+            'quality_scored', 'quality_score')
+
+_DIMENSION_INDEX = {name: index for index, name in enumerate(DIMENSIONS)}
+_ALL = tuple(range(len(DIMENSIONS)))
+
+# Marker items sort after every cell, so no hour range ever loads them
+MARKER_PREFIX = '~applied|'
+# TransactWriteItems takes 100 actions: the cell update and one marker per record
+MAX_TRANSACTION_RECORDS = 99
+
+
+def cell_key(item):
+    """
+    The base cell a logged execution belongs to
+    """
+    return (
+        item.get('category') or 'general',
+        item.get('complexity') or 'unknown',
+        item.get('error_type') or 'none',
+        item.get('hour') or str(item.get('timestamp', ''))[:13]
+    )
+
+
+def cell_measures(item, sign=1):
+    """
+    A logged execution's measures, negated for sign=-1
+    """
+    processing_time = float(item.get('total_processing_time_ms', 0) or 0)
+    quality = float(item.get('quality_score', 0) or 0)
+    return [
+        sign,
+        0 if item.get('success', True) else sign,
+        sign if processing_time > 0 else 0,
+        sign * processing_time,
+        sign if quality > 0 else 0,
+        sign * quality
+    ]
+
+
+def _sum(measure_lists):
+    return [sum(values) for values in zip(*measure_lists)]
+
+
+def _accumulate(groups, key, measures):
+    current = groups.get(key)
+    if current is None:
+        groups[key] = list(measures)
+        return
+    for index, value in enumerate(measures):
+        current[index] += value
+    # Float sums may leave residue once every execution is subtracted
+    if not current[0] and all(abs(value) < 1e-9 for value in current):
+        del groups[key]
+
+
+class Cube:
+    """
+    Base cells plus lazily materialized roll-ups, all maintained by add()
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self._cuboids = {_ALL: self.cells}
+
+    @classmethod
+    def from_items(cls, items):
+        cube = cls()
+        for item in items:
+            cube.add_item(item)
+        return cube
+
+    def add(self, key, measures):
+        """
+        Add measures to a base cell and every materialized roll-up of it.
+        Time Complexity: O(c) for c materialized cuboids
+        """
+        for dims, groups in self._cuboids.items():
+            _accumulate(groups, key if dims is _ALL else tuple(key[i] for i in dims), measures)
+
+    def add_item(self, item, sign=1):
+        self.add(cell_key(item), cell_measures(item, sign))
+
+    def query(self, group_by=(), filters=None):
+        """
+        Rows grouped by `group_by`, over cells whose value for each filtered
+        dimension is among the allowed ones. Raises ValueError for unknown
+        dimensions. Time Complexity: O(g) for g cells in the cuboid over the
+        grouped and filtered dimensions
+        """
+        filters = filters or {}
+        unknown = [name for name in list(group_by) + list(filters) if name not in _DIMENSION_INDEX]
+        if unknown:
+            raise ValueError(f"Unknown dimension: {unknown[0]}")
+
+        dims = tuple(sorted({_DIMENSION_INDEX[name] for name in list(group_by) + list(filters)}))
+        groups = self._cuboid(dims)
+        group_positions = [dims.index(_DIMENSION_INDEX[name]) for name in group_by]
+        checks = [(dims.index(_DIMENSION_INDEX[name]), set(values)) for name, values in filters.items()]
+
+        rolled = {}
+        for key, measures in groups.items():
+            if all(key[position] in allowed for position, allowed in checks):
+                _accumulate(rolled, tuple(key[position] for position in group_positions), measures)
+
+        rows = [_row(group_by, key, measures) for key, measures in rolled.items() if measures[0] > 0]
+        rows.sort(key=lambda row: (-row['executions'], [str(row[name]) for name in group_by]))
+        return rows
+
+    def _cuboid(self, dims):
+        groups = self._cuboids.get(dims)
+        if groups is None:
+            # Roll up from the smallest materialized cuboid that has every needed dimension
+            source_dims = min((held for held in list(self._cuboids) if set(dims) <= set(held)),
+                              key=lambda held: len(self._cuboids[held]))
+            positions = [source_dims.index(dim) for dim in dims]
+            groups = {}
+            for key, measures in self._cuboids[source_dims].items():
+                _accumulate(groups, tuple(key[position] for position in positions), measures)
+            self._cuboids[dims] = groups
+        return groups
+
+
+def _row(group_by, key, measures):
+    executions, failures, timed, processing_time, scored, quality = measures
+    row = dict(zip(group_by, key))
+    row.update({
+        'executions': int(executions),
+        'failures': int(failures),
+        'success_rate': round((executions - failures) / executions * 100, 2),
+        'average_processing_time': round(processing_time / timed, 2) if timed else 0.0,
+        'average_quality_score': round(quality / scored, 3) if scored else 0.0
+    })
+    return row
+
+
+class InMemoryCubeStore:
+    """
+    Process-local store with the same semantics as the DynamoDB store,
+    for tests and local runs
+    """
+
+    def __init__(self):
+        self.cube = Cube()
+        self.applied = set()
+
+    def add_cells(self, cells, sources=None):
+        skipped = 0
+        for key, measures in cells.items():
+            records = (sources or {}).get(key)
+            if records:
+                fresh = [record for sequence, record in records.items() if (key, sequence) not in self.applied]
+                skipped += len(records) - len(fresh)
+                self.applied.update((key, sequence) for sequence in records)
+                if not fresh:
+                    continue
+                if len(fresh) < len(records):
+                    measures = _sum(fresh)
+            self.cube.add(key, measures)
+        return skipped
+
+    def load(self, start_hour, end_hour):
+        cube = Cube()
+        for key, measures in self.cube.cells.items():
+            if start_hour <= key[3] <= end_hour:
+                cube.add(key, measures)
+        return cube
+
+
+class DynamoDBCubeStore:
+    """
+    Base cells in a DynamoDB table partitioned by day, sorted by
+    "hour|category|complexity|error_type". Measures are added with ADD, so
+    concurrent writers never conflict and no cell is read before it is updated.
+
+    A change that comes from stream records is written in one transaction
+    with a marker item per record, each conditional on the marker not
+    existing yet. A retry finds its markers and writes nothing. When a
+    retry groups records differently from the attempt that failed, as the
+    halves of a bisected batch do, some of its markers exist and the
+    transaction is cancelled; its records are then written one at a time,
+    skipping those already marked. Markers expire after marker_ttl_seconds
+    and cells hold only their measures, so no item grows with the traffic.
+    """
+
+    def __init__(self, table, client=None, marker_ttl_seconds=86400, clock=time.time):
+        self.table = table
+        self.client = client
+        self.marker_ttl_seconds = marker_ttl_seconds
+        self.clock = clock
+
+    def add_cells(self, cells, sources=None):
+        """
+        One update per cell with a non-zero change. `sources` maps a cell to
+        the measures of each stream record behind its change, by sequence
+        number; those records are written once, with the client's
+        TransactWriteItems. Returns the records skipped as already written.
+        """
+        skipped = 0
+        for key, measures in cells.items():
+            records = list((sources or {}).get(key, {}).items())
+            if not records:
+                update = self._cell_update(key, measures)
+                if update:
+                    self.table.update_item(**update)
+                continue
+            for start in range(0, len(records), MAX_TRANSACTION_RECORDS):
+                chunk = records[start:start + MAX_TRANSACTION_RECORDS]
+                if self._apply_records(key, chunk):
+                    continue
+                # An earlier attempt wrote some of these records in another grouping
+                for record in chunk:
+                    if not self._apply_records(key, [record]):
+                        skipped += 1
+        return skipped
+
+    def _cell_update(self, key, measures):
+        changed = [index for index, value in enumerate(measures) if value]
+        if not changed:
+            return None
+        # 'hour' is a DynamoDB reserved word, so every attribute goes through a name placeholder
+        names = {f"#d{index}": name for index, name in enumerate(DIMENSIONS)}
+        names.update({f"#m{index}": MEASURES[index] for index in changed})
+        values = {f":d{index}": value for index, value in enumerate(key)}
+        values.update({f":m{index}": _number(measures[index]) for index in changed})
+        return {
+            'Key': {'day': key[3][:10], 'cell': _cell_sort_key(key)},
+            'UpdateExpression': ('SET ' + ', '.join(f"#d{index} = :d{index}" for index in range(len(DIMENSIONS)))
+                                 + ' ADD ' + ', '.join(f"#m{index} :m{index}" for index in changed)),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+
+    def _apply_records(self, key, records):
+        """
+        Add the records' measures to a cell and mark each record, in one
+        transaction; False if any of them was already marked
+        """
+        update = self._cell_update(key, _sum(measures for _, measures in records))
+        if not update:
+            return True
+        serializer = TypeSerializer()
+
+        def typed(values):
+            return {name: serializer.serialize(value) for name, value in values.items()}
+
+        expires_at = int(self.clock()) + self.marker_ttl_seconds
+        actions = [{'Update': {
+            'TableName': self.table.name,
+            'Key': typed(update['Key']),
+            'UpdateExpression': update['UpdateExpression'],
+            'ExpressionAttributeNames': update['ExpressionAttributeNames'],
+            'ExpressionAttributeValues': typed(update['ExpressionAttributeValues'])
+        }}]
+        for sequence, _ in records:
+            actions.append({'Put': {
+                'TableName': self.table.name,
+                'Item': typed({'day': update['Key']['day'],
+                               'cell': f"{MARKER_PREFIX}{_cell_sort_key(key)}|{sequence}",
+                               'expires_at': expires_at}),
+                'ConditionExpression': 'attribute_not_exists(#cell)',
+                'ExpressionAttributeNames': {'#cell': 'cell'}
+            }})
+        try:
+            self.client.transact_write_items(TransactItems=actions)
+        except ClientError as e:
+            reasons = e.response.get('CancellationReasons', [])
+            if e.response['Error']['Code'] == 'TransactionCanceledException' and any(
+                    reason.get('Code') == 'ConditionalCheckFailed' for reason in reasons):
+                return False
+            raise
+        return True
+
+    def load(self, start_hour, end_hour):
+        """
+        A Cube of the cells for hours start_hour..end_hour ("YYYY-MM-DDTHH")
+        """
+        cube = Cube()
+        for day in _days(start_hour[:10], end_hour[:10]):
+            kwargs = {
+                'KeyConditionExpression': '#day = :day AND #cell BETWEEN :first AND :last',
+                'ExpressionAttributeNames': {'#day': 'day', '#cell': 'cell'},
+                'ExpressionAttributeValues': {':day': day, ':first': start_hour, ':last': end_hour + '|~'}
+            }
+            while True:
+                response = self.table.query(**kwargs)
+                for item in response.get('Items', []):
+                    cube.add(tuple(item[name] for name in DIMENSIONS),
+                             [float(item.get(name, 0)) for name in MEASURES])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return cube
+
+
+def _cell_sort_key(key):
+    return '|'.join((key[3],) + key[:3])
+
+
+def _number(value):
+    if isinstance(value, float):
+        return Decimal(str(round(value, 3)))
+    return value
+
+
+def _days(first, last):
+    day = date.fromisoformat(first)
+    end = date.fromisoformat(last)
+    while day <= end:
+        yield day.isoformat()
+        day += timedelta(days=1)
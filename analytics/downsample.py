@@ -0,0 +1,146 @@
+"""
+Server-side downsampling of the analytics time series.
+
+However long the window, /analytics returns at most `max_points` points
+per series, so payload size and chart render time stay flat:
+- counts (executions, failures) are re-bucketed exactly into fixed-width
+  time buckets, so every execution is still counted once;
+- the per-execution latency series is reduced with Largest-Triangle-
+  Three-Buckets (LTTB), which keeps the points that shape the line
+  (spikes, dips) instead of averaging them away.
+
+Bucket widths come from a fixed ladder of round durations and buckets are
+aligned to multiples of their width, so a bucket covers the same span on
+every request.
+"""
+
+import math
+from datetime import timezone
+
+import numpy as np
+
+# Round bucket widths in seconds, from one minute to one day
+BUCKET_STEPS = (60, 300, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+
+# Average LTTB bucket size above which areas are computed with NumPy; for
+# smaller buckets the per-call overhead outweighs the vectorized maths
+VECTOR_BUCKET_SIZE = 32
+
+
+def epoch_seconds(timestamps):
+    """
+    ISO-8601 UTC timestamps, as the pipeline logger writes them, as float
+    epoch seconds. Parsed in one vectorized call.
+    """
+    values = np.array([t[:-1] if t.endswith('Z') else t for t in timestamps], dtype='datetime64[us]')
+    return values.astype(np.int64) / 1e6
+
+
+def bucket_width(start, end, max_points):
+    """
+    The smallest round width that covers [start, end) with at most
+    `max_points` aligned buckets
+    """
+    for step in BUCKET_STEPS:
+        if math.ceil((end - math.floor(start / step) * step) / step) <= max_points:
+            return step
+    days = math.ceil((end - start) / max_points / 86400) + 1
+    return days * 86400
+
+
+def bucket_counts(times, start, end, max_points, weights=None):
+    """
+    Exact counts (or sums of `weights`) per aligned time bucket.
+    Returns (bucket start times, values, bucket width in seconds).
+    Time Complexity: O(n + b) for n points and b buckets
+    """
+    width = bucket_width(start, end, max_points)
+    first = math.floor(start / width) * width
+    buckets = max(1, math.ceil((end - first) / width))
+    index = np.clip(((times - first) // width).astype(np.int64), 0, buckets - 1)
+    values = np.bincount(index, weights=weights, minlength=buckets)
+    return first + width * np.arange(buckets), values, width
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps
+    from the series (x, y), with x ascending. The first and last points are
+    always kept. Each bucket in between contributes the point that forms
+    the largest triangle with the previously kept point and the average of
+    the next bucket. Series no longer than `threshold` are kept whole.
+    Time Complexity: O(n); bucket averages are vectorized, and so are the
+    areas within large buckets
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the interior points 1 .. n-2
+    buckets = threshold - 2
+    edges = np.linspace(0, n - 2, buckets + 1).astype(np.int64) + 1
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    # The third corner for bucket b is the next bucket's average (the last point for the final bucket)
+    next_x = np.append(mean_x[1:], x[n - 1])
+    next_y = np.append(mean_y[1:], y[n - 1])
+
+    # The walk depends on the previously kept point, so it runs bucket by
+    # bucket on Python scalars; NumPy scalar indexing costs more than the maths
+    xs, ys = x.tolist(), y.tolist()
+    bounds = edges.tolist()
+    corners = list(zip(next_x.tolist(), next_y.tolist()))
+    vectorize = (n - 2) / buckets > VECTOR_BUCKET_SIZE
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(buckets):
+        lo, hi = bounds[bucket], bounds[bucket + 1]
+        ax, ay = xs[previous], ys[previous]
+        cx, cy = corners[bucket]
+        # Twice the triangle (a, p, c) area is |px*kx + py*ky + k0|; the factor
+        # does not change the argmax
+        kx, ky, k0 = cy - ay, ax - cx, cx * ay - ax * cy
+        if vectorize:
+            previous = lo + int(np.argmax(np.abs(x[lo:hi] * kx + y[lo:hi] * ky + k0)))
+        else:
+            previous = max(range(lo, hi), key=lambda i: abs(xs[i] * kx + ys[i] * ky + k0))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_timeseries(items, start_time, end_time, max_points):
+    """
+    The /analytics `timeseries` block for items in the window [start_time,
+    end_time], given as naive UTC datetimes
+    """
+    start = start_time.replace(tzinfo=timezone.utc).timestamp()
+    end = end_time.replace(tzinfo=timezone.utc).timestamp()
+    timed = [item for item in items if item.get('timestamp')]
+    times = epoch_seconds([item['timestamp'] for item in timed])
+    failed = np.array([not item.get('success', True) for item in timed], dtype=np.float64)
+    latency = np.array([float(item.get('total_processing_time_ms', 0)) for item in timed], dtype=np.float64)
+
+    bucket_starts, executions, width = bucket_counts(times, start, end, max_points)
+    _, failures, _ = bucket_counts(times, start, end, max_points, weights=failed)
+
+    # LTTB needs x ascending; untimed executions have no latency to plot
+    order = np.argsort(times, kind='stable')
+    order = order[latency[order] > 0]
+    kept = order[lttb(times[order], latency[order], max_points)]
+
+    return {
+        'bucket_seconds': width,
+        'counts': {
+            'timestamps': np.datetime_as_string(bucket_starts.astype(np.int64).astype('datetime64[s]')).tolist(),
+            'executions': executions.astype(np.int64).tolist(),
+            'failures': failures.astype(np.int64).tolist()
+        },
+        'latency': {
+            'timestamps': [timed[i]['timestamp'] for i in kept],
+            'processing_time_ms': np.round(latency[kept], 2).tolist(),
+            'source_points': int(len(order))
+        }
+    }
@@ -0,0 +1,589 @@
+"""
+Live metric deltas for the dashboard.
+
+The dashboard loads one /analytics snapshot and then applies deltas pushed
+as executions are logged, instead of re-running the full scan every poll.
+A delta has the shape of an /analytics response, with additive values:
+
+    {"summary": {"total_executions": 1, "successful_executions": 1, ...},
+     "complexity_breakdown": {"simple": 1}, "category_breakdown": {...},
+     "recent_executions": [...], "removed_executions": []}
+
+A record contributes its new image minus its old image, so inserts,
+updates and deletes all fold into the same sums and deltas can be merged
+in any order.
+
+In AWS this module is the LiveMetricsFunction. Each DynamoDB stream batch
+from the pipeline log table becomes one merged delta. A batch that keeps
+failing is bisected to isolate a bad record, and one that still fails is
+sent to the LiveMetricsFailures queue. That delta is
+encoded once and posted to every viewer connected to the WebSocket API,
+and connections that have gone away are dropped. The WebSocket $connect
+and $disconnect routes maintain the connections table. Locally,
+local/server.py feeds the same deltas to a MetricsHub, which serves any
+number of server-sent event viewers from one computation.
+
+The same batches also keep the pre-aggregated cube behind /analytics/cube
+current (see cube.py): each batch's changes are netted per cell and added
+to the cube table before anything is posted. Newly logged executions
+then update the online anomaly detectors (see anomaly.py), and opened
+anomalies are counted in the PipelineAnomalies CloudWatch metric.
+
+Settings come from the environment:
+
+    LIVE_CONNECTIONS_TABLE       WebSocket connection ids (default LiveConnections)
+    LIVE_WEBSOCKET_ENDPOINT      https:// management endpoint of the WebSocket stage
+    LIVE_CONNECTION_TTL_SECONDS  lifetime of a connection record (default 7200,
+                                 the API Gateway connection limit)
+    LIVE_FANOUT_CONCURRENCY      concurrent posts to viewers (default 16)
+    CUBE_TABLE                   pre-aggregated cube cells (default PipelineCube)
+    CUBE_MARKER_TTL_SECONDS      lifetime of the markers that keep retried
+                                 batches from counting twice (default 86400,
+                                 the stream's retention)
+    ANOMALY_TABLE                anomaly detector state (default PipelineAnomalies)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from anomaly import DynamoDBAnomalyStore
+from aws_clients import lazy_client, lazy_table
+from cube import Cube, DynamoDBCubeStore, cell_key, cell_measures
+from timing import instrument_handler, phase
+
+connections_table_name = os.environ.get('LIVE_CONNECTIONS_TABLE', 'LiveConnections')
+connections_table = lazy_table(connections_table_name)
+CONNECTION_TTL_SECONDS = int(os.environ.get('LIVE_CONNECTION_TTL_SECONDS', '7200'))
+FANOUT_CONCURRENCY = int(os.environ.get('LIVE_FANOUT_CONCURRENCY', '16'))
+cube_table_name = os.environ.get('CUBE_TABLE', 'PipelineCube')
+cube_table = lazy_table(cube_table_name)
+CUBE_MARKER_TTL_SECONDS = int(os.environ.get('CUBE_MARKER_TTL_SECONDS', '86400'))
+anomaly_table_name = os.environ.get('ANOMALY_TABLE', 'PipelineAnomalies')
+anomaly_table = lazy_table(anomaly_table_name)
+cloudwatch = lazy_client('cloudwatch')
+# Cube cells are written in transactions, which the Table resource lacks
+dynamodb_client = lazy_client('dynamodb')
+
+# Posts messages to WebSocket connections; the endpoint is per stage
+apigateway_management = lazy_client('apigatewaymanagementapi',
+                                    endpoint_url=os.environ.get('LIVE_WEBSOCKET_ENDPOINT'),
+                                    max_pool_connections=max(10, FANOUT_CONCURRENCY))
+
+# Additive summary fields; rates and averages are derived from them
+SUMMARY_FIELDS = ('total_executions', 'successful_executions', 'failed_executions',
+                  'timed_executions', 'total_processing_time')
+RECENT_LIMIT = 10
+
+_deserializer = TypeDeserializer()
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+
+def recent_execution(item):
+    """
+    The row /analytics lists under recent_executions
+    """
+    return {
+        'execution_id': item.get('execution_id', 'unknown'),
+        'timestamp': item.get('timestamp', ''),
+        'complexity': item.get('complexity', 'unknown'),
+        'category': item.get('category', 'general'),
+        'success': item.get('success', True),
+        'processing_time_ms': float(item.get('total_processing_time_ms', 0)),
+        'input_length': int(item.get('input_length', 0)),
+        'output_length': int(item.get('output_length', 0))
+    }
+
+
+def empty_delta():
+    return {
+        'summary': dict.fromkeys(SUMMARY_FIELDS, 0),
+        'complexity_breakdown': {},
+        'category_breakdown': {},
+        'recent_executions': [],
+        'removed_executions': []
+    }
+
+
+def _add_counts(target, counts):
+    for key, value in counts.items():
+        total = target.get(key, 0) + value
+        if total:
+            target[key] = total
+        else:
+            target.pop(key, None)
+
+
+def item_delta(item, sign=1):
+    """
+    One logged execution's contribution to the metrics, negated for sign=-1
+    """
+    success = item.get('success', True)
+    processing_time = float(item.get('total_processing_time_ms', 0))
+    delta = empty_delta()
+    delta['summary'] = {
+        'total_executions': sign,
+        'successful_executions': sign if success else 0,
+        'failed_executions': 0 if success else sign,
+        'timed_executions': sign if processing_time > 0 else 0,
+        'total_processing_time': sign * processing_time if processing_time > 0 else 0
+    }
+    delta['complexity_breakdown'] = {item.get('complexity', 'unknown'): sign}
+    delta['category_breakdown'] = {item.get('category', 'general'): sign}
+    return delta
+
+
+def execution_delta(new_image, old_image):
+    """
+    Delta for one change to a log item: new image minus old image
+    """
+    delta = empty_delta()
+    if old_image:
+        merge_delta(delta, item_delta(old_image, -1))
+    if new_image:
+        merge_delta(delta, item_delta(new_image))
+        delta['recent_executions'] = [recent_execution(new_image)]
+    elif old_image:
+        delta['removed_executions'] = [old_image.get('execution_id', 'unknown')]
+    return delta
+
+
+def merge_delta(target, delta):
+    """
+    Fold `delta` into `target` in place. Recent rows and removals stay
+    consistent with each other, so a receiver may apply them in any order.
+    Time Complexity: O(b + r) for b breakdown keys and r recent rows
+    """
+    summary = target['summary']
+    for field, value in delta['summary'].items():
+        summary[field] = summary.get(field, 0) + value
+    _add_counts(target['complexity_breakdown'], delta['complexity_breakdown'])
+    _add_counts(target['category_breakdown'], delta['category_breakdown'])
+
+    removed = set(delta.get('removed_executions', ()))
+    added = {row['execution_id'] for row in delta['recent_executions']}
+    if removed or added:
+        target['removed_executions'] = [
+            execution_id for execution_id in target.get('removed_executions', []) if execution_id not in added
+        ] + sorted(removed - added)
+        rows = [
+            row for row in target['recent_executions']
+            if row['execution_id'] not in removed and row['execution_id'] not in added
+        ] + delta['recent_executions']
+        rows.sort(key=lambda row: row['timestamp'], reverse=True)
+        target['recent_executions'] = rows[:RECENT_LIMIT]
+    return target
+
+
+def stream_image(attributes):
+    """
+    Plain item from a stream record's typed image, or None
+    """
+    if not attributes:
+        return None
+    return {name: _deserializer.deserialize(value) for name, value in attributes.items()}
+
+
+def stream_delta(records):
+    """
+    One merged delta for a batch of DynamoDB stream records, and the
+    newest record's creation time (epoch seconds)
+    """
+    delta = empty_delta()
+    as_of = 0
+    for record in records:
+        change = record.get('dynamodb', {})
+        merge_delta(delta, execution_delta(stream_image(change.get('NewImage')),
+                                           stream_image(change.get('OldImage'))))
+        as_of = max(as_of, float(change.get('ApproximateCreationDateTime', 0)))
+    return delta, as_of
+
+
+def stream_cells(records, sources=None):
+    """
+    Net change per cube cell for a batch of DynamoDB stream records. When
+    given, `sources` is filled with each cell's change per record, by
+    sequence number.
+    """
+    changes = Cube()
+    for record in records:
+        change = record.get('dynamodb', {})
+        old_image = stream_image(change.get('OldImage'))
+        new_image = stream_image(change.get('NewImage'))
+        sequence = change.get('SequenceNumber')
+        for image, sign in ((old_image, -1), (new_image, 1)):
+            if image:
+                changes.add_item(image, sign)
+                if sources is not None and sequence:
+                    records = sources.setdefault(cell_key(image), {})
+                    measures = cell_measures(image, sign)
+                    if sequence in records:
+                        # An update within one cell adds its new image to its old one
+                        measures = [old + new for old, new in zip(records[sequence], measures)]
+                    records[sequence] = measures
+    return changes.cells
+
+
+def update_cube(records, store=None):
+    """
+    Add a batch's cell changes to the cube store, once per stream record
+    however often the batch is retried; returns the cells changed
+    """
+    sources = {}
+    cells = stream_cells(records, sources)
+    store = store or DynamoDBCubeStore(cube_table, dynamodb_client, CUBE_MARKER_TTL_SECONDS)
+    skipped = store.add_cells(cells, sources)
+    if skipped:
+        print(f"Cube records already written by an earlier attempt: {skipped}")
+    return len(cells)
+
+
+def new_executions(records):
+    """
+    Executions logged by a batch. Each request logs under its own key, so
+    only inserts are new; later changes to a logged execution are left out
+    and each execution is observed once.
+    """
+    return [stream_image(record.get('dynamodb', {}).get('NewImage')) for record in records
+            if record.get('eventName') == 'INSERT']
+
+
+def detect_anomalies(records, store=None):
+    """
+    Feed a batch's new executions to the anomaly detectors and count the
+    anomalies opened in CloudWatch. Returns the events.
+    """
+    events = (store or DynamoDBAnomalyStore(anomaly_table)).observe_items(new_executions(records))
+    if events:
+        for event in events:
+            print(f"Anomaly opened: {json.dumps(event)}")
+        cloudwatch.put_metric_data(
+            Namespace='AIPipeline',
+            MetricData=[{'MetricName': 'PipelineAnomalies', 'Value': len(events), 'Unit': 'Count'}]
+        )
+    return events
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def delta_message(delta, as_of, seq=None):
+    """
+    The JSON message viewers receive for a delta
+    """
+    message = {'type': 'delta', 'as_of': as_of, 'delta': delta}
+    if seq is not None:
+        message['seq'] = seq
+    return json.dumps(message, default=_plain, separators=(',', ':'))
+
+
+class LiveMetrics:
+    """
+    Running metrics in /analytics form, kept current by applying deltas
+    """
+
+    def __init__(self, snapshot=None):
+        self.totals = empty_delta()
+        if snapshot:
+            summary = snapshot.get('summary', {})
+            merge_delta(self.totals, {
+                'summary': {field: summary.get(field, 0) for field in SUMMARY_FIELDS},
+                'complexity_breakdown': snapshot.get('complexity_breakdown', {}),
+                'category_breakdown': snapshot.get('category_breakdown', {}),
+                'recent_executions': snapshot.get('recent_executions', [])
+            })
+        self.totals['removed_executions'] = []
+
+    def apply(self, delta):
+        merge_delta(self.totals, delta)
+        self.totals['removed_executions'] = []
+
+    def snapshot(self):
+        totals = self.totals['summary']
+        total = totals['total_executions']
+        timed = totals['timed_executions']
+        return {
+            'summary': {
+                **totals,
+                'total_processing_time': round(totals['total_processing_time'], 2),
+                'success_rate': round(totals['successful_executions'] / total * 100, 2) if total else 0.0,
+                'average_processing_time': round(totals['total_processing_time'] / timed, 2) if timed else 0.0
+            },
+            'complexity_breakdown': dict(self.totals['complexity_breakdown']),
+            'category_breakdown': dict(self.totals['category_breakdown']),
+            'recent_executions': list(self.totals['recent_executions'])
+        }
+
+
+class Subscription:
+    """
+    One viewer's bounded queue of server-sent event frames
+    """
+
+    def __init__(self, hub, limit):
+        self._hub = hub
+        self._limit = limit
+        self._frames = deque()
+        self._ready = threading.Condition()
+        self.closed = False
+        self.resets = 0
+
+    def offer(self, frame):
+        """
+        Queue a frame; False when the viewer has fallen `limit` frames behind
+        """
+        with self._ready:
+            if len(self._frames) >= self._limit:
+                return False
+            self._frames.append(frame)
+            self._ready.notify()
+            return True
+
+    def reset(self, frame):
+        """
+        Replace everything queued with one snapshot frame
+        """
+        with self._ready:
+            self._frames.clear()
+            self._frames.append(frame)
+            self.resets += 1
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """
+        Next frame, or None on timeout or once closed
+        """
+        with self._ready:
+            if not self._frames and not self.closed:
+                self._ready.wait(timeout)
+            return self._frames.popleft() if self._frames else None
+
+    def close(self):
+        self._hub.unsubscribe(self)
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+
+
+class MetricsHub:
+    """
+    Fans one upstream delta feed out to many server-sent event viewers.
+
+    Each published delta is merged into the running metrics and encoded
+    once into a frame. Every subscriber queues that same frame. New viewers
+    start from a snapshot frame, which is also encoded once per sequence
+    number. A reconnecting viewer that sends Last-Event-ID is replayed the
+    frames it missed while they are still in the `history` ring. A viewer
+    more than `queue_size` frames behind has its queue replaced by a
+    snapshot, so a slow viewer costs bounded memory and never delays the
+    others.
+    """
+
+    def __init__(self, snapshot=None, history=256, queue_size=64):
+        self.metrics = LiveMetrics(snapshot)
+        self.queue_size = queue_size
+        self.seq = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._snapshot_frame = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.resets = 0
+
+    def publish(self, delta, as_of=None):
+        """
+        Apply a delta and send it to every subscriber; returns its sequence number
+        """
+        with self._lock:
+            self.metrics.apply(delta)
+            self.seq += 1
+            self.published += 1
+            self._snapshot_frame = None
+            frame = sse_frame(self.seq, delta_message(delta, as_of if as_of is not None else time.time(), self.seq))
+            self._history.append((self.seq, frame))
+            for subscriber in self._subscribers:
+                if not subscriber.offer(frame):
+                    self.resets += 1
+                    subscriber.reset(self._snapshot())
+            return self.seq
+
+    def subscribe(self, last_event_id=None):
+        """
+        A new viewer, replayed from `last_event_id` when the history allows
+        """
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            missed = self._replay(last_event_id)
+            if missed is None or len(missed) > self.queue_size:
+                subscription.offer(self._snapshot())
+            else:
+                for frame in missed:
+                    subscription.offer(frame)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'seq': self.seq,
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'resets': self.resets
+            }
+
+    def _replay(self, last_event_id):
+        # Frames after last_event_id, or None when they are no longer all held
+        try:
+            last = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        if last > self.seq:
+            return None
+        if last == self.seq:
+            return []
+        if not self._history or self._history[0][0] > last + 1:
+            return None
+        return [frame for seq, frame in self._history if seq > last]
+
+    def _snapshot(self):
+        if self._snapshot_frame is None:
+            message = {'type': 'snapshot', 'seq': self.seq, 'snapshot': self.metrics.snapshot()}
+            self._snapshot_frame = sse_frame(self.seq, json.dumps(message, default=_plain, separators=(',', ':')))
+        return self._snapshot_frame
+
+
+def sse_frame(seq, data):
+    return f"id: {seq}\ndata: {data}\n\n".encode()
+
+
+@instrument_handler('live_metrics')
+def lambda_handler(event, context):
+    """
+    DynamoDB stream batches from the log table, and WebSocket route events
+    """
+    if 'Records' in event:
+        return handle_stream(event['Records'])
+
+    request_context = event.get('requestContext') or {}
+    route = request_context.get('routeKey')
+    connection_id = request_context.get('connectionId')
+    if route == '$connect':
+        connections_table.put_item(Item={
+            'connection_id': connection_id,
+            'connected_at': int(time.time()),
+            'expires_at': int(time.time()) + CONNECTION_TTL_SECONDS
+        })
+        print(f"Viewer connected: {connection_id}")
+    elif route == '$disconnect':
+        connections_table.delete_item(Key={'connection_id': connection_id})
+        print(f"Viewer disconnected: {connection_id}")
+    # Messages from viewers ($default) need no reply; the feed is one-way
+    return {'statusCode': 200}
+
+
+def handle_stream(records):
+    """
+    Update the cube, then compute one delta for the batch and post it to
+    every connection. Only a failed cube update fails the batch, so the
+    stream retries it; cells already written by the failed attempt are
+    skipped (see DynamoDBCubeStore). Everything after the cube is best
+    effort: a failure is logged and not retried, because retrying the batch
+    would resend the delta to every viewer.
+    """
+    with phase('cube'):
+        cells = update_cube(records)
+    result = {'records': len(records), 'cells': cells}
+    with phase('anomaly'):
+        # Detector state is statistical; losing one batch's observations
+        # beats retrying the batch for them
+        try:
+            result['anomalies'] = len(detect_anomalies(records))
+        except Exception as e:
+            print(f"Anomaly detection failed: {str(e)}")
+            result['anomalies'] = 0
+    try:
+        result.update(publish_delta(records))
+    except Exception as e:
+        print(f"Live delta failed: {str(e)}")
+        result['error'] = str(e)
+        return result
+    if result['connections']:
+        print(f"Live delta sent: {json.dumps(result)}")
+    return result
+
+
+def publish_delta(records):
+    """
+    Post the batch's delta to every connection; returns the delivery counts
+    """
+    with phase('delta'):
+        delta, as_of = stream_delta(records)
+    with phase('connections'):
+        connection_ids = list_connections()
+    if not connection_ids:
+        return {'connections': 0, 'delivered': 0, 'gone': 0, 'failed': 0}
+
+    data = delta_message(delta, as_of).encode()
+    with phase('fanout'):
+        if len(connection_ids) == 1:
+            outcomes = [post_to_connection(connection_ids[0], data)]
+        else:
+            outcomes = list(_pool().map(lambda connection_id: post_to_connection(connection_id, data),
+                                        connection_ids))
+    return {
+        'connections': len(connection_ids),
+        'delivered': outcomes.count('delivered'),
+        'gone': outcomes.count('gone'),
+        'failed': outcomes.count('failed')
+    }
+
+
+def list_connections():
+    connection_ids = []
+    kwargs = {'ProjectionExpression': 'connection_id'}
+    while True:
+        response = connections_table.scan(**kwargs)
+        connection_ids.extend(item['connection_id'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return connection_ids
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def post_to_connection(connection_id, data):
+    try:
+        apigateway_management.post_to_connection(ConnectionId=connection_id, Data=data)
+        return 'delivered'
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'GoneException':
+            # The viewer left without a $disconnect reaching us
+            try:
+                connections_table.delete_item(Key={'connection_id': connection_id})
+            except Exception as delete_error:
+                print(f"Failed to remove connection {connection_id}: {str(delete_error)}")
+            return 'gone'
+        print(f"Failed to post to {connection_id}: {str(e)}")
+        return 'failed'
+
+
+def _pool():
+    global _fanout_pool
+    if _fanout_pool is None:
+        with _fanout_lock:
+            if _fanout_pool is None:
+                _fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_CONCURRENCY, thread_name_prefix='live-fanout')
+    return _fanout_pool
@@ -0,0 +1,174 @@
+"""
+Load-shedding benchmark for the trigger's admission control.
+
+Replays a seeded synthetic overload against the trigger's per-client token
+buckets and global in-flight budget on a simulated clock. A single noisy
+tenant floods bulk work while many well-behaved tenants send a mix of
+priorities. Reports what was admitted or shed per priority and tenant,
+peak in-flight executions against the budget, and the real cost of each
+admission decision.
+
+Run from the repository root:
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --duration 120 --limit 100 --json
+"""
+
+import argparse
+import contextlib
+import heapq
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_stages import percentile
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+# Overload profile: requests per second per tenant and the priority mix
+NOISY_TENANT_RATE = 200.0
+NORMAL_TENANTS = 50
+NORMAL_TENANT_RATE = 2.0
+PRIORITY_MIX = {'interactive': 0.5, 'standard': 0.3, 'bulk': 0.2}
+
+# Simulated execution time per priority class (seconds)
+EXECUTION_SECONDS = {'interactive': 2.0, 'standard': 5.0, 'bulk': 15.0}
+
+
+def generate_arrivals(duration: float, seed: int) -> List[Dict[str, Any]]:
+    """
+    Poisson arrivals for every tenant, merged in time order
+    """
+    rng = random.Random(seed)
+    tenants = [('noisy', NOISY_TENANT_RATE, {'bulk': 1.0})]
+    tenants += [(f"tenant-{i}", NORMAL_TENANT_RATE, PRIORITY_MIX) for i in range(NORMAL_TENANTS)]
+
+    arrivals = []
+    for client_id, rate, mix in tenants:
+        priorities, weights = zip(*mix.items())
+        now = rng.expovariate(rate)
+        while now < duration:
+            arrivals.append({
+                'time': now,
+                'client_id': client_id,
+                'priority': rng.choices(priorities, weights)[0]
+            })
+            now += rng.expovariate(rate)
+    arrivals.sort(key=lambda arrival: arrival['time'])
+    return arrivals
+
+
+def run_overload(duration: float = 60.0, limit: int = 200, client_rate: float = 5.0,
+                 client_burst: float = 20.0, seed: int = 42) -> Dict[str, Any]:
+    """
+    Drive the admission controller with the overload profile and summarize the outcome
+    """
+    aws = LocalAWS()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        trigger = load_handler('trigger', aws)
+    limiter = trigger.ClientRateLimiter(client_rate, client_burst)
+    budget = trigger.ConcurrencyBudget(aws.table(trigger.admission_table_name), limit)
+
+    outcomes = {priority: {'offered': 0, 'admitted': 0, 'rate_limited': 0, 'shed': 0}
+                for priority in trigger.PRIORITY_CLASSES}
+    tenants = {'noisy': {'offered': 0, 'admitted': 0}, 'normal': {'offered': 0, 'admitted': 0}}
+    completions = []      # (finish time) heap of admitted executions
+    unshed = []           # same, had every request been admitted
+    peak_in_flight = 0
+    peak_unshed = 0
+    first_shed_at = None
+    decision_ns = []
+
+    for arrival in generate_arrivals(duration, seed):
+        now = arrival['time']
+        while completions and completions[0] <= now:
+            heapq.heappop(completions)
+            budget.release()
+        while unshed and unshed[0] <= now:
+            heapq.heappop(unshed)
+
+        priority = arrival['priority']
+        tenant = tenants['noisy' if arrival['client_id'] == 'noisy' else 'normal']
+        outcomes[priority]['offered'] += 1
+        tenant['offered'] += 1
+        heapq.heappush(unshed, now + EXECUTION_SECONDS[priority])
+        peak_unshed = max(peak_unshed, len(unshed))
+
+        started = time.perf_counter_ns()
+        cost = trigger.PRIORITY_CLASSES[priority]['cost']
+        if limiter.try_acquire(arrival['client_id'], cost, now=now):
+            decision = 'rate_limited'
+        elif budget.try_acquire(priority):
+            decision = 'admitted'
+        else:
+            decision = 'shed'
+        decision_ns.append(time.perf_counter_ns() - started)
+
+        outcomes[priority][decision] += 1
+        if decision == 'admitted':
+            tenant['admitted'] += 1
+            heapq.heappush(completions, now + EXECUTION_SECONDS[priority])
+            peak_in_flight = max(peak_in_flight, len(completions))
+        elif decision == 'shed' and first_shed_at is None:
+            first_shed_at = now
+
+    decision_us = sorted(ns / 1000 for ns in decision_ns)
+    return {
+        'duration_s': duration,
+        'limit': limit,
+        'offered': len(decision_ns),
+        'offered_per_sec': round(len(decision_ns) / duration, 1),
+        'by_priority': outcomes,
+        'by_tenant': {
+            name: {**counts, 'admit_rate': round(counts['admitted'] / counts['offered'], 3) if counts['offered'] else 0.0}
+            for name, counts in tenants.items()
+        },
+        'peak_in_flight': peak_in_flight,
+        'peak_in_flight_without_shedding': peak_unshed,
+        'first_shed_at_s': round(first_shed_at, 2) if first_shed_at is not None else None,
+        'decision_p50_us': round(percentile(decision_us, 50), 2),
+        'decision_p99_us': round(percentile(decision_us, 99), 2),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Offered {report['offered']} requests ({report['offered_per_sec']}/s) over {report['duration_s']}s, "
+        f"budget {report['limit']} in flight",
+        '',
+        f"{'priority':12} {'offered':>8} {'admitted':>9} {'429':>7} {'503':>7}",
+    ]
+    for priority, counts in report['by_priority'].items():
+        lines.append(f"{priority:12} {counts['offered']:>8} {counts['admitted']:>9} "
+                     f"{counts['rate_limited']:>7} {counts['shed']:>7}")
+    lines.append('')
+    for name, counts in report['by_tenant'].items():
+        lines.append(f"{name} tenants: admitted {counts['admitted']}/{counts['offered']} ({counts['admit_rate']:.1%})")
+    lines += [
+        '',
+        f"Peak in flight: {report['peak_in_flight']} (without shedding: {report['peak_in_flight_without_shedding']})",
+        f"First 503 at: {report['first_shed_at_s']}s",
+        f"Decision latency: p50 {report['decision_p50_us']}us, p99 {report['decision_p99_us']}us",
+    ]
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=60.0, help='Simulated seconds of overload')
+    parser.add_argument('--limit', type=int, default=200, help='Global in-flight execution budget')
+    parser.add_argument('--client-rate', type=float, default=5.0)
+    parser.add_argument('--client-burst', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args(argv)
+
+    report = run_overload(args.duration, args.limit, args.client_rate, args.client_burst, args.seed)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
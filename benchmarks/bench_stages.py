@@ -0,0 +1,294 @@
+"""
+Stage-level micro-benchmarks for the pipeline, analytics and chatbot handlers.
+
+Run from the repository root:
+    python -m benchmarks.bench_stages                  # compare against baseline
+    python -m benchmarks.bench_stages --save-baseline  # record a new baseline
+    python -m benchmarks.bench_stages --only input_analyzer.lambda_handler
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.workload import WorkloadGenerator
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Fraction of operations traced for allocations; tracing slows every call down
+ALLOCATION_SAMPLE = 200
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_benchmark(fn: Callable[[Any], Any], events: List[Any], warmup: int = 50) -> Dict[str, float]:
+    """
+    Time fn over every event, then trace allocations over a sample of them
+    """
+    for event in events[:warmup]:
+        fn(event)
+
+    latencies_ns = []
+    started = time.perf_counter_ns()
+    for event in events:
+        call_start = time.perf_counter_ns()
+        fn(event)
+        latencies_ns.append(time.perf_counter_ns() - call_start)
+    elapsed_ns = time.perf_counter_ns() - started
+
+    peak_bytes = []
+    retained_bytes = []
+    tracemalloc.start()
+    try:
+        for event in events[:ALLOCATION_SAMPLE]:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn(event)
+            current, peak = tracemalloc.get_traced_memory()
+            peak_bytes.append(peak - before)
+            retained_bytes.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies_us = sorted(ns / 1000 for ns in latencies_ns)
+    return {
+        'operations': len(events),
+        'ops_per_sec': round(len(events) / (elapsed_ns / 1e9), 1) if elapsed_ns else 0.0,
+        'mean_us': round(sum(latencies_us) / len(latencies_us), 2),
+        'p50_us': round(percentile(latencies_us, 50), 2),
+        'p95_us': round(percentile(latencies_us, 95), 2),
+        'p99_us': round(percentile(latencies_us, 99), 2),
+        'max_us': round(latencies_us[-1], 2),
+        'alloc_peak_bytes': int(sum(peak_bytes) / len(peak_bytes)),
+        'alloc_retained_bytes': int(sum(retained_bytes) / len(retained_bytes)),
+    }
+
+
+# ============================================================================
+# BENCHMARK DEFINITIONS
+# ============================================================================
+# Each builder returns the function under test and the events to feed it,
+# optionally followed by a cleanup callable run after measurement.
+
+def bench_input_analyzer(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    analyzer = load_handler('input_analyzer', aws)
+    events = [workload.analyzer_event() for _ in range(iterations)]
+    return lambda event: analyzer.lambda_handler(event, None), events
+
+
+def bench_response_enhancer(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    analyzer = load_handler('input_analyzer', aws)
+    enhancer = load_handler('response_enhancer', aws)
+    events = [workload.enhancer_event(analyzer.analyze_input) for _ in range(iterations)]
+    return lambda event: enhancer.lambda_handler(event, None), events
+
+
+def bench_extract_execution_data(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    logger = load_handler('pipeline_logger', aws)
+    events = [workload.logger_event(failed=(i % 10 == 0)) for i in range(iterations)]
+    return logger.extract_execution_data, events
+
+
+def bench_analyze_pipeline_data(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    analytics = load_handler('analytics', aws)
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=24)
+    # Each operation analyzes a 1,000-item window; rotate through a few windows
+    windows = [workload.log_items(1000, end_time=end_time) for _ in range(5)]
+    events = [windows[i % len(windows)] for i in range(max(iterations // 20, 10))]
+    return lambda items: analytics.analyze_pipeline_data(items, start_time, end_time), events
+
+
+def bench_trigger_fused(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    trigger = load_handler('trigger', aws)
+    # Distinct source IPs so the per-client admission limit never trips
+    events = [
+        {
+            'body': json.dumps({'input': text, 'mode': 'sync'}),
+            'requestContext': {'identity': {'sourceIp': f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}}
+        }
+        for i, text in enumerate(workload.inputs(iterations, size=200))
+    ]
+
+    def invoke(event):
+        trigger.lambda_handler(event, None)
+
+    # Logging is asynchronous; drain it so it does not outlive the benchmark
+    return invoke, events, lambda: trigger.fused.flush_pending_logs()
+
+
+def bench_validate_input(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    chatbot = load_handler('chatbot', aws)
+    events = [workload.user_input(size=workload._random.randint(10, 2000)) for _ in range(iterations)]
+    return chatbot.validate_input, events
+
+
+def bench_generate_conversation_id(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    chatbot = load_handler('chatbot', aws)
+    events = [workload.chat_event(message='hi') for _ in range(iterations)]
+    return chatbot.generate_conversation_id, events
+
+
+def bench_conversation_manager(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    chatbot = load_handler('chatbot', aws)
+    manager = chatbot.ConversationManager()
+    events = [
+        (f"conv_{i % 500}", chatbot.ChatMessage('user', workload.user_input(size=200), time.time()))
+        for i in range(iterations)
+    ]
+
+    def add_and_read(event):
+        conversation_id, message = event
+        manager.add_message(conversation_id, message)
+        return manager.get_history(conversation_id)
+
+    return add_and_read, events
+
+
+def bench_rate_limiter(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    chatbot = load_handler('chatbot', aws)
+    limiter = chatbot.RateLimiter(max_requests=100, window_seconds=60)
+    events = [f"client_{i % 1000}" for i in range(iterations)]
+    return limiter.is_allowed, events
+
+
+def bench_chatbot_handler(workload: WorkloadGenerator, aws: LocalAWS, iterations: int):
+    chatbot = load_handler('chatbot', aws)
+    # Distinct clients so the per-client rate limit never trips
+    events = [workload.chat_event(client=i) for i in range(iterations)]
+    return lambda event: chatbot.lambda_handler(event, None), events
+
+
+BENCHMARKS: Dict[str, Callable[[WorkloadGenerator, LocalAWS, int], Tuple]] = {
+    'input_analyzer.lambda_handler': bench_input_analyzer,
+    'response_enhancer.lambda_handler': bench_response_enhancer,
+    'pipeline_logger.extract_execution_data': bench_extract_execution_data,
+    'analytics.analyze_pipeline_data': bench_analyze_pipeline_data,
+    'trigger.fused': bench_trigger_fused,
+    'chatbot.validate_input': bench_validate_input,
+    'chatbot.generate_conversation_id': bench_generate_conversation_id,
+    'chatbot.ConversationManager': bench_conversation_manager,
+    'chatbot.RateLimiter': bench_rate_limiter,
+    'chatbot.lambda_handler': bench_chatbot_handler,
+}
+
+
+def run_suite(iterations: int = 2000, seed: int = 42,
+              only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Run the selected benchmarks with a fresh seeded workload each
+    """
+    results = {}
+    for name, builder in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        fn, events, *cleanup = builder(WorkloadGenerator(seed), LocalAWS(), iterations)
+        # Handlers print diagnostics on every call; keep them out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results[name] = run_benchmark(fn, events)
+            for finish in cleanup:
+                finish()
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    List benchmarks whose throughput or p95 latency moved past the tolerance
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['ops_per_sec'] < previous['ops_per_sec'] * (1 - tolerance):
+            regressions.append({
+                'benchmark': name, 'metric': 'ops_per_sec',
+                'baseline': previous['ops_per_sec'], 'current': current['ops_per_sec']
+            })
+        if current['p95_us'] > previous['p95_us'] * (1 + tolerance):
+            regressions.append({
+                'benchmark': name, 'metric': 'p95_us',
+                'baseline': previous['p95_us'], 'current': current['p95_us']
+            })
+    return regressions
+
+
+def format_report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> str:
+    header = f"{'benchmark':42} {'ops/sec':>11} {'vs base':>8} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'peak B':>9}"
+    lines = [header, '-' * len(header)]
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        change = (f"{(stats['ops_per_sec'] / previous['ops_per_sec'] - 1) * 100:+.0f}%"
+                  if previous and previous['ops_per_sec'] else 'new')
+        lines.append(
+            f"{name:42} {stats['ops_per_sec']:>11.1f} {change:>8} {stats['p50_us']:>9.1f} "
+            f"{stats['p95_us']:>9.1f} {stats['p99_us']:>9.1f} {stats['alloc_peak_bytes']:>9}"
+        )
+    return '\n'.join(lines)
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('benchmarks', {})
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed fractional regression before failing (default: 0.2)')
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.iterations, args.seed, args.only)
+    baseline = load_baseline(args.baseline)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results, baseline))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'recorded_at': datetime.utcnow().isoformat(),
+                'python': sys.version.split()[0],
+                'iterations': args.iterations,
+                'seed': args.seed,
+                'benchmarks': {**baseline, **results}
+            }, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
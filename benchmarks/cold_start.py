@@ -0,0 +1,402 @@
+"""
+Cold-start profiling with per-handler startup budgets.
+
+Each handler starts in a fresh interpreter, the way a new Lambda container
+does. Its CodeUri root and the shared layer go on sys.path and the module
+is imported, which is the init phase. Then, against the in-memory AWS
+stand-ins, it handles a first and a second representative event. Finally
+the boto3 clients the module declares are built for real; this needs no
+network. `-X importtime` output is split by phase and summed per
+top-level package, so the report shows where init time goes. It also
+shows what the first invocation still imports lazily.
+
+Two kinds of checks read benchmarks/startup_budgets.json:
+
+  imports   which packages each handler must import at init, and which it
+            must never import. These do not depend on the host, and any
+            handler that breaks them fails the run (exit 1).
+  budgets   milliseconds per handler, each the median of --runs fresh
+            interpreters. Timings depend on the machine, so a handler over
+            budget is only reported, unless --strict makes it fail the run.
+
+    import_ms        module import (init phase)
+    first_invoke_ms  first invocation, including anything imported lazily
+    clients_ms       building the handler's boto3 clients on first use
+    cold_start_ms    all three
+
+Budgets are recorded from a run with --save-budgets, which adds --margin
+(default 100%) over each median. Record them on the same kind of host
+that checks them with --strict.
+
+Run from the repository root:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --only analytics --runs 9 --modules 15
+    python -m benchmarks.cold_start --strict
+    python -m benchmarks.cold_start --save-budgets
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Only the standard library at module level: a child interpreter imports
+# this module before the handler, and anything imported here would be
+# missing from the handler's import profile.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGETS = os.path.join(REPO_ROOT, 'benchmarks', 'startup_budgets.json')
+
+METRICS = ('import_ms', 'first_invoke_ms', 'clients_ms', 'cold_start_ms')
+
+# Phases of a child's import profile that belong to the handler itself;
+# 'setup' is the local AWS stand-ins and the test events
+HANDLER_PHASES = ('import', 'invoke', 'warm', 'clients')
+
+# Markers a child writes to stderr between phases of the import profile,
+# and before its result on stdout, which handlers also print to
+PHASE_MARKER = 'cold_start phase: '
+RESULT_MARKER = 'cold_start result: '
+
+
+# ============================================================================
+# CHILD: one cold start
+# ============================================================================
+
+def first_event(name: str, module, aws) -> Dict[str, Any]:
+    """
+    A representative event for a handler, with any table data it reads
+    """
+    from benchmarks.workload import WorkloadGenerator, as_table_item
+
+    workload = WorkloadGenerator(7)
+    if name == 'input_analyzer':
+        return workload.analyzer_event()
+    if name == 'response_enhancer':
+        return {'input': workload.user_input(),
+                'analysis': {'complexity': 'medium', 'category': 'technical', 'question_count': 1},
+                'base_response': ''}
+    if name == 'pipeline_logger':
+        return workload.logger_event()
+    if name == 'trigger':
+        return {'body': json.dumps({'input': workload.user_input(size=200)}),
+                'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}}
+    if name == 'results':
+        aws.table(module.result_table_name).put_item(Item={'request_id': 'req_cold', 'status': 'SUCCEEDED',
+                                                           'result': {'content': 'done'}})
+        return {'pathParameters': {'request_id': 'req_cold'}, 'queryStringParameters': {'wait': '0'}}
+    if name == 'analytics':
+        for item in workload.log_items(500):
+            aws.table(module.table_name).put_item(Item=as_table_item(item))
+        return {'path': '/analytics', 'queryStringParameters': {'hours': '24'}}
+    if name == 'live_metrics':
+        records = []
+        log_table = aws.table('PipelineLogs')
+        log_table.add_stream_listener(records.append)
+        for item in workload.log_items(100, hours=1):
+            log_table.put_item(Item=as_table_item(item))
+        return {'Records': records}
+    if name == 'chatbot':
+        return workload.chat_event()
+    raise ValueError(f"No cold-start event for handler: {name}")
+
+
+def lazy_clients(module, _seen: Optional[set] = None) -> List[Any]:
+    """
+    The not-yet-built clients a module and its in-repo imports declare
+    """
+    seen = _seen if _seen is not None else set()
+    clients = []
+    for value in list(vars(module).values()):
+        if id(value) in seen:
+            continue
+        if type(value).__name__ == 'Lazy':
+            seen.add(id(value))
+            clients.append(value)
+        elif isinstance(value, type(module)) and is_repo_module(value):
+            seen.add(id(value))
+            clients.extend(lazy_clients(value, seen))
+    return clients
+
+
+def is_repo_module(module) -> bool:
+    path = getattr(module, '__file__', None) or ''
+    return os.path.abspath(path).startswith(REPO_ROOT + os.sep)
+
+
+def run_child(name: str, path: str) -> Dict[str, Any]:
+    """
+    Import, invoke and build clients for one handler in this fresh process
+    """
+    import importlib.util
+
+    # What Lambda does: the CodeUri root and the layer are on sys.path
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    for code_root in (os.path.dirname(path), os.path.join(REPO_ROOT, 'common')):
+        sys.path.append(code_root)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        mark('import')
+        started = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(f"cold_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        import_ms = (time.perf_counter() - started) * 1000
+        clients = lazy_clients(module)
+
+        mark('setup')
+        from local.fakes import FakeContext, LocalAWS
+        from local.handlers import install_fakes
+
+        aws = LocalAWS()
+        install_fakes(module, aws)
+        event = first_event(name, module, aws)
+        second = first_event(name, module, aws)
+
+        mark('invoke')
+        started = time.perf_counter()
+        module.lambda_handler(event, FakeContext(name))
+        first_invoke_ms = (time.perf_counter() - started) * 1000
+
+        mark('warm')
+        started = time.perf_counter()
+        module.lambda_handler(second, FakeContext(name))
+        warm_invoke_ms = (time.perf_counter() - started) * 1000
+
+    mark('clients')
+    started = time.perf_counter()
+    for client in clients:
+        client.resolve()
+    clients_ms = (time.perf_counter() - started) * 1000
+
+    mark('done')
+    return {
+        'handler': name,
+        'import_ms': round(import_ms, 3),
+        'first_invoke_ms': round(first_invoke_ms, 3),
+        'warm_invoke_ms': round(warm_invoke_ms, 3),
+        'clients_ms': round(clients_ms, 3),
+        'clients': len(clients),
+        'cold_start_ms': round(import_ms + first_invoke_ms + clients_ms, 3),
+    }
+
+
+def mark(phase: str) -> None:
+    sys.stderr.write(f"{PHASE_MARKER}{phase}\n")
+    sys.stderr.flush()
+
+
+# ============================================================================
+# PARENT: profiles, budgets and the report
+# ============================================================================
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, float]]:
+    """
+    Self time per top-level package (ms) for each phase of a child's
+    `-X importtime` output
+    """
+    phases: Dict[str, Dict[str, float]] = {}
+    current = None
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            current = line[len(PHASE_MARKER):].strip()
+            continue
+        if current is None or not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        package = fields[2].strip().split('.')[0]
+        totals = phases.setdefault(current, {})
+        totals[package] = totals.get(package, 0.0) + int(fields[0]) / 1000
+    return phases
+
+
+def profile_handler(name: str, path: str) -> Dict[str, Any]:
+    """
+    One cold start of a handler in a fresh interpreter
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.cold_start', '--child', name, '--path', path],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    [line] = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+    result = json.loads(line[len(RESULT_MARKER):])
+    result['packages'] = parse_importtime(completed.stderr)
+    return result
+
+
+def measure(only: Optional[List[str]] = None, runs: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Median cold start of each handler over `runs` fresh interpreters, with
+    the per-package import profile of the median run
+    """
+    from local.handlers import HANDLER_PATHS
+
+    results = {}
+    for name, relative_path in HANDLER_PATHS.items():
+        if only and name not in only:
+            continue
+        samples = [profile_handler(name, os.path.join(REPO_ROOT, relative_path)) for _ in range(runs)]
+        samples.sort(key=lambda sample: sample['cold_start_ms'])
+        median_run = samples[len(samples) // 2]
+        results[name] = {
+            **{metric: round(statistics.median(sample[metric] for sample in samples), 3)
+               for metric in METRICS + ('warm_invoke_ms',)},
+            'clients': median_run['clients'],
+            'packages': median_run['packages'],
+        }
+    return results
+
+
+def check_budgets(results: Dict[str, Dict[str, Any]], budgets: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """
+    Every metric of every handler that went over its budget
+    """
+    violations = []
+    for name, result in results.items():
+        for metric, budget in budgets.get(name, {}).items():
+            if metric in result and result[metric] > budget:
+                violations.append({'handler': name, 'metric': metric, 'budget': budget, 'current': result[metric]})
+    return violations
+
+
+def check_imports(results: Dict[str, Dict[str, Any]], rules: Dict[str, Dict[str, List[str]]]) -> List[Dict[str, Any]]:
+    """
+    Every import rule a handler broke. `init` lists packages the handler
+    must import at init, so its first request does not pay for them;
+    `never` lists packages it must not import at all.
+    """
+    violations = []
+    for name, result in results.items():
+        packages = result['packages']
+        rule = rules.get(name, {})
+        for package in rule.get('init', []):
+            if package not in packages.get('import', {}):
+                found = [phase for phase in HANDLER_PHASES if package in packages.get(phase, {})]
+                violations.append({'handler': name, 'package': package, 'rule': 'init',
+                                   'phase': found[0] if found else None})
+        for package in rule.get('never', []):
+            for phase in HANDLER_PHASES:
+                if package in packages.get(phase, {}):
+                    violations.append({'handler': name, 'package': package, 'rule': 'never', 'phase': phase})
+    return violations
+
+
+def read_budgets_file(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_budgets(path: str) -> Dict[str, Dict[str, float]]:
+    return read_budgets_file(path).get('budgets', {})
+
+
+def load_import_rules(path: str) -> Dict[str, Dict[str, List[str]]]:
+    return read_budgets_file(path).get('imports', {})
+
+
+def save_budgets(path: str, results: Dict[str, Dict[str, Any]], runs: int, margin: float) -> None:
+    """
+    Record timing budgets for the measured handlers, keeping the budgets of
+    the others and the import rules
+    """
+    saved = read_budgets_file(path)
+    budgets = saved.get('budgets', {})
+    for name, result in results.items():
+        budgets[name] = {metric: round(result[metric] * (1 + margin) + 1, 1) for metric in METRICS}
+    saved.update({
+        'recorded_at': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'margin': margin,
+        'budgets': budgets
+    })
+    with open(path, 'w') as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def describe_import_violation(violation: Dict[str, Any]) -> str:
+    if violation['rule'] == 'init':
+        where = f"imported during {violation['phase']}" if violation['phase'] else 'not imported'
+        return f"IMPORT {violation['handler']} {violation['package']}: {where}, expected at init"
+    return f"IMPORT {violation['handler']} {violation['package']}: imported during {violation['phase']}, expected never"
+
+
+def top_packages(packages: Dict[str, float], count: int) -> List[str]:
+    ranked = sorted(packages.items(), key=lambda entry: entry[1], reverse=True)[:count]
+    return [f"{package} {ms:.1f}" for package, ms in ranked if ms >= 0.1]
+
+
+def format_report(results: Dict[str, Dict[str, Any]], budgets: Dict[str, Dict[str, float]],
+                  modules: int = 5) -> str:
+    lines = [
+        f"{'handler':18} {'import':>9} {'1st call':>9} {'clients':>9} {'cold':>9} {'budget':>9} {'warm':>8}",
+    ]
+    for name, result in results.items():
+        budget = budgets.get(name, {}).get('cold_start_ms')
+        over = any(result[metric] > limit for metric, limit in budgets.get(name, {}).items() if metric in result)
+        lines.append(
+            f"{name:18} {result['import_ms']:>9.1f} {result['first_invoke_ms']:>9.1f} {result['clients_ms']:>9.1f} "
+            f"{result['cold_start_ms']:>9.1f} {budget if budget is not None else 'none':>9} "
+            f"{result['warm_invoke_ms']:>8.2f}{'  OVER' if over else ''}")
+    lines += ['', 'Milliseconds, median of fresh interpreters. Self import time by package (ms):']
+    for name, result in results.items():
+        packages = result['packages']
+        lines.append(f"  {name}")
+        for phase in ('import', 'invoke', 'clients'):
+            if packages.get(phase):
+                lines.append(f"    {phase:8} " + ', '.join(top_packages(packages[phase], modules)))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', action='append', help='Handler to profile (repeatable)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per handler')
+    parser.add_argument('--modules', type=int, default=5, help='Packages listed per phase')
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS)
+    parser.add_argument('--save-budgets', action='store_true')
+    parser.add_argument('--margin', type=float, default=1.0,
+                        help='Headroom over the measured medians when saving budgets (default: 1.0)')
+    parser.add_argument('--strict', action='store_true', help='Fail the run when a handler is over its timing budget')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(RESULT_MARKER + json.dumps(run_child(args.child, args.path)), flush=True)
+        return 0
+
+    results = measure(args.only, args.runs)
+    budgets = load_budgets(args.budgets)
+    print(json.dumps(results, indent=2) if args.json else format_report(results, budgets, args.modules))
+
+    if args.save_budgets:
+        save_budgets(args.budgets, results, args.runs, args.margin)
+        print(f"Budgets saved to {args.budgets}")
+        return 0
+
+    import_violations = check_imports(results, load_import_rules(args.budgets))
+    for violation in import_violations:
+        print(describe_import_violation(violation))
+
+    violations = check_budgets(results, budgets)
+    for violation in violations:
+        print(f"OVER BUDGET {violation['handler']} {violation['metric']}: "
+              f"{violation['current']} > {violation['budget']}{'' if args.strict else ' (report only)'}")
+    return 1 if import_violations or (violations and args.strict) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
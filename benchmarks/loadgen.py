@@ -0,0 +1,549 @@
+"""
+Open-loop load generator for the API handlers.
+
+Sends requests on a fixed schedule, whatever the responses are doing. With
+--rps R the i-th request is due at i/R seconds (or at Poisson arrivals with
+--arrivals poisson), and a pool of workers sends each one when it is due.
+Latency is measured from the time the request was due, not from when a
+worker got to it. A stalled target therefore shows up as the queueing
+delay every request behind it would have seen, rather than as one slow
+request among fewer samples (coordinated omission). Service time, from
+send to response, is reported next to it.
+
+Requests come from a seeded synthetic mix of /trigger, /chat and
+/analytics calls, or are replayed from a JSON lines log (--requests):
+
+    {"method": "POST", "path": "/chat", "body": {"message": "hi"}, "at": 0.25}
+
+`at` (seconds from the start) is optional; without --rps a log that has it
+is replayed at its recorded timing, scaled by --speed. Lines in API
+Gateway event form (httpMethod, path, queryStringParameters, body) work
+too.
+
+The target is either the handlers in this process, wired to the in-memory
+AWS stand-ins in local/fakes.py, or a deployed API by base URL. Latencies
+go into log-linear (HDR-style) histograms per endpoint; --hgrm-dir writes
+each one in the HdrHistogram percentile distribution format.
+
+Run from the repository root:
+    python -m benchmarks.loadgen --rps 200 --duration 30
+    python -m benchmarks.loadgen --rps 50 --mix chat=1 --model-latency-ms 800
+    python -m benchmarks.loadgen --target https://abc.execute-api.us-east-2.amazonaws.com/Prod --rps 20
+    python -m benchmarks.loadgen --requests recorded.jsonl --speed 2 --json
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.workload import WorkloadGenerator, as_table_item
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import load_handler
+
+# API routes served by each handler, as API Gateway resources
+ROUTES = [
+    ('POST', '/trigger', 'trigger'),
+    ('POST', '/trigger/batch', 'trigger'),
+    ('GET', '/result/{request_id}', 'results'),
+    ('POST', '/chat', 'chatbot'),
+    ('POST', '/chat/batch', 'chatbot'),
+    ('GET', '/analytics', 'analytics'),
+    ('GET', '/analytics/cube', 'analytics'),
+]
+
+DEFAULT_MIX = {'trigger': 1.0, 'chat': 1.0, 'analytics': 1.0}
+PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of integer microseconds, in the style of
+    HdrHistogram. Values below 2**sub_bucket_bits are counted exactly.
+    Above that each power of two is split into 2**(sub_bucket_bits - 1)
+    equal buckets, so a recorded value is off by at most 1/64 with the
+    default 7 bits. Recording is O(1) and memory grows with the number of
+    distinct buckets, not samples.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value: int) -> int:
+        bits = self.sub_bucket_bits
+        if value < 1 << bits:
+            return value
+        shift = value.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + ((value >> shift) - half)
+
+    def bucket_bounds(self, index: int) -> Tuple[int, int]:
+        """
+        Lowest and highest value counted in a bucket
+        """
+        bits = self.sub_bucket_bits
+        if index < 1 << bits:
+            return index, index
+        half = 1 << (bits - 1)
+        shift, offset = divmod(index - (1 << bits), half)
+        shift += 1
+        low = (half + offset) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, value_us: int, count: int = 1) -> None:
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value_us * count
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = max(self.max, value_us)
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct: float) -> int:
+        """
+        Highest value equivalent to the pct-th percentile sample
+        """
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def summary_ms(self) -> Dict[str, float]:
+        summary = {f"p{pct:g}": round(self.percentile(pct) / 1000, 3) for pct in PERCENTILES}
+        summary.update({
+            'min': round((self.min or 0) / 1000, 3),
+            'mean': round(self.mean() / 1000, 3),
+            'max': round(self.max / 1000, 3)
+        })
+        return summary
+
+    def percentile_distribution(self, ticks_per_half: int = 5, unit_ratio: float = 1000.0) -> str:
+        """
+        The HdrHistogram percentile distribution text (.hgrm), in milliseconds
+        """
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", '']
+        if self.total:
+            ordered = sorted(self.counts)
+            cumulative, seen = [], 0
+            for index in ordered:
+                seen += self.counts[index]
+                cumulative.append((seen, min(self.bucket_bounds(index)[1], self.max)))
+            # Percentiles halve the remaining distance to 100% every
+            # ticks_per_half steps, as in HdrHistogram's output
+            pct, step = 0.0, 0
+            while True:
+                rank = max(1, math.ceil(pct * self.total))
+                count, value = next(entry for entry in cumulative if entry[0] >= rank)
+                inverse = f"{1 / (1 - pct):14.2f}" if pct < 1 else ''
+                lines.append(f"{value / unit_ratio:12.3f} {pct:14.12f} {count:10d} {inverse}".rstrip())
+                if pct >= 1 or count == self.total:
+                    break
+                step += 1
+                halvings, tick = divmod(step, ticks_per_half)
+                pct = 1 - 0.5 ** halvings * (1 - tick / ticks_per_half / 2)
+            if pct < 1:
+                lines.append(f"{self.max / unit_ratio:12.3f} {1.0:14.12f} {self.total:10d}")
+        lines += [
+            f"#[Mean    = {self.mean() / unit_ratio:12.3f}, Total count    = {self.total:12d}]",
+            f"#[Max     = {self.max / unit_ratio:12.3f}, Buckets        = {len(self.counts):12d}]",
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def route_for(method: str, path: str) -> Tuple[Optional[str], str, Dict[str, str]]:
+    """
+    The handler, route template and path parameters for a request
+    """
+    for route_method, template, handler in ROUTES:
+        if route_method != method:
+            continue
+        pattern = '^' + re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', template) + '$'
+        match = re.match(pattern, path)
+        if match:
+            return handler, template, match.groupdict()
+    return None, path, {}
+
+
+def normalize_request(line: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A request from a log line, in either this tool's or API Gateway's form
+    """
+    if 'httpMethod' in line:
+        identity = (line.get('requestContext') or {}).get('identity') or {}
+        return {
+            'method': line['httpMethod'],
+            'path': line.get('path', '/'),
+            'query': line.get('queryStringParameters') or {},
+            'body': line.get('body'),
+            'client': identity.get('sourceIp'),
+            'at': line.get('at')
+        }
+    return {
+        'method': line.get('method', 'GET').upper(),
+        'path': line['path'],
+        'query': line.get('query') or {},
+        'body': line.get('body'),
+        'client': line.get('client'),
+        'at': line.get('at')
+    }
+
+
+def load_requests(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [normalize_request(json.loads(line)) for line in f if line.strip()]
+
+
+class SyntheticRequests:
+    """
+    Seeded requests drawn from an endpoint mix
+    """
+
+    def __init__(self, mix: Dict[str, float], seed: int = 42, clients: int = 1000):
+        self.workload = WorkloadGenerator(seed)
+        self.random = random.Random(seed)
+        self.clients = clients
+        self.endpoints = list(mix)
+        self.weights = [mix[endpoint] for endpoint in self.endpoints]
+
+    def next(self) -> Dict[str, Any]:
+        endpoint = self.random.choices(self.endpoints, self.weights)[0]
+        client = f"10.1.{self.random.randrange(self.clients) // 256}.{self.random.randrange(256)}"
+        if endpoint == 'trigger':
+            return {'method': 'POST', 'path': '/trigger', 'query': {},
+                    'body': {'input': self.workload.user_input()}, 'client': client}
+        if endpoint == 'chat':
+            return {'method': 'POST', 'path': '/chat', 'query': {},
+                    'body': {'message': self.workload.user_input(size=self.random.randint(10, 400))},
+                    'client': client}
+        if endpoint == 'cube':
+            return {'method': 'GET', 'path': '/analytics/cube',
+                    'query': {'group_by': self.random.choice(['category', 'complexity', 'category,error_type'])},
+                    'body': None, 'client': client}
+        return {'method': 'GET', 'path': '/analytics', 'query': {'hours': '24'}, 'body': None, 'client': client}
+
+
+def arrival_offsets(rps: float, duration: float, arrivals: str = 'constant', seed: int = 42) -> Iterator[float]:
+    """
+    Send times in seconds from the start, independent of responses
+    """
+    rng = random.Random(seed)
+    offset = 0.0 if arrivals == 'constant' else rng.expovariate(rps)
+    while offset < duration:
+        yield offset
+        offset += 1 / rps if arrivals == 'constant' else rng.expovariate(rps)
+
+
+def schedule(source, rps: Optional[float], duration: float, arrivals: str = 'constant',
+             speed: float = 1.0, seed: int = 42) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """
+    (offset, request) pairs: at `rps` from a synthetic source or a cycled
+    log, or at a log's recorded `at` offsets divided by `speed`
+    """
+    if isinstance(source, list):
+        if not source:
+            return
+        if rps is None:
+            for request in source:
+                offset = float(request.get('at') or 0) / speed
+                if offset >= duration:
+                    return
+                yield offset, request
+            return
+        index = 0
+        for offset in arrival_offsets(rps, duration, arrivals, seed):
+            yield offset, source[index % len(source)]
+            index += 1
+        return
+    for offset in arrival_offsets(rps or 10.0, duration, arrivals, seed):
+        yield offset, source.next()
+
+
+class InProcessTarget:
+    """
+    The repository's handlers, called directly with API Gateway proxy
+    events against one in-memory LocalAWS
+    """
+
+    def __init__(self, aws: Optional[LocalAWS] = None, model_latency_ms: float = 0.0, log_items: int = 2000,
+                 seed: int = 42):
+        self.aws = aws or LocalAWS()
+        self.aws.bedrock.latency_s = model_latency_ms / 1000
+        self.handlers = {}
+        for name in {handler for _, _, handler in ROUTES}:
+            self.handlers[name] = load_handler(name, self.aws)
+        # Something for /analytics to aggregate
+        log_table = self.aws.table(self.handlers['analytics'].table_name)
+        for item in WorkloadGenerator(seed).log_items(log_items):
+            log_table.put_item(Item=as_table_item(item))
+
+    def send(self, request: Dict[str, Any]) -> int:
+        handler, resource, path_parameters = route_for(request['method'], request['path'])
+        if handler is None:
+            return 404
+        body = request.get('body')
+        event = {
+            'httpMethod': request['method'],
+            'path': request['path'],
+            'resource': resource,
+            'pathParameters': path_parameters or None,
+            'queryStringParameters': request.get('query') or None,
+            'headers': {'Content-Type': 'application/json'},
+            'requestContext': {'identity': {'sourceIp': request.get('client') or '127.0.0.1'}},
+            'body': body if body is None or isinstance(body, str) else json.dumps(body)
+        }
+        response = self.handlers[handler].lambda_handler(event, FakeContext(handler))
+        if hasattr(response.get('body'), '__iter__') and not isinstance(response.get('body'), (str, bytes)):
+            # Streamed bodies are read to the end, as a client would
+            for _ in response['body']:
+                pass
+        return int(response.get('statusCode', 200))
+
+
+class UrlTarget:
+    """
+    A deployed API by base URL, one keep-alive connection per worker thread
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self.connection_class(self.netloc, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def send(self, request: Dict[str, Any]) -> int:
+        path = self.prefix + request['path']
+        if request.get('query'):
+            path += '?' + urlencode(request['query'])
+        body = request.get('body')
+        if body is not None and not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            connection = self._connection()
+            connection.request(request['method'], path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            # A fresh connection for the next request on this worker
+            self._local.connection = None
+            raise
+
+
+class EndpointStats:
+    """
+    Latency histograms and outcome counts for one endpoint
+    """
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+        self.client_errors = 0
+
+    def record(self, status: Optional[int], latency_s: float, service_s: float) -> None:
+        self.latency.record(latency_s * 1e6)
+        self.service.record(service_s * 1e6)
+        key = str(status) if status is not None else 'exception'
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+        elif status >= 400:
+            self.client_errors += 1
+
+
+def run_load(target, requests: Iterator[Tuple[float, Dict[str, Any]]], concurrency: int = 64,
+             clock: Callable[[], float] = time.perf_counter) -> Dict[str, Any]:
+    """
+    Send each request when it is due and record, per endpoint, latency
+    from its due time and service time from when it was sent
+    """
+    stats: Dict[str, EndpointStats] = {}
+    lock = threading.Lock()
+    dispatch_lag = LatencyHistogram()
+
+    def send(request: Dict[str, Any], due: float) -> None:
+        sent = clock()
+        try:
+            status = target.send(request)
+        except Exception:
+            status = None
+        done = clock()
+        _, endpoint, _ = route_for(request['method'], request['path'])
+        with lock:
+            stats.setdefault(f"{request['method']} {endpoint}", EndpointStats()).record(status, done - due, done - sent)
+
+    start = clock() + 0.05
+    scheduled = 0
+    last_offset = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadgen') as pool:
+        for offset, request in requests:
+            due = start + offset
+            wait = due - clock()
+            if wait > 0:
+                time.sleep(wait)
+            dispatch_lag.record(max(0.0, clock() - due) * 1e6)
+            pool.submit(send, request, due)
+            scheduled += 1
+            last_offset = offset
+    elapsed = clock() - start
+
+    overall = EndpointStats()
+    endpoints = {}
+    for name, endpoint in sorted(stats.items()):
+        overall.latency.merge(endpoint.latency)
+        overall.service.merge(endpoint.service)
+        overall.errors += endpoint.errors
+        overall.client_errors += endpoint.client_errors
+        endpoints[name] = endpoint_report(endpoint, elapsed)
+    return {
+        'scheduled': scheduled,
+        'offered_rps': round(scheduled / last_offset, 2) if last_offset else float(scheduled),
+        'elapsed_s': round(elapsed, 3),
+        'concurrency': concurrency,
+        'dispatch_lag_ms': dispatch_lag.summary_ms(),
+        'overall': endpoint_report(overall, elapsed),
+        'endpoints': endpoints,
+        'histograms': {name: endpoint.latency for name, endpoint in stats.items()}
+    }
+
+
+def endpoint_report(endpoint: EndpointStats, elapsed: float) -> Dict[str, Any]:
+    count = endpoint.latency.total
+    return {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(endpoint.errors / count, 4) if count else 0.0,
+        'client_error_rate': round(endpoint.client_errors / count, 4) if count else 0.0,
+        'statuses': dict(sorted(endpoint.statuses.items())),
+        'latency_ms': endpoint.latency.summary_ms(),
+        'service_ms': endpoint.service.summary_ms()
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Scheduled {report['scheduled']} requests at {report['offered_rps']}/s over {report['elapsed_s']}s "
+        f"with {report['concurrency']} workers (dispatch lag p99 {report['dispatch_lag_ms']['p99']}ms)",
+        '',
+        'Latency from each request\'s scheduled time, corrected for coordinated omission (ms);',
+        'service = send to response p99',
+        '',
+        f"{'endpoint':26} {'reqs':>6} {'rps':>7} {'5xx':>6} {'4xx':>6} "
+        f"{'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>8} {'service':>8}",
+    ]
+    rows = list(report['endpoints'].items()) + [('all', report['overall'])]
+    for name, row in rows:
+        latency = row['latency_ms']
+        lines.append(
+            f"{name:26} {row['requests']:>6} {row['throughput_rps']:>7} {row['error_rate']:>6.1%} "
+            f"{row['client_error_rate']:>6.1%} {latency['p50']:>8} {latency['p90']:>8} {latency['p99']:>8} "
+            f"{latency['p99.9']:>8} {latency['max']:>8} {row['service_ms']['p99']:>8}")
+    return '\n'.join(lines)
+
+
+def write_hgrm(report: Dict[str, Any], directory: str) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, histogram in report['histograms'].items():
+        path = os.path.join(directory, re.sub(r'[^\w]+', '_', name).strip('_') + '.hgrm')
+        with open(path, 'w') as f:
+            f.write(histogram.percentile_distribution())
+        paths.append(path)
+    return paths
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('trigger', 'chat', 'analytics', 'cube'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default='local',
+                        help="'local' for in-process handlers, or the API's base URL")
+    parser.add_argument('--rps', type=float, help='Scheduled requests per second (default 10, or a log\'s own timing)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of schedule')
+    parser.add_argument('--arrivals', choices=('constant', 'poisson'), default='constant')
+    parser.add_argument('--concurrency', type=int, default=64, help='Most requests in flight')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Synthetic endpoint weights, e.g. trigger=2,chat=1,analytics=1,cube=1')
+    parser.add_argument('--requests', help='Replay requests from this JSON lines log')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed-up for a log\'s recorded timing')
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help='Local Bedrock stand-in latency')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout against a URL')
+    parser.add_argument('--hgrm-dir', help='Write each endpoint\'s histogram as .hgrm here')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args(argv)
+
+    source = load_requests(args.requests) if args.requests else SyntheticRequests(args.mix, args.seed)
+    if isinstance(source, list) and args.rps is None and not any(request.get('at') is not None for request in source):
+        args.rps = 10.0
+    requests = schedule(source, args.rps, args.duration, args.arrivals, args.speed, args.seed)
+
+    if args.target == 'local':
+        # Handlers log to stdout on every call; keep the console for the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            target = InProcessTarget(model_latency_ms=args.model_latency_ms, seed=args.seed)
+            report = run_load(target, requests, args.concurrency)
+    else:
+        report = run_load(UrlTarget(args.target, args.timeout), requests, args.concurrency)
+
+    if args.hgrm_dir:
+        for path in write_hgrm(report, args.hgrm_dir):
+            sys.stderr.write(f"Wrote {path}\n")
+    report.pop('histograms')
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 1 if report['overall']['error_rate'] > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Replay harness for the online anomaly detector.
+
+Runs the detector from analytics/anomaly.py over seeded synthetic latency
+series with a known onset: plain noise, isolated spikes, a step
+regression and a gradual ramp. For each scenario it reports whether the
+change was caught, how many observations it took, the false alarms
+before the onset, and the cost and state size per observation. With
+--items it replays exported log items instead (a JSON list of items, or
+the output of `aws dynamodb scan`) in timestamp order and lists the
+anomalies opened.
+
+Run from the repository root:
+    python -m benchmarks.replay_anomalies
+    python -m benchmarks.replay_anomalies --points 4000 --shift-z 3 --json
+    python -m benchmarks.replay_anomalies --items scan.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from local.handlers import REPO_ROOT, load_module
+
+# Latency of the synthetic series: a baseline with multiplicative noise
+BASE_LATENCY_MS = 800.0
+NOISE_SIGMA = 0.15
+SPIKE_FACTOR = 4.0
+STEP_FACTOR = 1.3
+RAMP_FACTOR = 2.0
+
+SCENARIOS = ('noise', 'spikes', 'step', 'ramp')
+
+
+def load_anomaly():
+    return load_module(os.path.join(REPO_ROOT, 'analytics', 'anomaly.py'), 'local_anomaly')
+
+
+def synthetic_series(scenario: str, points: int, seed: int) -> Dict[str, Any]:
+    """
+    Latencies for a scenario, the index where the change starts and the
+    indices that are anomalous by construction (spikes only)
+    """
+    rng = random.Random(seed)
+    onset = points // 2
+    values = [BASE_LATENCY_MS * rng.lognormvariate(0, NOISE_SIGMA) for _ in range(points)]
+    marked = []
+    if scenario == 'spikes':
+        marked = sorted(rng.sample(range(onset, points), 5))
+        for index in marked:
+            values[index] *= SPIKE_FACTOR
+    elif scenario == 'step':
+        for index in range(onset, points):
+            values[index] *= STEP_FACTOR
+    elif scenario == 'ramp':
+        for index in range(onset, points):
+            values[index] *= 1 + (RAMP_FACTOR - 1) * (index - onset) / (points - onset)
+    return {'values': values, 'onset': None if scenario == 'noise' else onset, 'marked': marked}
+
+
+def as_items(values: List[float], complexity: str = 'high') -> List[Dict[str, Any]]:
+    start = datetime(2026, 1, 1)
+    return [{
+        'execution_id': f"exec_{index}",
+        'timestamp': (start + timedelta(seconds=index)).isoformat(),
+        'complexity': complexity,
+        'total_processing_time_ms': value
+    } for index, value in enumerate(values)]
+
+
+def replay_scenario(anomaly, detector, scenario: str, points: int, seed: int) -> Dict[str, Any]:
+    series = synthetic_series(scenario, points, seed)
+    monitor = anomaly.AnomalyMonitor(detector, recent=points)
+    flagged = []
+    started = time.perf_counter()
+    for index, item in enumerate(as_items(series['values'])):
+        if monitor.observe_item(item):
+            flagged.append(index)
+    elapsed = time.perf_counter() - started
+
+    onset = series['onset']
+    before = [index for index in flagged if onset is None or index < onset]
+    after = [index for index in flagged if onset is not None and index >= onset]
+    report = {
+        'scenario': scenario,
+        'points': points,
+        'onset': onset,
+        'events': len(flagged),
+        'false_alarms': len(before),
+        'detected': bool(after),
+        'delay': after[0] - onset if after else None,
+        'observe_us': round(elapsed / points * 1e6, 2),
+        'state_bytes': max(len(json.dumps(state)) for state in monitor.states.values())
+    }
+    if series['marked']:
+        report['spikes_caught'] = sum(1 for index in series['marked'] if index in flagged)
+        report['spikes'] = len(series['marked'])
+    return report
+
+
+def run_replay(points: int = 2000, seed: int = 42, **settings) -> Dict[str, Any]:
+    """
+    Replay every synthetic scenario with one set of detector settings
+    """
+    anomaly = load_anomaly()
+    detector = anomaly.Detector(**{name: value for name, value in settings.items() if value is not None})
+    return {
+        'settings': {name: getattr(detector, name) for name in ('alpha', 'fast_alpha', 'spike_z', 'shift_z', 'warmup')},
+        'scenarios': [replay_scenario(anomaly, detector, scenario, points, seed) for scenario in SCENARIOS]
+    }
+
+
+def replay_items(path: str, **settings) -> Dict[str, Any]:
+    """
+    Replay exported log items in timestamp order
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        deserializer = TypeDeserializer()
+        data = [{name: deserializer.deserialize(value) for name, value in item.items()}
+                for item in data.get('Items', [])]
+    items = sorted(data, key=lambda item: str(item.get('timestamp', '')))
+
+    anomaly = load_anomaly()
+    monitor = anomaly.AnomalyMonitor(
+        anomaly.Detector(**{name: value for name, value in settings.items() if value is not None}),
+        recent=len(items) or 1)
+    for item in items:
+        monitor.observe_item(item)
+    report = monitor.snapshot()
+    report['items'] = len(items)
+    report['recent'] = sorted(monitor.events, key=lambda event: event.get('at') or '')
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    settings = report['settings']
+    lines = [
+        'Detector: ' + ', '.join(f"{name}={value}" for name, value in settings.items()),
+        '',
+        f"{'scenario':10} {'events':>7} {'false':>6} {'detected':>9} {'delay':>6} {'us/obs':>7} {'state B':>8}",
+    ]
+    for row in report['scenarios']:
+        detected = 'yes' if row['detected'] else ('-' if row['onset'] is None else 'NO')
+        if 'spikes' in row:
+            detected = f"{row['spikes_caught']}/{row['spikes']}"
+        delay = '' if row['delay'] is None else row['delay']
+        lines.append(f"{row['scenario']:10} {row['events']:>7} {row['false_alarms']:>6} {detected:>9} "
+                     f"{delay:>6} {row['observe_us']:>7} {row['state_bytes']:>8}")
+    return '\n'.join(lines)
+
+
+def format_items_report(report: Dict[str, Any]) -> str:
+    lines = [f"Replayed {report['items']} items across {report['series']} series, "
+             f"{len(report['recent'])} anomalies opened"]
+    for event in report['recent']:
+        lines.append(f"  {event['at']}  {event['series']:40} {event['kind']:5} "
+                     f"value {event['value']} vs baseline {event['baseline']} (score {event['score']})")
+    for active in report['active']:
+        lines.append(f"Still anomalous: {active['series']} since {active['since']}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=2000, help='Observations per synthetic series')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--items', help='Replay exported log items from this JSON file instead')
+    parser.add_argument('--alpha', type=float)
+    parser.add_argument('--fast-alpha', type=float)
+    parser.add_argument('--spike-z', type=float)
+    parser.add_argument('--shift-z', type=float)
+    parser.add_argument('--warmup', type=int)
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args(argv)
+
+    settings = {'alpha': args.alpha, 'fast_alpha': args.fast_alpha, 'spike_z': args.spike_z,
+                'shift_z': args.shift_z, 'warmup': args.warmup}
+    if args.items:
+        report = replay_items(args.items, **settings)
+        print(json.dumps(report, indent=2, default=str) if args.json else format_items_report(report))
+    else:
+        report = run_replay(args.points, args.seed, **settings)
+        print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,518 @@
+"""
+Memory-size tuning for the Lambda functions in pipeline-template.yaml.
+
+Each function's handler runs over a representative seeded workload against
+the in-memory AWS stand-ins, by default in its own fresh interpreter, so
+its resident memory is its own. For every invocation the harness records
+CPU time, wall time and the AWS calls made. For a traced sample it also
+records the peak memory allocated.
+
+Lambda gives a function CPU in proportion to its memory, with one full
+vCPU at 1,769 MB. The handlers here are single-threaded, so above that
+size they get no faster. A function's duration at a memory size is
+modelled as
+
+    CPU time * max(1, 1769 / MemorySize) + AWS call time
+
+AWS call time does not change with memory. It is the number of calls an
+invocation made, times a typical latency per service (--call-latency).
+Calls are taken to be sequential; live metrics posts to viewers in
+parallel, so its call time is an upper bound.
+Each tier's billed duration is rounded up to the millisecond and priced
+per GB-second plus the request charge, per million invocations. The
+recommended MemorySize is the cheapest tier that:
+
+- holds the function's working set (resident memory after import plus
+  its peak allocation per invocation) with --headroom to spare;
+- keeps the modelled p99 duration within the function's Timeout.
+
+A tier that costs at most --tolerance more is preferred when it saves
+whole billed milliseconds.
+`--strategy speed` instead takes the fastest tier within the tolerance of
+its duration, and `balanced` minimises cost times duration.
+
+Local CPU time stands in for Lambda vCPU time. --cpu-factor scales it when
+this machine is faster or slower than a Lambda vCPU (above 1 if faster).
+
+Run from the repository root:
+    python -m benchmarks.tune_memory
+    python -m benchmarks.tune_memory --only ChatbotFunction --tiers
+    python -m benchmarks.tune_memory --call-latency bedrock=2000 --architecture arm64 --json
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.bench_stages import percentile
+from benchmarks.workload import WorkloadGenerator, as_table_item
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import REPO_ROOT, load_handler
+from local.state_machine import DEFAULT_TEMPLATE, load_template
+
+# Memory at which a function has one full vCPU
+LAMBDA_VCPU_MB = 1769
+
+MEMORY_TIERS = (128, 192, 256, 384, 512, 768, 1024, 1536, 1769, 2048, 3008)
+
+# On-demand prices in USD (us-east-1, first pricing tier)
+PRICE_PER_GB_SECOND = {'x86_64': 0.0000166667, 'arm64': 0.0000133334}
+PRICE_PER_REQUEST = 0.0000002
+
+# Typical in-region latency per call (ms). A Bedrock call is a short Haiku reply.
+DEFAULT_CALL_LATENCY_MS = {
+    'dynamodb': 6.0,
+    'stepfunctions': 30.0,
+    'bedrock': 800.0,
+    'cloudwatch': 15.0,
+    'apigateway': 20.0,
+}
+
+# Invocations traced for allocations; tracing slows every call down
+ALLOCATION_SAMPLE = 50
+
+# Workload sizes: log items behind each /analytics query, records per
+# stream batch (the template's BatchSize) and dashboard viewers connected
+ANALYTICS_LOG_ITEMS = 5000
+STREAM_BATCH_SIZE = 100
+LIVE_VIEWERS = 20
+
+STRATEGIES = ('cost', 'speed', 'balanced')
+
+
+# ============================================================================
+# WORKLOADS
+# ============================================================================
+# Each builder returns the invocation function and the events to feed it,
+# optionally followed by a cleanup callable run after measurement.
+
+def invoke(handler, name: str) -> Callable[[Any], Any]:
+    def call(event):
+        response = handler.lambda_handler(event, FakeContext(name))
+        body = response.get('body') if isinstance(response, dict) else None
+        if body is not None and not isinstance(body, (str, bytes)):
+            # Streamed bodies are produced while they are read
+            for _ in body:
+                pass
+        return response
+    return call
+
+
+def client_ip(i: int) -> str:
+    # Distinct source IPs so per-client limits never trip
+    return f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+
+
+def workload_input_analyzer(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    analyzer = load_handler('input_analyzer', aws)
+    return invoke(analyzer, 'input_analyzer'), [workload.analyzer_event() for _ in range(iterations)]
+
+
+def workload_response_enhancer(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    analyzer = load_handler('input_analyzer', aws)
+    enhancer = load_handler('response_enhancer', aws)
+    events = [workload.enhancer_event(analyzer.analyze_input) for _ in range(iterations)]
+    return invoke(enhancer, 'response_enhancer'), events
+
+
+def workload_pipeline_logger(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    logger = load_handler('pipeline_logger', aws)
+    events = [workload.logger_event(failed=(i % 10 == 0)) for i in range(iterations)]
+    return invoke(logger, 'pipeline_logger'), events
+
+
+def workload_analytics(workload: WorkloadGenerator, aws: LocalAWS, iterations: int,
+                       log_items: int = ANALYTICS_LOG_ITEMS, **options):
+    analytics = load_handler('analytics', aws)
+    log_table = aws.table(analytics.table_name)
+    for item in workload.log_items(log_items):
+        log_table.put_item(Item=as_table_item(item))
+    # Mostly dashboard refreshes, with some drill-downs
+    events = [
+        {'path': '/analytics/cube', 'queryStringParameters': {'group_by': 'category,complexity'}}
+        if i % 4 == 3 else {'path': '/analytics', 'queryStringParameters': {'hours': '24'}}
+        for i in range(iterations)
+    ]
+    return invoke(analytics, 'analytics'), events
+
+
+def workload_live_metrics(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    live = load_handler('live_metrics', aws)
+    for i in range(LIVE_VIEWERS):
+        aws.table(live.connections_table_name).put_item(Item={'connection_id': f"viewer_{i}"})
+    records = []
+    log_table = aws.table('PipelineLogs')
+    log_table.add_stream_listener(records.append)
+    for item in workload.log_items(iterations * STREAM_BATCH_SIZE, hours=1):
+        log_table.put_item(Item=as_table_item(item))
+    events = [{'Records': records[i:i + STREAM_BATCH_SIZE]} for i in range(0, len(records), STREAM_BATCH_SIZE)]
+    return invoke(live, 'live_metrics'), events
+
+
+def workload_trigger(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    trigger = load_handler('trigger', aws)
+    # The template's auto mode: light inputs run fused, heavy ones start executions
+    events = [
+        {'body': json.dumps({'input': text}), 'requestContext': {'identity': {'sourceIp': client_ip(i)}}}
+        for i, text in enumerate(workload.inputs(iterations))
+    ]
+    return invoke(trigger, 'trigger'), events, lambda: trigger.fused.flush_pending_logs()
+
+
+def workload_results(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    results = load_handler('results', aws)
+    result_table = aws.table(results.result_table_name)
+    events = []
+    for i in range(iterations):
+        request_id = f"req_{i:08d}"
+        result_table.put_item(Item={
+            'request_id': request_id,
+            'status': 'SUCCEEDED',
+            'created_at': '2026-01-01T00:00:00',
+            'completed_at': '2026-01-01T00:00:02',
+            'result': {'enhanced_response': workload.user_input(size=800)}
+        })
+        events.append({'pathParameters': {'request_id': request_id}, 'queryStringParameters': {'wait': '0'}})
+    return invoke(results, 'results'), events
+
+
+def workload_chatbot(workload: WorkloadGenerator, aws: LocalAWS, iterations: int, **options):
+    chatbot = load_handler('chatbot', aws)
+    events = [workload.chat_event(client=i) for i in range(iterations)]
+    return invoke(chatbot, 'chatbot'), events
+
+
+# Template logical ID -> (local handler, workload builder)
+WORKLOADS: Dict[str, Tuple[str, Callable[..., Tuple]]] = {
+    'InputAnalyzerFunction': ('input_analyzer', workload_input_analyzer),
+    'ResponseEnhancerFunction': ('response_enhancer', workload_response_enhancer),
+    'PipelineLoggerFunction': ('pipeline_logger', workload_pipeline_logger),
+    'AnalyticsDashboardFunction': ('analytics', workload_analytics),
+    'LiveMetricsFunction': ('live_metrics', workload_live_metrics),
+    'PipelineTriggerFunction': ('trigger', workload_trigger),
+    'PipelineResultFunction': ('results', workload_results),
+    'ChatbotFunction': ('chatbot', workload_chatbot),
+}
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def max_rss_mb() -> float:
+    """
+    Peak resident memory of this process so far
+    """
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def service_calls(aws: LocalAWS) -> Dict[str, int]:
+    """
+    AWS calls made so far, per service
+    """
+    return {
+        'dynamodb': sum(table.read_count + table.write_count for table in aws.dynamodb.tables()),
+        'stepfunctions': aws.stepfunctions.start_calls,
+        'bedrock': len(aws.bedrock.calls),
+        'cloudwatch': len(aws.cloudwatch.metric_data),
+        'apigateway': sum(len(messages) for messages in aws.apigateway_management.messages.values()),
+    }
+
+
+def measure_function(logical_id: str, iterations: int = 200, seed: int = 42,
+                     log_items: int = ANALYTICS_LOG_ITEMS) -> Dict[str, Any]:
+    """
+    Run one function's workload in this process and record CPU time, wall
+    time and AWS calls per invocation, plus memory
+    """
+    handler_name, builder = WORKLOADS[logical_id]
+    rss_start = max_rss_mb()
+    aws = LocalAWS()
+    # Handlers print diagnostics on every call; keep them out of the output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Resident memory once the code is imported, before the stand-in
+        # tables fill up with workload data that would live in DynamoDB
+        load_handler(handler_name, aws)
+        rss_loaded = max_rss_mb()
+        fn, events, *cleanup = builder(WorkloadGenerator(seed), aws, iterations, log_items=log_items)
+
+        cpu_ms, wall_ms, calls = [], [], []
+        for event in events:
+            before = service_calls(aws)
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            fn(event)
+            cpu_ms.append((time.process_time() - cpu_start) * 1000)
+            wall_ms.append((time.perf_counter() - wall_start) * 1000)
+            after = service_calls(aws)
+            calls.append({service: after[service] - before[service]
+                          for service in after if after[service] != before[service]})
+
+        peak_bytes = []
+        tracemalloc.start()
+        try:
+            for event in events[:ALLOCATION_SAMPLE]:
+                tracemalloc.reset_peak()
+                current, _ = tracemalloc.get_traced_memory()
+                fn(event)
+                peak_bytes.append(tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+        for finish in cleanup:
+            finish()
+
+    return {
+        'function': logical_id,
+        'invocations': len(events),
+        'cpu_ms': [round(value, 4) for value in cpu_ms],
+        'wall_ms': [round(value, 4) for value in wall_ms],
+        'calls': calls,
+        'alloc_peak_mb': round(max(peak_bytes) / (1024 * 1024), 3) if peak_bytes else 0.0,
+        'rss_start_mb': round(rss_start, 1),
+        'rss_loaded_mb': round(rss_loaded, 1),
+        'rss_peak_mb': round(max_rss_mb(), 1),
+    }
+
+
+def measure_isolated(logical_id: str, iterations: int = 200, seed: int = 42,
+                     log_items: int = ANALYTICS_LOG_ITEMS) -> Dict[str, Any]:
+    """
+    measure_function in a fresh interpreter, as a cold Lambda container
+    would load it, so resident memory is this function's alone
+    """
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.tune_memory', '--measure', logical_id,
+         '--iterations', str(iterations), '--seed', str(seed), '--log-items', str(log_items)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    measurement = json.loads(completed.stdout)
+    measurement['isolated'] = True
+    return measurement
+
+
+# ============================================================================
+# MODEL
+# ============================================================================
+
+def template_functions(template: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Current MemorySize, Timeout and architecture of each function
+    """
+    defaults = template.get('Globals', {}).get('Function', {})
+    functions = {}
+    for logical_id, resource in template['Resources'].items():
+        if resource.get('Type') != 'AWS::Serverless::Function':
+            continue
+        properties = resource['Properties']
+        architectures = properties.get('Architectures', defaults.get('Architectures', ['x86_64']))
+        functions[logical_id] = {
+            'memory_mb': int(properties.get('MemorySize', defaults.get('MemorySize', 128))),
+            'timeout_s': float(properties.get('Timeout', defaults.get('Timeout', 3))),
+            'architecture': architectures[0],
+        }
+    return functions
+
+
+def call_time_ms(calls: Dict[str, int], call_latency: Dict[str, float]) -> float:
+    return sum(count * call_latency.get(service, 0.0) for service, count in calls.items())
+
+
+def model_tiers(measurement: Dict[str, Any], tiers=MEMORY_TIERS, call_latency: Optional[Dict[str, float]] = None,
+                architecture: str = 'x86_64', cpu_factor: float = 1.0, headroom: float = 0.25,
+                timeout_s: float = 30.0) -> Dict[str, Any]:
+    """
+    Modelled duration and cost of the measured invocations at each memory tier
+    """
+    call_latency = call_latency or DEFAULT_CALL_LATENCY_MS
+    io_ms = [call_time_ms(calls, call_latency) for calls in measurement['calls']]
+    working_set_mb = measurement['rss_loaded_mb'] + measurement['alloc_peak_mb']
+    required_mb = math.ceil(working_set_mb * (1 + headroom))
+
+    rows = []
+    for memory_mb in tiers:
+        slowdown = max(1.0, LAMBDA_VCPU_MB / memory_mb)
+        durations = sorted(cpu / cpu_factor * slowdown + io for cpu, io in zip(measurement['cpu_ms'], io_ms))
+        billed_ms = sum(math.ceil(duration) for duration in durations) / len(durations)
+        cost = billed_ms / 1000 * memory_mb / 1024 * PRICE_PER_GB_SECOND[architecture] + PRICE_PER_REQUEST
+        p99_ms = percentile(durations, 99)
+        rows.append({
+            'memory_mb': memory_mb,
+            'mean_ms': round(sum(durations) / len(durations), 3),
+            'p99_ms': round(p99_ms, 3),
+            'billed_ms': round(billed_ms, 3),
+            'cost_per_million': round(cost * 1e6, 4),
+            'fits': memory_mb >= required_mb and p99_ms <= timeout_s * 1000
+        })
+    return {
+        'working_set_mb': round(working_set_mb, 1),
+        'required_mb': required_mb,
+        'cpu_ms': round(sum(measurement['cpu_ms']) / len(measurement['cpu_ms']), 3),
+        'io_ms': round(sum(io_ms) / len(io_ms), 3),
+        'tiers': rows
+    }
+
+
+def recommend(rows: List[Dict[str, Any]], strategy: str = 'cost', tolerance: float = 0.05) -> Optional[Dict[str, Any]]:
+    """
+    The tier to deploy, among those that fit, by strategy
+    """
+    fitting = [row for row in rows if row['fits']]
+    if not fitting:
+        return None
+    if strategy == 'speed':
+        fastest = min(row['mean_ms'] for row in fitting)
+        candidates = [row for row in fitting if row['mean_ms'] <= fastest * (1 + tolerance)]
+        return min(candidates, key=lambda row: (row['cost_per_million'], row['memory_mb']))
+    if strategy == 'balanced':
+        return min(fitting, key=lambda row: (row['cost_per_million'] * row['mean_ms'], row['memory_mb']))
+    # Within the tolerance, more memory only wins when it saves whole
+    # billed milliseconds; sub-millisecond speed-ups are not worth paying for
+    cheapest = min(row['cost_per_million'] for row in fitting)
+    candidates = [row for row in fitting if row['cost_per_million'] <= cheapest * (1 + tolerance)]
+    return min(candidates, key=lambda row: (round(row['billed_ms']), row['memory_mb']))
+
+
+def tune(only: Optional[List[str]] = None, iterations: int = 200, seed: int = 42,
+         template_path: str = DEFAULT_TEMPLATE, isolate: bool = True, tiers=MEMORY_TIERS,
+         call_latency: Optional[Dict[str, float]] = None, architecture: Optional[str] = None,
+         cpu_factor: float = 1.0, headroom: float = 0.25, strategy: str = 'cost', tolerance: float = 0.05,
+         log_items: int = ANALYTICS_LOG_ITEMS) -> Dict[str, Any]:
+    """
+    Measure each selected function and recommend its MemorySize
+    """
+    call_latency = {**DEFAULT_CALL_LATENCY_MS, **(call_latency or {})}
+    configured = template_functions(load_template(template_path))
+    measure = measure_isolated if isolate else measure_function
+
+    functions = []
+    for logical_id in WORKLOADS:
+        if (only and logical_id not in only) or logical_id not in configured:
+            continue
+        current = configured[logical_id]
+        arch = architecture or current['architecture']
+        measurement = measure(logical_id, iterations, seed, log_items)
+        sizes = sorted(set(tiers) | {current['memory_mb']})
+        model = model_tiers(measurement, sizes, call_latency, arch, cpu_factor, headroom, current['timeout_s'])
+        best = recommend([row for row in model['tiers'] if row['memory_mb'] in tiers], strategy, tolerance)
+        now = next(row for row in model['tiers'] if row['memory_mb'] == current['memory_mb'])
+        functions.append({
+            'function': logical_id,
+            'architecture': arch,
+            'current_mb': current['memory_mb'],
+            'recommended_mb': best['memory_mb'] if best else None,
+            'current': now,
+            'recommended': best,
+            'rss_peak_mb': measurement['rss_peak_mb'],
+            'wall_ms': round(sum(measurement['wall_ms']) / len(measurement['wall_ms']), 3),
+            'isolated': measurement.get('isolated', False),
+            **model
+        })
+    return {
+        'settings': {
+            'iterations': iterations, 'seed': seed, 'strategy': strategy, 'tolerance': tolerance,
+            'headroom': headroom, 'cpu_factor': cpu_factor, 'call_latency_ms': call_latency
+        },
+        'functions': functions
+    }
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def format_report(report: Dict[str, Any], show_tiers: bool = False) -> str:
+    settings = report['settings']
+    lines = [
+        f"Strategy {settings['strategy']} (tolerance {settings['tolerance']:.0%}), headroom {settings['headroom']:.0%}, "
+        f"cpu factor {settings['cpu_factor']}, call latency (ms) "
+        + ', '.join(f"{service}={latency:g}" for service, latency in settings['call_latency_ms'].items()),
+        '',
+        f"{'function':28} {'cpu ms':>8} {'aws ms':>8} {'mem MB':>7} {'now MB':>7} {'rec MB':>7} "
+        f"{'p99 now':>9} {'p99 rec':>9} {'$/1M now':>9} {'$/1M rec':>9}",
+    ]
+    for row in report['functions']:
+        now, best = row['current'], row['recommended']
+        recommended = best['memory_mb'] if best else 'none'
+        lines.append(
+            f"{row['function']:28} {row['cpu_ms']:>8.2f} {row['io_ms']:>8.1f} {row['required_mb']:>7} "
+            f"{row['current_mb']:>7} {recommended:>7} {now['p99_ms']:>9.1f} "
+            f"{best['p99_ms'] if best else float('nan'):>9.1f} {now['cost_per_million']:>9.2f} "
+            f"{best['cost_per_million'] if best else float('nan'):>9.2f}")
+    lines += ['', 'mem MB is the working set plus headroom: resident memory after import and the peak '
+                  'allocation per invocation.']
+    if any(not row['isolated'] for row in report['functions']):
+        lines.append('Measured in one shared process: resident memory includes the other functions.')
+
+    if show_tiers:
+        for row in report['functions']:
+            lines += ['', f"{row['function']} ({row['architecture']}, working set {row['working_set_mb']} MB)",
+                      f"  {'MB':>6} {'mean ms':>9} {'p99 ms':>9} {'billed':>9} {'$/1M':>9}"]
+            for tier in row['tiers']:
+                marks = ('*' if row['recommended'] and tier['memory_mb'] == row['recommended']['memory_mb'] else ' ') + \
+                        ('' if tier['fits'] else ' (does not fit)')
+                lines.append(f"  {tier['memory_mb']:>6} {tier['mean_ms']:>9.2f} {tier['p99_ms']:>9.2f} "
+                             f"{tier['billed_ms']:>9.2f} {tier['cost_per_million']:>9.4f}{marks}")
+    return '\n'.join(lines)
+
+
+def parse_call_latency(text: str) -> Dict[str, float]:
+    latencies = {}
+    for part in text.split(','):
+        service, _, latency = part.partition('=')
+        if service.strip() not in DEFAULT_CALL_LATENCY_MS or not latency:
+            raise argparse.ArgumentTypeError(
+                f"expected service=ms with service one of {', '.join(DEFAULT_CALL_LATENCY_MS)}")
+        latencies[service.strip()] = float(latency)
+    return latencies
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', action='append', choices=sorted(WORKLOADS))
+    parser.add_argument('--iterations', type=int, default=200, help='Invocations per function')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE)
+    parser.add_argument('--log-items', type=int, default=ANALYTICS_LOG_ITEMS,
+                        help='Log items behind each analytics query')
+    parser.add_argument('--call-latency', type=parse_call_latency, default={},
+                        help='Per-call AWS latency overrides, e.g. dynamodb=10,bedrock=1500')
+    parser.add_argument('--architecture', choices=sorted(PRICE_PER_GB_SECOND),
+                        help='Price every function as this architecture')
+    parser.add_argument('--cpu-factor', type=float, default=1.0,
+                        help='Speed of this machine relative to one Lambda vCPU')
+    parser.add_argument('--headroom', type=float, default=0.25, help='Spare memory above the working set')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='cost')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='Cost (or, for speed, duration) within which a faster (cheaper) tier is preferred')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Measure every function in this process (faster; resident memory is shared)')
+    parser.add_argument('--tiers', action='store_true', help='Show the model at every memory tier')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        # One isolated measurement, for measure_isolated
+        print(json.dumps(measure_function(args.measure, args.iterations, args.seed, args.log_items)))
+        return 0
+
+    report = tune(args.only, args.iterations, args.seed, args.template, not args.in_process,
+                  call_latency=args.call_latency, architecture=args.architecture, cpu_factor=args.cpu_factor,
+                  headroom=args.headroom, strategy=args.strategy, tolerance=args.tolerance,
+                  log_items=args.log_items)
+    print(json.dumps(report, indent=2) if args.json else format_report(report, args.tiers))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
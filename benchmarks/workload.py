@@ -0,0 +1,170 @@
+"""
+Seeded synthetic workload generator for the pipeline and chatbot handlers.
+The same seed always produces the same inputs, so runs are comparable.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+# Share of inputs per size bucket (characters) and category
+SIZE_BUCKETS = [
+    ((10, 100), 0.5),
+    ((100, 500), 0.3),
+    ((500, 1000), 0.15),
+    ((1000, 2000), 0.05),
+]
+
+CATEGORY_WEIGHTS = {
+    'technical': 0.35,
+    'creative': 0.2,
+    'research': 0.15,
+    'general': 0.3,
+}
+
+CATEGORY_VOCABULARY = {
+    'technical': ['algorithm', 'database', 'api', 'architecture', 'optimization', 'model'],
+    'creative': ['story', 'poem', 'character', 'plot', 'fiction', 'narrative'],
+    'research': ['research', 'study', 'compare', 'evaluate', 'survey', 'report'],
+    'general': ['weather', 'travel', 'recipe', 'garden', 'music', 'holiday'],
+}
+
+FILLER_WORDS = [
+    'please', 'explain', 'the', 'difference', 'between', 'how', 'why', 'when',
+    'should', 'could', 'with', 'from', 'about', 'simple', 'detail', 'example',
+]
+
+# Probability of an input carrying 0..3 questions
+QUESTION_COUNT_WEIGHTS = [0.4, 0.35, 0.15, 0.1]
+
+COMPLEXITIES = ['low', 'medium', 'high']
+ERROR_MESSAGES = [
+    'Task timeout after 30 seconds',
+    'Invalid input format',
+    'Throttling: rate limit exceeded',
+    'Connection reset by peer',
+]
+
+
+def as_table_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A generated item with floats as Decimal, as DynamoDB writes require
+    """
+    return {name: Decimal(str(value)) if isinstance(value, float) else value for name, value in item.items()}
+
+
+class WorkloadGenerator:
+    """
+    Produces handler events with controlled size, category and question mixes
+    """
+
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+        self._random = random.Random(seed)
+
+    def user_input(self, category: Optional[str] = None, size: Optional[int] = None,
+                   questions: Optional[int] = None) -> str:
+        """
+        Build one input text of roughly `size` characters
+        """
+        rng = self._random
+        if category is None:
+            category = rng.choices(list(CATEGORY_WEIGHTS), weights=list(CATEGORY_WEIGHTS.values()))[0]
+        if size is None:
+            (low, high), = rng.choices(
+                [bucket for bucket, _ in SIZE_BUCKETS],
+                weights=[weight for _, weight in SIZE_BUCKETS]
+            )
+            size = rng.randint(low, high)
+        if questions is None:
+            questions = rng.choices(range(len(QUESTION_COUNT_WEIGHTS)), weights=QUESTION_COUNT_WEIGHTS)[0]
+
+        vocabulary = CATEGORY_VOCABULARY[category]
+        words = [rng.choice(vocabulary)]
+        length = len(words[0])
+        while length < size:
+            word = rng.choice(vocabulary) if rng.random() < 0.2 else rng.choice(FILLER_WORDS)
+            words.append(word)
+            length += len(word) + 1
+
+        text = ' '.join(words)[:max(size, 1)]
+        return text + '?' * questions
+
+    def inputs(self, count: int, **kwargs) -> List[str]:
+        return [self.user_input(**kwargs) for _ in range(count)]
+
+    def analyzer_event(self) -> Dict[str, Any]:
+        return {'input': self.user_input()}
+
+    def enhancer_event(self, analyze_input) -> Dict[str, Any]:
+        """
+        Enhancer event with a real analysis from `analyze_input`
+        """
+        text = self.user_input()
+        return {'input': text, 'analysis': analyze_input(text), 'base_response': ''}
+
+    def logger_event(self, failed: bool = False) -> Dict[str, Any]:
+        """
+        Step Functions state as it reaches LogSuccess or LogError
+        """
+        rng = self._random
+        text = self.user_input()
+        event = {
+            'input': text,
+            'request_id': f"req_{rng.getrandbits(48):012x}",
+            'analysis': {
+                'complexity': rng.choice(COMPLEXITIES),
+                'category': rng.choice(list(CATEGORY_WEIGHTS)),
+                'processing_time_ms': round(rng.uniform(0.1, 5.0), 2),
+            },
+        }
+        if failed:
+            event['error'] = rng.choice(ERROR_MESSAGES)
+        else:
+            event['enhanced_response'] = {
+                'content': 'x' * rng.randint(200, 2000),
+                'quality_score': round(rng.uniform(0.5, 1.0), 2),
+                'processing_time_ms': round(rng.uniform(0.1, 10.0), 2),
+            }
+        return event
+
+    def log_items(self, count: int, end_time: Optional[datetime] = None,
+                  hours: float = 24, failure_rate: float = 0.05) -> List[Dict[str, Any]]:
+        """
+        Items shaped like the PipelineLogs table rows, spread over a time window
+        """
+        rng = self._random
+        end_time = end_time or datetime.utcnow()
+        items = []
+        for i in range(count):
+            timestamp = end_time - timedelta(seconds=rng.uniform(0, hours * 3600))
+            success = rng.random() >= failure_rate
+            items.append({
+                'execution_id': f"exec_{i:08d}",
+                'timestamp': timestamp.isoformat(),
+                'date': timestamp.strftime('%Y-%m-%d'),
+                'hour': timestamp.strftime('%Y-%m-%dT%H'),
+                'success': success,
+                'complexity': rng.choice(COMPLEXITIES),
+                'category': rng.choice(list(CATEGORY_WEIGHTS)),
+                'total_processing_time_ms': round(rng.lognormvariate(1.0, 0.6), 2),
+                'input_length': rng.randint(10, 2000),
+                'output_length': rng.randint(100, 3000),
+                'quality_score': round(rng.uniform(0.5, 1.0), 2),
+                'error_type': None if success else rng.choice(['timeout', 'validation', 'rate_limit']),
+            })
+        return items
+
+    def chat_event(self, message: Optional[str] = None, client: Optional[int] = None) -> Dict[str, Any]:
+        """
+        API Gateway event for the chatbot from one of many synthetic clients
+        """
+        rng = self._random
+        client = rng.randint(0, 10000) if client is None else client
+        return {
+            'body': json.dumps({'message': message or self.user_input(size=rng.randint(10, 400))}),
+            'requestContext': {'identity': {'sourceIp': f"10.0.{client // 256 % 256}.{client % 256}"}},
+            'headers': {'User-Agent': f"bench-client-{client}"},
+        }
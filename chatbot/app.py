@@ -1,12 +1,22 @@
 import os
-import boto3
 import json
 import time
 import hashlib
 import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from typing import List, Dict, Optional
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
 from dataclasses import dataclass
+from decimal import Decimal
+
+from aws_clients import lazy_client, lazy_table
+from timing import current_timer, in_context, instrument_handler, phase
+from conversation_store import ConversationConflict, DynamoDBConversationStore
+from rate_limit_store import DynamoDBRateLimitStore
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientInvoker
+from response_cache import DynamoDBResponseCacheStore, ResponseCache, cache_key
 
 # Configure logging
 logger = logging.getLogger()
@@ -19,43 +29,381 @@ class ChatMessage:
     timestamp: float
     token_count: Optional[int] = None
 
+class _Conversation:
+    """
+    One conversation's bounded history and its accounting
+    """
+    __slots__ = ("history", "costs", "size_bytes", "token_total", "appended", "summary_key", "summary",
+                 "last_access", "version", "validated_at")
+    
+    def __init__(self, max_history: int, now: float, version: int = 0):
+        self.history = deque(maxlen=max_history)
+        self.costs = deque(maxlen=max_history)  # (bytes, tokens) per message, in step with history
+        self.size_bytes = 0
+        self.token_total = 0  # running sum of message_tokens over history
+        self.appended = 0     # messages ever appended; positions key the summary cache
+        self.summary_key = None
+        self.summary = None
+        self.last_access = now
+        self.version = version
+        self.validated_at = now
+
+def message_size(message: ChatMessage) -> int:
+    """
+    Bytes a message's content occupies, as counted against the byte budget.
+    ASCII text (the common case) is measured without encoding it.
+    """
+    content = message.content
+    return len(content) if content.isascii() else len(content.encode("utf-8"))
+
+def message_tokens(message: ChatMessage) -> int:
+    """
+    Tokens a message costs in a prompt: its recorded count, else an estimate
+    """
+    if message.token_count is not None:
+        return message.token_count
+    return TokenCounter.estimate_tokens(message.content)
+
+def summarize_turns(messages: List[ChatMessage], max_tokens: int) -> str:
+    """
+    Extractive summary of older turns: the opening of each, oldest first,
+    cut to about max_tokens (~4 characters per token).
+    Time Complexity: O(n) where n is the length of the turns
+    """
+    budget_chars = max_tokens * 4
+    per_turn = max(40, budget_chars // max(1, len(messages)))
+    lines = []
+    for message in messages:
+        text = " ".join(message.content[:per_turn * 2].split())
+        if len(text) > per_turn:
+            text = text[:per_turn - 3].rstrip() + "..."
+        lines.append(f"{message.role}: {text}")
+    return "\n".join(lines)[:budget_chars]
+
+def message_to_record(message: ChatMessage) -> Dict[str, Any]:
+    """
+    Stored form of a message; DynamoDB needs Decimal instead of float
+    """
+    record = {
+        "role": message.role,
+        "content": message.content,
+        "timestamp": Decimal(str(round(message.timestamp, 3)))
+    }
+    if message.token_count is not None:
+        record["token_count"] = message.token_count
+    return record
+
+def record_to_message(record: Dict[str, Any]) -> ChatMessage:
+    token_count = record.get("token_count")
+    return ChatMessage(
+        role=record["role"],
+        content=record["content"],
+        timestamp=float(record.get("timestamp", 0)),
+        token_count=int(token_count) if token_count is not None else None
+    )
+
 class ConversationManager:
     """
-    Manages conversation history with O(1) access and O(n) memory complexity.
-    Uses LRU-like eviction strategy for memory management.
+    Manages conversation history with O(1) access and bounded memory.
+    Conversations are kept in LRU order; the least recently used are evicted
+    once the conversation, message or byte budget is exceeded, and any
+    conversation idle longer than idle_ttl_seconds expires.
+    
+    With a store, the in-memory conversations become a write-through cache
+    of it: every append is a version-checked write to the store, and a cached
+    conversation is served without a round trip for revalidate_after_seconds
+    after it was last confirmed, then re-read once and kept if its version
+    has not moved.
     """
     
-    def __init__(self, max_history: int = 10):
+    def __init__(self, max_history: int = 10, max_conversations: int = 10000,
+                 max_messages: int = 50000, max_bytes: int = 16 * 1024 * 1024,
+                 idle_ttl_seconds: float = 1800, clock: Callable[[], float] = time.monotonic,
+                 store=None, revalidate_after_seconds: float = 1.0, max_write_attempts: int = 3,
+                 summary_max_tokens: int = 0,
+                 summarizer: Callable[[List[ChatMessage], int], str] = summarize_turns):
         self.max_history = max_history
-        self._conversation_cache = {}  # O(1) lookup by conversation_id
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.store = store
+        self.revalidate_after_seconds = revalidate_after_seconds
+        self.max_write_attempts = max_write_attempts
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        self._clock = clock
+        self._conversation_cache = OrderedDict()  # O(1) lookup, least recently used first
+        self._next_expiry_check = clock()
+        self.total_messages = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.conflicts = 0
     
     def add_message(self, conversation_id: str, message: ChatMessage) -> None:
         """
-        Time Complexity: O(1) average case
-        Space Complexity: O(n) where n is number of messages
+        Time Complexity: O(1) amortized; each eviction is O(history)
+        Space Complexity: bounded by the message and byte budgets
         """
-        if conversation_id not in self._conversation_cache:
-            self._conversation_cache[conversation_id] = []
+        if self.store is not None:
+            self.add_messages(conversation_id, [message])
+            return
         
-        history = self._conversation_cache[conversation_id]
-        history.append(message)
+        now = self._clock()
+        # A live conversation is touched inline; _lookup handles expiry
+        conversation = self._conversation_cache.get(conversation_id)
+        if conversation is not None and now - conversation.last_access <= self.idle_ttl_seconds:
+            conversation.last_access = now
+            self._conversation_cache.move_to_end(conversation_id)
+        else:
+            conversation = self._lookup(conversation_id, now)
+        if conversation is None:
+            conversation = _Conversation(self.max_history, now)
+            self._conversation_cache[conversation_id] = conversation
+        self._append(conversation, message)
+        self._after_write(now)
+    
+    def add_messages(self, conversation_id: str, messages: List[ChatMessage]) -> None:
+        """
+        Append messages in order. With a store this is one conditional write,
+        retried against the latest stored version if another writer got there first.
+        Time Complexity: O(k) without a store, O(m) with one
+        """
+        now = self._clock()
+        if self.store is None:
+            conversation = self._lookup(conversation_id, now)
+            if conversation is None:
+                conversation = _Conversation(self.max_history, now)
+                self._conversation_cache[conversation_id] = conversation
+        else:
+            conversation = self._write_through(conversation_id, messages, now)
         
-        # Maintain max history size - O(1) operation
-        if len(history) > self.max_history:
-            history.pop(0)  # Remove oldest message
+        for message in messages:
+            self._append(conversation, message)
+        self._after_write(now)
     
     def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
         """
         Time Complexity: O(m) where m is number of messages in conversation
         Space Complexity: O(m)
         """
-        if conversation_id not in self._conversation_cache:
+        now = self._clock()
+        conversation = self._conversation_cache.get(conversation_id)
+        if (self.store is None and conversation is not None
+                and now - conversation.last_access <= self.idle_ttl_seconds):
+            conversation.last_access = now
+            self._conversation_cache.move_to_end(conversation_id)
+            self.hits += 1
+        else:
+            conversation = self._current(conversation_id)
+        if conversation is None:
             return []
         
         return [
             {"role": msg.role, "content": msg.content}
-            for msg in self._conversation_cache[conversation_id]
+            for msg in conversation.history
         ]
+    
+    def get_window(self, conversation_id: str, max_tokens: int) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        The newest messages that fit in max_tokens, starting with a user turn,
+        and, when summaries are enabled, a summary of the older turns left out.
+        The summary's tokens come out of the same budget and it is cached
+        until the window moves.
+        Time Complexity: O(1) to decide when the whole history fits, O(k) to
+        select k messages otherwise; summarizing is O(older turns) on a cache miss
+        """
+        conversation = self._current(conversation_id)
+        if conversation is None:
+            return [], None
+        
+        history = conversation.history
+        fits = conversation.token_total <= max_tokens
+        if fits:
+            selected = list(history)
+        else:
+            budget = max_tokens - self.summary_max_tokens
+            used = 0
+            selected = []
+            for message in reversed(history):
+                used += message_tokens(message)
+                if used > budget:
+                    break
+                selected.append(message)
+            selected.reverse()
+        # Bedrock requires the conversation to open with a user turn; the
+        # oldest turns may be assistant replies whose question was dropped
+        first_user = 0
+        while first_user < len(selected) and selected[first_user].role != "user":
+            first_user += 1
+        if first_user:
+            selected = selected[first_user:]
+        
+        summary = None
+        excluded = len(history) - len(selected)
+        # A history that fits is never summarized: its budget has no room set aside
+        if self.summary_max_tokens > 0 and excluded and not fits:
+            first = conversation.appended - len(history)
+            key = (first, first + excluded)
+            if conversation.summary_key != key:
+                older = [history[i] for i in range(excluded)]
+                conversation.summary = self.summarizer(older, self.summary_max_tokens)
+                conversation.summary_key = key
+            summary = conversation.summary
+        
+        return [{"role": msg.role, "content": msg.content} for msg in selected], summary
+    
+    def _current(self, conversation_id: str) -> Optional[_Conversation]:
+        """
+        The conversation to read from, revalidated against the store when
+        due, with hit and miss accounting
+        """
+        now = self._clock()
+        conversation = self._lookup(conversation_id, now)
+        if self.store is not None and (
+                conversation is None or now - conversation.validated_at > self.revalidate_after_seconds):
+            conversation = self._refresh(conversation_id, conversation, now)
+            if conversation is not None and not conversation.history:
+                conversation = None
+        elif conversation is not None:
+            self.hits += 1
+        
+        if conversation is None and self.store is None:
+            self.misses += 1
+        return conversation
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._conversation_cache),
+            "messages": self.total_messages,
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "conflicts": self.conflicts
+        }
+    
+    def _write_through(self, conversation_id: str, messages: List[ChatMessage], now: float) -> _Conversation:
+        """
+        Save the cached history plus the new messages to the store, reloading
+        and retrying on a version conflict
+        """
+        conversation = self._lookup(conversation_id, now)
+        if conversation is None:
+            conversation = self._refresh(conversation_id, None, now)
+        new_records = [message_to_record(message) for message in messages]
+        
+        for attempt in range(self.max_write_attempts):
+            records = [message_to_record(message) for message in conversation.history] + new_records
+            try:
+                version = self.store.save(conversation_id, records[-self.max_history:], conversation.version)
+            except ConversationConflict:
+                self.conflicts += 1
+                if attempt == self.max_write_attempts - 1:
+                    raise
+                conversation = self._refresh(conversation_id, conversation, now)
+                continue
+            conversation.version = version
+            conversation.validated_at = now
+            return conversation
+    
+    def _refresh(self, conversation_id: str, conversation: Optional[_Conversation],
+                 now: float) -> _Conversation:
+        """
+        Re-read a conversation from the store, keeping the cached copy when
+        its version is unchanged - one round trip
+        """
+        version, records = self.store.load(conversation_id)
+        if conversation is not None and conversation.version == version:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if conversation is not None:
+                self._remove(conversation_id)
+            conversation = _Conversation(self.max_history, now, version)
+            for record in records:
+                self._append(conversation, record_to_message(record))
+            self._conversation_cache[conversation_id] = conversation
+            self._enforce_budgets()
+        conversation.validated_at = now
+        return conversation
+    
+    def _append(self, conversation: _Conversation, message: ChatMessage) -> None:
+        # deque(maxlen) drops the oldest message on append - O(1); its costs
+        # were recorded when it was added, so nothing is measured twice
+        content = message.content
+        size = len(content) if content.isascii() else len(content.encode("utf-8"))
+        tokens = message.token_count
+        if tokens is None:
+            tokens = len(content) // 4 or 1  # TokenCounter.estimate_tokens, inlined
+        costs = conversation.costs
+        if len(costs) == self.max_history:
+            dropped_size, dropped_tokens = costs[0]
+            conversation.size_bytes -= dropped_size - size
+            conversation.token_total -= dropped_tokens - tokens
+            self.total_bytes -= dropped_size - size
+        else:
+            conversation.size_bytes += size
+            conversation.token_total += tokens
+            self.total_bytes += size
+            self.total_messages += 1
+        conversation.history.append(message)
+        costs.append((size, tokens))
+        conversation.appended += 1
+    
+    def _lookup(self, conversation_id: str, now: float) -> Optional[_Conversation]:
+        """
+        Fetch a live conversation and mark it most recently used - O(1)
+        """
+        conversation = self._conversation_cache.get(conversation_id)
+        if conversation is None:
+            return None
+        if now - conversation.last_access > self.idle_ttl_seconds:
+            self._remove(conversation_id)
+            self.expirations += 1
+            return None
+        conversation.last_access = now
+        self._conversation_cache.move_to_end(conversation_id)
+        return conversation
+    
+    def _after_write(self, now: float) -> None:
+        # Both checks are a comparison or two unless there is work to do
+        if now >= self._next_expiry_check:
+            self._expire_idle(now)
+        if (self.total_bytes > self.max_bytes or self.total_messages > self.max_messages
+                or len(self._conversation_cache) > self.max_conversations):
+            self._enforce_budgets()
+    
+    def _expire_idle(self, now: float) -> None:
+        # LRU order is access order, so idle conversations sit at the front;
+        # checking once a second is plenty for TTLs measured in minutes
+        self._next_expiry_check = now + 1.0
+        while self._conversation_cache:
+            conversation_id, conversation = next(iter(self._conversation_cache.items()))
+            if now - conversation.last_access <= self.idle_ttl_seconds:
+                break
+            self._remove(conversation_id)
+            self.expirations += 1
+    
+    def _enforce_budgets(self) -> None:
+        # Never evict the conversation that was just written
+        while len(self._conversation_cache) > 1 and (
+                len(self._conversation_cache) > self.max_conversations
+                or self.total_messages > self.max_messages
+                or self.total_bytes > self.max_bytes):
+            self._remove(next(iter(self._conversation_cache)))
+            self.evictions += 1
+    
+    def _remove(self, conversation_id: str) -> None:
+        conversation = self._conversation_cache.pop(conversation_id)
+        self.total_messages -= len(conversation.history)
+        self.total_bytes -= conversation.size_bytes
 
 class TokenCounter:
     """
@@ -74,46 +422,156 @@ class TokenCounter:
 
 class RateLimiter:
     """
-    Token bucket algorithm for rate limiting.
-    Time Complexity: O(1) for each check
-    Space Complexity: O(k) where k is number of unique identifiers
+    Generic cell rate algorithm (GCRA), equivalent to a token bucket holding
+    max_requests tokens that refills one every window_seconds / max_requests.
+    Each identifier costs one float: its theoretical arrival time (TAT).
+    An identifier whose TAT has passed is indistinguishable from a new one,
+    so a periodic sweep drops it and memory is bounded by active clients.
+    
+    With a store, each check is made atomically against state shared by every
+    container, so the limit holds per client rather than per container. The
+    local TAT then acts as a cache that turns a limited client away without
+    a round trip until its next request could be admitted.
+    Time Complexity: O(1) per check, plus an O(k) sweep once per interval
+    Space Complexity: O(k) where k is number of active identifiers
     """
     
-    def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+    def __init__(self, max_requests: int = 10, window_seconds: int = 60, store=None,
+                 sweep_interval_seconds: Optional[float] = None, clock: Callable[[], float] = time.time):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._buckets = {}
+        self.interval = window_seconds / max_requests
+        self.tolerance = self.interval * (max_requests - 1)
+        self.store = store
+        self.sweep_interval_seconds = sweep_interval_seconds or window_seconds
+        self._clock = clock
+        self._tats = {}
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + self.sweep_interval_seconds
     
     def is_allowed(self, identifier: str) -> bool:
         """
-        Time Complexity: O(1)
+        Time Complexity: O(1) amortized
         Space Complexity: O(1) per identifier
         """
-        current_time = time.time()
-        
-        if identifier not in self._buckets:
-            self._buckets[identifier] = []
-        
-        # Remove old requests outside the window - O(k) worst case where k <= max_requests
-        bucket = self._buckets[identifier]
-        self._buckets[identifier] = [
-            req_time for req_time in bucket 
-            if current_time - req_time < self.window_seconds
-        ]
-        
-        # Check if under limit
-        if len(self._buckets[identifier]) < self.max_requests:
-            self._buckets[identifier].append(current_time)
-            return True
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            
+            tat = max(self._tats.get(identifier, now), now)
+            if tat - now > self.tolerance:
+                return False
+            if self.store is None:
+                self._tats[identifier] = tat + self.interval
+                return True
         
-        return False
+        allowed, shared_tat = self.store.acquire(
+            identifier,
+            int(now * 1000),
+            max(1, int(self.interval * 1000)),
+            int(self.tolerance * 1000)
+        )
+        with self._lock:
+            self._tats[identifier] = max(self._tats.get(identifier, 0.0), shared_tat / 1000)
+        return allowed
+    
+    def _sweep(self, now: float) -> None:
+        # Called under _lock; expired TATs carry no state worth keeping
+        self._tats = {identifier: tat for identifier, tat in self._tats.items() if tat > now}
+        self._next_sweep = now + self.sweep_interval_seconds
 
 # Global instances
 MODEL_ID = os.getenv("BEDROCK_MODEL_ID")
-bedrock = boto3.client("bedrock-runtime")
-conversation_manager = ConversationManager()
+# Batch limits: prompts per request and model calls in flight at once
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "50"))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "8"))
+# Model calls run far longer than the default read timeout. Retries are
+# left to bedrock_invoker, which knows the Lambda's remaining time. The
+# pool must fit every concurrent batch call.
+bedrock = lazy_client("bedrock-runtime", read_timeout=float(os.getenv("BEDROCK_READ_TIMEOUT", "25")),
+                      retries={"mode": "standard", "max_attempts": 1},
+                      max_pool_connections=max(10, CHAT_BATCH_MAX_CONCURRENCY))
+bedrock_invoker = ResilientInvoker(
+    max_attempts=int(os.getenv("BEDROCK_MAX_ATTEMPTS", "4")),
+    base_delay_seconds=float(os.getenv("BEDROCK_RETRY_BASE_SECONDS", "0.2")),
+    max_delay_seconds=float(os.getenv("BEDROCK_RETRY_MAX_SECONDS", "4")),
+    hedge=os.getenv("BEDROCK_HEDGE", "false").lower() == "true",
+    # Calls with a deadline run on this pool: every batch call plus its hedge
+    max_workers=2 * CHAT_BATCH_MAX_CONCURRENCY,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("BEDROCK_BREAKER_FAILURES", "5")),
+        reset_timeout_seconds=float(os.getenv("BEDROCK_BREAKER_RESET_SECONDS", "30"))
+    )
+)
+# Time kept back from the Lambda timeout to write the response
+DEADLINE_MARGIN_SECONDS = float(os.getenv("BEDROCK_DEADLINE_MARGIN_MS", "1000")) / 1000
+conversation_manager = ConversationManager(
+    # The token budget below decides how much history a prompt uses
+    max_history=int(os.getenv("CONVERSATION_MAX_HISTORY", "40")),
+    max_conversations=int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "10000")),
+    max_messages=int(os.getenv("CONVERSATION_MAX_MESSAGES", "50000")),
+    max_bytes=int(os.getenv("CONVERSATION_MAX_BYTES", str(16 * 1024 * 1024))),
+    idle_ttl_seconds=float(os.getenv("CONVERSATION_IDLE_TTL_SECONDS", "1800")),
+    revalidate_after_seconds=float(os.getenv("CONVERSATION_REVALIDATE_SECONDS", "1")),
+    summary_max_tokens=int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "0"))
+)
+# Tokens of conversation history sent with each message
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# Conversations persist to DynamoDB when a table is configured, otherwise
+# they live only in this container's memory
+CONVERSATION_TABLE = os.getenv("CONVERSATION_TABLE", "")
+CONVERSATION_TTL_SECONDS = int(os.getenv("CONVERSATION_TTL_SECONDS", "86400"))
+conversation_table_name = CONVERSATION_TABLE or "ChatConversations"
+conversation_table = lazy_table(conversation_table_name)
 token_counter = TokenCounter()
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(
+    max_requests=int(os.getenv("CHAT_RATE_LIMIT_REQUESTS", "10")),
+    window_seconds=int(os.getenv("CHAT_RATE_LIMIT_WINDOW_SECONDS", "60"))
+)
+# Identical requests are answered from cache; 0 seconds turns it off
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+)
+RESPONSE_CACHE_TABLE = os.getenv("RESPONSE_CACHE_TABLE", "")
+response_cache_table_name = RESPONSE_CACHE_TABLE or "ChatResponseCache"
+response_cache_table = lazy_table(response_cache_table_name)
+# Rate limits are enforced across containers when a table is configured
+RATE_LIMIT_TABLE = os.getenv("RATE_LIMIT_TABLE", "")
+rate_limit_table_name = RATE_LIMIT_TABLE or "ChatRateLimits"
+rate_limit_table = lazy_table(rate_limit_table_name)
+
+def attach_shared_stores() -> None:
+    """
+    Give the conversation manager, rate limiter and response cache their
+    shared stores on first use
+    """
+    if CONVERSATION_TABLE and conversation_manager.store is None:
+        conversation_manager.store = DynamoDBConversationStore(conversation_table, CONVERSATION_TTL_SECONDS)
+    if RATE_LIMIT_TABLE and rate_limiter.store is None:
+        rate_limiter.store = DynamoDBRateLimitStore(rate_limit_table)
+    if RESPONSE_CACHE_TABLE and response_cache.shared is None:
+        response_cache.shared = DynamoDBResponseCacheStore(response_cache_table)
+
+def call_deadline(context) -> Optional[float]:
+    """
+    When model calls must finish, on bedrock_invoker's clock, or None
+    without a Lambda context
+    """
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    return bedrock_invoker.clock() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN_SECONDS
+
+def unavailable_response(error: Exception) -> Dict[str, Any]:
+    """
+    503 for an open circuit or a missed deadline, with a Retry-After hint
+    """
+    logger.warning(f"Model unavailable: {error}")
+    response = error_response(503, "Service temporarily unavailable")
+    retry_after = getattr(error, "retry_after_seconds", 1)
+    response["headers"]["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
 
 def generate_conversation_id(event: dict) -> str:
     """
@@ -156,119 +614,459 @@ def validate_input(message: str) -> Dict[str, any]:
         "length": len(message)
     }
 
-def lambda_handler(event, context):
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"error": message})
+    }
+
+def prepare_chat(event: dict) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
-    Main handler with comprehensive error handling and performance tracking.
-    Overall Time Complexity: O(n + m) where n=message length, m=conversation history
-    Space Complexity: O(m) where m=conversation history size
+    Rate limit, validate and load history for a chat request.
+    Returns (error_response, None) to reject it, or (None, chat) to answer it.
+    Time Complexity: O(n + m) where n=message length, m=conversation history
     """
-    start_time = time.time()
     conversation_id = generate_conversation_id(event)
+    attach_shared_stores()
     
-    try:
-        # Rate limiting check - O(1)
-        if not rate_limiter.is_allowed(conversation_id):
-            return {
-                "statusCode": 429,
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({
-                    "error": "Rate limit exceeded. Please wait before sending another message."
-                })
-            }
-        
-        # Parse and validate input - O(n)
-        body = json.loads(event.get("body", "{}"))
-        user_input = body.get("message", "")
-        
-        validation_result = validate_input(user_input)
-        if not validation_result["valid"]:
-            return {
-                "statusCode": 400,
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": validation_result["error"]})
-            }
-        
-        # Get conversation history - O(m)
-        history = conversation_manager.get_history(conversation_id)
-        messages = history + [{"role": "user", "content": user_input}]
-        
-        # Add user message to conversation
-        user_message = ChatMessage(
+    # Rate limiting check - O(1)
+    with phase("rate_limit"):
+        allowed = rate_limiter.is_allowed(conversation_id)
+    if not allowed:
+        return error_response(429, "Rate limit exceeded. Please wait before sending another message."), None
+    
+    # Parse and validate input - O(n)
+    body = json.loads(event.get("body") or "{}")
+    user_input = body.get("message", "")
+    
+    validation_result = validate_input(user_input)
+    if not validation_result["valid"]:
+        return error_response(400, validation_result["error"]), None
+    
+    # Newest history that fits the token budget - O(k), at most one store read
+    with phase("history"):
+        history, summary = conversation_manager.get_window(conversation_id, HISTORY_TOKEN_BUDGET)
+    chat = build_chat(conversation_id, user_input, validation_result["estimated_tokens"], history, summary)
+    chat["stream"] = wants_stream(event, body)
+    return None, chat
+
+def build_chat(conversation_id: str, user_input: str, input_tokens: int,
+               history: List[Dict[str, str]], summary: Optional[str]) -> Dict[str, Any]:
+    """
+    The model request for a validated message and the history to send with it
+    """
+    messages = history + [{"role": "user", "content": user_input}]
+    request = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 1000,
+        "messages": messages
+    }
+    if summary:
+        request["system"] = f"Summary of earlier turns in this conversation:\n{summary}"
+    prompt_tokens = sum(token_counter.estimate_tokens(m["content"]) for m in messages)
+    if summary:
+        prompt_tokens += token_counter.estimate_tokens(request["system"])
+    
+    return {
+        "conversation_id": conversation_id,
+        "stream": False,
+        "history_length": len(history),
+        "input_tokens": input_tokens,
+        "prompt_tokens": prompt_tokens,
+        "cache_key": cache_key(MODEL_ID, request),
+        "user_message": ChatMessage(
             role="user",
             content=user_input,
             timestamp=time.time(),
-            token_count=validation_result["estimated_tokens"]
-        )
-        conversation_manager.add_message(conversation_id, user_message)
-        
-        # Call Bedrock API
-        payload = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": messages
-        })
-        
-        bedrock_start = time.time()
+            token_count=input_tokens
+        ),
+        "payload": json.dumps(request)
+    }
+
+def wants_stream(event: dict, body: dict) -> bool:
+    """
+    Clients ask for a streamed reply with {"stream": true} or Accept: text/event-stream
+    """
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    return bool(body.get("stream")) or "text/event-stream" in (headers.get("accept") or "")
+
+def record_reply(chat: Dict[str, Any], reply: str, output_tokens: Optional[int] = None) -> ChatMessage:
+    """
+    Record both turns in one write, so a failed model call leaves no
+    unanswered user message behind
+    """
+    assistant_message = ChatMessage(
+        role="assistant",
+        content=reply,
+        timestamp=time.time(),
+        token_count=output_tokens or token_counter.estimate_tokens(reply)
+    )
+    conversation_manager.add_messages(chat["conversation_id"], [chat["user_message"], assistant_message])
+    return assistant_message
+
+def invoke_reply(payload: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    One blocking model call, retried and hedged by bedrock_invoker, in the
+    form the response cache stores
+    """
+    def call() -> Dict[str, Any]:
         resp = bedrock.invoke_model(
             modelId=MODEL_ID,
             body=payload,
             contentType="application/json",
             accept="application/json"
         )
-        bedrock_duration = time.time() - bedrock_start
+        return json.loads(resp["body"].read().decode("utf-8"))
+
+    data = bedrock_invoker.call(call, deadline)
+    reply = data["content"][0]["text"]
+    return {"reply": reply, "output_tokens": token_counter.estimate_tokens(reply)}
+
+def cache_metadata(source: str) -> Dict[str, Any]:
+    return {
+        "hit": source != "model",
+        "source": source,
+        "hit_rate": response_cache.stats()["hit_rate"]
+    }
+
+def stream_reply(payload: str, timing: Dict[str, Any], deadline: Optional[float] = None) -> Iterator[str]:
+    """
+    Yield reply text as Bedrock generates it. Fills `timing` with
+    first_token_s (time to first token), bedrock_s and, when Bedrock
+    reports it, output_tokens. Opening the stream is retried; once text has
+    been sent it cannot be, and streams are never hedged.
+    """
+    bedrock_start = time.time()
+    resp = bedrock_invoker.call(lambda: bedrock.invoke_model_with_response_stream(
+        modelId=MODEL_ID,
+        body=payload,
+        contentType="application/json",
+        accept="application/json"
+    ), deadline, hedge=False)
+    for event in resp["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        data = json.loads(chunk["bytes"])
+        if data.get("type") == "content_block_delta":
+            text = data.get("delta", {}).get("text", "")
+            if text:
+                if "first_token_s" not in timing:
+                    timing["first_token_s"] = time.time() - bedrock_start
+                yield text
+        elif data.get("type") == "message_stop":
+            metrics = data.get("amazon-bedrock-invocationMetrics") or {}
+            if "outputTokenCount" in metrics:
+                timing["output_tokens"] = metrics["outputTokenCount"]
+    timing["bedrock_s"] = time.time() - bedrock_start
+    timing.setdefault("first_token_s", timing["bedrock_s"])
+
+def sse_frame(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chat_frames(chat: Dict[str, Any], start_time: float) -> Iterator[str]:
+    """
+    Server-sent events for one streamed reply: a `delta` frame per chunk,
+    then a `done` frame with the metadata the buffered reply carries.
+    Turns are recorded only once the reply is complete.
+    """
+    timing = {}
+    lookup_start = time.time()
+    pending = None
+    try:
+        # Identical concurrent streams wait for one model call, as buffered replies do
+        cached, source, pending = response_cache.begin(chat["cache_key"])
+        if cached is not None:
+            # A cached reply arrives whole, as one delta
+            timing["first_token_s"] = timing["bedrock_s"] = time.time() - lookup_start
+            timing["output_tokens"] = cached.get("output_tokens")
+            reply = cached["reply"]
+            yield sse_frame("delta", {"text": reply})
+        else:
+            source = "model"
+            parts = []
+            for text in stream_reply(chat["payload"], timing, chat.get("deadline")):
+                parts.append(text)
+                yield sse_frame("delta", {"text": text})
+            reply = "".join(parts)
+            response_cache.finish(chat["cache_key"], pending, {
+                "reply": reply,
+                "output_tokens": timing.get("output_tokens") or token_counter.estimate_tokens(reply)
+            })
+            pending = None
+    except (ClientError, CircuitOpen, DeadlineExceeded) as e:
+        logger.error(f"Model error: {e}")
+        if pending is not None:
+            response_cache.finish(chat["cache_key"], pending, error=e)
+            pending = None
+        # Kept for a buffering caller to map to a status code
+        chat["error"] = e
+        yield sse_frame("error", {"error": "Service temporarily unavailable"})
+        return
+    finally:
+        if pending is not None:
+            # Abandoned mid-stream: waiting callers make their own call
+            response_cache.finish(chat["cache_key"], pending)
+    
+    # The model phase spans yields, so it is recorded from the stream's own timing
+    timer = current_timer()
+    if timer is not None:
+        timer.record("model", int(timing["bedrock_s"] * 1e9))
+    with phase("record"):
+        assistant_message = record_reply(chat, reply, timing.get("output_tokens"))
+    chat["cache_source"] = source
+    total_duration = time.time() - start_time
+    timing["total_s"] = total_duration
+    chat["timing"] = timing
+    
+    logger.info(f"Request streamed - Total: {total_duration:.3f}s, Bedrock: {timing['bedrock_s']:.3f}s, "
+               f"First token: {timing['first_token_s']:.3f}s, "
+               f"Input tokens: ~{chat['input_tokens']}, "
+               f"Conversation length: {chat['history_length'] + 2}, "
+               f"Cache: {source} (hit rate {response_cache.stats()['hit_rate']:.1%})")
+    
+    yield sse_frame("done", {
+        "metadata": {
+            "conversation_id": chat["conversation_id"],
+            "response_time_ms": int(total_duration * 1000),
+            "time_to_first_token_ms": int(timing["first_token_s"] * 1000),
+            "estimated_tokens": {
+                "input": chat["input_tokens"],
+                "prompt": chat["prompt_tokens"],
+                "output": assistant_message.token_count
+            },
+            "cache": cache_metadata(source)
+        }
+    })
+
+def stream_handler(event, context) -> Iterator[str]:
+    """
+    Response-streaming entry point: yields server-sent event frames for a
+    host that can flush them to the client as they are produced, such as a
+    Function URL behind the Lambda Web Adapter or the local dev server.
+    """
+    start_time = time.time()
+    try:
+        error, chat = prepare_chat(event)
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        error, chat = error_response(500, "Internal server error"), None
+    if error is not None:
+        yield sse_frame("error", json.loads(error["body"]))
+        return
+    chat["deadline"] = call_deadline(context)
+    yield from stream_chat_frames(chat, start_time)
+
+def is_batch_request(event: dict) -> bool:
+    """
+    Check whether an API Gateway event targets /chat/batch
+    """
+    return (event.get("resource") == "/chat/batch"
+            or str(event.get("path", "")).rstrip("/").endswith("/chat/batch"))
+
+def answer_batch_item(index: int, chat: Dict[str, Any], deadline: Optional[float]) -> Dict[str, Any]:
+    """
+    One model call for a batch item. Failures become the item's result
+    instead of failing the batch.
+    """
+    item_start = time.time()
+    result = {"index": index}
+    if deadline is not None and bedrock_invoker.clock() >= deadline:
+        result.update({"status": "failed", "status_code": 503, "error": "Batch ran out of time"})
+        return result
+    try:
+        value, source = response_cache.get_or_compute(
+            chat["cache_key"], lambda: invoke_reply(chat["payload"], deadline))
+    except (CircuitOpen, DeadlineExceeded) as e:
+        logger.warning(f"Batch item {index} unavailable: {e}")
+        result.update({"status": "failed", "status_code": 503, "error": "Service temporarily unavailable"})
+    except ClientError as e:
+        logger.error(f"AWS Client Error: {e}")
+        result.update({"status": "failed", "status_code": 500, "error": "Service temporarily unavailable"})
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        result.update({"status": "failed", "status_code": 500, "error": "Internal server error"})
+    else:
+        result.update({
+            "status": "ok",
+            "status_code": 200,
+            "reply": value["reply"],
+            "estimated_tokens": {
+                "input": chat["input_tokens"],
+                "prompt": chat["prompt_tokens"],
+                "output": value.get("output_tokens") or token_counter.estimate_tokens(value["reply"])
+            },
+            "cache": source
+        })
+    result["response_time_ms"] = int((time.time() - item_start) * 1000)
+    return result
+
+def handle_batch_request(event: dict, context) -> Dict[str, Any]:
+    """
+    Handle POST /chat/batch with body {"messages": ["...", ...]}.
+    Every prompt is independent: it is sent without history and not
+    recorded in a conversation. All prompts are validated and rate limited
+    up front, then the accepted ones are answered on a bounded thread pool.
+    Results keep the order of `messages`.
+    Time Complexity: O(n) checks plus n model calls, c at a time
+    """
+    batch_start = time.time()
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except ValueError:
+        return error_response(400, "Request body must be valid JSON")
+    prompts = body.get("messages") if isinstance(body, dict) else None
+    if not isinstance(prompts, list) or not prompts:
+        return error_response(400, "Request body must contain a non-empty 'messages' list")
+    if len(prompts) > CHAT_BATCH_MAX_ITEMS:
+        return error_response(400, f"Batch too large (max {CHAT_BATCH_MAX_ITEMS} messages)")
+    
+    client_id = generate_conversation_id(event)
+    attach_shared_stores()
+    deadline = call_deadline(context)
+    
+    # Validation and rate limiting per item, in order - O(n)
+    results = [None] * len(prompts)
+    accepted = []
+    with phase("validate"):
+        for index, prompt in enumerate(prompts):
+            validation_result = validate_input(prompt if isinstance(prompt, str) else "")
+            if not validation_result["valid"]:
+                results[index] = {"index": index, "status": "invalid", "status_code": 400,
+                                  "error": validation_result["error"]}
+            elif not rate_limiter.is_allowed(client_id):
+                results[index] = {"index": index, "status": "rate_limited", "status_code": 429,
+                                  "error": "Rate limit exceeded"}
+            else:
+                chat = build_chat(f"{client_id}-batch-{index}", prompt, validation_result["estimated_tokens"], [], None)
+                accepted.append((index, chat))
+    
+    if accepted:
+        concurrency = min(CHAT_BATCH_MAX_CONCURRENCY, len(accepted))
+        with phase("model"), ThreadPoolExecutor(max_workers=concurrency) as pool:
+            answers = pool.map(in_context(lambda item: answer_batch_item(item[0], item[1], deadline)), accepted)
+            for (index, _), answer in zip(accepted, answers):
+                results[index] = answer
+    
+    succeeded = [r for r in results if r["status"] == "ok"]
+    total_duration = time.time() - batch_start
+    tokens = {
+        key: sum(r["estimated_tokens"][key] for r in succeeded)
+        for key in ("input", "prompt", "output")
+    }
+    logger.info(f"Batch processed - Total: {total_duration:.3f}s, Items: {len(prompts)}, "
+                f"Succeeded: {len(succeeded)}, Output tokens: ~{tokens['output']}")
+    
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            "X-Response-Time": str(total_duration)
+        },
+        "body": json.dumps({
+            "total": len(prompts),
+            "succeeded": len(succeeded),
+            "failed": len(prompts) - len(succeeded),
+            "results": results,
+            "metadata": {
+                "response_time_ms": int(total_duration * 1000),
+                "concurrency": min(CHAT_BATCH_MAX_CONCURRENCY, len(accepted)),
+                "estimated_tokens": tokens
+            }
+        })
+    }
+
+@instrument_handler("chatbot")
+def lambda_handler(event, context):
+    """
+    Main handler with comprehensive error handling and performance tracking.
+    Requests that ask for a stream get the same server-sent events as
+    stream_handler, buffered, since API Gateway returns the body whole.
+    Overall Time Complexity: O(n + m) where n=message length, m=conversation history
+    Space Complexity: O(m) where m=conversation history size
+    """
+    start_time = time.time()
+    
+    try:
+        if is_batch_request(event):
+            return handle_batch_request(event, context)
         
-        # Parse response
-        data = json.loads(resp["body"].read().decode("utf-8"))
-        reply = data["content"][0]["text"]
+        error, chat = prepare_chat(event)
+        if error is not None:
+            return error
+        chat["deadline"] = call_deadline(context)
         
-        # Add assistant message to conversation
-        assistant_message = ChatMessage(
-            role="assistant",
-            content=reply,
-            timestamp=time.time(),
-            token_count=token_counter.estimate_tokens(reply)
-        )
-        conversation_manager.add_message(conversation_id, assistant_message)
+        if chat["stream"]:
+            body = "".join(stream_chat_frames(chat, start_time))
+            if "error" in chat:
+                # Same status and Retry-After as the buffered path below
+                raise chat["error"]
+            timing = chat["timing"]
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "X-Response-Time": str(timing["total_s"]),
+                    "X-Bedrock-Time": str(timing["bedrock_s"]),
+                    "X-Bedrock-TTFT": str(timing["first_token_s"]),
+                    "X-Cache": "MISS" if chat["cache_source"] == "model" else "HIT"
+                },
+                "body": body
+            }
+        
+        # Call Bedrock API, unless the same request was answered recently
+        with phase("model") as calling:
+            cached, source = response_cache.get_or_compute(
+                chat["cache_key"], lambda: invoke_reply(chat["payload"], chat["deadline"]))
+        bedrock_duration = calling.duration_ns / 1e9
+        reply = cached["reply"]
+        with phase("record"):
+            record_reply(chat, reply)
         
         # Performance metrics
         total_duration = time.time() - start_time
         
         # Log performance metrics
         logger.info(f"Request processed - Total: {total_duration:.3f}s, Bedrock: {bedrock_duration:.3f}s, "
-                   f"Input tokens: ~{validation_result['estimated_tokens']}, "
-                   f"Conversation length: {len(history) + 2}")
+                   f"Input tokens: ~{chat['input_tokens']}, "
+                   f"Conversation length: {chat['history_length'] + 2}, "
+                   f"Cache: {source} (hit rate {response_cache.stats()['hit_rate']:.1%})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Conversation cache: {conversation_manager.stats()}")
+            logger.debug(f"Model calls: {bedrock_invoker.stats()}")
         
         return {
             "statusCode": 200,
             "headers": {
                 "Content-Type": "application/json",
                 "X-Response-Time": str(total_duration),
-                "X-Bedrock-Time": str(bedrock_duration)
+                "X-Bedrock-Time": str(bedrock_duration),
+                # Without streaming the first token arrives with the last
+                "X-Bedrock-TTFT": str(bedrock_duration),
+                "X-Cache": "MISS" if source == "model" else "HIT"
             },
             "body": json.dumps({
                 "reply": reply,
                 "metadata": {
-                    "conversation_id": conversation_id,
+                    "conversation_id": chat["conversation_id"],
                     "response_time_ms": int(total_duration * 1000),
                     "estimated_tokens": {
-                        "input": validation_result["estimated_tokens"],
+                        "input": chat["input_tokens"],
+                        "prompt": chat["prompt_tokens"],
                         "output": token_counter.estimate_tokens(reply)
-                    }
+                    },
+                    "cache": cache_metadata(source)
                 }
             })
         }
         
+    except (CircuitOpen, DeadlineExceeded) as e:
+        return unavailable_response(e)
     except ClientError as e:
         logger.error(f"AWS Client Error: {e}")
-        return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "Service temporarily unavailable"})
-        }
+        return error_response(500, "Service temporarily unavailable")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        return {
-            "statusCode": 500,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "Internal server error"})
-        }
\ No newline at end of file
+        return error_response(500, "Internal server error")
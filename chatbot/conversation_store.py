@@ -0,0 +1,98 @@
+"""
+Storage backends for chat conversation history.
+
+A store holds each conversation as a list of message records plus a version
+number. Writes are compare-and-swap: `save` only succeeds when the stored
+version still matches the version the caller read, so two containers
+appending to the same conversation can never overwrite each other's turns.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+
+
+class ConversationConflict(Exception):
+    """
+    The conversation changed since it was read
+    """
+
+
+class InMemoryConversationStore:
+    """
+    Process-local store with the same semantics as the DynamoDB store,
+    for tests and local runs
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        self.read_count = 0
+        self.write_count = 0
+
+    def load(self, conversation_id: str) -> Tuple[int, List[Dict[str, Any]]]:
+        with self._lock:
+            self.read_count += 1
+            version, messages = self._items.get(conversation_id, (0, []))
+            return version, list(messages)
+
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], expected_version: int) -> int:
+        with self._lock:
+            self.write_count += 1
+            version, _ = self._items.get(conversation_id, (0, []))
+            if version != expected_version:
+                raise ConversationConflict(conversation_id)
+            self._items[conversation_id] = (version + 1, list(messages))
+            return version + 1
+
+
+class DynamoDBConversationStore:
+    """
+    Conversations in a DynamoDB table keyed by conversation_id. Each save is
+    one conditional update guarded by the version the caller read; items
+    expire through the table's TTL on expires_at.
+    """
+
+    def __init__(self, table, ttl_seconds: int = 86400):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def load(self, conversation_id: str) -> Tuple[int, List[Dict[str, Any]]]:
+        item = self.table.get_item(
+            Key={"conversation_id": conversation_id},
+            ConsistentRead=True
+        ).get("Item")
+        if not item:
+            return 0, []
+        return int(item.get("version", 0)), list(item.get("messages", []))
+
+    def save(self, conversation_id: str, messages: List[Dict[str, Any]], expected_version: int) -> int:
+        now = int(time.time())
+        if expected_version:
+            condition = "#version = :expected"
+            values = {":expected": expected_version}
+        else:
+            condition = "attribute_not_exists(conversation_id)"
+            values = {}
+        values.update({
+            ":messages": messages,
+            ":version": expected_version + 1,
+            ":updated_at": now,
+            ":expires_at": now + self.ttl_seconds
+        })
+        try:
+            self.table.update_item(
+                Key={"conversation_id": conversation_id},
+                UpdateExpression="SET messages = :messages, #version = :version, "
+                                 "updated_at = :updated_at, expires_at = :expires_at",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#version": "version"},
+                ExpressionAttributeValues=values
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                raise ConversationConflict(conversation_id) from e
+            raise
+        return expected_version + 1
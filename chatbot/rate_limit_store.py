@@ -0,0 +1,106 @@
+"""
+Shared state for the chatbot rate limiter.
+
+The limiter uses GCRA: each key's state is one theoretical arrival time
+(TAT). A request is admitted when the TAT is at most `tolerance` ahead of
+now, and admitting it moves the TAT forward by one emission interval. These
+stores make that check-and-advance atomic across containers. Times are
+integer milliseconds so DynamoDB stores them exactly.
+"""
+
+import threading
+from typing import Tuple
+
+from botocore.exceptions import ClientError
+
+
+def is_conditional_check_failure(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+class InMemoryRateLimitStore:
+    """
+    Process-local store with the same semantics as the DynamoDB store,
+    for tests and local runs
+    """
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+        self.call_count = 0
+
+    def acquire(self, key: str, now_ms: int, interval_ms: int, tolerance_ms: int) -> Tuple[bool, int]:
+        """
+        Admit one request for `key`. Returns whether it was admitted and the key's TAT.
+        """
+        with self._lock:
+            self.call_count += 1
+            tat = max(self._tats.get(key, now_ms), now_ms)
+            if tat - now_ms > tolerance_ms:
+                return False, tat
+            self._tats[key] = tat + interval_ms
+            return True, tat + interval_ms
+
+
+class DynamoDBRateLimitStore:
+    """
+    TATs in a DynamoDB table keyed by limiter_key. Admission is a single
+    conditional update with no read: one form advances a TAT that is still
+    ahead of now, the other restarts a new or idle key from now. Only when
+    both conditions fail is the TAT read, to confirm the key is over its
+    limit and tell the caller when it frees up. Items expire through the
+    table's TTL on expires_at once their TAT has passed.
+    """
+
+    def __init__(self, table, max_attempts: int = 3):
+        self.table = table
+        self.max_attempts = max_attempts
+
+    def acquire(self, key: str, now_ms: int, interval_ms: int, tolerance_ms: int) -> Tuple[bool, int]:
+        """
+        Admit one request for `key`. Returns whether it was admitted and the key's TAT.
+        """
+        # An admitted request leaves the TAT at most this far ahead
+        expires_at = (now_ms + tolerance_ms + interval_ms) // 1000 + 1
+        for _ in range(self.max_attempts):
+            try:
+                response = self.table.update_item(
+                    Key={"limiter_key": key},
+                    UpdateExpression="SET tat = tat + :interval, expires_at = :expires_at",
+                    ConditionExpression="tat BETWEEN :now AND :limit",
+                    ExpressionAttributeValues={
+                        ":interval": interval_ms,
+                        ":now": now_ms,
+                        ":limit": now_ms + tolerance_ms,
+                        ":expires_at": expires_at
+                    },
+                    ReturnValues="UPDATED_NEW"
+                )
+                return True, int(response["Attributes"]["tat"])
+            except ClientError as e:
+                if not is_conditional_check_failure(e):
+                    raise
+
+            try:
+                self.table.update_item(
+                    Key={"limiter_key": key},
+                    UpdateExpression="SET tat = :tat, expires_at = :expires_at",
+                    ConditionExpression="attribute_not_exists(tat) OR tat < :now",
+                    ExpressionAttributeValues={
+                        ":tat": now_ms + interval_ms,
+                        ":now": now_ms,
+                        ":expires_at": expires_at
+                    }
+                )
+                return True, now_ms + interval_ms
+            except ClientError as e:
+                if not is_conditional_check_failure(e):
+                    raise
+
+            item = self.table.get_item(Key={"limiter_key": key}, ConsistentRead=True).get("Item")
+            tat = int(item["tat"]) if item else now_ms
+            if tat - now_ms > tolerance_ms:
+                return False, tat
+            # Another container moved the TAT between our writes; try again
+
+        return False, now_ms
@@ -0,0 +1,341 @@
+"""
+Resilient calls to the model endpoint.
+
+Bedrock throttles under load and occasionally stalls. Model calls go
+through ResilientInvoker, which:
+- retries throttling and transient errors with full-jitter exponential
+  backoff, never sleeping past the caller's deadline (the Lambda's
+  remaining time);
+- optionally hedges: when a call has not returned within the recent p95
+  latency, an identical second call is sent and the first reply wins;
+- bounds every call by the caller's deadline, so a stalled call ends
+  there rather than at the client's read timeout;
+- fails fast through a circuit breaker while the endpoint keeps failing,
+  letting a single probe through once the breaker has cooled down.
+  Throttling is backpressure from a healthy endpoint, so it is retried
+  but never opens the breaker.
+"""
+
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+# Error codes that say "try again later" rather than "this request is wrong"
+RETRYABLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException"
+})
+# The retryable codes that mean "slow down" rather than "unhealthy"
+THROTTLING_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException"
+})
+
+
+class CircuitOpen(Exception):
+    """
+    Raised without calling the endpoint while the circuit breaker is open
+    """
+
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(f"Model endpoint unavailable; retry after {retry_after_seconds:.1f}s")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when no reply arrived before the caller's deadline
+    """
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_ERROR_CODES or status == 429 or status >= 500
+    # Connection failures and read timeouts
+    return isinstance(error, (BotoConnectionError, HTTPClientError))
+
+
+def is_throttling(error: Exception) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return code in THROTTLING_ERROR_CODES or status == 429
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout_seconds`. Then one probe call is let through: success
+    closes the breaker, failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejections = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout_seconds:
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Admit a call or raise CircuitOpen. Time Complexity: O(1)
+        """
+        if self._state == self.CLOSED:
+            return
+        with self._lock:
+            if self._state == self.OPEN:
+                waited = self._clock() - self._opened_at
+                if waited < self.reset_timeout_seconds:
+                    self.rejections += 1
+                    raise CircuitOpen(self.reset_timeout_seconds - waited)
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejections += 1
+                    raise CircuitOpen(1.0)
+                self._probing = True
+
+    def record_success(self) -> None:
+        if self._state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_throttle(self) -> None:
+        """
+        A throttled call says nothing about the endpoint's health: the
+        failure count is kept and a half-open breaker admits another probe
+        """
+        if self._state == self.CLOSED:
+            return
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class LatencyTracker:
+    """
+    Latencies of the last `window` successful calls
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """
+        Time Complexity: O(w log w) for a window of w samples
+        """
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+
+class ResilientInvoker:
+    """
+    Runs model calls with retries, optional hedging and a circuit breaker.
+    Deadlines are absolute times on `clock`.
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay_seconds: float = 0.2,
+                 max_delay_seconds: float = 4.0, breaker: Optional[CircuitBreaker] = None,
+                 hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 hedge_min_delay_seconds: float = 0.05, max_workers: int = 8,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.max_workers = max_workers
+        self.clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def call(self, fn: Callable[[], Any], deadline: Optional[float] = None, hedge: Optional[bool] = None) -> Any:
+        """
+        fn() with retries. Non-retryable errors are raised at once; a
+        retryable one is raised when attempts run out or the next backoff
+        would end past `deadline`. With a deadline, each attempt runs on the
+        pool and DeadlineExceeded is raised once it passes. Raises
+        CircuitOpen while the breaker is open.
+        """
+        self.calls += 1
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self.breaker.before_call()
+            try:
+                # A half-open breaker lets exactly one probe through, so no hedge
+                if hedge and (self.breaker is None or self.breaker.state == CircuitBreaker.CLOSED):
+                    result = self._hedged(fn, deadline)
+                else:
+                    result = self._bounded(fn, deadline)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.breaker is not None:
+                    if is_throttling(e):
+                        self.breaker.record_throttle()
+                    elif retryable or isinstance(e, DeadlineExceeded):
+                        self.breaker.record_failure()
+                    else:
+                        # The endpoint answered; the request itself was at fault
+                        self.breaker.record_success()
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt)
+                if deadline is not None and self.clock() + delay >= deadline:
+                    raise
+                self.retries += 1
+                self._sleep(delay)
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full jitter: uniform between 0 and the capped exponential delay
+        """
+        return self._rng.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        How long to wait before sending a hedge, or None until enough
+        latencies have been seen
+        """
+        if len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay_seconds, self.latency.percentile(self.hedge_quantile))
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": int(p95 * 1000) if p95 is not None else None,
+            "breaker": self.breaker.state if self.breaker is not None else None,
+            "breaker_rejections": self.breaker.rejections if self.breaker is not None else 0
+        }
+
+    def _timed(self, fn: Callable[[], Any]) -> Any:
+        started = self.clock()
+        result = fn()
+        self.latency.observe(self.clock() - started)
+        return result
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="model-call")
+        return self._executor
+
+    def _submit(self, fn: Callable[[], Any]):
+        # Pool threads do not inherit context variables, such as the request's phase timer
+        return self._pool().submit(contextvars.copy_context().run, self._timed, fn)
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - self.clock())
+
+    def _bounded(self, fn: Callable[[], Any], deadline: Optional[float]) -> Any:
+        """
+        fn() on the pool, abandoned with DeadlineExceeded at `deadline`
+        """
+        remaining = self._remaining(deadline)
+        if remaining is None:
+            return self._timed(fn)
+        if remaining <= 0:
+            raise DeadlineExceeded("No time left for a model call")
+        future = self._submit(fn)
+        done, _ = wait([future], timeout=remaining)
+        if not done:
+            raise DeadlineExceeded("No model reply before the deadline")
+        return future.result()
+
+    def _hedged(self, fn: Callable[[], Any], deadline: Optional[float]) -> Any:
+        delay = self.hedge_delay()
+        remaining = self._remaining(deadline)
+        if delay is None or remaining is not None and remaining <= delay:
+            return self._bounded(fn, deadline)
+
+        primary = self._submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        hedge = self._submit(fn)
+        pending = [primary, hedge]
+        error = None
+        while pending:
+            done, _ = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("No model reply before the deadline")
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if future is hedge:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -0,0 +1,270 @@
+"""
+Exact-match cache of chatbot replies.
+
+Replies are keyed by a hash of the canonical Bedrock request (model plus
+payload), so an identical prompt with identical history is answered without
+invoking the model. A local LRU with a TTL serves warm containers. Concurrent
+misses for one key are coalesced onto a single model call. An optional
+shared tier lets replies survive cold starts and be shared across containers.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+MEMORY = "memory"
+SHARED = "shared"
+COALESCED = "coalesced"
+MODEL = "model"
+
+
+def cache_key(model_id: Optional[str], request: Dict[str, Any]) -> str:
+    """
+    Hash of the canonical request: key order and JSON spacing do not matter
+    """
+    canonical = json.dumps({"model": model_id, "request": request},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Pending:
+    """
+    A model call in progress that other requests for the same key wait on
+    """
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Local LRU of replies with a TTL, in-flight coalescing and an optional
+    shared tier. Values are small dicts such as {"reply": ..., "output_tokens": ...}.
+    Safe to share between request threads; counters are updated under the lock.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300, shared=None,
+                 clock: Callable[[], float] = time.time, coalesce_timeout_seconds: float = 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.coalesce_timeout_seconds = coalesce_timeout_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        A cached value and where it came from, or (None, None)
+        """
+        if not self.enabled:
+            self._count("misses")
+            return None, None
+        value, source = self._lookup(key)
+        self._count("misses" if value is None else "hits")
+        return value, source
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        now = self._clock()
+        self._put_local(key, value, now)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value, now + self.ttl_seconds)
+            except Exception:
+                # The shared tier is an optimization; the reply is already served
+                self._count("shared_errors")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+        """
+        The cached value, or the result of compute() stored for next time.
+        Concurrent callers missing on the same key share one compute().
+        Returns the value and its source: memory, shared, coalesced or model.
+        """
+        value, source, pending = self.begin(key)
+        if pending is None:
+            return value, source
+        try:
+            value = compute()
+        except Exception as e:
+            self.finish(key, pending, error=e)
+            raise
+        self.finish(key, pending, value)
+        return value, MODEL
+
+    def begin(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[_Pending]]:
+        """
+        First half of get_or_compute, for callers that produce the value
+        themselves, such as a streamed reply. Returns (value, source, None)
+        for a cached or coalesced value. Otherwise returns (None, None, pending)
+        and the caller must produce the value and pass it, or its error, to
+        finish(); concurrent callers for the key wait for it meanwhile.
+        Re-raises the error of a call this one waited on.
+        """
+        if not self.enabled:
+            self._count("misses")
+            return None, None, _Pending()
+
+        value, source = self._lookup(key)
+        if value is not None:
+            self._count("hits")
+            return value, source, None
+
+        with self._lock:
+            pending = self._in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = _Pending()
+                self._in_flight[key] = pending
+                self.misses += 1
+        if leader:
+            return None, None, pending
+
+        pending.done.wait(self.coalesce_timeout_seconds)
+        if pending.value is not None:
+            with self._lock:
+                self.hits += 1
+                self.coalesced += 1
+            return pending.value, COALESCED, None
+        if pending.error is not None:
+            raise pending.error
+        # The call timed out or was abandoned: make our own, uncoalesced
+        self._count("misses")
+        return None, None, _Pending()
+
+    def finish(self, key: str, pending: _Pending, value: Optional[Dict[str, Any]] = None,
+               error: Optional[Exception] = None) -> None:
+        """
+        Complete a begin(): store the value and wake the callers waiting on it.
+        With neither a value nor an error, waiters make their own call.
+        """
+        try:
+            if value is not None:
+                pending.value = value
+                self.put(key, value)
+            pending.error = error
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is pending:
+                    del self._in_flight[key]
+            pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "shared_hits": self.shared_hits,
+                "shared_errors": self.shared_errors,
+                "evictions": self.evictions
+            }
+
+    def _count(self, counter: str) -> None:
+        # Request threads (batch items, hedged calls) share one cache
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        now = self._clock()
+        with self._lock:
+            value = self._get_local(key, now)
+        if value is not None:
+            return value, MEMORY
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key, now)
+            except Exception:
+                self._count("shared_errors")
+                value = None
+            if value is not None:
+                self._count("shared_hits")
+                self._put_local(key, value, now)
+                return value, SHARED
+        return None, None
+
+    def _get_local(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        # Called under _lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value: Dict[str, Any], now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class InMemoryResponseCacheStore:
+    """
+    Process-local shared tier with the same semantics as the DynamoDB one,
+    for tests and local runs
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            expires_at, value = self._items.get(key, (0, None))
+        return value if expires_at > now else None
+
+    def put(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._items[key] = (expires_at, dict(value))
+
+
+class DynamoDBResponseCacheStore:
+    """
+    Shared tier in a DynamoDB table keyed by cache_key. Items carry
+    expires_at for the table's TTL; since TTL deletion lags, reads also
+    ignore items past it.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        if not item or int(item.get("expires_at", 0)) <= now:
+            return None
+        return {"reply": item["reply"], "output_tokens": int(item.get("output_tokens", 0))}
+
+    def put(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        self.table.put_item(Item={
+            "cache_key": key,
+            "reply": value["reply"],
+            "output_tokens": int(value.get("output_tokens", 0)),
+            "expires_at": int(expires_at)
+        })
@@ -0,0 +1,142 @@
+"""
+Shared boto3 client factory, deployed to every function as a Lambda layer.
+
+Clients are created on first use instead of at import, then cached for the
+life of the process, so warm invocations and every module in a function
+share one connection pool per service. Connection settings come from the
+environment:
+
+    BOTO_MAX_POOL_CONNECTIONS  connections kept open per client (default 10)
+    BOTO_CONNECT_TIMEOUT       seconds to establish a connection (default 2)
+    BOTO_READ_TIMEOUT          seconds to wait for a response (default 10)
+    BOTO_RETRY_MODE            standard, adaptive or legacy (default standard)
+    BOTO_MAX_ATTEMPTS          attempts per call, including the first (default 3)
+    BOTO_TCP_KEEPALIVE         keep idle connections alive (default true)
+
+Callers may override any setting per client, e.g. a longer read timeout
+for Bedrock or a larger pool for a fan-out. An `endpoint_url` override is
+passed to the client itself, for services such as the API Gateway
+management API that are addressed per deployment.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import boto3
+from botocore.config import Config
+
+_lock = threading.RLock()
+_instances: Dict[Tuple, Any] = {}
+_session = None
+
+
+def client_config(**overrides) -> Config:
+    """
+    botocore Config from the environment, with per-client overrides
+    """
+    settings = {
+        'max_pool_connections': int(os.environ.get('BOTO_MAX_POOL_CONNECTIONS', '10')),
+        'connect_timeout': float(os.environ.get('BOTO_CONNECT_TIMEOUT', '2')),
+        'read_timeout': float(os.environ.get('BOTO_READ_TIMEOUT', '10')),
+        'retries': {
+            'mode': os.environ.get('BOTO_RETRY_MODE', 'standard'),
+            'max_attempts': int(os.environ.get('BOTO_MAX_ATTEMPTS', '3'))
+        },
+        'tcp_keepalive': os.environ.get('BOTO_TCP_KEEPALIVE', 'true').lower() == 'true',
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def _cached(key: Tuple, factory: Callable[[], Any]) -> Any:
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory()
+                _instances[key] = instance
+    return instance
+
+
+def _get_session():
+    # Called under _lock: boto3 sessions are not safe to build clients from concurrently
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_client(service: str, **overrides) -> Any:
+    """
+    The process-wide client for a service and configuration
+    """
+    key = ('client', service, repr(sorted(overrides.items())))
+    settings = dict(overrides)
+    endpoint_url = settings.pop('endpoint_url', None)
+    return _cached(key, lambda: _get_session().client(service, endpoint_url=endpoint_url,
+                                                      config=client_config(**settings)))
+
+
+def get_resource(service: str, **overrides) -> Any:
+    """
+    The process-wide resource for a service and configuration
+    """
+    key = ('resource', service, repr(sorted(overrides.items())))
+    return _cached(key, lambda: _get_session().resource(service, config=client_config(**overrides)))
+
+
+def get_table(table_name: str) -> Any:
+    """
+    A DynamoDB Table on the shared resource. Building a Table makes no API call.
+    """
+    return _cached(('table', table_name), lambda: get_resource('dynamodb').Table(table_name))
+
+
+class Lazy:
+    """
+    Module-level stand-in that resolves to the shared client on first use.
+    Handlers keep `name = lazy_client(...)` globals, which tests can still
+    replace, without paying for client creation at import time.
+    """
+
+    __slots__ = ('_factory', '_description')
+
+    def __init__(self, factory: Callable[[], Any], description: str):
+        self._factory = factory
+        self._description = description
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory(), name)
+
+    def resolve(self) -> Any:
+        """
+        The shared client, created now if it has not been yet
+        """
+        return self._factory()
+
+    def __repr__(self) -> str:
+        return f"<Lazy {self._description}>"
+
+
+def lazy_client(service: str, **overrides) -> Lazy:
+    return Lazy(lambda: get_client(service, **overrides), f"client {service}")
+
+
+def lazy_resource(service: str, **overrides) -> Lazy:
+    return Lazy(lambda: get_resource(service, **overrides), f"resource {service}")
+
+
+def lazy_table(table_name: str) -> Lazy:
+    return Lazy(lambda: get_table(table_name), f"table {table_name}")
+
+
+def reset_clients() -> None:
+    """
+    Drop every cached client, e.g. between tests that change the environment
+    """
+    global _session
+    with _lock:
+        _instances.clear()
+        _session = None
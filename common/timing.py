@@ -0,0 +1,199 @@
+"""
+Phase timing shared by every handler, deployed as part of the Lambda layer.
+
+A handler decorated with instrument_handler gets a PhaseTimer per request.
+Code anywhere below it marks named phases with `with phase('name'):` or
+the @timed decorator. When the handler returns, its phases are:
+- added to API responses as a standard Server-Timing header, which browser
+  dev tools show per request;
+- logged as one JSON line: {"timing": handler, "status", "total_ms", "phases"}.
+
+Phases are measured with perf_counter_ns. A phase with the same name
+entered twice accumulates. Work handed to a thread pool is timed only when
+submitted through in_context(), which carries the request's timer over;
+phases from concurrent workers add up their busy time, so they can exceed
+the request total. Settings come from the environment:
+
+    PHASE_TIMING   record phases, add the header and log them (default true)
+
+With PHASE_TIMING=false, instrument_handler and timed return the function
+unchanged. phase() still measures, because some callers report the
+duration, but records it nowhere; that costs well under a microsecond.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+ENABLED = os.environ.get('PHASE_TIMING', 'true').lower() == 'true'
+
+_current: contextvars.ContextVar = contextvars.ContextVar('phase_timer', default=None)
+
+
+class PhaseTimer:
+    """
+    Named phase durations for one request, in the order they first ran
+    """
+    __slots__ = ('name', 'phases', 'started_ns', '_lock')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: Dict[str, int] = {}
+        self.started_ns = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ns: int) -> None:
+        # Pool workers running in_context() record into the same timer
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0) + duration_ns
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter_ns() - self.started_ns) / 1e6
+
+    def phases_ms(self) -> Dict[str, float]:
+        return {name: round(ns / 1e6, 3) for name, ns in self.phases.items()}
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value, e.g. "query;dur=12.345, total;dur=15.001"
+        """
+        entries = [f"{name};dur={ns / 1e6:.3f}" for name, ns in self.phases.items()]
+        entries.append(f"total;dur={self.elapsed_ms():.3f}")
+        return ', '.join(entries)
+
+    def log_line(self, **fields) -> str:
+        """
+        One JSON log line. Built by hand because it is written on every
+        request; handler and phase names are identifiers, so need no escaping.
+        """
+        extra = ''.join(f', "{key}": {_json_scalar(value)}' for key, value in fields.items())
+        phases = ', '.join(f'"{name}": {ns / 1e6:.3f}' for name, ns in self.phases.items())
+        return (f'{{"timing": "{self.name}"{extra}, "total_ms": {self.elapsed_ms():.3f}, '
+                f'"phases": {{{phases}}}}}')
+
+
+def _json_scalar(value: Any) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, (bool, str)):
+        return json.dumps(value)
+    return str(value)
+
+
+class Phase:
+    """
+    Context manager timing one phase. duration_ns (and duration_ms) are set
+    on exit, also when the block raises.
+    """
+    __slots__ = ('name', 'timer', 'start_ns', 'duration_ns')
+
+    def __init__(self, name: str, timer: Optional[PhaseTimer]):
+        self.name = name
+        self.timer = timer
+        self.start_ns = 0
+        self.duration_ns = 0
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_ns / 1e6
+
+    def __enter__(self) -> 'Phase':
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self.duration_ns = time.perf_counter_ns() - self.start_ns
+        if self.timer is not None:
+            self.timer.record(self.name, self.duration_ns)
+        return False
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    return _current.get()
+
+
+def phase(name: str) -> Phase:
+    """
+    Time a block as phase `name` of the current request
+    """
+    return Phase(name, _current.get())
+
+
+def in_context(fn: Callable) -> Callable:
+    """
+    fn wrapped to run in a copy of the caller's context, for submitting to
+    a thread pool: executor threads do not inherit context variables, so
+    phases timed in a worker would otherwise be recorded nowhere
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """
+    Decorator timing every call of a function as phase `name`
+    (default: the function's name)
+    """
+    def decorator(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+        phase_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Phase(phase_name, _current.get()):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_handler(name: str) -> Callable:
+    """
+    Decorator for a Lambda handler: times the request, adds Server-Timing
+    to API Gateway responses and logs the phases
+    """
+    def decorator(handler: Callable) -> Callable:
+        if not ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            timer = PhaseTimer(name)
+            token = _current.set(timer)
+            try:
+                response = handler(event, context)
+            except Exception as e:
+                print(timer.log_line(error=type(e).__name__))
+                raise
+            finally:
+                _current.reset(token)
+            if isinstance(response, dict):
+                add_server_timing(response, timer)
+                print(timer.log_line(status=response.get('statusCode')))
+            else:
+                print(timer.log_line())
+            return response
+        return wrapper
+    return decorator
+
+
+def add_server_timing(response: Dict[str, Any], timer: PhaseTimer) -> None:
+    """
+    Add the Server-Timing header to an API Gateway proxy response. Browsers
+    only expose it to cross-origin pages that Timing-Allow-Origin permits.
+    """
+    headers = response.get('headers')
+    if not isinstance(headers, dict):
+        return
+    headers['Server-Timing'] = timer.server_timing()
+    if 'Access-Control-Allow-Origin' in headers:
+        headers.setdefault('Timing-Allow-Origin', headers['Access-Control-Allow-Origin'])
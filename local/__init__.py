@@ -0,0 +1,3 @@
+"""
+Local stand-ins for running the Lambda handlers without an AWS account
+"""
@@ -0,0 +1,213 @@
+"""
+Evaluator for the DynamoDB expression subset the handlers use, so the
+in-memory table can honour conditional writes and atomic updates.
+
+Conditions: attribute_exists / attribute_not_exists / begins_with /
+contains, the comparison operators, BETWEEN, AND / OR / NOT and parentheses.
+Updates: SET (with +, -, if_not_exists and list_append), ADD and REMOVE.
+Attribute paths are top-level names or #placeholders.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),+\-]|[#:]?[A-Za-z_][A-Za-z0-9_]*)')
+
+MISSING = object()
+
+
+def tokenize(expression: str) -> List[str]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Cannot parse expression at: {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression: str, names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise ValueError(f"Expected {expected or 'token'}, got {token!r}")
+        self.position += 1
+        return token
+
+    def name(self, token: str) -> str:
+        return self.names[token] if token.startswith('#') else token
+
+    def operand(self, item: Dict[str, Any]) -> Any:
+        """
+        Value of a path, :value or function call
+        """
+        token = self.take()
+        lowered = token.lower()
+        if lowered in ('if_not_exists', 'list_append', 'size') and self.peek() == '(':
+            self.take('(')
+            if lowered == 'size':
+                value = self.operand(item)
+                self.take(')')
+                return MISSING if value is MISSING else len(value)
+            first = self.operand(item)
+            self.take(',')
+            second = self.operand(item)
+            self.take(')')
+            if lowered == 'if_not_exists':
+                return second if first is MISSING else first
+            return list(first if first is not MISSING else []) + list(second if second is not MISSING else [])
+        if token.startswith(':'):
+            return self.values[token]
+        return item.get(self.name(token), MISSING)
+
+    def value_expression(self, item: Dict[str, Any]) -> Any:
+        value = self.operand(item)
+        while self.peek() in ('+', '-'):
+            operator = self.take()
+            other = self.operand(item)
+            value = value + other if operator == '+' else value - other
+        return value
+
+
+class ConditionEvaluator(_Parser):
+    """
+    Recursive-descent evaluation of a ConditionExpression against one item
+    """
+
+    def evaluate(self, item: Dict[str, Any]) -> bool:
+        result = self.or_expression(item)
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token {self.peek()!r}")
+        return result
+
+    def or_expression(self, item):
+        result = self.and_expression(item)
+        while self.peek() and self.peek().upper() == 'OR':
+            self.take()
+            right = self.and_expression(item)
+            result = result or right
+        return result
+
+    def and_expression(self, item):
+        result = self.not_expression(item)
+        while self.peek() and self.peek().upper() == 'AND':
+            self.take()
+            right = self.not_expression(item)
+            result = result and right
+        return result
+
+    def not_expression(self, item):
+        if self.peek() and self.peek().upper() == 'NOT':
+            self.take()
+            return not self.not_expression(item)
+        return self.comparison(item)
+
+    def comparison(self, item):
+        token = self.peek()
+        if token == '(':
+            self.take('(')
+            result = self.or_expression(item)
+            self.take(')')
+            return result
+
+        lowered = token.lower()
+        if lowered in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains') and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            if lowered == 'begins_with':
+                value = self.operand(item)
+                self.take(',')
+                prefix = self.operand(item)
+                self.take(')')
+                return isinstance(value, str) and value.startswith(prefix)
+            if lowered == 'contains':
+                value = self.operand(item)
+                self.take(',')
+                member = self.operand(item)
+                self.take(')')
+                return value is not MISSING and member in value
+            exists = item.get(self.name(self.take())) is not None
+            self.take(')')
+            return exists if lowered == 'attribute_exists' else not exists
+
+        left = self.value_expression(item)
+        operator = self.take()
+        if operator.upper() == 'BETWEEN':
+            low = self.value_expression(item)
+            self.take('AND')
+            high = self.value_expression(item)
+            return left is not MISSING and low <= left <= high
+        right = self.value_expression(item)
+        if left is MISSING or right is MISSING:
+            return operator == '<>'
+        return {
+            '=': left == right,
+            '<>': left != right,
+            '<': left < right,
+            '<=': left <= right,
+            '>': left > right,
+            '>=': left >= right,
+        }[operator]
+
+
+def evaluate_condition(expression: Optional[str], item: Dict[str, Any],
+                       names: Optional[Dict[str, str]] = None, values: Optional[Dict[str, Any]] = None) -> bool:
+    if not expression:
+        return True
+    return ConditionEvaluator(expression, names, values).evaluate(item)
+
+
+class UpdateApplier(_Parser):
+    """
+    Applies an UpdateExpression to a copy of an item
+    """
+
+    CLAUSES = ('SET', 'ADD', 'REMOVE', 'DELETE')
+
+    def apply(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        original = dict(item)
+        updated = dict(item)
+        while self.peek() is not None:
+            clause = self.take().upper()
+            if clause not in self.CLAUSES:
+                raise ValueError(f"Unknown update clause {clause}")
+            while True:
+                if clause == 'SET':
+                    name = self.name(self.take())
+                    self.take('=')
+                    updated[name] = self.value_expression(original)
+                elif clause == 'ADD':
+                    name = self.name(self.take())
+                    increment = self.operand(original)
+                    current = updated.get(name)
+                    if isinstance(increment, set):
+                        updated[name] = (current or set()) | increment
+                    else:
+                        updated[name] = (current if current is not None else 0) + increment
+                elif clause == 'REMOVE':
+                    updated.pop(self.name(self.take()), None)
+                else:
+                    name = self.name(self.take())
+                    updated[name] = (updated.get(name) or set()) - self.operand(original)
+                if self.peek() != ',':
+                    break
+                self.take(',')
+        return updated
+
+
+def apply_update(expression: str, item: Dict[str, Any],
+                 names: Optional[Dict[str, str]] = None, values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return UpdateApplier(expression, names, values).apply(item)
@@ -0,0 +1,514 @@
+"""
+In-memory stand-ins for the AWS clients the handlers use.
+They implement only the calls this repo makes, with the same response shapes.
+"""
+
+import contextlib
+import copy
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+from local.expressions import apply_update, evaluate_condition
+
+
+def client_error(code: str, message: str, operation: str) -> ClientError:
+    """
+    Build the ClientError botocore raises for an AWS error code
+    """
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+# Key schema (hash key, range key) of each table, by the default table name
+# the handlers use when their environment variable is unset
+TABLE_KEYS = {
+    'PipelineLogs': ('execution_id', None),
+    'PipelineResults': ('request_id', None),
+    'PipelineIdempotency': ('idempotency_key', None),
+    'PipelineAdmission': ('budget_key', None),
+    'ChatConversations': ('conversation_id', None),
+    'ChatRateLimits': ('limiter_key', None),
+    'ChatResponseCache': ('cache_key', None),
+    'LiveConnections': ('connection_id', None),
+    'PipelineCube': ('day', 'cell'),
+    'PipelineAnomalies': ('series', None),
+}
+
+
+def check_dynamodb_types(value: Any) -> None:
+    """
+    Reject floats the way boto3's serializer does
+    """
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        for nested in value.values():
+            check_dynamodb_types(nested)
+    elif isinstance(value, (list, tuple, set)):
+        for nested in value:
+            check_dynamodb_types(nested)
+
+
+class FakeTable:
+    """
+    DynamoDB Table stand-in with conditional writes and update expressions.
+    Listeners added with add_stream_listener receive a NEW_AND_OLD_IMAGES
+    stream record for every write, as a Lambda stream trigger would.
+    Setting scan_page_size makes scan() return pages of that many items, as
+    the 1 MB page limit does for a large table.
+    """
+
+    def __init__(self, name: str, key: str = 'execution_id', range_key: Optional[str] = None):
+        self.name = name
+        self.key = key
+        self.range_key = range_key
+        self.read_count = 0
+        self.write_count = 0
+        self.scan_page_size: Optional[int] = None
+        self._items = {}
+        self._lock = threading.Lock()
+        self._stream_listeners = []
+        self._stream_sequence = 0
+
+    def add_stream_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        self._stream_listeners.append(listener)
+
+    def _emit(self, key: Dict[str, Any], old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        if not self._stream_listeners or (old is None and new is None):
+            return
+        serializer = TypeSerializer()
+        with self._lock:
+            self._stream_sequence += 1
+            sequence = self._stream_sequence
+        change = {
+            'Keys': {name: serializer.serialize(value) for name, value in key.items()},
+            'ApproximateCreationDateTime': int(time.time()),
+            'SequenceNumber': str(sequence),
+            'StreamViewType': 'NEW_AND_OLD_IMAGES'
+        }
+        if new is not None:
+            change['NewImage'] = {name: serializer.serialize(value) for name, value in new.items()}
+        if old is not None:
+            change['OldImage'] = {name: serializer.serialize(value) for name, value in old.items()}
+        record = {
+            'eventID': str(sequence),
+            'eventName': 'REMOVE' if new is None else 'INSERT' if old is None else 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': change
+        }
+        for listener in self._stream_listeners:
+            listener(record)
+
+    def _key_fields(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        names = (self.key, self.range_key) if self.range_key else (self.key,)
+        return {name: item[name] for name in names}
+
+    def _key_of(self, item: Dict[str, Any]):
+        if self.range_key:
+            return (item[self.key], item[self.range_key])
+        return item[self.key]
+
+    def _check_condition(self, operation: str, current: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> None:
+        if not evaluate_condition(kwargs.get('ConditionExpression'), current or {},
+                                  kwargs.get('ExpressionAttributeNames'),
+                                  kwargs.get('ExpressionAttributeValues')):
+            raise client_error('ConditionalCheckFailedException',
+                               'The conditional request failed', operation)
+
+    def put_item(self, Item: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        check_dynamodb_types(Item)
+        with self._lock:
+            self.write_count += 1
+            key = self._key_of(Item)
+            current = self._items.get(key)
+            self._check_condition('PutItem', current, kwargs)
+            self._items[key] = copy.deepcopy(Item)
+        self._emit(self._key_fields(Item), current, Item)
+        if kwargs.get('ReturnValues') == 'ALL_OLD' and current is not None:
+            return {'Attributes': copy.deepcopy(current)}
+        return {}
+
+    def get_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.read_count += 1
+            item = self._items.get(self._key_of(Key))
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str, **kwargs) -> Dict[str, Any]:
+        check_dynamodb_types(kwargs.get('ExpressionAttributeValues'))
+        with self._lock:
+            self.write_count += 1
+            key = self._key_of(Key)
+            current = self._items.get(key)
+            self._check_condition('UpdateItem', current, kwargs)
+            updated = apply_update(UpdateExpression, {**(current or {}), **Key},
+                                   kwargs.get('ExpressionAttributeNames'),
+                                   kwargs.get('ExpressionAttributeValues'))
+            self._items[key] = updated
+        self._emit(self._key_fields(Key), current, updated)
+        return_values = kwargs.get('ReturnValues', 'NONE')
+        if return_values in ('ALL_NEW', 'UPDATED_NEW'):
+            return {'Attributes': copy.deepcopy(updated)}
+        if return_values in ('ALL_OLD', 'UPDATED_OLD') and current is not None:
+            return {'Attributes': copy.deepcopy(current)}
+        return {}
+
+    def delete_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.write_count += 1
+            key = self._key_of(Key)
+            self._check_condition('DeleteItem', self._items.get(key), kwargs)
+            current = self._items.pop(key, None)
+        self._emit(self._key_fields(Key), current, None)
+        return {}
+
+    def query(self, KeyConditionExpression: str, **kwargs) -> Dict[str, Any]:
+        names = kwargs.get('ExpressionAttributeNames')
+        values = kwargs.get('ExpressionAttributeValues')
+        filter_expression = kwargs.get('FilterExpression')
+        with self._lock:
+            self.read_count += 1
+            candidates = [copy.deepcopy(item) for item in self._items.values()]
+        items = [
+            item for item in candidates
+            if evaluate_condition(KeyConditionExpression, item, names, values)
+            and evaluate_condition(filter_expression, item, names, values)
+        ]
+        if self.range_key:
+            items.sort(key=lambda item: item.get(self.range_key), reverse=not kwargs.get('ScanIndexForward', True))
+        if kwargs.get('Limit'):
+            items = items[:kwargs['Limit']]
+        return {'Items': items, 'Count': len(items)}
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.read_count += 1
+            keys = list(self._items)
+            if kwargs.get('ExclusiveStartKey'):
+                keys = keys[keys.index(self._key_of(kwargs['ExclusiveStartKey'])) + 1:]
+            more = self.scan_page_size is not None and len(keys) > self.scan_page_size
+            if more:
+                keys = keys[:self.scan_page_size]
+            items = [copy.deepcopy(self._items[key]) for key in keys]
+        last_key = self._key_fields(items[-1]) if more else None
+        if kwargs.get('FilterExpression'):
+            items = [
+                item for item in items
+                if evaluate_condition(kwargs['FilterExpression'], item,
+                                      kwargs.get('ExpressionAttributeNames'),
+                                      kwargs.get('ExpressionAttributeValues'))
+            ]
+        if last_key is not None:
+            return {'Items': items, 'Count': len(items), 'LastEvaluatedKey': last_key}
+        return {'Items': items, 'Count': len(items)}
+
+    def items(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [copy.deepcopy(item) for item in self._items.values()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class FakeDynamoDBResource:
+    """
+    boto3.resource('dynamodb') stand-in handing out shared FakeTables
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def Table(self, name: str) -> FakeTable:
+        with self._lock:
+            if name not in self._tables:
+                key, range_key = TABLE_KEYS.get(name, ('execution_id', None))
+                self._tables[name] = FakeTable(name, key, range_key)
+            return self._tables[name]
+
+    def tables(self) -> List[FakeTable]:
+        with self._lock:
+            return list(self._tables.values())
+
+
+class FakeDynamoDBClient:
+    """
+    boto3.client('dynamodb') stand-in for TransactWriteItems over the tables
+    of a FakeDynamoDBResource. Every condition is checked before anything is
+    written, so a transaction applies in full or not at all.
+    """
+
+    def __init__(self, resource: FakeDynamoDBResource):
+        self.resource = resource
+        self.transactions = 0
+
+    def transact_write_items(self, TransactItems: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        deserializer = TypeDeserializer()
+
+        def plain(values):
+            return {name: deserializer.deserialize(value) for name, value in (values or {}).items()}
+
+        actions = []
+        for entry in TransactItems:
+            [(operation, request)] = entry.items()
+            table = self.resource.Table(request['TableName'])
+            fields = plain(request['Item'] if operation == 'Put' else request['Key'])
+            actions.append((table, operation, request, fields, plain(request.get('ExpressionAttributeValues'))))
+
+        tables = sorted({id(table): table for table, *_ in actions}.values(), key=lambda table: table.name)
+        emitted = []
+        with contextlib.ExitStack() as stack:
+            for table in tables:
+                stack.enter_context(table._lock)
+            reasons = []
+            for table, operation, request, fields, values in actions:
+                current = table._items.get(table._key_of(fields))
+                passed = evaluate_condition(request.get('ConditionExpression'), current or {},
+                                            request.get('ExpressionAttributeNames'), values)
+                reasons.append({'Code': 'None'} if passed else
+                               {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                error = client_error('TransactionCanceledException', 'Transaction cancelled', 'TransactWriteItems')
+                error.response['CancellationReasons'] = reasons
+                raise error
+            self.transactions += 1
+            for table, operation, request, fields, values in actions:
+                key = table._key_of(fields)
+                current = table._items.get(key)
+                if operation == 'Put':
+                    updated = copy.deepcopy(fields)
+                else:
+                    updated = apply_update(request['UpdateExpression'], {**(current or {}), **fields},
+                                           request.get('ExpressionAttributeNames'), values)
+                table.write_count += 1
+                table._items[key] = updated
+                emitted.append((table, table._key_fields(fields), current, updated))
+        for table, key, current, updated in emitted:
+            table._emit(key, current, updated)
+        return {}
+
+
+class FakeCloudWatch:
+    """
+    CloudWatch client stand-in that records put_metric_data calls
+    """
+
+    def __init__(self):
+        self.metric_data = []
+        self._lock = threading.Lock()
+
+    def put_metric_data(self, Namespace: str, MetricData: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            self.metric_data.append({'Namespace': Namespace, 'MetricData': MetricData})
+        return {}
+
+
+class FakeStepFunctions:
+    """
+    Step Functions client stand-in; executions stay RUNNING until completed.
+    `latency_s` delays each StartExecution and `throttle_rate` makes that
+    fraction of calls fail with ThrottlingException.
+    """
+
+    def __init__(self, region: str = 'us-east-1', account: str = '123456789012',
+                 latency_s: float = 0.0, throttle_rate: float = 0.0, seed: Optional[int] = None):
+        self.region = region
+        self.account = account
+        self.latency_s = latency_s
+        self.throttle_rate = throttle_rate
+        self.executions = {}
+        self.start_calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn: str, name: str, input: str) -> Dict[str, Any]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        machine = stateMachineArn.rsplit(':', 1)[-1]
+        arn = f"arn:aws:states:{self.region}:{self.account}:execution:{machine}:{name}"
+        with self._lock:
+            self.start_calls += 1
+            if self.throttle_rate and self._random.random() < self.throttle_rate:
+                raise client_error('ThrottlingException', 'Rate exceeded', 'StartExecution')
+            existing = self.executions.get(arn)
+            if existing is not None:
+                # Same name and input is idempotent for standard workflows
+                if existing['input'] != input:
+                    raise client_error('ExecutionAlreadyExists', f"Execution already exists: {name}",
+                                       'StartExecution')
+                return {'executionArn': arn, 'startDate': existing['startDate']}
+            self.executions[arn] = {
+                'executionArn': arn,
+                'stateMachineArn': stateMachineArn,
+                'name': name,
+                'status': 'RUNNING',
+                'input': input,
+                'startDate': time.time()
+            }
+        return {'executionArn': arn, 'startDate': self.executions[arn]['startDate']}
+
+    def complete_execution(self, arn: str, output: Dict[str, Any], status: str = 'SUCCEEDED') -> None:
+        with self._lock:
+            self.executions[arn].update({
+                'status': status,
+                'output': json.dumps(output),
+                'stopDate': time.time()
+            })
+
+    def describe_execution(self, executionArn: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.executions[executionArn])
+
+    def list_executions(self, stateMachineArn: str, statusFilter: Optional[str] = None,
+                        maxResults: int = 100, nextToken: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            matching = [dict(execution) for execution in self.executions.values()
+                        if execution['stateMachineArn'] == stateMachineArn
+                        and statusFilter in (None, execution['status'])]
+        start = int(nextToken or 0)
+        page = {'executions': matching[start:start + maxResults]}
+        if start + maxResults < len(matching):
+            page['nextToken'] = str(start + maxResults)
+        return page
+
+    def describe_state_machine(self, stateMachineArn: str) -> Dict[str, Any]:
+        return {'stateMachineArn': stateMachineArn, 'status': 'ACTIVE'}
+
+
+class FakeBedrock:
+    """
+    bedrock-runtime client stand-in with a fixed reply and optional latency.
+    Streamed replies arrive in `chunk_size`-character deltas: the first after
+    `latency_s`, each later one after `chunk_latency_s`. Faults queued with
+    inject() apply to the next calls in order.
+    """
+
+    def __init__(self, reply: str = "This is a local reply.", latency_s: float = 0.0,
+                 chunk_size: int = 8, chunk_latency_s: float = 0.0):
+        self.reply = reply
+        self.latency_s = latency_s
+        self.chunk_size = chunk_size
+        self.chunk_latency_s = chunk_latency_s
+        self.stream_error = None
+        self.calls = []
+        self._faults = deque()
+        self._lock = threading.Lock()
+
+    def inject(self, count: int = 1, error: Optional[Exception] = None,
+               latency_s: Optional[float] = None) -> None:
+        """
+        Make the next `count` calls wait `latency_s` (instead of the usual
+        latency) and then raise `error`, if given
+        """
+        with self._lock:
+            self._faults.extend([(error, latency_s)] * count)
+
+    def _next_fault(self, call: Dict[str, Any]) -> Tuple[Optional[Exception], float]:
+        with self._lock:
+            self.calls.append(call)
+            error, latency_s = self._faults.popleft() if self._faults else (None, None)
+        return error, self.latency_s if latency_s is None else latency_s
+
+    def invoke_model(self, modelId: Optional[str], body: str, **kwargs) -> Dict[str, Any]:
+        error, latency_s = self._next_fault({'modelId': modelId, 'body': body})
+        if latency_s:
+            time.sleep(latency_s)
+        if error is not None:
+            raise error
+        payload = json.dumps({'content': [{'type': 'text', 'text': self.reply}]})
+        return {'body': io.BytesIO(payload.encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId: Optional[str], body: str, **kwargs) -> Dict[str, Any]:
+        error, latency_s = self._next_fault({'modelId': modelId, 'body': body, 'stream': True})
+        if error is not None:
+            if latency_s:
+                time.sleep(latency_s)
+            raise error
+        return {'body': self._stream_events(latency_s)}
+
+    def _stream_events(self, latency_s: float):
+        """
+        The Anthropic messages event sequence Bedrock streams, one chunk per event
+        """
+        def chunk(data: Dict[str, Any]) -> Dict[str, Any]:
+            return {'chunk': {'bytes': json.dumps(data).encode('utf-8')}}
+
+        started = time.time()
+        yield chunk({'type': 'message_start', 'message': {'role': 'assistant', 'content': []}})
+        yield chunk({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        for offset in range(0, len(self.reply), self.chunk_size):
+            delay = latency_s if offset == 0 else self.chunk_latency_s
+            if delay:
+                time.sleep(delay)
+            if self.stream_error and offset:
+                raise self.stream_error
+            yield chunk({'type': 'content_block_delta', 'index': 0,
+                         'delta': {'type': 'text_delta', 'text': self.reply[offset:offset + self.chunk_size]}})
+        yield chunk({'type': 'content_block_stop', 'index': 0})
+        yield chunk({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}})
+        yield chunk({'type': 'message_stop', 'amazon-bedrock-invocationMetrics': {
+            'inputTokenCount': 0,
+            'outputTokenCount': max(1, len(self.reply) // 4),
+            'invocationLatency': int((time.time() - started) * 1000),
+            'firstByteLatency': int(latency_s * 1000)
+        }})
+
+
+class FakeApiGatewayManagement:
+    """
+    apigatewaymanagementapi client stand-in recording the messages posted to
+    each WebSocket connection. Connections in `gone` raise GoneException,
+    like viewers that left without a $disconnect.
+    """
+
+    def __init__(self):
+        self.messages: Dict[str, List[bytes]] = {}
+        self.gone = set()
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes) -> Dict[str, Any]:
+        if ConnectionId in self.gone:
+            raise client_error('GoneException', 'Connection is gone', 'PostToConnection')
+        with self._lock:
+            self.messages.setdefault(ConnectionId, []).append(Data)
+        return {}
+
+
+class FakeContext:
+    """
+    Lambda context stand-in
+    """
+
+    def __init__(self, function_name: str = 'local', timeout_ms: int = 30000):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.time() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+
+class LocalAWS:
+    """
+    One set of in-memory AWS services shared by every locally loaded handler
+    """
+
+    def __init__(self, bedrock_reply: str = "This is a local reply."):
+        self.dynamodb = FakeDynamoDBResource()
+        self.dynamodb_client = FakeDynamoDBClient(self.dynamodb)
+        self.cloudwatch = FakeCloudWatch()
+        self.stepfunctions = FakeStepFunctions()
+        self.bedrock = FakeBedrock(bedrock_reply)
+        self.apigateway_management = FakeApiGatewayManagement()
+
+    def table(self, name: str) -> FakeTable:
+        return self.dynamodb.Table(name)
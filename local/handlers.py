@@ -0,0 +1,94 @@
+"""
+Load the Lambda handler modules from their CodeUri directories and point
+their AWS clients at a LocalAWS instance.
+"""
+
+import importlib.util
+import os
+import sys
+from types import ModuleType
+from typing import Optional
+
+from local.fakes import LocalAWS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HANDLER_PATHS = {
+    'input_analyzer': os.path.join('pipeline', 'input_analyzer', 'app.py'),
+    'response_enhancer': os.path.join('pipeline', 'response_enhancer', 'app.py'),
+    'pipeline_logger': os.path.join('pipeline', 'pipeline_logger', 'app.py'),
+    'trigger': os.path.join('pipeline', 'trigger.py'),
+    'results': os.path.join('pipeline', 'results.py'),
+    'analytics': os.path.join('analytics', 'app.py'),
+    'live_metrics': os.path.join('analytics', 'live.py'),
+    'chatbot': os.path.join('chatbot', 'app.py'),
+}
+
+# Lambda layer contents, on sys.path at /opt/python in every deployed function
+LAYER_PATHS = [os.path.join(REPO_ROOT, 'common')]
+
+LOCAL_STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456789012:stateMachine:local-AIPipeline'
+
+# Module attributes holding boto3 clients, and the LocalAWS service replacing each
+CLIENT_ATTRIBUTES = ('dynamodb', 'dynamodb_client', 'cloudwatch', 'stepfunctions', 'bedrock', 'apigateway_management')
+
+
+def load_handler(name: str, aws: Optional[LocalAWS] = None) -> ModuleType:
+    """
+    Import a fresh copy of a handler module wired to in-memory AWS services
+    """
+    if name not in HANDLER_PATHS:
+        raise ValueError(f"Unknown handler: {name}")
+
+    return load_module(os.path.join(REPO_ROOT, HANDLER_PATHS[name]), f"local_{name}", aws)
+
+
+def load_module(path: str, module_name: str, aws: Optional[LocalAWS] = None) -> ModuleType:
+    """
+    Import the module at `path` under `module_name` and install fakes into it
+    """
+    # boto3 needs a region when a handler first builds a client
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    # Lambda puts the CodeUri root and the layers on sys.path, so sibling
+    # modules and the shared layer modules are importable
+    for code_root in [os.path.dirname(path)] + LAYER_PATHS:
+        if code_root not in sys.path:
+            sys.path.append(code_root)
+
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    install_fakes(module, aws or LocalAWS())
+    return module
+
+
+def install_fakes(module: ModuleType, aws: LocalAWS, _seen: Optional[set] = None) -> None:
+    """
+    Replace a loaded handler module's AWS clients with LocalAWS services,
+    including in-repo modules it imported
+    """
+    seen = _seen if _seen is not None else set()
+    if id(module) in seen:
+        return
+    seen.add(id(module))
+
+    for attribute in CLIENT_ATTRIBUTES:
+        if hasattr(module, attribute):
+            setattr(module, attribute, getattr(aws, attribute))
+
+    # `table` / `<name>_table` attributes are built from `<attribute>_name`
+    for attribute, value in list(vars(module).items()):
+        if (attribute == 'table' or attribute.endswith('_table')) and isinstance(
+                getattr(module, f"{attribute}_name", None), str):
+            setattr(module, attribute, aws.table(getattr(module, f"{attribute}_name")))
+
+    if hasattr(module, 'STATE_MACHINE_ARN') and not module.STATE_MACHINE_ARN:
+        module.STATE_MACHINE_ARN = LOCAL_STATE_MACHINE_ARN
+
+    module.local_aws = aws
+
+    for value in list(vars(module).values()):
+        if isinstance(value, ModuleType) and (getattr(value, '__file__', None) or '').startswith(REPO_ROOT):
+            install_fakes(value, aws, seen)
@@ -0,0 +1,191 @@
+"""
+Local server for the dashboard and its live metrics feed.
+
+Serves the dashboard, the /analytics and /analytics/cube APIs and /live, a
+server-sent event stream of metric deltas, all against one in-memory
+LocalAWS. Writes to the pipeline log table reach a MetricsHub, the cube
+and the anomaly detectors through the fake table's stream listener, as
+the log table stream reaches LiveMetricsFunction in AWS, so every open
+dashboard shares one delta computation. With --demo-rate the local state
+machine runs generated requests through the pipeline, which gives the
+dashboard something to show.
+
+    python -m local.server --port 8000 --demo-rate 2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from local.fakes import LocalAWS
+from local.handlers import REPO_ROOT, load_handler
+
+DASHBOARD_PATH = os.path.join(REPO_ROOT, 'dashboard', 'index.html')
+
+# Placeholders in dashboard/index.html, filled in when served locally
+DASHBOARD_ENDPOINTS = {
+    'YOUR_ANALYTICS_API_ENDPOINT': '/analytics',
+    'YOUR_LIVE_ENDPOINT': '/live',
+}
+
+
+class LiveServer:
+    """
+    Dashboard, /analytics and the /live event stream on one local port
+    """
+
+    def __init__(self, aws: Optional[LocalAWS] = None, host: str = '127.0.0.1', port: int = 8000,
+                 keepalive_seconds: float = 15.0):
+        self.aws = aws or LocalAWS()
+        self.analytics = load_handler('analytics', self.aws)
+        self.live = load_handler('live_metrics', self.aws)
+        self.keepalive_seconds = keepalive_seconds
+        self.stopping = threading.Event()
+
+        # One full computation seeds the hub; after that only deltas
+        status, _, body = self.call_analytics({'hours': '24'})
+        self.hub = self.live.MetricsHub(json.loads(body) if status == 200 else None)
+        self.aws.table(self.analytics.table_name).add_stream_listener(self.on_log_record)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._request_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def on_log_record(self, record: Dict[str, Any]) -> None:
+        self.live.update_cube([record])
+        self.live.detect_anomalies([record])
+        delta, as_of = self.live.stream_delta([record])
+        self.hub.publish(delta, as_of)
+
+    def call_analytics(self, query: Dict[str, str], path: str = '/analytics'):
+        response = self.analytics.lambda_handler({'path': path, 'queryStringParameters': query or None}, None)
+        return response['statusCode'], response.get('headers', {}), response['body']
+
+    def dashboard(self) -> bytes:
+        with open(DASHBOARD_PATH) as f:
+            html = f.read()
+        for placeholder, path in DASHBOARD_ENDPOINTS.items():
+            html = html.replace(placeholder, path)
+        return html.encode()
+
+    def start(self) -> 'LiveServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='live-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _request_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path in ('/', '/index.html'):
+                    self._send(200, {'Content-Type': 'text/html; charset=utf-8'}, server.dashboard())
+                elif url.path in ('/analytics', '/analytics/cube'):
+                    status, headers, body = server.call_analytics(dict(parse_qsl(url.query)), url.path)
+                    self._send(status, headers, body.encode())
+                elif url.path == '/live':
+                    self._stream(self.headers.get('Last-Event-ID') or dict(parse_qsl(url.query)).get('lastEventId'))
+                elif url.path == '/live/stats':
+                    self._send(200, {'Content-Type': 'application/json'}, json.dumps(server.hub.stats()).encode())
+                else:
+                    self._send(404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}')
+
+            def _send(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, last_event_id: Optional[str]) -> None:
+                subscription = server.hub.subscribe(last_event_id)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    self.wfile.write(b'retry: 2000\n\n')
+                    while not server.stopping.is_set():
+                        frame = subscription.get(timeout=server.keepalive_seconds)
+                        # A comment line keeps proxies from closing an idle stream
+                        self.wfile.write(frame if frame is not None else b': keepalive\n\n')
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    subscription.close()
+
+            def log_message(self, format, *args):
+                if self.path.startswith('/live'):
+                    return
+                sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+        return Handler
+
+
+def run_demo_traffic(server: LiveServer, rate: float, seed: int = 42) -> threading.Thread:
+    """
+    Run generated requests through the local state machine at `rate` per second
+    """
+    from benchmarks.workload import WorkloadGenerator
+    from local.state_machine import LocalStateMachine
+
+    machine = LocalStateMachine.from_template(aws=server.aws)
+    workload = WorkloadGenerator(seed)
+
+    def loop():
+        while not server.stopping.is_set():
+            machine.execute({'input': workload.user_input(), 'timestamp': time.time()})
+            server.stopping.wait(1 / rate)
+
+    thread = threading.Thread(target=loop, name='demo-traffic', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--demo-rate', type=float, default=0.0,
+                        help='Pipeline executions per second to generate (default none)')
+    args = parser.parse_args(argv)
+
+    # Handlers log to stdout on every call; keep the console for the server
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        server = LiveServer(host=args.host, port=args.port)
+        if args.demo_rate > 0:
+            run_demo_traffic(server, args.demo_rate)
+        sys.stderr.write(f"Dashboard at {server.url}/ (live feed at {server.url}/live)\n")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""
+Local executor for the AIPipeline Step Functions definition.
+
+Parses the state machine out of pipeline-template.yaml, resolves each Task
+resource to the in-repo handler module and applies InputPath/ResultPath/
+OutputPath, Retry and Catch the way Step Functions does. Executions run on
+a thread pool and record per-state timings, so orchestration overhead and
+end-to-end throughput can be measured without deploying.
+
+    python -m local.state_machine --executions 5000 --workers 64
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import re
+import sys
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.bench_stages import percentile
+from benchmarks.workload import WorkloadGenerator
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import REPO_ROOT, load_module
+
+DEFAULT_TEMPLATE = os.path.join(REPO_ROOT, 'pipeline-template.yaml')
+DEFAULT_STATE_MACHINE = 'AIPipelineStateMachine'
+
+# ${Logical.Arn} references inside DefinitionString
+ARN_REFERENCE = re.compile(r'\$\{([A-Za-z0-9]+)\.Arn\}')
+LOCAL_RESOURCE_PREFIX = 'local:function:'
+
+
+class StatesError(Exception):
+    """
+    A failed state, carrying the Step Functions error name and cause
+    """
+
+    def __init__(self, error: str, cause: str):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+# ============================================================================
+# TEMPLATE PARSING
+# ============================================================================
+
+def load_template(path: str = DEFAULT_TEMPLATE) -> Dict[str, Any]:
+    """
+    Load a SAM/CloudFormation template, keeping intrinsic tags as Fn:: dicts
+    """
+    import yaml
+
+    class TemplateLoader(yaml.SafeLoader):
+        pass
+
+    def construct_intrinsic(loader, tag_suffix, node):
+        if isinstance(node, yaml.ScalarNode):
+            value = loader.construct_scalar(node)
+        elif isinstance(node, yaml.SequenceNode):
+            value = loader.construct_sequence(node, deep=True)
+        else:
+            value = loader.construct_mapping(node, deep=True)
+        name = 'Ref' if tag_suffix == 'Ref' else f"Fn::{tag_suffix}"
+        return {name: value}
+
+    TemplateLoader.add_multi_constructor('!', construct_intrinsic)
+
+    with open(path) as f:
+        return yaml.load(f, Loader=TemplateLoader)
+
+
+def extract_definition(template: Dict[str, Any], state_machine: str = DEFAULT_STATE_MACHINE) -> Dict[str, Any]:
+    """
+    Return the state machine definition with function ARNs made local
+    """
+    properties = template['Resources'][state_machine]['Properties']
+    definition = properties.get('Definition')
+    if definition is not None:
+        return definition
+
+    definition_string = properties['DefinitionString']
+    if isinstance(definition_string, dict):
+        definition_string = definition_string['Fn::Sub']
+
+    return json.loads(ARN_REFERENCE.sub(lambda m: LOCAL_RESOURCE_PREFIX + m.group(1), definition_string))
+
+
+def resolve_functions(template: Dict[str, Any], aws: LocalAWS) -> Dict[str, Callable]:
+    """
+    Map each AWS::Serverless::Function logical ID to its handler callable
+    """
+    default_handler = template.get('Globals', {}).get('Function', {}).get('Handler', 'app.lambda_handler')
+    functions = {}
+    for logical_id, resource in template['Resources'].items():
+        if resource.get('Type') != 'AWS::Serverless::Function':
+            continue
+        properties = resource['Properties']
+        module_name, function_name = properties.get('Handler', default_handler).rsplit('.', 1)
+        path = os.path.join(REPO_ROOT, properties['CodeUri'], module_name.replace('.', os.sep) + '.py')
+        if not os.path.exists(path):
+            continue
+        module = load_module(path, f"local_sfn_{logical_id}", aws)
+        functions[logical_id] = getattr(module, function_name)
+    return functions
+
+
+# ============================================================================
+# JSONPATH (the $.a.b subset Step Functions definitions use here)
+# ============================================================================
+
+def _path_keys(path: str) -> List[str]:
+    if path == '$':
+        return []
+    if not path.startswith('$.'):
+        raise ValueError(f"Unsupported path: {path}")
+    return path[2:].split('.')
+
+
+def get_path(data: Any, path: Optional[str]) -> Any:
+    if path is None:
+        return {}
+    for key in _path_keys(path):
+        data = data[key]
+    return data
+
+
+def set_path(data: Any, path: Optional[str], value: Any) -> Any:
+    """
+    Apply ResultPath semantics: replace, discard (null), or merge into a copy
+    """
+    if path is None:
+        return data
+    keys = _path_keys(path)
+    if not keys:
+        return value
+
+    result = copy.copy(data) if isinstance(data, dict) else {}
+    target = result
+    for key in keys[:-1]:
+        child = target.get(key)
+        target[key] = copy.copy(child) if isinstance(child, dict) else {}
+        target = target[key]
+    target[keys[-1]] = value
+    return result
+
+
+def error_matches(error_equals: List[str], error: str) -> bool:
+    if 'States.ALL' in error_equals:
+        return True
+    if 'States.TaskFailed' in error_equals and error != 'States.Timeout':
+        return True
+    return error in error_equals
+
+
+# ============================================================================
+# EXECUTOR
+# ============================================================================
+
+class LocalStateMachine:
+    """
+    Interprets Task/Pass/Succeed/Fail states against local handler callables
+    """
+
+    def __init__(self, definition: Dict[str, Any], functions: Dict[str, Callable],
+                 serialize: bool = True, retry_time_scale: float = 1.0):
+        self.definition = definition
+        self.functions = functions
+        # Step Functions passes JSON between states; round-trip to match
+        self.serialize = serialize
+        self.retry_time_scale = retry_time_scale
+
+    @classmethod
+    def from_template(cls, path: str = DEFAULT_TEMPLATE, state_machine: str = DEFAULT_STATE_MACHINE,
+                      aws: Optional[LocalAWS] = None, **kwargs) -> 'LocalStateMachine':
+        template = load_template(path)
+        aws = aws or LocalAWS()
+        return cls(extract_definition(template, state_machine), resolve_functions(template, aws), **kwargs)
+
+    def execute(self, execution_input: Dict[str, Any], name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run one execution to completion, recording per-state timings
+        """
+        record = {
+            'name': name or str(uuid.uuid4()),
+            'status': 'RUNNING',
+            'states': [],
+            'output': None,
+            'error': None,
+        }
+        started = time.perf_counter()
+        state_name = self.definition['StartAt']
+        data = self._copy(execution_input)
+
+        try:
+            while state_name:
+                state = self.definition['States'][state_name]
+                state_started = time.perf_counter()
+                timing = {'name': state_name, 'task_ms': 0.0, 'status': 'SUCCEEDED'}
+                try:
+                    data, state_name = self._run_state(state_name, state, data, timing)
+                finally:
+                    timing['duration_ms'] = (time.perf_counter() - state_started) * 1000
+                    timing['overhead_ms'] = timing['duration_ms'] - timing['task_ms']
+                    record['states'].append(timing)
+            record['status'] = 'SUCCEEDED'
+            record['output'] = data
+        except StatesError as e:
+            record['status'] = 'FAILED'
+            record['error'] = {'Error': e.error, 'Cause': e.cause}
+
+        record['duration_ms'] = (time.perf_counter() - started) * 1000
+        return record
+
+    def run_many(self, inputs: List[Dict[str, Any]], workers: int = 32) -> Dict[str, Any]:
+        """
+        Run many executions concurrently and summarize throughput and timings
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            executions = list(pool.map(self.execute, inputs))
+        wall_seconds = time.perf_counter() - started
+        return {'executions': executions, 'summary': summarize(executions, wall_seconds, workers)}
+
+    def _run_state(self, state_name: str, state: Dict[str, Any], data: Any, timing: Dict[str, Any]):
+        state_type = state['Type']
+        next_state = None if state.get('End') else state.get('Next')
+
+        if state_type == 'Succeed':
+            return data, None
+        if state_type == 'Fail':
+            raise StatesError(state.get('Error', 'States.Fail'), state.get('Cause', ''))
+        if state_type == 'Pass':
+            result = state.get('Result', get_path(data, state.get('InputPath', '$')))
+            return self._output(state, data, result), next_state
+        if state_type != 'Task':
+            raise NotImplementedError(f"State type {state_type} is not supported locally")
+
+        task_input = get_path(data, state.get('InputPath', '$'))
+        try:
+            result = self._invoke_with_retry(state, task_input, timing)
+        except StatesError as e:
+            for catcher in state.get('Catch', []):
+                if error_matches(catcher['ErrorEquals'], e.error):
+                    timing['status'] = 'CAUGHT'
+                    error_output = {'Error': e.error, 'Cause': e.cause}
+                    return set_path(data, catcher.get('ResultPath', '$'), error_output), catcher['Next']
+            timing['status'] = 'FAILED'
+            raise
+
+        return self._output(state, data, result), next_state
+
+    def _invoke_with_retry(self, state: Dict[str, Any], task_input: Any, timing: Dict[str, Any]) -> Any:
+        attempts = {}
+        while True:
+            try:
+                return self._invoke(state['Resource'], task_input, timing)
+            except StatesError as e:
+                retrier = next((r for r in state.get('Retry', []) if error_matches(r['ErrorEquals'], e.error)), None)
+                if retrier is None:
+                    raise
+                key = id(retrier)
+                attempts[key] = attempts.get(key, 0) + 1
+                if attempts[key] > retrier.get('MaxAttempts', 3):
+                    raise
+                interval = retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** (attempts[key] - 1)
+                time.sleep(interval * self.retry_time_scale)
+
+    def _invoke(self, resource: str, task_input: Any, timing: Dict[str, Any]) -> Any:
+        logical_id = resource[len(LOCAL_RESOURCE_PREFIX):] if resource.startswith(LOCAL_RESOURCE_PREFIX) else resource
+        if logical_id not in self.functions:
+            raise StatesError('States.Runtime', f"No local function for resource {resource}")
+
+        payload = self._copy(task_input)
+        invoked = time.perf_counter()
+        try:
+            result = self.functions[logical_id](payload, FakeContext(logical_id))
+        except Exception as e:
+            # Lambda reports unhandled exceptions with the exception type as the error name
+            cause = json.dumps({
+                'errorMessage': str(e),
+                'errorType': type(e).__name__,
+                'stackTrace': traceback.format_tb(e.__traceback__),
+            })
+            raise StatesError(type(e).__name__, cause)
+        finally:
+            timing['task_ms'] += (time.perf_counter() - invoked) * 1000
+        return self._copy(result)
+
+    def _output(self, state: Dict[str, Any], data: Any, result: Any) -> Any:
+        data = set_path(data, state.get('ResultPath', '$'), result)
+        return get_path(data, state.get('OutputPath', '$'))
+
+    def _copy(self, value: Any) -> Any:
+        return json.loads(json.dumps(value)) if self.serialize else value
+
+
+def summarize(executions: List[Dict[str, Any]], wall_seconds: float, workers: int) -> Dict[str, Any]:
+    """
+    Aggregate end-to-end and per-state timings across executions
+    """
+    durations = sorted(e['duration_ms'] for e in executions)
+    per_state = {}
+    for execution in executions:
+        for timing in execution['states']:
+            stats = per_state.setdefault(timing['name'], {'durations': [], 'overheads': [], 'caught': 0})
+            stats['durations'].append(timing['duration_ms'])
+            stats['overheads'].append(timing['overhead_ms'])
+            stats['caught'] += timing['status'] == 'CAUGHT'
+
+    states = {}
+    for name, stats in per_state.items():
+        ordered = sorted(stats['durations'])
+        states[name] = {
+            'count': len(ordered),
+            'caught_errors': stats['caught'],
+            'mean_ms': round(sum(ordered) / len(ordered), 3),
+            'p95_ms': round(percentile(ordered, 95), 3),
+            'mean_overhead_ms': round(sum(stats['overheads']) / len(ordered), 3),
+        }
+
+    overheads = [
+        e['duration_ms'] - sum(t['task_ms'] for t in e['states'])
+        for e in executions
+    ]
+    return {
+        'executions': len(executions),
+        'succeeded': sum(1 for e in executions if e['status'] == 'SUCCEEDED'),
+        'failed': sum(1 for e in executions if e['status'] == 'FAILED'),
+        'workers': workers,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_per_sec': round(len(executions) / wall_seconds, 1) if wall_seconds else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(durations, 50), 3),
+            'p95': round(percentile(durations, 95), 3),
+            'p99': round(percentile(durations, 99), 3),
+        },
+        'mean_orchestration_overhead_ms': round(sum(overheads) / len(overheads), 3) if overheads else 0.0,
+        'states': states,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE)
+    parser.add_argument('--state-machine', default=DEFAULT_STATE_MACHINE)
+    parser.add_argument('--executions', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-serialize', action='store_true',
+                        help='Skip the JSON round trip between states')
+    args = parser.parse_args(argv)
+
+    machine = LocalStateMachine.from_template(args.template, args.state_machine,
+                                              serialize=not args.no_serialize)
+    workload = WorkloadGenerator(args.seed)
+    inputs = [
+        {'input': text, 'timestamp': time.time(), 'request_id': f"local_{i}"}
+        for i, text in enumerate(workload.inputs(args.executions))
+    ]
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = machine.run_many(inputs, workers=args.workers)
+
+    print(json.dumps(result['summary'], indent=2))
+    return 0 if result['summary']['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+# Priority classes: the share of the global budget each class may fill and
+# the tokens one request costs. Under load, bulk work is shed first.
+PRIORITY_CLASSES = {
+    'interactive': {'budget_share': 1.0, 'cost': 1.0},
+    'standard': {'budget_share': 0.8, 'cost': 1.0},
+    'bulk': {'budget_share': 0.5, 'cost': 2.0},
+}
+
+COMPLEXITY_PRIORITIES = {'low': 'interactive', 'medium': 'standard', 'high': 'bulk'}
+
+# Per container: budget key -> monotonic time of the next reconcile attempt
+_next_reconcile: Dict[str, float] = {}
+
+
+def estimate_priority(user_input: str, complexity: Optional[str] = None) -> str:
+    """
+    Priority class from the analyzer's complexity when already known, else
+    from input length using the analyzer's length thresholds
+    """
+    if complexity is None:
+        length = len(user_input)
+        complexity = 'high' if length > 1000 else 'medium' if length > 100 else 'low'
+    return COMPLEXITY_PRIORITIES.get(complexity, 'standard')
+
+
+def retry_after_seconds(base: int) -> int:
+    """
+    Retry-After hint with jitter so shed clients do not all return at once
+    """
+    return base + random.randint(0, base)
+
+
+class ClientRateLimiter:
+    """
+    Per-client token buckets refilled at `rate` tokens per second up to `burst`.
+    Each bucket is two floats; the least recently seen clients are dropped
+    beyond `max_clients`, which only ever resets them to a full bucket.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: float = 20.0, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, client_id: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Take `cost` tokens. Returns 0.0 when admitted, otherwise the seconds
+        until the bucket will hold enough tokens.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(client_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[client_id] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyBudget:
+    """
+    Global cap on in-flight executions shared by every trigger container,
+    kept as an atomic counter item updated with conditional writes.
+    A priority class may only take a slot while the count is below its
+    share of the limit. Slots are returned by the pipeline logger; releases
+    lost to executions that time out, abort or fail outside a Catch are
+    recovered by reconcile().
+    """
+
+    def __init__(self, table, limit: int, key: str = 'global'):
+        self.table = table
+        self.limit = limit
+        self.key = key
+
+    def try_acquire(self, priority: str = 'standard') -> bool:
+        ceiling = max(1, int(self.limit * PRIORITY_CLASSES[priority]['budget_share']))
+        try:
+            self.table.update_item(
+                Key={'budget_key': self.key},
+                UpdateExpression='ADD in_flight :one',
+                ConditionExpression='attribute_not_exists(in_flight) OR in_flight < :ceiling',
+                ExpressionAttributeValues={':one': 1, ':ceiling': ceiling}
+            )
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def release(self) -> None:
+        try:
+            self.table.update_item(
+                Key={'budget_key': self.key},
+                UpdateExpression='ADD in_flight :minus_one',
+                ConditionExpression='in_flight > :zero',
+                ExpressionAttributeValues={':minus_one': -1, ':zero': 0}
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+
+    def reconcile(self, count_running: Callable[[], int], interval_seconds: float) -> Optional[int]:
+        """
+        Reset the counter to the number of executions actually running, at
+        most once per interval across every container. The write only lands
+        if the counter has not moved since it was read, so a slot taken or
+        returned meanwhile defers the reset to a later attempt.
+        Returns the reconciled count, or None when skipped.
+        """
+        if time.monotonic() < _next_reconcile.get(self.key, 0.0):
+            return None
+        _next_reconcile[self.key] = time.monotonic() + interval_seconds
+
+        now = int(time.time())
+        item = self.table.get_item(Key={'budget_key': self.key}, ConsistentRead=True).get('Item') or {}
+        if now - int(item.get('reconciled_at', 0)) < interval_seconds:
+            return None
+        seen = int(item.get('in_flight', 0))
+        running = count_running()
+        try:
+            self.table.update_item(
+                Key={'budget_key': self.key},
+                UpdateExpression='SET in_flight = :running, reconciled_at = :now',
+                ConditionExpression='(attribute_not_exists(in_flight) OR in_flight = :seen) AND '
+                                    '(attribute_not_exists(reconciled_at) OR reconciled_at < :due)',
+                ExpressionAttributeValues={
+                    ':running': running, ':now': now, ':seen': seen, ':due': now - int(interval_seconds)
+                }
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return None
+        if running != seen:
+            print(f"Admission budget reconciled from {seen} to {running} in flight")
+        return running
+
+    def in_flight(self) -> int:
+        item = self.table.get_item(Key={'budget_key': self.key}, ConsistentRead=True).get('Item') or {}
+        return int(item.get('in_flight', 0))
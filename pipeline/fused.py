@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List
+
+from input_analyzer.app import analyze_input
+from response_enhancer.app import enhance_response
+from pipeline_logger import app as pipeline_logger
+from timing import phase
+
+# Inputs above this length, or at an excluded complexity, go through Step Functions
+FUSED_MAX_INPUT_LENGTH = int(os.environ.get('FUSED_MAX_INPUT_LENGTH', '1000'))
+FUSED_EXCLUDED_COMPLEXITIES = set(
+    filter(None, os.environ.get('FUSED_EXCLUDED_COMPLEXITIES', 'high').split(','))
+)
+
+# Logging runs on a worker so the handler can bound how long it waits for it.
+# Lambda may freeze and then reclaim the container once the handler returns,
+# so the trigger flushes the write before returning; only a write still
+# running after FUSED_LOG_FLUSH_SECONDS is left for the next invocation.
+FUSED_LOG_FLUSH_SECONDS = float(os.environ.get('FUSED_LOG_FLUSH_SECONDS', '2'))
+_log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fused-logger')
+_pending_logs: List = []
+
+
+def should_use_fused_path(user_input: str, analysis: Dict[str, Any]) -> bool:
+    """
+    Route light inputs to the in-process pipeline and heavy ones to Step Functions
+    """
+    if len(user_input) > FUSED_MAX_INPUT_LENGTH:
+        return False
+    return analysis['complexity'] not in FUSED_EXCLUDED_COMPLEXITIES
+
+
+def run_fused_pipeline(user_input: str, request_id: str, analysis: Dict[str, Any] = None,
+                       analysis_time_ms: float = 0.0) -> Dict[str, Any]:
+    """
+    Run analysis and enhancement in-process and queue the execution log write;
+    callers flush it with flush_pending_logs before returning.
+    Pass a precomputed analysis to skip re-analyzing the input.
+    """
+    reap_pending_logs()
+
+    if analysis is None:
+        with phase('analysis') as analyzing:
+            analysis = analyze_input(user_input)
+        analysis_time_ms = analyzing.duration_ms
+
+    with phase('enhancement') as enhancing:
+        enhanced_response = enhance_response(user_input, analysis, '')
+    enhancement_time_ms = enhancing.duration_ms
+
+    # Same state shape the logger receives from the LogSuccess step
+    log_event = {
+        'input': user_input,
+        'request_id': request_id,
+        'execution_mode': 'fused',
+        'analysis': {
+            'complexity': analysis['complexity'],
+            'category': analysis['category'],
+            'processing_time_ms': round(analysis_time_ms, 2)
+        },
+        'enhanced_response': {
+            'content': enhanced_response['content'],
+            'quality_score': enhanced_response['quality_score'],
+            'processing_time_ms': round(enhancement_time_ms, 2)
+        }
+    }
+    _pending_logs.append(_log_executor.submit(pipeline_logger.lambda_handler, log_event, None))
+
+    return {
+        'analysis': analysis,
+        'enhanced_response': enhanced_response,
+        'processing_time_ms': round(analysis_time_ms + enhancement_time_ms, 2)
+    }
+
+
+def reap_pending_logs() -> None:
+    """
+    Drop finished log writes, reporting any that failed
+    """
+    for future in [f for f in _pending_logs if f.done()]:
+        _pending_logs.remove(future)
+        if future.exception():
+            print(f"Fused pipeline logging failed: {future.exception()}")
+
+
+def flush_pending_logs(timeout: float = None) -> int:
+    """
+    Wait up to timeout seconds in total for queued log writes to finish,
+    reporting failures; returns how many are still running
+    """
+    wait(list(_pending_logs), timeout=timeout)
+    reap_pending_logs()
+    if _pending_logs:
+        print(f"{len(_pending_logs)} fused pipeline log write(s) still running after {timeout}s")
+    return len(_pending_logs)
@@ -0,0 +1,150 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+
+def normalize_input(user_input: str) -> str:
+    """
+    Collapse whitespace and case so trivially different resubmissions match
+    """
+    return ' '.join(user_input.split()).casefold()
+
+
+def build_idempotency_key(user_input: str, client_key: Optional[str] = None) -> str:
+    """
+    Key for a request: the client-supplied key if any, else a hash of the normalized input
+    """
+    if client_key:
+        return f"client:{client_key}"
+    return f"input:{hashlib.sha256(normalize_input(user_input).encode('utf-8')).hexdigest()}"
+
+
+def is_conditional_check_failure(error: Exception) -> bool:
+    return (isinstance(error, ClientError)
+            and error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException')
+
+
+class IdempotencyStore:
+    """
+    Conditional-write claims on a DynamoDB table keyed by idempotency_key.
+    The first request to claim a key owns it; any concurrent or later
+    duplicate reads back the owner's record instead. A claim starts with a
+    short lease that only mark_started extends to the full TTL, so a request
+    that dies before starting its execution blocks duplicates for seconds,
+    not for the TTL. Works unchanged against the in-memory table in local/fakes.py.
+    """
+
+    def __init__(self, table, ttl_seconds: int = 3600, lease_seconds: int = 10,
+                 max_claim_attempts: int = 3):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_claim_attempts = max_claim_attempts
+
+    def claim(self, key: str, request_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a key for request_id. Returns None when claimed, otherwise the
+        record of the request that already owns the key.
+        """
+        for _ in range(self.max_claim_attempts):
+            now = int(time.time())
+            try:
+                self.table.put_item(
+                    Item=self._starting_item(key, request_id, now),
+                    # TTL deletion lags expiry, so expired claims and leases are fair game
+                    ConditionExpression='attribute_not_exists(idempotency_key) OR expires_at < :now',
+                    ExpressionAttributeValues={':now': now}
+                )
+                return None
+            except ClientError as e:
+                if not is_conditional_check_failure(e):
+                    raise
+            existing = self.get(key)
+            if existing is not None:
+                return existing
+            # The owner expired or released between our write and read; try again
+        raise RuntimeError(f"Could not claim idempotency key {key} after {self.max_claim_attempts} attempts")
+
+    def take_over(self, key: str, request_id: str, previous_request_id: str) -> bool:
+        """
+        Replace the owner of a key, e.g. after its execution failed.
+        Only one of several concurrent callers succeeds.
+        """
+        try:
+            self.table.put_item(
+                Item=self._starting_item(key, request_id, int(time.time())),
+                ConditionExpression='request_id = :previous',
+                ExpressionAttributeValues={':previous': previous_request_id}
+            )
+            return True
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+            return False
+
+    def mark_started(self, key: str, request_id: str, execution_arn: str) -> None:
+        """
+        Attach the started execution to the claim so duplicates can find it,
+        and hold the key for the full TTL from now on
+        """
+        try:
+            self.table.update_item(
+                Key={'idempotency_key': key},
+                UpdateExpression='SET #status = :started, execution_arn = :arn, expires_at = :expires_at',
+                ConditionExpression='request_id = :request_id',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':started': 'STARTED',
+                    ':arn': execution_arn,
+                    ':expires_at': int(time.time()) + self.ttl_seconds,
+                    ':request_id': request_id
+                }
+            )
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+
+    def release(self, key: str, request_id: str) -> None:
+        """
+        Drop a claim whose execution never started so a retry can run
+        """
+        try:
+            self.table.delete_item(
+                Key={'idempotency_key': key},
+                ConditionExpression='request_id = :request_id',
+                ExpressionAttributeValues={':request_id': request_id}
+            )
+        except ClientError as e:
+            if not is_conditional_check_failure(e):
+                raise
+
+    def lease_expired(self, record: Dict[str, Any]) -> bool:
+        """
+        Whether a claim's owner let its lease lapse without starting an execution
+        """
+        return record.get('status') == 'STARTING' and record.get('expires_at', 0) < int(time.time())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.table.get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item')
+
+    def wait_for_execution(self, key: str, timeout: float, interval: float = 0.05) -> Optional[Dict[str, Any]]:
+        """
+        Wait briefly for the owner of a key to record its execution ARN
+        """
+        deadline = time.monotonic() + timeout
+        record = self.get(key)
+        while record and not record.get('execution_arn') and time.monotonic() < deadline:
+            time.sleep(interval)
+            record = self.get(key)
+        return record
+
+    def _starting_item(self, key: str, request_id: str, now: int) -> Dict[str, Any]:
+        return {
+            'idempotency_key': key,
+            'request_id': request_id,
+            'status': 'STARTING',
+            'created_at': now,
+            'expires_at': now + self.lease_seconds
+        }
@@ -3,12 +3,13 @@ import re
 import time
 from typing import Dict, Any
 
+from timing import instrument_handler, phase
+
+@instrument_handler('input_analyzer')
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Analyzes user input to determine complexity and processing requirements
     """
-    start_time = time.time()
-
     # Extract input from event
     user_input = event.get('input', '')
     if not user_input:
@@ -17,10 +18,9 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     print(f"Analyzing input: {user_input[:100]}...")
     
     # Perform analysis
-    analysis = analyze_input(user_input)
-    
-    # Calculate processing time
-    processing_time = (time.time() - start_time) * 1000
+    with phase('analyze') as analyzing:
+        analysis = analyze_input(user_input)
+    processing_time = analyzing.duration_ms
     
     print(f"Analysis complete in {processing_time:.2f}ms")
     print(f"Complexity: {analysis['complexity']}")
@@ -1,22 +1,50 @@
 import json
-import boto3
 import time
 import os
+import uuid
 from datetime import datetime
 from decimal import Decimal
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client, lazy_table
+from timing import instrument_handler, timed
 
 # Initialize AWS services
-dynamodb = boto3.resource('dynamodb')
-cloudwatch = boto3.client('cloudwatch')
+cloudwatch = lazy_client('cloudwatch')
 
 # Get table name from environment variable
 table_name = os.environ.get('PIPELINE_LOG_TABLE', 'PipelineLogs')
-table = dynamodb.Table(table_name)
+table = lazy_table(table_name)
 
+# Completed results served by GET /result/{request_id}
+result_table_name = os.environ.get('RESULT_TABLE', 'PipelineResults')
+result_table = lazy_table(result_table_name)
+RESULT_TTL_SECONDS = int(os.environ.get('RESULT_TTL_SECONDS', '86400'))
+
+# In-flight execution budget the trigger admits against
+admission_table_name = os.environ.get('ADMISSION_TABLE', 'PipelineAdmission')
+admission_table = lazy_table(admission_table_name)
+
+@instrument_handler('pipeline_logger')
 def lambda_handler(event, context):
     """
     Logs pipeline execution data to DynamoDB and CloudWatch
     """
+    try:
+        return log_execution(event)
+    finally:
+        # Return the admission slot the trigger took for this execution, even
+        # if logging failed; LogSuccess has no Catch to do it instead
+        if event.get('admission_budget'):
+            try:
+                release_admission_slot(event['admission_budget'])
+            except Exception as e:
+                print(f"Failed to release admission slot: {str(e)}")
+
+
+def log_execution(event):
+    """
+    Record one execution and return the execution's output
+    """
     print(f"Logging to table: {table_name}")
     
     # Extract execution data from Step Functions event
@@ -28,12 +56,25 @@ def lambda_handler(event, context):
     # Send metrics to CloudWatch
     send_cloudwatch_metrics(execution_data)
     
+    # Populate the result cache so clients polling /result get a cache hit.
+    # Best effort: /result falls back to describe_execution on a miss.
+    if event.get('request_id'):
+        try:
+            cache_execution_result(event['request_id'], execution_data)
+        except Exception as e:
+            print(f"Failed to cache result for {event['request_id']}: {str(e)}")
+    
     print(f"Successfully logged execution: {execution_data['execution_id']}")
     
+    # This is the execution's output, so /result can rebuild the cached
+    # result from DescribeExecution when the cache write above was missed
+    status, outcome_key, outcome = execution_outcome(execution_data)
     return {
         'statusCode': 200,
         'message': 'Logging completed successfully',
-        'execution_id': execution_data['execution_id']
+        'execution_id': execution_data['execution_id'],
+        'status': status,
+        outcome_key: outcome
     }
         
 
@@ -42,7 +83,9 @@ def extract_execution_data(event):
     Extract and normalize execution data from Step Functions event
     """
     timestamp = datetime.utcnow()
-    execution_id = f"exec_{int(timestamp.timestamp())}"
+    # One log item per request: the trigger's request_id is unique, and a
+    # retried LogSuccess step rewrites its own item rather than another's
+    execution_id = f"exec_{event.get('request_id') or uuid.uuid4().hex}"
     
     # Default values
     execution_data = {
@@ -73,6 +116,9 @@ def extract_execution_data(event):
     # Extract analysis data
     if 'analysis' in event:
         analysis = event['analysis']
+        # The analyzer nests its classification under 'analysis'
+        if isinstance(analysis.get('analysis'), dict):
+            analysis = {**analysis, **analysis['analysis']}
         execution_data['complexity'] = analysis.get('complexity', 'unknown')
         execution_data['category'] = analysis.get('category', 'general')
         execution_data['input_analysis_time_ms'] = analysis.get('processing_time_ms', 0)
@@ -80,6 +126,9 @@ def extract_execution_data(event):
     # Extract enhancement data
     if 'enhanced_response' in event:
         enhanced = event['enhanced_response']
+        # The enhancer nests content and quality score under 'enhanced_response'
+        if isinstance(enhanced.get('enhanced_response'), dict):
+            enhanced = {**enhanced, **enhanced['enhanced_response']}
         execution_data['output'] = enhanced.get('content', '')
         execution_data['output_length'] = len(execution_data['output'])
         execution_data['quality_score'] = enhanced.get('quality_score', 0.0)
@@ -94,7 +143,7 @@ def extract_execution_data(event):
     # Check for errors
     if 'error' in event or event.get('statusCode', 200) >= 400:
         execution_data['success'] = False
-        execution_data['error_message'] = event.get('error', 'Unknown error')
+        execution_data['error_message'] = extract_error_message(event.get('error', 'Unknown error'))
         execution_data['error_type'] = classify_error(execution_data['error_message'])
     
     print(f"Extracted execution data for {execution_id}")
@@ -105,23 +154,113 @@ def extract_execution_data(event):
     
     return execution_data
 
+def extract_error_message(error):
+    """
+    Normalize an error into a message string.
+    Step Functions Catch passes {"Error": ..., "Cause": ...}, where Cause is
+    the Lambda error payload serialized as JSON.
+    """
+    if not isinstance(error, dict):
+        return str(error)
+    
+    cause = error.get('Cause', '')
+    try:
+        cause = json.loads(cause).get('errorMessage', cause)
+    except (TypeError, ValueError, AttributeError):
+        pass
+    
+    return f"{error.get('Error', 'Error')}: {cause}" if cause else str(error.get('Error', 'Unknown error'))
+
+@timed('dynamodb')
 def log_to_dynamodb(execution_data):
     """
     Store execution data in DynamoDB
     """
     # Convert float values to Decimal for DynamoDB
-    item = {}
-    for key, value in execution_data.items():
-        if isinstance(value, float):
-            item[key] = Decimal(str(value))
-        else:
-            item[key] = value
+    item = to_dynamodb_value(execution_data)
     
     # Write to DynamoDB
     table.put_item(Item=item)
     print(f"Logged to DynamoDB: {execution_data['execution_id']}")
 
 
+def execution_outcome(execution_data):
+    """
+    The request's terminal status and its result or error, in the shape
+    GET /result serves: ('SUCCEEDED', 'result', {...}) or ('FAILED', 'error', {...})
+    """
+    if execution_data['success']:
+        return 'SUCCEEDED', 'result', {
+            'content': execution_data['output'],
+            'quality_score': execution_data['quality_score'],
+            'complexity': execution_data['complexity'],
+            'category': execution_data['category'],
+            'processing_time_ms': execution_data['total_processing_time_ms']
+        }
+    return 'FAILED', 'error', {
+        'error_type': execution_data['error_type'],
+        'error_message': execution_data['error_message']
+    }
+
+
+@timed('result_cache')
+def cache_execution_result(request_id, execution_data):
+    """
+    Record the completed result for a request in the result table.
+    Updates rather than puts, keeping the execution ARN the trigger stored.
+    """
+    status, outcome_key, outcome = execution_outcome(execution_data)
+    
+    result_table.update_item(
+        Key={'request_id': request_id},
+        UpdateExpression='SET #status = :status, #outcome = :outcome, execution_id = :execution_id, '
+                         'completed_at = :completed_at, expires_at = :expires_at',
+        ExpressionAttributeNames={
+            '#status': 'status',
+            '#outcome': outcome_key
+        },
+        ExpressionAttributeValues=to_dynamodb_value({
+            ':status': status,
+            ':outcome': outcome,
+            ':execution_id': execution_data['execution_id'],
+            ':completed_at': execution_data['timestamp'],
+            ':expires_at': int(time.time()) + RESULT_TTL_SECONDS
+        })
+    )
+    print(f"Cached result for request: {request_id}")
+
+
+@timed('admission')
+def release_admission_slot(budget_key):
+    """
+    Decrement the trigger's in-flight counter, never below zero
+    """
+    try:
+        admission_table.update_item(
+            Key={'budget_key': budget_key},
+            UpdateExpression='ADD in_flight :minus_one',
+            ConditionExpression='in_flight > :zero',
+            ExpressionAttributeValues={':minus_one': -1, ':zero': 0}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def to_dynamodb_value(value):
+    """
+    Recursively convert floats to Decimal, as DynamoDB requires
+    """
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: to_dynamodb_value(nested) for key, nested in value.items()}
+    if isinstance(value, list):
+        return [to_dynamodb_value(nested) for nested in value]
+    return value
+
+
+@timed('metrics')
 def send_cloudwatch_metrics(execution_data):
     """
     Send custom metrics to CloudWatch
@@ -1,30 +1,33 @@
 import json
 import time
 import random
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
+from timing import instrument_handler, phase
+
+@instrument_handler('response_enhancer')
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Enhances AI responses based on input analysis and user requirements
     """
-    start_time = time.time()
+    base_response = event.get('base_response', '')
+    enhancing = phase('enhance')
     
     try:
-        # Extract data from previous steps
-        input_text = event.get('input', '')
-        analysis = event.get('analysis', {})
-        base_response = event.get('base_response', '')
-        
-        if not input_text or not analysis:
-            raise ValueError("Missing required input or analysis data")
-        
-        print(f"Enhancing response for {analysis.get('complexity', 'unknown')} complexity input")
-        
-        # Perform enhancement
-        enhanced_response = enhance_response(input_text, analysis, base_response)
+        with enhancing:
+            # Extract data from previous steps
+            input_text = event.get('input', '')
+            analysis = event.get('analysis', {})
+            
+            if not input_text or not analysis:
+                raise ValueError("Missing required input or analysis data")
+            
+            print(f"Enhancing response for {analysis.get('complexity', 'unknown')} complexity input")
+            
+            # Perform enhancement
+            enhanced_response = enhance_response(input_text, analysis, base_response)
         
-        # Calculate processing time
-        processing_time = (time.time() - start_time) * 1000
+        processing_time = enhancing.duration_ms
         
         print(f"Enhancement complete in {processing_time:.2f}ms")
         print(f"Enhanced response length: {len(enhanced_response['content'])} characters")
@@ -37,7 +40,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         }
         
     except Exception as e:
-        processing_time = (time.time() - start_time) * 1000
+        processing_time = enhancing.duration_ms
         error_msg = f"Response enhancement failed: {str(e)}"
         print(f"{error_msg}")
         
@@ -53,9 +56,56 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
             'timestamp': time.time()
         }
 
+def stream_handler(event: Dict[str, Any], context) -> Iterator[str]:
+    """
+    Streaming counterpart of lambda_handler: yields the enhanced response in
+    chunks so consumers can start rendering before the whole response exists
+    """
+    input_text = event.get('input', '')
+    analysis = event.get('analysis', {})
+    
+    if not input_text or not analysis:
+        raise ValueError("Missing required input or analysis data")
+    
+    return stream_enhanced_response(input_text, analysis, event.get('base_response', ''))
+
 def enhance_response(input_text: str, analysis: Dict[str, Any], base_response: str) -> Dict[str, Any]:
     """
-    Enhance the response based on input analysis
+    Enhance the response based on input analysis.
+    Non-streaming adapter over plan_enhancement: the chunks are joined once.
+    """
+    plan = plan_enhancement(input_text, analysis, base_response)
+    enhanced_content = ''.join(iter_response_chunks(plan))
+    
+    return {
+        'content': enhanced_content,
+        'enhancements': plan['enhancements'],
+        'quality_score': plan['quality_score'],
+        'original_length': plan['original_length'],
+        'enhanced_length': plan['enhanced_length'],
+        'improvement_factor': plan['improvement_factor']
+    }
+
+def stream_enhanced_response(input_text: str, analysis: Dict[str, Any], base_response: str) -> Iterator[str]:
+    """
+    Yield the enhanced response as ordered chunks without materializing it
+    """
+    return iter_response_chunks(plan_enhancement(input_text, analysis, base_response))
+
+def iter_response_chunks(plan: Dict[str, Any]) -> Iterator[str]:
+    """
+    Yield prefix sections (outermost first), the base response, then suffix sections
+    """
+    for prefix in reversed(plan['prefixes']):
+        yield prefix
+    yield plan['base_response']
+    for suffix in plan['suffixes']:
+        yield suffix
+
+def plan_enhancement(input_text: str, analysis: Dict[str, Any], base_response: str) -> Dict[str, Any]:
+    """
+    Decide which sections surround the base response, tracking lengths only.
+    Wrapping sections push a prefix and a suffix; appended sections push a suffix.
     """
     complexity = analysis.get('complexity', 'medium')
     category = analysis.get('category', 'general')
@@ -65,64 +115,71 @@ def enhance_response(input_text: str, analysis: Dict[str, Any], base_response: s
     if not base_response:
         base_response = generate_mock_response(input_text, complexity, category)
     
-    enhanced_content = base_response
+    prefixes = []  # innermost first
+    suffixes = []
     enhancements = []
     
     # Apply complexity-based enhancements
     if complexity == 'high':
-        enhanced_content = add_detailed_explanations(enhanced_content)
+        suffixes.append(DETAILED_EXPLANATION_SECTION)
         enhancements.append('detailed_explanations')
         
-        enhanced_content = add_examples(enhanced_content, category)
+        suffixes.append(EXAMPLE_SECTIONS.get(category, EXAMPLE_SECTIONS['general']))
         enhancements.append('examples')
         
-        enhanced_content = add_structured_format(enhanced_content)
+        prefixes.append(STRUCTURED_FORMAT_PREFIX)
+        suffixes.append(STRUCTURED_FORMAT_SUFFIX)
         enhancements.append('structured_format')
     
     elif complexity == 'medium':
-        enhanced_content = add_moderate_detail(enhanced_content)
+        suffixes.append(MODERATE_DETAIL_SECTION)
         enhancements.append('moderate_detail')
         
         if category in ['technical', 'research']:
-            enhanced_content = add_examples(enhanced_content, category)
+            suffixes.append(EXAMPLE_SECTIONS.get(category, EXAMPLE_SECTIONS['general']))
             enhancements.append('examples')
     
     # Apply category-specific enhancements
     if category == 'technical':
-        enhanced_content = add_technical_formatting(enhanced_content)
+        suffixes.append(TECHNICAL_FORMATTING_SECTION)
         enhancements.append('technical_formatting')
     
     elif category == 'creative':
-        enhanced_content = add_creative_elements(enhanced_content)
+        suffixes.append(CREATIVE_ELEMENTS_SECTION)
         enhancements.append('creative_elements')
     
     elif category == 'research':
-        enhanced_content = add_research_structure(enhanced_content)
+        suffixes.append(RESEARCH_STRUCTURE_SECTION)
         enhancements.append('research_structure')
     
     # Apply feature-based enhancements
     if features.get('has_questions'):
-        enhanced_content = add_qa_structure(enhanced_content)
+        suffixes.append(QA_STRUCTURE_SECTION)
         enhancements.append('qa_structure')
     
     if features.get('multi_part'):
-        enhanced_content = add_section_headers(enhanced_content)
+        prefixes.append(SECTION_HEADERS_PREFIX)
+        suffixes.append(SECTION_HEADERS_SUFFIX)
         enhancements.append('section_headers')
     
     # Calculate quality score
-    quality_score = calculate_quality_score(enhanced_content, enhancements, complexity)
+    content_length = len(base_response) + sum(map(len, prefixes)) + sum(map(len, suffixes))
+    quality_score = score_content_length(content_length, enhancements, complexity)
     
     # Add final polish
-    enhanced_content = add_final_polish(enhanced_content, complexity)
+    suffixes.append(FINAL_POLISH_SECTIONS.get(complexity, FINAL_POLISH_SECTIONS['medium']))
     enhancements.append('final_polish')
+    enhanced_length = content_length + len(suffixes[-1])
     
     return {
-        'content': enhanced_content,
+        'base_response': base_response,
+        'prefixes': prefixes,
+        'suffixes': suffixes,
         'enhancements': enhancements,
         'quality_score': quality_score,
         'original_length': len(base_response),
-        'enhanced_length': len(enhanced_content),
-        'improvement_factor': len(enhanced_content) / max(len(base_response), 1)
+        'enhanced_length': enhanced_length,
+        'improvement_factor': enhanced_length / max(len(base_response), 1)
     }
 
 def generate_mock_response(input_text: str, complexity: str, category: str) -> str:
@@ -145,67 +202,51 @@ def generate_mock_response(input_text: str, complexity: str, category: str) -> s
     
     return base
 
-def add_detailed_explanations(content: str) -> str:
-    """Add detailed explanations for high complexity responses"""
-    return content + "\n\n**Detailed Explanation:**\nThis topic involves multiple interconnected concepts that build upon each other to form a comprehensive understanding."
-
-def add_examples(content: str, category: str) -> str:
-    """Add relevant examples based on category"""
-    examples = {
-        'technical': "\n\n**Example:**\n```python\n# Sample code implementation\ndef example_function():\n    return 'This demonstrates the concept'\n```",
-        'research': "\n\n**Example Study:**\nFor instance, a 2023 study demonstrated similar findings when researchers analyzed comparable data sets.",
-        'creative': "\n\n**Example:**\nImagine a scenario where the main character faces this exact challenge - how would they overcome it?",
-        'general': "\n\n**Example:**\nTo illustrate this point, consider how this applies in everyday situations."
-    }
-    
-    return content + examples.get(category, examples['general'])
+# Enhancement sections. Appended sections follow the content; wrapping
+# sections contribute a prefix and a suffix around it.
+DETAILED_EXPLANATION_SECTION = "\n\n**Detailed Explanation:**\nThis topic involves multiple interconnected concepts that build upon each other to form a comprehensive understanding."
 
-def add_structured_format(content: str) -> str:
-    """Add structured formatting with headers and bullets"""
-    return f"## Overview\n{content}\n\n## Key Points\n• Main concept explained\n• Supporting details provided\n• Practical applications considered"
+EXAMPLE_SECTIONS = {
+    'technical': "\n\n**Example:**\n```python\n# Sample code implementation\ndef example_function():\n    return 'This demonstrates the concept'\n```",
+    'research': "\n\n**Example Study:**\nFor instance, a 2023 study demonstrated similar findings when researchers analyzed comparable data sets.",
+    'creative': "\n\n**Example:**\nImagine a scenario where the main character faces this exact challenge - how would they overcome it?",
+    'general': "\n\n**Example:**\nTo illustrate this point, consider how this applies in everyday situations."
+}
 
-def add_moderate_detail(content: str) -> str:
-    """Add moderate level of detail"""
-    return content + "\n\nAdditional context: This builds on fundamental principles while addressing your specific needs."
+STRUCTURED_FORMAT_PREFIX = "## Overview\n"
+STRUCTURED_FORMAT_SUFFIX = "\n\n## Key Points\n• Main concept explained\n• Supporting details provided\n• Practical applications considered"
 
-def add_technical_formatting(content: str) -> str:
-    """Add technical formatting elements"""
-    return content + "\n\n**Technical Notes:**\n- Implementation considerations\n- Performance implications\n- Best practices"
+MODERATE_DETAIL_SECTION = "\n\nAdditional context: This builds on fundamental principles while addressing your specific needs."
 
-def add_creative_elements(content: str) -> str:
-    """Add creative elements and inspiration"""
-    return content + "\n\n*Creative Inspiration:* Consider exploring different perspectives and let your imagination guide the development of ideas."
+TECHNICAL_FORMATTING_SECTION = "\n\n**Technical Notes:**\n- Implementation considerations\n- Performance implications\n- Best practices"
 
-def add_research_structure(content: str) -> str:
-    """Add research-oriented structure"""
-    return content + "\n\n**Research Framework:**\n1. Problem definition\n2. Analysis methodology\n3. Findings and implications"
+CREATIVE_ELEMENTS_SECTION = "\n\n*Creative Inspiration:* Consider exploring different perspectives and let your imagination guide the development of ideas."
 
-def add_qa_structure(content: str) -> str:
-    """Add Q&A structure for responses with questions"""
-    return content + "\n\n**Q&A Section:**\n**Q:** What are the key considerations?\n**A:** The main factors to consider include context, requirements, and desired outcomes."
+RESEARCH_STRUCTURE_SECTION = "\n\n**Research Framework:**\n1. Problem definition\n2. Analysis methodology\n3. Findings and implications"
 
-def add_section_headers(content: str) -> str:
-    """Add section headers for multi-part content"""
-    return f"# Response Overview\n\n{content}\n\n## Additional Considerations\nFurther details and related topics are explored here."
+QA_STRUCTURE_SECTION = "\n\n**Q&A Section:**\n**Q:** What are the key considerations?\n**A:** The main factors to consider include context, requirements, and desired outcomes."
 
-def add_final_polish(content: str, complexity: str) -> str:
-    """Add final polish and conclusion"""
-    conclusions = {
-        'high': "\n\n**Conclusion:**\nThis comprehensive analysis provides a thorough foundation for understanding and applying these concepts effectively.",
-        'medium': "\n\n**Summary:**\nThese key points should help you move forward with confidence and clarity.",
-        'low': "\n\nI hope this helps clarify things for you!"
-    }
-    
-    return content + conclusions.get(complexity, conclusions['medium'])
+SECTION_HEADERS_PREFIX = "# Response Overview\n\n"
+SECTION_HEADERS_SUFFIX = "\n\n## Additional Considerations\nFurther details and related topics are explored here."
+
+FINAL_POLISH_SECTIONS = {
+    'high': "\n\n**Conclusion:**\nThis comprehensive analysis provides a thorough foundation for understanding and applying these concepts effectively.",
+    'medium': "\n\n**Summary:**\nThese key points should help you move forward with confidence and clarity.",
+    'low': "\n\nI hope this helps clarify things for you!"
+}
 
 def calculate_quality_score(content: str, enhancements: list, complexity: str) -> float:
     """Calculate quality score based on content and enhancements"""
+    return score_content_length(len(content), enhancements, complexity)
+
+def score_content_length(content_length: int, enhancements: list, complexity: str) -> float:
+    """Calculate quality score from the content length, without needing the content"""
     base_score = 0.5
     
     # Length bonus
-    if len(content) > 500:
+    if content_length > 500:
         base_score += 0.2
-    elif len(content) > 200:
+    elif content_length > 200:
         base_score += 0.1
     
     # Enhancement bonus
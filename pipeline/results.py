@@ -0,0 +1,226 @@
+import json
+import time
+import os
+from collections import OrderedDict
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, Any, Optional
+
+from aws_clients import lazy_client, lazy_table
+from timing import instrument_handler, timed
+
+# Initialize AWS services
+stepfunctions = lazy_client('stepfunctions')
+
+result_table_name = os.environ.get('RESULT_TABLE', 'PipelineResults')
+result_table = lazy_table(result_table_name)
+RESULT_TTL_SECONDS = int(os.environ.get('RESULT_TTL_SECONDS', '86400'))
+
+# Long-poll limits; API Gateway cuts integrations off at 29 seconds
+RESULT_MAX_WAIT_SECONDS = float(os.environ.get('RESULT_MAX_WAIT_SECONDS', '25'))
+RESULT_DEFAULT_WAIT_SECONDS = float(os.environ.get('RESULT_DEFAULT_WAIT_SECONDS', '10'))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', '1024'))
+
+# Polling backoff between consistent reads of the result table
+POLL_INITIAL_DELAY = 0.05
+POLL_MAX_DELAY = 1.0
+
+# Leave time to build the response before the function times out
+CONTEXT_SAFETY_MARGIN_MS = 1000
+
+TERMINAL_STATUSES = ('SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED')
+
+# Terminal results never change, so a warm container can serve them from memory
+_result_cache = OrderedDict()
+_result_cache_lock = Lock()
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """
+    JSON encoder for the Decimal values DynamoDB returns
+    """
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj) if obj % 1 == 0 else float(obj)
+        return super().default(obj)
+
+
+@instrument_handler('results')
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    GET /result/{request_id}?wait=<seconds>
+    Returns the pipeline result, long-polling up to `wait` seconds while the
+    execution is still running.
+    """
+    request_id = (event.get('pathParameters') or {}).get('request_id')
+    if not request_id:
+        return create_response(400, {'error': 'request_id path parameter is required'})
+
+    wait_seconds = extract_wait_seconds(event, context)
+    if wait_seconds is None:
+        return create_response(400, {'error': 'wait must be a number of seconds'})
+
+    cached = get_cached_result(request_id)
+    if cached:
+        return create_result_response(cached, 'memory')
+
+    record = wait_for_result(request_id, wait_seconds)
+    if record and record.get('status') in TERMINAL_STATUSES:
+        remember_result(record)
+        return create_result_response(record, 'table')
+
+    # Missed or still running: ask Step Functions once whether it has finished
+    if record and record.get('execution_arn'):
+        described = describe_result(record)
+        if described:
+            remember_result(described)
+            return create_result_response(described, 'step_functions')
+
+    if not record:
+        return create_response(404, {'error': f"Unknown request_id: {request_id}", 'request_id': request_id})
+
+    return create_response(202, format_result(record, 'table'), {
+        'Retry-After': str(max(1, int(POLL_MAX_DELAY)))
+    })
+
+
+def extract_wait_seconds(event: Dict[str, Any], context) -> Optional[float]:
+    """
+    Requested wait, clamped to the configured maximum and the remaining Lambda time
+    """
+    params = event.get('queryStringParameters') or {}
+    try:
+        wait_seconds = float(params.get('wait', RESULT_DEFAULT_WAIT_SECONDS))
+    except (TypeError, ValueError):
+        return None
+
+    wait_seconds = max(0.0, min(wait_seconds, RESULT_MAX_WAIT_SECONDS))
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = (context.get_remaining_time_in_millis() - CONTEXT_SAFETY_MARGIN_MS) / 1000
+        wait_seconds = max(0.0, min(wait_seconds, remaining))
+    return wait_seconds
+
+
+@timed('poll')
+def wait_for_result(request_id: str, wait_seconds: float) -> Optional[Dict[str, Any]]:
+    """
+    Poll the result table with exponential backoff until the result is
+    terminal or the wait expires. Returns the last record seen, if any.
+    """
+    deadline = time.monotonic() + wait_seconds
+    delay = POLL_INITIAL_DELAY
+
+    while True:
+        record = result_table.get_item(Key={'request_id': request_id}, ConsistentRead=True).get('Item')
+        if record and record.get('status') in TERMINAL_STATUSES:
+            return record
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return record
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+
+@timed('describe')
+def describe_result(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build a terminal result from DescribeExecution and write it back to the
+    table, for executions whose logger never cached a result. The execution's
+    output is the logger's return value, which carries the same status and
+    result or error the logger would have cached.
+    """
+    try:
+        execution = stepfunctions.describe_execution(executionArn=record['execution_arn'])
+    except Exception as e:
+        print(f"Failed to describe execution {record['execution_arn']}: {str(e)}")
+        return None
+
+    status = execution['status']
+    if status not in TERMINAL_STATUSES:
+        return None
+
+    described = dict(record)
+    described['status'] = status
+    described['completed_at'] = str(execution.get('stopDate', ''))
+    if status == 'SUCCEEDED':
+        output = json.loads(execution.get('output') or 'null', parse_float=Decimal)
+        if isinstance(output, dict) and output.get('status') in ('SUCCEEDED', 'FAILED'):
+            # Caught failures end in the logger too, so the execution itself succeeds
+            described['status'] = output['status']
+            outcome_key = 'result' if output['status'] == 'SUCCEEDED' else 'error'
+            described[outcome_key] = output.get(outcome_key)
+        else:
+            print(f"Execution {record['execution_arn']} has no logged result in its output")
+            described['result'] = None
+    else:
+        described['error'] = {
+            'error_type': execution.get('error', status),
+            'error_message': execution.get('cause', f"Execution {status.lower()}")
+        }
+
+    try:
+        result_table.put_item(
+            Item=described,
+            ConditionExpression='attribute_not_exists(request_id) OR #status = :running',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':running': 'RUNNING'}
+        )
+    except Exception as e:
+        # The logger finished first or the write failed; the response is still valid
+        print(f"Result write-back skipped for {record['request_id']}: {str(e)}")
+
+    return described
+
+
+def get_cached_result(request_id: str) -> Optional[Dict[str, Any]]:
+    with _result_cache_lock:
+        record = _result_cache.get(request_id)
+        if record is not None:
+            _result_cache.move_to_end(request_id)
+        return record
+
+
+def remember_result(record: Dict[str, Any]) -> None:
+    with _result_cache_lock:
+        _result_cache[record['request_id']] = record
+        _result_cache.move_to_end(record['request_id'])
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
+
+def format_result(record: Dict[str, Any], source: str) -> Dict[str, Any]:
+    body = {
+        'request_id': record['request_id'],
+        'status': record.get('status', 'RUNNING'),
+        'execution_arn': record.get('execution_arn'),
+        'created_at': record.get('created_at'),
+        'completed_at': record.get('completed_at'),
+        'source': source
+    }
+    if 'result' in record:
+        body['result'] = record['result']
+    if 'error' in record:
+        body['error'] = record['error']
+    return body
+
+
+def create_result_response(record: Dict[str, Any], source: str) -> Dict[str, Any]:
+    return create_response(200, format_result(record, source))
+
+
+def create_response(status_code: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Create API Gateway response with CORS headers
+    """
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'GET,OPTIONS',
+            **(headers or {})
+        },
+        'body': json.dumps(body, cls=DecimalEncoder)
+    }
@@ -0,0 +1,76 @@
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+# Error codes AWS services use when a caller exceeds its request rate
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException',
+}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Check whether an exception is an AWS throttling response
+    """
+    if not isinstance(error, ClientError):
+        return False
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def backoff_delay(attempt: int, base: float = 0.05, cap: float = 2.0) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit shared by the workers of one batch.
+    The limit grows by one after a full window of successes and halves on
+    throttling, at most once per cooldown so one burst of throttles is not
+    counted many times.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64, cooldown_seconds: float = 0.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self._successes = 0
+                self.limit += 1
+                self._condition.notify()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown_seconds:
+                self._last_decrease = now
+                self._successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
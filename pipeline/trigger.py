@@ -1,21 +1,72 @@
 import json
-import boto3
+import math
 import time
 import os
-from typing import Dict, Any
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from typing import Dict, Any, List, Optional
 
-# Initialize AWS services
-stepfunctions = boto3.client('stepfunctions')
+import fused
+from aws_clients import lazy_client, lazy_table
+from timing import in_context, instrument_handler, phase, timed
+from admission import (
+    PRIORITY_CLASSES, ClientRateLimiter, ConcurrencyBudget, estimate_priority, retry_after_seconds
+)
+from idempotency import IdempotencyStore, build_idempotency_key
+from results import DecimalEncoder, TERMINAL_STATUSES
+from throttling import AdaptiveConcurrencyLimiter, backoff_delay, is_throttling_error
+
+# Batch limits: items per request, parallel StartExecution calls, attempts per item
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '1000'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '32'))
+BATCH_MAX_ATTEMPTS = int(os.environ.get('BATCH_MAX_ATTEMPTS', '6'))
+
+# Initialize AWS services; the pool must fit every concurrent batch worker
+stepfunctions = lazy_client('stepfunctions', max_pool_connections=BATCH_MAX_CONCURRENCY)
 
 # Get Step Functions ARN from environment
 STATE_MACHINE_ARN = os.environ.get('STATE_MACHINE_ARN')
 
+# Result cache read by GET /result/{request_id}
+result_table_name = os.environ.get('RESULT_TABLE', 'PipelineResults')
+result_table = lazy_table(result_table_name)
+RESULT_TTL_SECONDS = int(os.environ.get('RESULT_TTL_SECONDS', '86400'))
+
+# Duplicate submissions within the TTL attach to the first execution (0 disables)
+idempotency_table_name = os.environ.get('IDEMPOTENCY_TABLE', 'PipelineIdempotency')
+idempotency_table = lazy_table(idempotency_table_name)
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '3600'))
+IDEMPOTENCY_ATTACH_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_ATTACH_WAIT_SECONDS', '2'))
+# How long a claim may sit without a started execution before a duplicate takes it over
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '10'))
+
+# Admission control: per-client token buckets (per container) and a global
+# budget of in-flight executions shared through DynamoDB (0 disables it)
+ADMISSION_CLIENT_RATE = float(os.environ.get('ADMISSION_CLIENT_RATE', '5'))
+ADMISSION_CLIENT_BURST = float(os.environ.get('ADMISSION_CLIENT_BURST', '20'))
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', '1000'))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', '2'))
+# When the budget looks full, recount running executions at most this often
+ADMISSION_RECONCILE_SECONDS = int(os.environ.get('ADMISSION_RECONCILE_SECONDS', '60'))
+admission_table_name = os.environ.get('ADMISSION_TABLE', 'PipelineAdmission')
+admission_table = lazy_table(admission_table_name)
+client_limiter = ClientRateLimiter(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST)
+
+# auto: light inputs run fused in-process, heavy ones start an execution
+# fused / state_machine: force one path for every request
+PIPELINE_MODE = os.environ.get('PIPELINE_MODE', 'auto')
+
+@instrument_handler('trigger')
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Triggers the AI Pipeline Step Functions workflow
     """
     print("AI Pipeline trigger activated")
     
+    if is_batch_request(event):
+        return handle_batch_request(event)
+    
     # Extract input from event
     user_input = extract_user_input(event)
     
@@ -24,15 +75,80 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     
     print(f"Processing input: {user_input[:100]}...")
     
+    # Shed clients over their rate before doing any work for them
+    priority = estimate_priority(user_input)
+    with phase('rate_limit'):
+        wait_seconds = client_limiter.try_acquire(extract_client_id(event), PRIORITY_CLASSES[priority]['cost'])
+    if wait_seconds:
+        return create_error_response(429, "Too many requests", {
+            'Retry-After': str(max(1, math.ceil(wait_seconds)))
+        })
+    
+    request_id = context.aws_request_id if context else f"req_{uuid.uuid4().hex}"
+    
+    # Light inputs are answered synchronously by the fused in-process pipeline
+    requested_mode = extract_execution_mode(event)
+    if PIPELINE_MODE != 'state_machine' and requested_mode != 'async':
+        with phase('analysis') as analyzing:
+            analysis = fused.analyze_input(user_input)
+        analysis_time_ms = analyzing.duration_ms
+        priority = estimate_priority(user_input, analysis['complexity'])
+        
+        if PIPELINE_MODE == 'fused' or requested_mode == 'sync' or fused.should_use_fused_path(user_input, analysis):
+            try:
+                result = fused.run_fused_pipeline(user_input, request_id, analysis, analysis_time_ms)
+            except Exception as e:
+                print(f"Fused pipeline failed, falling back to Step Functions: {str(e)}")
+            else:
+                print(f"Fused pipeline completed in {result['processing_time_ms']}ms")
+                response = create_fused_response(request_id, result)
+                # The container may be frozen and reclaimed after returning; write the log first
+                with phase('log_flush'):
+                    fused.flush_pending_logs(fused.FUSED_LOG_FLUSH_SECONDS)
+                return response
+    
+    # Duplicates of an in-flight or completed request reuse its execution
+    idempotency_key = None
+    if IDEMPOTENCY_TTL_SECONDS > 0:
+        idempotency_key = build_idempotency_key(user_input, extract_idempotency_key(event))
+        with phase('idempotency'):
+            duplicate = attach_to_existing_request(idempotency_key, request_id)
+        if duplicate:
+            return duplicate
+    
     # Prepare execution input
     execution_input = {
         'input': user_input,
         'timestamp': time.time(),
-        'request_id': context.aws_request_id if context else f"req_{int(time.time())}"
+        'request_id': request_id
     }
     
+    # Take a slot of the global budget; the logger returns it when the execution ends
+    budget = get_concurrency_budget()
+    if budget:
+        with phase('admission'):
+            admitted = acquire_admission_slot(budget, priority)
+        if not admitted:
+            if idempotency_key:
+                get_idempotency_store().release(idempotency_key, request_id)
+            print(f"Shedding {priority} request: pipeline at capacity")
+            return create_error_response(503, "Pipeline at capacity, retry later", {
+                'Retry-After': str(retry_after_seconds(ADMISSION_RETRY_AFTER_SECONDS))
+            })
+        execution_input['admission_budget'] = budget.key
+    
     # Start Step Functions execution
-    execution_response = start_pipeline_execution(execution_input)
+    try:
+        execution_response = start_pipeline_execution(execution_input)
+    except Exception:
+        if budget:
+            budget.release()
+        if idempotency_key:
+            get_idempotency_store().release(idempotency_key, request_id)
+        raise
+    record_pending_result(request_id, execution_response['executionArn'])
+    if idempotency_key:
+        get_idempotency_store().mark_started(idempotency_key, request_id, execution_response['executionArn'])
     
     print(f"Pipeline started: {execution_response['executionArn']}")
     
@@ -84,16 +200,165 @@ def extract_user_input(event: Dict[str, Any]) -> str:
         return event
     
     return ''
+
+
+def extract_execution_mode(event: Dict[str, Any]) -> Optional[str]:
+    """
+    Client-requested execution mode: 'sync' (fused) or 'async' (state machine)
+    """
+    mode = None
+    
+    if isinstance(event.get('body'), str):
+        try:
+            body = json.loads(event['body'])
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            mode = body.get('mode')
+    elif isinstance(event.get('body'), dict):
+        mode = event['body'].get('mode')
+    
+    if not mode and 'input' in event:
+        mode = event.get('mode')
+    
+    if not mode and event.get('queryStringParameters'):
+        mode = event['queryStringParameters'].get('mode')
+    
+    return mode if mode in ('sync', 'async') else None
     
 
-def start_pipeline_execution(execution_input: Dict[str, Any]) -> Dict[str, Any]:
+def extract_idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    """
+    Client-supplied idempotency key from the Idempotency-Key header or the body
+    """
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key' and value:
+            return str(value)
+    
+    body = event.get('body')
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = None
+    if isinstance(body, dict) and body.get('idempotency_key'):
+        return str(body['idempotency_key'])
+    
+    return event.get('idempotency_key') if 'input' in event else None
+
+
+def extract_client_id(event: Dict[str, Any]) -> str:
+    """
+    Identify the caller for rate limiting: API key, then source IP
+    """
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('apiKey') or identity.get('sourceIp') or 'anonymous'
+
+
+def get_concurrency_budget() -> Optional[ConcurrencyBudget]:
+    if ADMISSION_MAX_IN_FLIGHT <= 0:
+        return None
+    return ConcurrencyBudget(admission_table, ADMISSION_MAX_IN_FLIGHT)
+
+
+def acquire_admission_slot(budget: ConcurrencyBudget, priority: str) -> bool:
+    """
+    Take a slot of the global budget. A full budget is first checked against
+    the executions actually running, which recovers slots whose release was lost.
+    """
+    if budget.try_acquire(priority):
+        return True
+    if budget.reconcile(count_running_executions, ADMISSION_RECONCILE_SECONDS) is None:
+        return False
+    return budget.try_acquire(priority)
+
+
+def count_running_executions() -> int:
+    """
+    Number of pipeline executions currently running
+    """
+    running = 0
+    params = {'stateMachineArn': STATE_MACHINE_ARN, 'statusFilter': 'RUNNING', 'maxResults': 1000}
+    while True:
+        page = stepfunctions.list_executions(**params)
+        running += len(page['executions'])
+        if not page.get('nextToken'):
+            return running
+        params['nextToken'] = page['nextToken']
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore(idempotency_table, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LEASE_SECONDS)
+
+
+def attach_to_existing_request(idempotency_key: str, request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim the idempotency key for this request. If another request owns it,
+    return a response describing that request's execution (or its cached
+    result) instead. Failed executions are not reused: the key is taken over
+    and the pipeline runs again.
+    """
+    store = get_idempotency_store()
+    existing = store.claim(idempotency_key, request_id)
+    if existing is None:
+        return None
+    
+    result = result_table.get_item(Key={'request_id': existing['request_id']}, ConsistentRead=True).get('Item')
+    if result and result.get('status') in TERMINAL_STATUSES and result['status'] != 'SUCCEEDED':
+        if store.take_over(idempotency_key, request_id, existing['request_id']):
+            print(f"Retrying failed request {existing['request_id']} as {request_id}")
+            return None
+        existing = store.get(idempotency_key) or existing
+        result = None
+    
+    if not existing.get('execution_arn') and not result:
+        existing = store.wait_for_execution(idempotency_key, IDEMPOTENCY_ATTACH_WAIT_SECONDS) or existing
+        # The owner died before starting its execution; run this request instead
+        if store.lease_expired(existing) and store.take_over(idempotency_key, request_id, existing['request_id']):
+            print(f"Taking over abandoned claim of {existing['request_id']} as {request_id}")
+            return None
+    
+    print(f"Duplicate request attached to {existing['request_id']}")
+    return create_duplicate_response(existing, result)
+
+
+def create_duplicate_response(existing: Dict[str, Any], result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Response for a duplicate: the original request's execution and, once it
+    has finished, its cached result
+    """
+    body = {
+        'message': 'Duplicate request attached to an existing execution',
+        'request_id': existing['request_id'],
+        'execution_arn': existing.get('execution_arn') or (result or {}).get('execution_arn'),
+        'status': (result or {}).get('status', 'RUNNING'),
+        'deduplicated': True
+    }
+    if result and 'result' in result:
+        body['result'] = result['result']
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,Idempotency-Key',
+            'Access-Control-Allow-Methods': 'POST,OPTIONS'
+        },
+        'body': json.dumps(body, cls=DecimalEncoder)
+    }
+
+
+@timed('start_execution')
+def start_pipeline_execution(execution_input: Dict[str, Any], execution_name: Optional[str] = None) -> Dict[str, Any]:
     """
     Start Step Functions execution
     """
     if not STATE_MACHINE_ARN:
         raise ValueError("STATE_MACHINE_ARN environment variable not set")
     
-    execution_name = f"pipeline-{int(time.time())}-{execution_input['request_id'][-8:]}"
+    if not execution_name:
+        execution_name = f"pipeline-{int(time.time())}-{execution_input['request_id'][-8:]}"
     
     response = stepfunctions.start_execution(
         stateMachineArn=STATE_MACHINE_ARN,
@@ -104,7 +369,53 @@ def start_pipeline_execution(execution_input: Dict[str, Any]) -> Dict[str, Any]:
     return response
 
 
-def create_error_response(status_code: int, message: str) -> Dict[str, Any]:
+@timed('record_pending')
+def record_pending_result(request_id: str, execution_arn: str) -> None:
+    """
+    Register a running execution in the result cache so /result can find it.
+    Never overwrites: the logger may already have stored the completed result.
+    """
+    try:
+        result_table.put_item(
+            Item={
+                'request_id': request_id,
+                'status': 'RUNNING',
+                'execution_arn': execution_arn,
+                'created_at': int(time.time()),
+                'expires_at': int(time.time()) + RESULT_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(request_id)'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Failed to record pending result for {request_id}: {str(e)}")
+
+
+def create_fused_response(request_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create the synchronous response for a fused pipeline run
+    """
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'POST,OPTIONS'
+        },
+        'body': json.dumps({
+            'message': 'Pipeline completed successfully',
+            'request_id': request_id,
+            'status': 'SUCCEEDED',
+            'mode': 'fused',
+            'analysis': result['analysis'],
+            'enhanced_response': result['enhanced_response'],
+            'processing_time_ms': result['processing_time_ms']
+        })
+    }
+
+
+def create_error_response(status_code: int, message: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
     Create standardized error response
     """
@@ -114,7 +425,8 @@ def create_error_response(status_code: int, message: str) -> Dict[str, Any]:
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Allow-Methods': 'POST,OPTIONS'
+            'Access-Control-Allow-Methods': 'POST,OPTIONS',
+            **(headers or {})
         },
         'body': json.dumps({
             'error': message,
@@ -145,35 +457,140 @@ def handle_scheduled_execution(event: Dict[str, Any]) -> Dict[str, Any]:
         'execution_type': 'scheduled'
     }
 
-def handle_batch_execution(inputs: list) -> list:
+def is_batch_request(event: Dict[str, Any]) -> bool:
+    """
+    Check whether an API Gateway event targets /trigger/batch
+    """
+    return (event.get('resource') == '/trigger/batch'
+            or str(event.get('path', '')).rstrip('/').endswith('/trigger/batch'))
+
+
+def handle_batch_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handle POST /trigger/batch with body {"inputs": ["...", ...]}
+    """
+    body = event.get('body') or '{}'
+    try:
+        body = json.loads(body) if isinstance(body, str) else body
+    except ValueError:
+        return create_error_response(400, "Request body must be valid JSON")
+    
+    inputs = body.get('inputs') if isinstance(body, dict) else None
+    if not isinstance(inputs, list) or not inputs:
+        return create_error_response(400, "Request body must contain a non-empty 'inputs' list")
+    if len(inputs) > BATCH_MAX_ITEMS:
+        return create_error_response(400, f"Batch too large (max {BATCH_MAX_ITEMS} inputs)")
+    
+    # A batch counts as one bulk request against the client's bucket
+    with phase('rate_limit'):
+        wait_seconds = client_limiter.try_acquire(extract_client_id(event), PRIORITY_CLASSES['bulk']['cost'])
+    if wait_seconds:
+        return create_error_response(429, "Too many requests", {
+            'Retry-After': str(max(1, math.ceil(wait_seconds)))
+        })
+    
+    batch_id = f"batch-{uuid.uuid4().hex[:16]}"
+    with phase('start_executions') as starting:
+        executions = handle_batch_execution(inputs, batch_id=batch_id)
+    started = sum(1 for e in executions if e['status'] == 'started')
+    rejected = sum(1 for e in executions if e['status'] == 'rejected')
+    
+    print(f"Batch started {started}/{len(inputs)} executions in {starting.duration_ms / 1000:.2f}s")
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'POST,OPTIONS'
+        },
+        'body': json.dumps({
+            'message': f"Started {started} of {len(inputs)} pipeline executions",
+            'batch_id': batch_id,
+            'total': len(inputs),
+            'started': started,
+            'failed': len(inputs) - started - rejected,
+            'rejected': rejected,
+            'executions': executions
+        })
+    }
+
+
+def handle_batch_execution(inputs: list, max_concurrency: int = None, batch_id: str = None) -> List[Dict[str, Any]]:
     """
-    Handle multiple inputs in batch (for future batch processing)
+    Start one execution per input on a bounded thread pool.
+    Concurrency adapts to throttling (AIMD) and throttled starts are retried
+    with jittered exponential backoff. Results keep the order of `inputs`.
     """
-    executions = []
+    max_concurrency = max_concurrency or BATCH_MAX_CONCURRENCY
+    limiter = AdaptiveConcurrencyLimiter(initial=min(8, max_concurrency), maximum=max_concurrency)
+    
+    # A random batch ID keeps request IDs and execution names unique across batches
+    batch_id = batch_id or f"batch-{uuid.uuid4().hex[:16]}"
     
-    for i, user_input in enumerate(inputs):
+    def start_item(index: int) -> Dict[str, Any]:
+        user_input = inputs[index]
+        request_id = f"{batch_id}-{index}"
+        result = {
+            'index': index,
+            'request_id': request_id,
+            'input_preview': preview_input(user_input)
+        }
+        
+        if not isinstance(user_input, str) or not user_input.strip():
+            result.update({'status': 'failed', 'error': 'No input provided', 'attempts': 0})
+            return result
+        
         execution_input = {
             'input': user_input,
             'timestamp': time.time(),
-            'request_id': f"batch_{int(time.time())}_{i}",
+            'request_id': request_id,
             'execution_type': 'batch'
         }
         
-        try:
-            execution_response = start_pipeline_execution(execution_input)
-            executions.append({
-                'status': 'started',
-                'execution_arn': execution_response['executionArn'],
-                'input_preview': user_input[:50] + '...' if len(user_input) > 50 else user_input
-            })
-        except Exception as e:
-            executions.append({
-                'status': 'failed',
-                'error': str(e),
-                'input_preview': user_input[:50] + '...' if len(user_input) > 50 else user_input
-            })
+        # Batch items are bulk work: shed them before interactive requests
+        budget = get_concurrency_budget()
+        if budget:
+            if not acquire_admission_slot(budget, 'bulk'):
+                result.update({'status': 'rejected', 'error': 'Pipeline at capacity', 'attempts': 0})
+                return result
+            execution_input['admission_budget'] = budget.key
+        
+        for attempt in range(1, BATCH_MAX_ATTEMPTS + 1):
+            limiter.acquire()
+            try:
+                execution_response = start_pipeline_execution(execution_input, execution_name=request_id)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if throttled:
+                    limiter.on_throttle()
+                if not throttled or attempt == BATCH_MAX_ATTEMPTS:
+                    if budget:
+                        budget.release()
+                    result.update({'status': 'failed', 'error': str(e), 'attempts': attempt})
+                    return result
+            else:
+                limiter.on_success()
+                record_pending_result(request_id, execution_response['executionArn'])
+                result.update({
+                    'status': 'started',
+                    'execution_arn': execution_response['executionArn'],
+                    'attempts': attempt
+                })
+                return result
+            finally:
+                limiter.release()
+            
+            time.sleep(backoff_delay(attempt - 1))
     
-    return executions
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        return list(pool.map(in_context(start_item), range(len(inputs))))
+
+
+def preview_input(user_input: Any) -> str:
+    text = str(user_input)
+    return text[:50] + '...' if len(text) > 50 else text
 
 # Health check function
 def health_check() -> Dict[str, Any]:
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# boto3 needs a region to build clients
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+# Handlers import the shared layer modules, which Lambda serves from /opt/python
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
@@ -11,7 +11,7 @@ import sys
 import os
 
 # Add the chatbot directory to the path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'chatbot'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
 
 from app import (
     ConversationManager, TokenCounter, RateLimiter, 
@@ -50,6 +50,151 @@ class TestConversationManager:
         """Test O(1) lookup for non-existent conversation"""
         manager = ConversationManager()
         assert manager.get_history("nonexistent") == []
+    
+    def test_lru_eviction_by_conversation_count(self):
+        """Test that the least recently used conversation is evicted first"""
+        manager = ConversationManager(max_conversations=2)
+        manager.add_message("a", ChatMessage("user", "first", time.time()))
+        manager.add_message("b", ChatMessage("user", "second", time.time()))
+        manager.get_history("a")  # "a" is now most recently used
+        manager.add_message("c", ChatMessage("user", "third", time.time()))
+        
+        assert manager.get_history("b") == []
+        assert len(manager.get_history("a")) == 1
+        assert manager.stats()["evictions"] == 1
+    
+    def test_message_and_byte_budgets(self):
+        """Test that global message and byte totals stay within budget"""
+        manager = ConversationManager(max_history=3, max_messages=10, max_bytes=100)
+        for i in range(50):
+            manager.add_message(f"conv{i % 7}", ChatMessage("user", "x" * 8, time.time()))
+            stats = manager.stats()
+            assert stats["messages"] <= 10
+            assert stats["bytes"] <= 100
+        
+        recounted = sum(len(manager.get_history(f"conv{i}")) for i in range(7))
+        assert recounted == manager.stats()["messages"]
+    
+    def test_idle_expiry(self):
+        """Test that idle conversations expire on access and during writes"""
+        clock = [0.0]
+        manager = ConversationManager(idle_ttl_seconds=60, clock=lambda: clock[0])
+        manager.add_message("idle", ChatMessage("user", "hello", 0))
+        manager.add_message("active", ChatMessage("user", "hello", 0))
+        
+        clock[0] = 50.0
+        manager.get_history("active")
+        clock[0] = 100.0
+        manager.add_message("new", ChatMessage("user", "hello", 100))
+        
+        assert "idle" not in manager._conversation_cache
+        assert len(manager.get_history("active")) == 1
+        assert manager.stats()["expirations"] == 1
+    
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits or misses"""
+        manager = ConversationManager()
+        manager.add_message("conv1", ChatMessage("user", "test", time.time()))
+        manager.get_history("conv1")
+        manager.get_history("conv2")
+        
+        stats = manager.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+    
+    def test_many_distinct_clients_stay_bounded(self):
+        """Test that memory stays bounded under many one-off conversations"""
+        manager = ConversationManager(max_conversations=1000)
+        for i in range(20000):
+            manager.add_message(f"client-{i}", ChatMessage("user", "hi", time.time()))
+        
+        assert len(manager._conversation_cache) == 1000
+        assert manager.stats()["evictions"] == 19000
+
+class TestHistoryWindow:
+    """Test token-budgeted history selection"""
+    
+    def add_turns(self, manager, sizes):
+        for i, tokens in enumerate(sizes):
+            role = "user" if i % 2 == 0 else "assistant"
+            manager.add_message("conv1", ChatMessage(role, f"turn {i} " + "x" * tokens * 4, time.time(), tokens))
+    
+    def test_whole_history_when_it_fits(self):
+        """Test O(1) decision when the running total is within budget"""
+        manager = ConversationManager(max_history=20)
+        self.add_turns(manager, [10, 10, 10, 10])
+        
+        window, summary = manager.get_window("conv1", max_tokens=100)
+        assert len(window) == 4
+        assert summary is None
+    
+    def test_newest_turns_within_budget(self):
+        """Test that one long message cannot blow up the prompt"""
+        manager = ConversationManager(max_history=20)
+        self.add_turns(manager, [10, 500, 10, 10, 10, 10])
+        
+        window, _ = manager.get_window("conv1", max_tokens=100)
+        assert [m["content"].split()[1] for m in window] == ["2", "3", "4", "5"]
+    
+    def test_window_opens_with_user_turn(self):
+        """Test that a leading assistant turn is left out"""
+        manager = ConversationManager(max_history=20)
+        self.add_turns(manager, [10, 10, 10, 10, 10])
+        
+        window, _ = manager.get_window("conv1", max_tokens=45)
+        assert window[0]["role"] == "user"
+        assert len(window) == 3
+    
+    def test_whole_history_opens_with_user_turn(self):
+        """Test that a history that fits still drops an assistant turn left first by eviction"""
+        manager = ConversationManager(max_history=3)
+        self.add_turns(manager, [10, 10, 10, 10])  # turn 0 (user) evicted; turn 1 is the assistant's
+        
+        window, summary = manager.get_window("conv1", max_tokens=100)
+        assert [m["content"].split()[1] for m in window] == ["2", "3"]
+        assert window[0]["role"] == "user"
+        assert summary is None
+    
+    def test_running_total_tracks_eviction(self):
+        """Test that dropping the oldest message updates the token total"""
+        manager = ConversationManager(max_history=2)
+        self.add_turns(manager, [100, 10, 20])
+        
+        assert manager._conversation_cache["conv1"].token_total == 30
+    
+    def test_summary_of_older_turns_is_cached(self):
+        """Test that older turns are compacted once per window position"""
+        calls = []
+        def summarizer(messages, max_tokens):
+            calls.append(len(messages))
+            return f"{len(messages)} earlier turns"
+        manager = ConversationManager(max_history=20, summary_max_tokens=20, summarizer=summarizer)
+        self.add_turns(manager, [50, 50, 10, 10])
+        
+        first = manager.get_window("conv1", max_tokens=60)
+        second = manager.get_window("conv1", max_tokens=60)
+        assert first == second
+        assert first[1] == "2 earlier turns"
+        assert calls == [2]
+        
+        self.add_turns(manager, [10, 10])  # same older turns: still cached
+        manager.get_window("conv1", max_tokens=60)
+        assert calls == [2]
+        
+        self.add_turns(manager, [10, 10])  # the window moved
+        manager.get_window("conv1", max_tokens=60)
+        assert calls == [2, 4]
+    
+    def test_default_summary_respects_budget(self):
+        """Test that the extractive summary stays within its token allowance"""
+        manager = ConversationManager(max_history=20, summary_max_tokens=25)
+        self.add_turns(manager, [200, 200, 200, 10, 10])
+        
+        window, summary = manager.get_window("conv1", max_tokens=50)
+        assert summary.startswith("user: turn 0")
+        assert TokenCounter.estimate_tokens(summary) <= 25
+        assert len(window) == 1
 
 class TestTokenCounter:
     """Test O(n) token counting algorithm"""
@@ -94,6 +239,34 @@ class TestRateLimiter:
         assert limiter.is_allowed("user2") == True
         assert limiter.is_allowed("user1") == False
         assert limiter.is_allowed("user2") == False
+    
+    def test_steady_refill(self):
+        """Test that one request is admitted per emission interval after a burst"""
+        clock = [0.0]
+        limiter = RateLimiter(max_requests=10, window_seconds=60, clock=lambda: clock[0])
+        
+        assert sum(limiter.is_allowed("user1") for _ in range(20)) == 10
+        clock[0] = 6.0  # 60s / 10 requests
+        assert limiter.is_allowed("user1") == True
+        assert limiter.is_allowed("user1") == False
+    
+    def test_one_float_per_identifier(self):
+        """Test that each identifier stores a single arrival time"""
+        limiter = RateLimiter(max_requests=5, window_seconds=60)
+        limiter.is_allowed("user1")
+        
+        assert isinstance(limiter._tats["user1"], float)
+    
+    def test_sweep_drops_idle_identifiers(self):
+        """Test that memory is bounded by clients active within the window"""
+        clock = [0.0]
+        limiter = RateLimiter(max_requests=10, window_seconds=60, clock=lambda: clock[0])
+        for i in range(10000):
+            limiter.is_allowed(f"user{i}")
+        
+        clock[0] = 61.0
+        limiter.is_allowed("active")
+        assert list(limiter._tats) == ["active"]
 
 class TestInputValidation:
     """Test O(n) input validation complexity"""
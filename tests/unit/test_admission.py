@@ -0,0 +1,220 @@
+"""
+Unit tests for admission control and load shedding at the trigger
+"""
+
+import json
+import sys
+
+import pytest
+
+from benchmarks import bench_admission
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def trigger(aws):
+    return load_handler('trigger', aws)
+
+
+@pytest.fixture()
+def logger(aws):
+    return load_handler('pipeline_logger', aws)
+
+
+@pytest.fixture(autouse=True)
+def fresh_reconcile_schedule(trigger):
+    # The per-container reconcile schedule lives in the shared admission module
+    sys.modules[trigger.ConcurrencyBudget.__module__]._next_reconcile.clear()
+
+
+def trigger_event(text='Explain the CAP theorem', client='10.0.0.1'):
+    return {
+        'body': json.dumps({'input': text, 'mode': 'async'}),
+        'requestContext': {'identity': {'sourceIp': client}}
+    }
+
+
+class TestClientRateLimiter:
+    """Test the per-client token buckets"""
+
+    def test_burst_then_refill(self, trigger):
+        """A client may burst, is then limited, and recovers at the refill rate"""
+        limiter = trigger.ClientRateLimiter(rate=2.0, burst=3.0)
+
+        assert [limiter.try_acquire('c', now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.try_acquire('c', now=0.0) == pytest.approx(0.5)
+        assert limiter.try_acquire('c', now=0.5) == 0.0
+
+    def test_clients_are_independent(self, trigger):
+        """One client exhausting its bucket does not affect another"""
+        limiter = trigger.ClientRateLimiter(rate=1.0, burst=1.0)
+        limiter.try_acquire('a', now=0.0)
+
+        assert limiter.try_acquire('a', now=0.0) > 0
+        assert limiter.try_acquire('b', now=0.0) == 0.0
+
+    def test_client_table_is_bounded(self, trigger):
+        """Only the most recently seen clients are tracked"""
+        limiter = trigger.ClientRateLimiter(max_clients=100)
+        for i in range(1000):
+            limiter.try_acquire(f"client-{i}", now=0.0)
+        assert len(limiter._buckets) == 100
+
+
+class TestConcurrencyBudget:
+    """Test the global in-flight budget and priority shares"""
+
+    def test_priority_ceilings(self, trigger, aws):
+        """Bulk work stops at half the budget while interactive work may fill it"""
+        budget = trigger.ConcurrencyBudget(aws.table('PipelineAdmission'), limit=10)
+
+        bulk = sum(budget.try_acquire('bulk') for _ in range(10))
+        interactive = sum(budget.try_acquire('interactive') for _ in range(10))
+
+        assert bulk == 5
+        assert interactive == 5
+        assert budget.in_flight() == 10
+
+    def test_release_never_goes_negative(self, trigger, aws):
+        """Releasing an empty budget leaves it at zero"""
+        budget = trigger.ConcurrencyBudget(aws.table('PipelineAdmission'), limit=10)
+        budget.try_acquire()
+        budget.release()
+        budget.release()
+        assert budget.in_flight() == 0
+
+    def test_priority_estimate(self, trigger):
+        """Known complexity maps directly; otherwise length decides"""
+        assert trigger.estimate_priority('short') == 'interactive'
+        assert trigger.estimate_priority('x' * 500) == 'standard'
+        assert trigger.estimate_priority('x' * 5000) == 'bulk'
+        assert trigger.estimate_priority('short', 'high') == 'bulk'
+
+
+class TestTriggerAdmission:
+    """Test the 429 and 503 responses of /trigger"""
+
+    def test_rate_limited_client_gets_429(self, trigger, aws, monkeypatch):
+        """A client over its bucket is rejected with Retry-After before any work"""
+        monkeypatch.setattr(trigger, 'client_limiter', trigger.ClientRateLimiter(rate=0.5, burst=2))
+
+        statuses = [trigger.lambda_handler(trigger_event(), FakeContext())['statusCode'] for _ in range(3)]
+        response = trigger.lambda_handler(trigger_event(), FakeContext())
+        other = trigger.lambda_handler(trigger_event(client='10.0.0.2'), FakeContext())
+
+        assert statuses[:2] == [200, 200] and statuses[2] == 429
+        assert response['statusCode'] == 429
+        assert int(response['headers']['Retry-After']) >= 1
+        assert other['statusCode'] == 200
+        assert len(aws.stepfunctions.executions) == 1
+
+    def test_full_budget_sheds_with_503(self, trigger, aws, monkeypatch):
+        """Once the global budget is used up, new executions are shed"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 2)
+
+        responses = [
+            trigger.lambda_handler(trigger_event(f"Question {i}", client=f"10.0.0.{i}"), FakeContext())
+            for i in range(3)
+        ]
+
+        assert [r['statusCode'] for r in responses] == [200, 200, 503]
+        assert int(responses[2]['headers']['Retry-After']) >= trigger.ADMISSION_RETRY_AFTER_SECONDS
+        assert len(aws.stepfunctions.executions) == 2
+
+    def test_shed_request_releases_idempotency_claim(self, trigger, aws, monkeypatch):
+        """A shed request can be resubmitted once capacity frees up"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 1)
+        trigger.lambda_handler(trigger_event("first"), FakeContext())
+
+        assert trigger.lambda_handler(trigger_event("second"), FakeContext())['statusCode'] == 503
+        trigger.get_concurrency_budget().release()
+        response = trigger.lambda_handler(trigger_event("second"), FakeContext())
+
+        assert response['statusCode'] == 200
+        assert 'deduplicated' not in json.loads(response['body'])
+
+    def test_logger_returns_slot(self, trigger, logger, aws, monkeypatch):
+        """The logger releases the slot named in the execution state"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 1)
+        trigger.lambda_handler(trigger_event("first"), FakeContext())
+        execution = next(iter(aws.stepfunctions.executions.values()))
+
+        logger.lambda_handler(json.loads(execution['input']), None)
+
+        assert trigger.get_concurrency_budget().in_flight() == 0
+        assert trigger.lambda_handler(trigger_event("second"), FakeContext())['statusCode'] == 200
+
+    def test_logger_returns_slot_when_logging_fails(self, trigger, logger, aws, monkeypatch):
+        """A logger that raises still releases the execution's slot"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 1)
+        trigger.lambda_handler(trigger_event("first"), FakeContext())
+        execution = next(iter(aws.stepfunctions.executions.values()))
+
+        def fail(execution_data):
+            raise RuntimeError('DynamoDB unavailable')
+
+        monkeypatch.setattr(logger, 'log_to_dynamodb', fail)
+        with pytest.raises(RuntimeError):
+            logger.lambda_handler(json.loads(execution['input']), None)
+
+        assert trigger.get_concurrency_budget().in_flight() == 0
+
+    def test_lost_release_is_reconciled(self, trigger, aws, monkeypatch):
+        """Slots of executions that ended without the logger are recovered from the running count"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 2)
+        for i in range(2):
+            trigger.lambda_handler(trigger_event(f"Question {i}", client=f"10.0.0.{i}"), FakeContext())
+        # One execution times out: the logger never runs, so its slot is never released
+        timed_out = next(iter(aws.stepfunctions.executions))
+        aws.stepfunctions.complete_execution(timed_out, {}, status='TIMED_OUT')
+
+        response = trigger.lambda_handler(trigger_event("Question 2", client='10.0.0.2'), FakeContext())
+
+        assert response['statusCode'] == 200
+        assert trigger.get_concurrency_budget().in_flight() == 2
+
+    def test_reconcile_runs_once_per_interval(self, trigger, aws):
+        """Reconciling is skipped within the interval, across containers too"""
+        table = aws.table('PipelineAdmission')
+        budget = trigger.ConcurrencyBudget(table, limit=10)
+        budget.try_acquire()
+
+        assert budget.reconcile(lambda: 0, interval_seconds=60) == 0
+        assert budget.reconcile(lambda: 5, interval_seconds=60) is None
+        # Another container has its own schedule but sees the shared reconciled_at
+        sys.modules[trigger.ConcurrencyBudget.__module__]._next_reconcile.clear()
+        assert budget.reconcile(lambda: 5, interval_seconds=60) is None
+        assert budget.in_flight() == 0
+
+    def test_batch_items_rejected_over_budget(self, trigger, aws, monkeypatch):
+        """Batch items beyond the bulk share are rejected individually"""
+        monkeypatch.setattr(trigger, 'ADMISSION_MAX_IN_FLIGHT', 10)
+        event = {'resource': '/trigger/batch', 'body': json.dumps({'inputs': [f"q{i}" for i in range(8)]})}
+
+        body = json.loads(trigger.lambda_handler(event, None)['body'])
+
+        assert body['started'] == 5
+        assert body['rejected'] == 3
+        assert body['failed'] == 0
+
+
+class TestOverloadBenchmark:
+    """Test the synthetic overload benchmark"""
+
+    def test_budget_holds_under_overload(self):
+        """Shedding keeps in-flight work at the budget and favours interactive requests"""
+        report = bench_admission.run_overload(duration=10, limit=50)
+
+        assert report['peak_in_flight'] <= 50 < report['peak_in_flight_without_shedding']
+        admit_rate = {priority: counts['admitted'] / counts['offered']
+                      for priority, counts in report['by_priority'].items()}
+        assert admit_rate['interactive'] > admit_rate['standard'] > admit_rate['bulk']
+        assert report['by_tenant']['normal']['admit_rate'] > report['by_tenant']['noisy']['admit_rate']
+        offered = sum(counts['offered'] for counts in report['by_priority'].values())
+        assert offered == report['offered']
@@ -0,0 +1,253 @@
+"""
+Unit tests for online anomaly detection and its replay harness
+"""
+
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from benchmarks import replay_anomalies
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def analytics(aws):
+    return load_handler('analytics', aws)
+
+
+@pytest.fixture()
+def live(aws):
+    return load_handler('live_metrics', aws)
+
+
+@pytest.fixture()
+def anomaly(analytics):
+    # anomaly is importable once the analytics CodeUri is on sys.path
+    return sys.modules[analytics.DynamoDBAnomalyStore.__module__]
+
+
+def log_item(i, processing_ms, complexity='high', start=None):
+    return {
+        'execution_id': f"exec_{i}",
+        'timestamp': ((start or datetime(2026, 1, 1)) + timedelta(seconds=i)).isoformat(),
+        'complexity': complexity,
+        'category': 'technical',
+        'success': True,
+        'total_processing_time_ms': Decimal(str(round(processing_ms, 1))),
+        'quality_score': Decimal('0.8')
+    }
+
+
+def latencies(count, seed=3, factor=lambda i: 1.0):
+    rng = random.Random(seed)
+    return [800 * rng.lognormvariate(0, 0.15) * factor(i) for i in range(count)]
+
+
+class TestDetector:
+    """Test the EWMA/EWMV detector on single series"""
+
+    def test_noise_is_quiet_and_state_stays_small(self, anomaly):
+        """Stationary noise rarely opens an anomaly and the state does not grow"""
+        monitor = anomaly.AnomalyMonitor()
+        sizes, events = [], []
+        for i, value in enumerate(latencies(3000)):
+            events.extend(monitor.observe_item(log_item(i, value)))
+            if i in (100, 2999):
+                sizes.append(len(json.dumps(monitor.states)))
+
+        assert len(events) <= 1
+        assert sizes[1] < sizes[0] + 64
+
+    def test_a_step_regression_is_caught_quickly(self, anomaly):
+        """A 30% latency step opens one shift anomaly within a few observations"""
+        monitor = anomaly.AnomalyMonitor()
+        events = []
+        for i, value in enumerate(latencies(1000, factor=lambda i: 1.3 if i >= 500 else 1.0)):
+            events.extend((i, event) for event in monitor.observe_item(log_item(i, value)))
+
+        first, event = events[0]
+        assert 500 <= first < 530
+        assert event['series'] == 'processing_time|complexity=high'
+        assert event['kind'] in ('shift', 'spike')
+        assert event['baseline'] == pytest.approx(800, rel=0.1)
+
+    def test_a_gradual_ramp_is_caught(self, anomaly):
+        """Latency creeping up by 0.1% per execution is flagged as a shift"""
+        monitor = anomaly.AnomalyMonitor()
+        kinds = []
+        for i, value in enumerate(latencies(1500, factor=lambda i: 1 + max(0, i - 500) / 1000)):
+            kinds.extend(event['kind'] for event in monitor.observe_item(log_item(i, value)))
+
+        assert 'shift' in kinds
+
+    def test_an_outlier_does_not_inflate_the_baseline(self, anomaly):
+        """One huge value is flagged as a spike and barely moves the state"""
+        detector = anomaly.Detector()
+        state = anomaly.initial_state()
+        for value in latencies(300):
+            detector.update(state, value)
+        before = dict(state)
+
+        assert detector.update(state, 80000.0)[0] == 'spike'
+        assert state['var'] < before['var'] * 1.2
+        assert state['mean'] < before['mean'] * 1.02
+
+    def test_anomalous_status_expires_without_observations(self, anomaly):
+        """A series that stops reporting leaves `active`, and opens a new event if it returns anomalous"""
+        clock = [1000.0]
+        monitor = anomaly.AnomalyMonitor(max_age_seconds=3600, clock=lambda: clock[0])
+        values = latencies(600, factor=lambda i: 1.5 if i >= 500 else 1.0)
+        opened = [event for i, value in enumerate(values[:550]) for event in monitor.observe_item(log_item(i, value))]
+        assert len(opened) == 1
+        assert [active['series'] for active in monitor.snapshot()['active']] == ['processing_time|complexity=high']
+
+        clock[0] += 3601
+        assert monitor.snapshot()['active'] == []
+        assert monitor.observe_item(log_item(550, values[550]))[0]['series'] == 'processing_time|complexity=high'
+
+    def test_low_quality_is_the_bad_direction(self, anomaly):
+        """Quality scores are flagged when they drop, not when they rise"""
+        detector = anomaly.Detector()
+        state = anomaly.initial_state()
+        rng = random.Random(5)
+        for _ in range(300):
+            detector.update(state, 0.8 + rng.gauss(0, 0.02), 'low')
+
+        assert detector.update(dict(state), 0.99, 'low') is None
+        assert detector.update(dict(state), 0.5, 'low')[0] == 'spike'
+
+
+class TestStreamDetection:
+    """Test detection from the log table stream and reporting through /analytics"""
+
+    def test_anomalies_reach_the_table_cloudwatch_and_analytics(self, aws, live, analytics):
+        """A regression in streamed executions is stored, counted and reported"""
+        records = []
+        log_table = aws.table(analytics.table_name)
+        log_table.add_stream_listener(records.append)
+        start = datetime.utcnow() - timedelta(hours=1)
+        values = latencies(400, factor=lambda i: 1.5 if i >= 300 else 1.0)
+        results = []
+        for batch in range(0, 400, 100):
+            records.clear()
+            for i in range(batch, batch + 100):
+                log_table.put_item(Item=log_item(i, values[i], start=start))
+            results.append(live.lambda_handler({'Records': list(records)}, None))
+
+        assert [result['anomalies'] for result in results[:3]] == [0, 0, 0]
+        assert results[3]['anomalies'] >= 1
+        [metric] = [data for call in aws.cloudwatch.metric_data for data in call['MetricData']
+                    if data['MetricName'] == 'PipelineAnomalies']
+        assert metric['Value'] == results[3]['anomalies']
+
+        state = aws.table(live.anomaly_table_name).get_item(
+            Key={'series': 'processing_time|complexity=high'})['Item']
+        assert state['n'] == 400
+        assert state['version'] == 4
+
+        body = json.loads(analytics.lambda_handler({'queryStringParameters': {'hours': '2'}}, None)['body'])
+        assert body['anomalies']['series'] == 2
+        assert body['anomalies']['recent'][0]['series'] == 'processing_time|complexity=high'
+        assert body['anomalies']['recent'][0]['at'] >= log_item(300, 0, start=start)['timestamp']
+        assert [active['series'] for active in body['anomalies']['active']] == ['processing_time|complexity=high']
+
+    def test_updates_are_not_observed_twice(self, aws, live, analytics):
+        """Changing an already logged execution does not feed the detectors again"""
+        records = []
+        log_table = aws.table(analytics.table_name)
+        log_table.add_stream_listener(records.append)
+        log_table.put_item(Item=log_item(1, 700))
+        log_table.update_item(Key={'execution_id': 'exec_1'}, UpdateExpression='SET success = :f',
+                              ExpressionAttributeValues={':f': False})
+
+        assert [record['eventName'] for record in records] == ['INSERT', 'MODIFY']
+        assert [execution['execution_id'] for execution in live.new_executions(records)] == ['exec_1']
+
+    def test_concurrent_writers_retry_on_the_version(self, aws, anomaly):
+        """A batch that loses the version race re-reads and applies on top"""
+        table = aws.table('PipelineAnomalies')
+        first = anomaly.DynamoDBAnomalyStore(table)
+        second = anomaly.DynamoDBAnomalyStore(table)
+        first.observe_items([log_item(0, 800)])
+
+        original_get = table.get_item
+        raced = []
+
+        def racing_get_item(**kwargs):
+            response = original_get(**kwargs)
+            if not raced:
+                raced.append(True)
+                first.observe_items([log_item(1, 810)])
+            return response
+
+        table.get_item = racing_get_item
+        second.observe_items([log_item(2, 790)])
+
+        item = original_get(Key={'series': 'processing_time|complexity=high'})['Item']
+        assert item['n'] == 3
+        assert item['version'] == 3
+
+    def test_stored_status_expires_by_age(self, aws, anomaly):
+        """The table's last update time decides whether a stored anomaly is still active"""
+        clock = [1000.0]
+        store = anomaly.DynamoDBAnomalyStore(aws.table('PipelineAnomalies'), clock=lambda: clock[0])
+        values = latencies(400, factor=lambda i: 1.5 if i >= 300 else 1.0)
+        store.observe_items([log_item(i, value) for i, value in enumerate(values)])
+        assert len(store.snapshot()['active']) == 1
+
+        clock[0] += anomaly.ACTIVE_SECONDS + 1
+        assert store.snapshot()['active'] == []
+
+    def test_analytics_survives_a_missing_anomaly_table(self, aws, analytics):
+        """A failing anomaly read leaves the rest of /analytics intact"""
+        def broken_scan(**kwargs):
+            raise RuntimeError('table not found')
+
+        aws.table(analytics.anomaly_table_name).scan = broken_scan
+        response = analytics.lambda_handler({'queryStringParameters': None}, None)
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['anomalies']['error'] == 'unavailable'
+
+
+class TestReplayHarness:
+    """Test the synthetic replay harness"""
+
+    def test_scenarios_are_told_apart(self):
+        """Noise stays quiet while spikes, steps and ramps are caught"""
+        report = replay_anomalies.run_replay(points=2000, seed=7)
+        rows = {row['scenario']: row for row in report['scenarios']}
+
+        assert rows['noise']['events'] == 0
+        assert rows['spikes']['spikes_caught'] == rows['spikes']['spikes']
+        assert rows['step']['detected'] and rows['step']['delay'] < 50
+        assert rows['ramp']['detected']
+        assert all(row['false_alarms'] == 0 for row in rows.values())
+
+    def test_exported_scans_replay(self, tmp_path):
+        """A DynamoDB scan export replays in timestamp order"""
+        from boto3.dynamodb.types import TypeSerializer
+        serializer = TypeSerializer()
+        values = latencies(300, factor=lambda i: 2.0 if i >= 200 else 1.0)
+        items = [log_item(i, value) for i, value in enumerate(values)]
+        random.Random(1).shuffle(items)
+        path = tmp_path / 'scan.json'
+        path.write_text(json.dumps({'Items': [
+            {name: serializer.serialize(value) for name, value in item.items()} for item in items
+        ]}))
+
+        report = replay_anomalies.replay_items(str(path))
+
+        assert report['items'] == 300
+        assert report['recent'][0]['at'] >= '2026-01-01T00:03:20'
+        assert report['recent'][0]['series'] == 'processing_time|complexity=high'
@@ -0,0 +1,104 @@
+"""
+Unit tests for the shared lazy AWS client factory
+"""
+
+import pytest
+
+import aws_clients
+from local.fakes import FakeTable, LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    aws_clients.reset_clients()
+    yield
+    aws_clients.reset_clients()
+
+
+class TestClientFactory:
+    """Test lazy creation, caching and configuration"""
+
+    def test_lazy_client_created_on_first_use(self):
+        """Declaring a client costs nothing until an attribute is used"""
+        sqs = aws_clients.lazy_client('sqs')
+        assert aws_clients._instances == {}
+
+        assert sqs.meta.service_model.service_name == 'sqs'
+        assert len(aws_clients._instances) == 1
+
+    def test_clients_are_shared(self):
+        """Every lazy reference with the same configuration shares one client"""
+        first = aws_clients.lazy_client('stepfunctions')
+        second = aws_clients.lazy_client('stepfunctions')
+
+        assert first.meta is second.meta
+        assert aws_clients.get_client('stepfunctions') is aws_clients.get_client('stepfunctions')
+        assert aws_clients.get_client('stepfunctions', max_pool_connections=32) is not \
+            aws_clients.get_client('stepfunctions')
+
+    def test_resolve_builds_the_shared_client(self):
+        """resolve() returns the same client attribute access would use"""
+        table = aws_clients.lazy_table('PipelineLogs')
+
+        assert table.resolve() is aws_clients.get_table('PipelineLogs')
+        assert table.resolve().name == 'PipelineLogs'
+
+    def test_config_from_environment(self, monkeypatch):
+        """Pool size, timeouts, retries and keep-alive come from the environment"""
+        monkeypatch.setenv('BOTO_MAX_POOL_CONNECTIONS', '64')
+        monkeypatch.setenv('BOTO_READ_TIMEOUT', '3')
+        monkeypatch.setenv('BOTO_RETRY_MODE', 'adaptive')
+        monkeypatch.setenv('BOTO_MAX_ATTEMPTS', '5')
+
+        config = aws_clients.client_config()
+
+        assert config.max_pool_connections == 64
+        assert config.read_timeout == 3.0
+        assert config.retries == {'mode': 'adaptive', 'max_attempts': 5}
+        assert config.tcp_keepalive is True
+
+    def test_overrides_win(self):
+        """Per-client overrides replace the environment defaults"""
+        client = aws_clients.get_client('bedrock-runtime', read_timeout=60)
+        assert client.meta.config.read_timeout == 60
+        assert client.meta.config.connect_timeout == 2.0
+
+    def test_endpoint_url_goes_to_the_client(self):
+        """An endpoint override addresses the client rather than its Config"""
+        endpoint = 'https://abc123.execute-api.us-east-1.amazonaws.com/live'
+        client = aws_clients.get_client('apigatewaymanagementapi', endpoint_url=endpoint)
+
+        assert client.meta.endpoint_url == endpoint
+
+    def test_tables_share_one_resource(self):
+        """Lazy tables resolve to Table objects on the shared DynamoDB resource"""
+        logs = aws_clients.lazy_table('PipelineLogs')
+        results = aws_clients.lazy_table('PipelineResults')
+
+        assert logs.name == 'PipelineLogs'
+        assert results.name == 'PipelineResults'
+        assert len([key for key in aws_clients._instances if key[0] == 'resource']) == 1
+
+
+class TestHandlers:
+    """Test that handlers defer client creation and skip control-plane calls"""
+
+    @pytest.mark.parametrize('name', ['trigger', 'results', 'pipeline_logger', 'analytics', 'chatbot'])
+    def test_import_creates_no_clients(self, name):
+        """Loading a handler builds no boto3 client"""
+        load_handler(name, LocalAWS())
+        assert aws_clients._instances == {}
+
+    def test_analytics_makes_no_describe_table_call(self, monkeypatch):
+        """The analytics API reads the table without a per-request DescribeTable"""
+        aws = LocalAWS()
+        analytics = load_handler('analytics', aws)
+
+        def describe_table(self):
+            raise AssertionError('table_status triggers DescribeTable')
+
+        monkeypatch.setattr(FakeTable, 'table_status', property(describe_table), raising=False)
+        response = analytics.lambda_handler({'queryStringParameters': None}, None)
+
+        assert response['statusCode'] == 200
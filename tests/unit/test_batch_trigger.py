@@ -0,0 +1,122 @@
+"""
+Unit tests for the concurrent /trigger/batch endpoint
+"""
+
+import json
+import time
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def trigger(aws, monkeypatch):
+    module = load_handler('trigger', aws)
+    monkeypatch.setattr(module, 'backoff_delay', lambda attempt: 0)
+    return module
+
+
+def batch_event(inputs):
+    return {'resource': '/trigger/batch', 'httpMethod': 'POST', 'body': json.dumps({'inputs': inputs})}
+
+
+class TestBatchEndpoint:
+    """Test the API contract of /trigger/batch"""
+
+    def test_starts_every_input_in_order(self, trigger, aws):
+        """Each input gets a per-item status in submission order"""
+        inputs = [f"Question number {i}" for i in range(100)]
+
+        response = trigger.lambda_handler(batch_event(inputs), None)
+        body = json.loads(response['body'])
+
+        assert response['statusCode'] == 200
+        assert body['started'] == 100
+        assert [item['index'] for item in body['executions']] == list(range(100))
+        assert all(item['status'] == 'started' for item in body['executions'])
+        assert len(aws.stepfunctions.executions) == 100
+
+    def test_names_unique_across_batches(self, trigger, aws):
+        """Identical batches submitted back to back never collide"""
+        inputs = ["same input"] * 50
+
+        first = json.loads(trigger.lambda_handler(batch_event(inputs), None)['body'])
+        second = json.loads(trigger.lambda_handler(batch_event(inputs), None)['body'])
+
+        assert first['batch_id'] != second['batch_id']
+        assert first['started'] == second['started'] == 50
+        assert len(aws.stepfunctions.executions) == 100
+
+    def test_invalid_items_reported(self, trigger):
+        """Empty or non-string items fail individually"""
+        body = json.loads(trigger.lambda_handler(batch_event(["ok", "", 42]), None)['body'])
+
+        assert [item['status'] for item in body['executions']] == ['started', 'failed', 'failed']
+        assert body['executions'][1]['error'] == 'No input provided'
+
+    def test_rejects_oversized_batch(self, trigger):
+        """Batches above BATCH_MAX_ITEMS are rejected up front"""
+        response = trigger.lambda_handler(batch_event(["x"] * (trigger.BATCH_MAX_ITEMS + 1)), None)
+        assert response['statusCode'] == 400
+
+    def test_rejects_missing_inputs(self, trigger):
+        """A body without an inputs list is a client error"""
+        response = trigger.lambda_handler({'resource': '/trigger/batch', 'body': '{}'}, None)
+        assert response['statusCode'] == 400
+
+
+class TestThrottling:
+    """Test retries and adaptive concurrency under throttling"""
+
+    def test_throttled_starts_are_retried(self, trigger, aws, monkeypatch):
+        """Throttled StartExecution calls are retried until they succeed"""
+        monkeypatch.setattr(trigger, 'BATCH_MAX_ATTEMPTS', 20)
+        aws.stepfunctions.throttle_rate = 0.3
+        inputs = [f"input {i}" for i in range(200)]
+
+        results = trigger.handle_batch_execution(inputs)
+
+        assert all(item['status'] == 'started' for item in results)
+        assert max(item['attempts'] for item in results) > 1
+        assert aws.stepfunctions.start_calls > 200
+
+    def test_gives_up_after_max_attempts(self, trigger, aws):
+        """Persistent throttling fails the item after BATCH_MAX_ATTEMPTS"""
+        aws.stepfunctions.throttle_rate = 1.0
+
+        results = trigger.handle_batch_execution(["input"])
+
+        assert results[0]['status'] == 'failed'
+        assert results[0]['attempts'] == trigger.BATCH_MAX_ATTEMPTS
+        assert 'ThrottlingException' in results[0]['error']
+
+    def test_runs_concurrently(self, trigger, aws):
+        """Wall time is far below the serial sum of call latencies"""
+        aws.stepfunctions.latency_s = 0.01
+        inputs = [f"input {i}" for i in range(200)]
+
+        started = time.time()
+        results = trigger.handle_batch_execution(inputs, max_concurrency=32)
+        elapsed = time.time() - started
+
+        assert all(item['status'] == 'started' for item in results)
+        assert elapsed < 200 * 0.01 / 2
+
+    def test_limiter_aimd(self, trigger):
+        """The limit halves on throttling and grows after a window of successes"""
+        limiter = trigger.AdaptiveConcurrencyLimiter(initial=8, maximum=16, cooldown_seconds=60)
+
+        limiter.on_throttle()
+        limiter.on_throttle()  # within cooldown: ignored
+        assert limiter.limit == 4
+
+        for _ in range(4):
+            limiter.on_success()
+        assert limiter.limit == 5
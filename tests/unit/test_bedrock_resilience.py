@@ -0,0 +1,281 @@
+"""
+Unit tests for retries, hedging and circuit breaking around Bedrock calls
+"""
+
+import json
+import random
+import sys
+import time
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+from local.fakes import FakeContext, LocalAWS, client_error
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def chatbot(aws, monkeypatch):
+    monkeypatch.setenv('BEDROCK_RETRY_BASE_SECONDS', '0.001')
+    monkeypatch.setenv('BEDROCK_BREAKER_FAILURES', '3')
+    monkeypatch.setenv('RESPONSE_CACHE_TTL_SECONDS', '0')
+    return load_handler('chatbot', aws)
+
+
+@pytest.fixture()
+def resilience(chatbot):
+    # resilience is importable once the chatbot's CodeUri is on sys.path
+    return sys.modules[chatbot.ResilientInvoker.__module__]
+
+
+def throttled():
+    return client_error('ThrottlingException', 'Too many requests', 'InvokeModel')
+
+
+def unavailable():
+    return client_error('ServiceUnavailableException', 'Service unavailable', 'InvokeModel')
+
+
+def chat_event(text='Hello', stream=False):
+    return {
+        'body': json.dumps({'message': text, 'stream': stream}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRetries:
+    """Test jittered retries bounded by the deadline"""
+
+    def test_throttled_call_is_retried(self, chatbot, aws):
+        """Two throttles then a reply is a 200 after three calls"""
+        aws.bedrock.inject(2, error=throttled())
+        response = chatbot.lambda_handler(chat_event(), FakeContext())
+
+        assert response['statusCode'] == 200
+        assert len(aws.bedrock.calls) == 3
+        assert chatbot.bedrock_invoker.stats()['retries'] == 2
+
+    def test_client_errors_are_not_retried(self, chatbot, aws):
+        """A malformed request fails once instead of four times"""
+        aws.bedrock.inject(error=client_error('ValidationException', 'bad input', 'InvokeModel'))
+        response = chatbot.lambda_handler(chat_event(), FakeContext())
+
+        assert response['statusCode'] == 500
+        assert len(aws.bedrock.calls) == 1
+
+    def test_retryable_classification(self, resilience):
+        """Throttling, 5xx and connection errors retry; validation errors do not"""
+        server_error = ClientError({'Error': {'Code': 'Boom'}, 'ResponseMetadata': {'HTTPStatusCode': 503}}, 'Op')
+        assert resilience.is_retryable(throttled())
+        assert resilience.is_retryable(server_error)
+        assert resilience.is_retryable(EndpointConnectionError(endpoint_url='https://bedrock'))
+        assert resilience.is_retryable(ReadTimeoutError(endpoint_url='https://bedrock'))
+        assert not resilience.is_retryable(client_error('ValidationException', 'bad', 'Op'))
+
+    def test_backoff_is_jittered_and_capped(self, chatbot):
+        """Delays are spread over [0, min(cap, base * 2^n)]"""
+        invoker = chatbot.ResilientInvoker(base_delay_seconds=0.1, max_delay_seconds=0.5, rng=random.Random(7))
+        delays = [invoker.backoff(attempt) for attempt in range(1, 8) for _ in range(50)]
+
+        assert max(delays) <= 0.5
+        assert len(set(delays)) == len(delays)
+        assert max(invoker.backoff(1) for _ in range(50)) <= 0.1
+
+    def test_retries_stop_at_the_deadline(self, chatbot):
+        """No backoff is slept that would end past the deadline"""
+        clock = FakeClock()
+        invoker = chatbot.ResilientInvoker(max_attempts=100, base_delay_seconds=1, max_delay_seconds=1,
+                                           clock=clock, sleep=clock.sleep, rng=random.Random(1))
+        calls = []
+
+        def call():
+            calls.append(clock.now)
+            raise throttled()
+
+        with pytest.raises(ClientError):
+            invoker.call(call, deadline=5.0)
+        assert clock.now < 5.0
+        assert 1 < len(calls) < 100
+
+    def test_lambda_remaining_time_sets_the_deadline(self, chatbot):
+        """The deadline keeps the configured margin back from the Lambda timeout"""
+        deadline = chatbot.call_deadline(FakeContext(timeout_ms=10000))
+        expected = chatbot.bedrock_invoker.clock() + 10 - chatbot.DEADLINE_MARGIN_SECONDS
+
+        assert abs(deadline - expected) < 0.1
+        assert chatbot.call_deadline(None) is None
+
+    def test_stalled_call_ends_at_the_deadline(self, chatbot, aws):
+        """A call that outlives the deadline is abandoned rather than awaited"""
+        invoker = chatbot.ResilientInvoker()
+        aws.bedrock.inject(latency_s=0.5)
+
+        started = time.perf_counter()
+        with pytest.raises(chatbot.DeadlineExceeded):
+            invoker.call(lambda: aws.bedrock.invoke_model(modelId=None, body='{}'),
+                         deadline=invoker.clock() + 0.1)
+        assert time.perf_counter() - started < 0.3
+
+    def test_calls_on_the_pool_keep_the_request_context(self, chatbot):
+        """A call bounded by a deadline still sees the request's phase timer"""
+        timing = sys.modules[chatbot.phase.__module__]
+        timer = timing.PhaseTimer('test')
+        token = timing._current.set(timer)
+        try:
+            invoker = chatbot.ResilientInvoker()
+            assert invoker.call(timing.current_timer, deadline=invoker.clock() + 1) is timer
+        finally:
+            timing._current.reset(token)
+
+    def test_handler_answers_503_at_the_deadline(self, chatbot, aws):
+        """A stalled model call leaves the handler time to answer"""
+        aws.bedrock.inject(latency_s=0.5)
+        chatbot.DEADLINE_MARGIN_SECONDS = 0
+        response = chatbot.lambda_handler(chat_event(), FakeContext(timeout_ms=100))
+
+        assert response['statusCode'] == 503
+        assert 'Retry-After' in response['headers']
+
+    def test_stream_opening_is_retried(self, chatbot, aws):
+        """A throttled stream is reopened before any text is sent"""
+        aws.bedrock.inject(error=throttled())
+        body = ''.join(chatbot.stream_handler(chat_event(stream=True), FakeContext()))
+
+        assert 'event: done' in body
+        assert len(aws.bedrock.calls) == 2
+
+
+class TestCircuitBreaker:
+    """Test failing fast while the endpoint is unhealthy"""
+
+    def test_opens_after_consecutive_failures(self, chatbot):
+        """Calls are rejected without reaching the endpoint once open"""
+        clock = FakeClock()
+        breaker = chatbot.CircuitBreaker(failure_threshold=2, reset_timeout_seconds=10, clock=clock)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+
+        with pytest.raises(chatbot.CircuitOpen) as raised:
+            breaker.before_call()
+        assert raised.value.retry_after_seconds == 10
+        assert breaker.state == 'open'
+
+    def test_half_open_admits_one_probe(self, chatbot):
+        """After the cool-down one probe goes through and its success closes the breaker"""
+        clock = FakeClock()
+        breaker = chatbot.CircuitBreaker(failure_threshold=1, reset_timeout_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+
+        breaker.before_call()
+        with pytest.raises(chatbot.CircuitOpen):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+        assert breaker.state == 'closed'
+
+    def test_failed_probe_reopens(self, chatbot):
+        """A failing probe starts a new cool-down"""
+        clock = FakeClock()
+        breaker = chatbot.CircuitBreaker(failure_threshold=3, reset_timeout_seconds=10, clock=clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now = 10.0
+        breaker.before_call()
+        breaker.record_failure()
+
+        with pytest.raises(chatbot.CircuitOpen):
+            breaker.before_call()
+
+    def test_handler_fails_fast_with_retry_after(self, chatbot, aws):
+        """Once the breaker opens requests get 503 without calling Bedrock"""
+        chatbot.bedrock_invoker.max_attempts = 1
+        aws.bedrock.inject(3, error=unavailable())
+        for _ in range(3):
+            assert chatbot.lambda_handler(chat_event(), FakeContext())['statusCode'] == 500
+
+        response = chatbot.lambda_handler(chat_event(), FakeContext())
+        assert response['statusCode'] == 503
+        assert int(response['headers']['Retry-After']) == 30
+        assert len(aws.bedrock.calls) == 3
+
+    def test_throttling_does_not_open_the_breaker(self, chatbot, aws):
+        """Throttled calls are retried but leave the breaker closed"""
+        chatbot.bedrock_invoker.max_attempts = 1
+        aws.bedrock.inject(5, error=throttled())
+        for _ in range(5):
+            assert chatbot.lambda_handler(chat_event(), FakeContext())['statusCode'] == 500
+
+        assert chatbot.bedrock_invoker.breaker.state == 'closed'
+        assert chatbot.lambda_handler(chat_event(), FakeContext())['statusCode'] == 200
+
+    def test_throttled_probe_admits_another(self, chatbot):
+        """A half-open breaker whose probe is throttled lets the next probe through"""
+        clock = FakeClock()
+        breaker = chatbot.CircuitBreaker(failure_threshold=1, reset_timeout_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+
+        breaker.before_call()
+        breaker.record_throttle()
+        breaker.before_call()
+        assert breaker.state == 'half_open'
+
+
+class TestHedging:
+    """Test hedged requests after the p95 delay"""
+
+    def warm(self, invoker, aws):
+        def call():
+            return aws.bedrock.invoke_model(modelId=None, body='{}')
+        for _ in range(invoker.hedge_min_samples):
+            invoker.call(call)
+        return call
+
+    def test_no_hedge_until_latencies_are_known(self, chatbot):
+        """Without enough samples there is no p95 to hedge at"""
+        invoker = chatbot.ResilientInvoker(hedge=True)
+
+        assert invoker.hedge_delay() is None
+
+    def test_slow_call_is_hedged(self, chatbot, aws):
+        """A call slower than p95 is raced by a second one, which wins"""
+        invoker = chatbot.ResilientInvoker(hedge=True, hedge_min_samples=5, hedge_min_delay_seconds=0.01)
+        call = self.warm(invoker, aws)
+        aws.bedrock.inject(latency_s=0.5)
+
+        started = time.perf_counter()
+        invoker.call(call)
+
+        assert time.perf_counter() - started < 0.3
+        assert invoker.stats()['hedges'] == 1
+        assert invoker.stats()['hedge_wins'] == 1
+
+    def test_hedge_is_abandoned_at_the_deadline(self, chatbot, aws):
+        """When both calls stall the deadline ends the wait"""
+        invoker = chatbot.ResilientInvoker(hedge=True, hedge_min_samples=5, hedge_min_delay_seconds=0.01)
+        call = self.warm(invoker, aws)
+        aws.bedrock.inject(2, latency_s=0.5)
+
+        started = time.perf_counter()
+        with pytest.raises(chatbot.DeadlineExceeded):
+            invoker.call(call, deadline=invoker.clock() + 0.1)
+        assert time.perf_counter() - started < 0.3
@@ -0,0 +1,54 @@
+"""
+Unit tests for the benchmark harness and workload generator
+"""
+
+from benchmarks import bench_stages
+from benchmarks.workload import WorkloadGenerator
+
+
+class TestWorkloadGenerator:
+    """Test that workloads are reproducible and shaped as requested"""
+
+    def test_same_seed_same_workload(self):
+        """Two generators with one seed produce identical inputs"""
+        assert WorkloadGenerator(7).inputs(50) == WorkloadGenerator(7).inputs(50)
+
+    def test_controlled_input(self):
+        """Size, category keywords and question count are honoured"""
+        text = WorkloadGenerator(1).user_input(category='creative', size=300, questions=3)
+        assert text.endswith('???') and not text.endswith('????')
+        assert 290 <= len(text) <= 303
+
+    def test_log_items_within_window(self):
+        """Generated log items fall inside the requested window"""
+        items = WorkloadGenerator(3).log_items(100, hours=2)
+        hours = {item['hour'] for item in items}
+        assert len(items) == 100
+        assert len(hours) <= 3
+
+
+class TestBenchStages:
+    """Test the benchmark runner and baseline comparison"""
+
+    def test_run_suite_reports_metrics(self):
+        """Each benchmark reports throughput, percentiles and allocations"""
+        results = bench_stages.run_suite(iterations=20, only=['input_analyzer.lambda_handler'])
+        stats = results['input_analyzer.lambda_handler']
+        assert stats['operations'] == 20
+        assert stats['ops_per_sec'] > 0
+        assert stats['p50_us'] <= stats['p95_us'] <= stats['p99_us'] <= stats['max_us']
+        assert stats['alloc_peak_bytes'] >= 0
+
+    def test_compare_flags_regressions(self):
+        """Throughput drops and p95 increases past tolerance are reported"""
+        baseline = {'a': {'ops_per_sec': 1000, 'p95_us': 10}, 'b': {'ops_per_sec': 1000, 'p95_us': 10}}
+        results = {'a': {'ops_per_sec': 700, 'p95_us': 10}, 'b': {'ops_per_sec': 950, 'p95_us': 11}}
+        regressions = bench_stages.compare_to_baseline(results, baseline, tolerance=0.2)
+        assert [(r['benchmark'], r['metric']) for r in regressions] == [('a', 'ops_per_sec')]
+
+    def test_percentile_nearest_rank(self):
+        """Nearest-rank percentile of a sorted list"""
+        values = list(range(1, 101))
+        assert bench_stages.percentile(values, 50) == 50
+        assert bench_stages.percentile(values, 99) == 99
+        assert bench_stages.percentile([], 50) == 0.0
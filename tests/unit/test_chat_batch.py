@@ -0,0 +1,134 @@
+"""
+Unit tests for the batch chat endpoint
+"""
+
+import json
+import time
+
+import pytest
+
+from local.fakes import FakeContext, LocalAWS, client_error
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def chatbot(aws, monkeypatch):
+    monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '1000')
+    return load_handler('chatbot', aws)
+
+
+def batch_event(messages):
+    return {
+        'resource': '/chat/batch',
+        'path': '/chat/batch',
+        'body': json.dumps({'messages': messages}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}
+    }
+
+
+def run_batch(chatbot, messages):
+    response = chatbot.lambda_handler(batch_event(messages), FakeContext())
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+class TestBatchChat:
+    """Test bulk validation, ordering and per-item accounting"""
+
+    def test_results_keep_request_order(self, chatbot, aws):
+        """Each result carries its index and the reply for its prompt"""
+        aws.bedrock.latency_s = 0.01
+        body = run_batch(chatbot, [f"Question {i}" for i in range(10)])
+
+        assert [r['index'] for r in body['results']] == list(range(10))
+        assert body['succeeded'] == 10
+        sent = sorted(json.loads(call['body'])['messages'][0]['content'] for call in aws.bedrock.calls)
+        assert sent == sorted(f"Question {i}" for i in range(10))
+
+    def test_invalid_items_fail_alone(self, chatbot, aws):
+        """Bad prompts get a per-item 400 and are never sent to the model"""
+        body = run_batch(chatbot, ['Fine', '', 42, 'x' * 2001, 'Also fine'])
+
+        assert [r['status'] for r in body['results']] == ['ok', 'invalid', 'invalid', 'invalid', 'ok']
+        assert body['results'][1]['error'] == 'Message cannot be empty'
+        assert body['failed'] == 3
+        assert len(aws.bedrock.calls) == 2
+
+    def test_model_errors_fail_alone(self, chatbot, aws):
+        """A failing model call marks its item without failing the batch"""
+        aws.bedrock.inject(error=client_error('ValidationException', 'bad input', 'InvokeModel'))
+        body = run_batch(chatbot, ['one', 'two', 'three'])
+
+        assert sorted(r['status_code'] for r in body['results']) == [200, 200, 500]
+
+    def test_rate_limit_applies_per_item(self, aws, monkeypatch):
+        """Each prompt takes one request from the client's allowance"""
+        monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '3')
+        chatbot = load_handler('chatbot', aws)
+        body = run_batch(chatbot, ['a', 'b', 'c', 'd', 'e'])
+
+        assert [r['status_code'] for r in body['results']] == [200, 200, 200, 429, 429]
+        assert len(aws.bedrock.calls) == 3
+
+    def test_batches_share_the_chat_quota(self, aws, monkeypatch):
+        """Batching gets a client no more prompts than /chat allows"""
+        monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '10')
+        chatbot = load_handler('chatbot', aws)
+        chat_event = dict(batch_event([]), resource='/chat', path='/chat', body=json.dumps({'message': 'Hello'}))
+        assert chatbot.lambda_handler(chat_event, FakeContext())['statusCode'] == 200
+
+        answered = sum(run_batch(chatbot, [f"{batch}-{i}" for i in range(50)])['succeeded'] for batch in range(2))
+
+        assert answered == 9
+        assert len(aws.bedrock.calls) == 10
+        assert chatbot.lambda_handler(chat_event, FakeContext())['statusCode'] == 429
+
+    def test_tokens_are_counted_per_item(self, chatbot):
+        """Item token estimates add up to the batch totals"""
+        body = run_batch(chatbot, ['Short', 'A somewhat longer prompt'])
+        items = [r['estimated_tokens'] for r in body['results']]
+
+        assert items[0]['input'] < items[1]['input']
+        assert body['metadata']['estimated_tokens'] == {
+            key: sum(item[key] for item in items) for key in ('input', 'prompt', 'output')
+        }
+
+    def test_prompts_are_independent(self, chatbot, aws):
+        """Batch prompts are sent without history and leave none behind"""
+        run_batch(chatbot, ['first', 'second'])
+
+        assert all(len(json.loads(call['body'])['messages']) == 1 for call in aws.bedrock.calls)
+        assert chatbot.conversation_manager.stats()['conversations'] == 0
+
+    def test_throughput_scales_with_concurrency(self, chatbot, aws):
+        """Eight workers finish a batch of slow calls several times faster than one"""
+        aws.bedrock.latency_s = 0.05
+        durations = {}
+        for concurrency in (1, 8):
+            chatbot.CHAT_BATCH_MAX_CONCURRENCY = concurrency
+            started = time.perf_counter()
+            body = run_batch(chatbot, [f"c{concurrency} prompt {i}" for i in range(16)])
+            durations[concurrency] = time.perf_counter() - started
+            assert body['metadata']['concurrency'] == concurrency
+
+        assert durations[1] > 3 * durations[8]
+
+    @pytest.mark.parametrize('body, error', [
+        ({'messages': []}, "Request body must contain a non-empty 'messages' list"),
+        ({'message': 'hi'}, "Request body must contain a non-empty 'messages' list"),
+        ({'messages': ['hi'] * 51}, 'Batch too large (max 50 messages)'),
+    ])
+    def test_rejects_malformed_batches(self, chatbot, body, error):
+        """The whole request is rejected when the batch itself is malformed"""
+        event = batch_event([])
+        event['body'] = json.dumps(body)
+        response = chatbot.lambda_handler(event, FakeContext())
+
+        assert response['statusCode'] == 400
+        assert json.loads(response['body']) == {'error': error}
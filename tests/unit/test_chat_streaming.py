@@ -0,0 +1,136 @@
+"""
+Unit tests for streamed chat replies and time-to-first-token metrics
+"""
+
+import json
+import time
+
+import pytest
+
+from local.fakes import LocalAWS, client_error
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS(bedrock_reply="Streaming lets the user read the reply while it is written.")
+
+
+@pytest.fixture()
+def chatbot(aws):
+    return load_handler('chatbot', aws)
+
+
+def chat_event(text='Tell me about streaming', stream=True, source_ip='10.0.0.1'):
+    return {
+        'body': json.dumps({'message': text, 'stream': stream}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': source_ip}}
+    }
+
+
+def parse_frames(body):
+    frames = []
+    for block in body.strip().split('\n\n'):
+        event_line, data_line = block.split('\n')
+        frames.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+    return frames
+
+
+class TestStreamHandler:
+    """Test the response-streaming entry point"""
+
+    def test_chunks_arrive_before_generation_ends(self, chatbot, aws):
+        """The first frame is produced long before the reply is complete"""
+        aws.bedrock.chunk_latency_s = 0.01
+        started = time.perf_counter()
+        arrivals = []
+        for frame in chatbot.stream_handler(chat_event(), None):
+            arrivals.append(time.perf_counter() - started)
+
+        assert len(arrivals) > 3
+        assert arrivals[0] < arrivals[-1] / 2
+
+    def test_reply_is_assembled_and_recorded(self, chatbot, aws):
+        """The concatenated deltas are the reply recorded in the conversation"""
+        frames = parse_frames(''.join(chatbot.stream_handler(chat_event(), None)))
+        reply = ''.join(data['text'] for event, data in frames if event == 'delta')
+
+        assert reply == aws.bedrock.reply
+        conversation_id = chatbot.generate_conversation_id(chat_event())
+        history = chatbot.conversation_manager.get_history(conversation_id)
+        assert [m['content'] for m in history] == ['Tell me about streaming', reply]
+
+    def test_done_frame_carries_metrics(self, chatbot, aws):
+        """Token accounting uses Bedrock's output count and TTFT is reported"""
+        aws.bedrock.latency_s = 0.02
+        event, data = parse_frames(''.join(chatbot.stream_handler(chat_event(), None)))[-1]
+
+        assert event == 'done'
+        metadata = data['metadata']
+        assert metadata['estimated_tokens']['output'] == len(aws.bedrock.reply) // 4
+        assert 20 <= metadata['time_to_first_token_ms'] <= metadata['response_time_ms']
+
+    def test_rejected_request_yields_error_frame(self, chatbot):
+        """Validation errors become a single error frame"""
+        frames = parse_frames(''.join(chatbot.stream_handler(chat_event(text=''), None)))
+
+        assert frames == [('error', {'error': 'Message cannot be empty'})]
+
+    def test_failure_mid_stream_records_nothing(self, chatbot, aws):
+        """A broken stream ends with an error frame and leaves no partial turn"""
+        aws.bedrock.stream_error = client_error('ModelStreamErrorException', 'stream broke',
+                                                'InvokeModelWithResponseStream')
+        frames = parse_frames(''.join(chatbot.stream_handler(chat_event(), None)))
+
+        assert frames[-1] == ('error', {'error': 'Service temporarily unavailable'})
+        conversation_id = chatbot.generate_conversation_id(chat_event())
+        assert chatbot.conversation_manager.get_history(conversation_id) == []
+
+
+class TestLambdaHandlerStreaming:
+    """Test the buffered API Gateway handler"""
+
+    def test_stream_request_returns_event_stream(self, chatbot, aws):
+        """Streaming requests get server-sent events and a TTFT header"""
+        aws.bedrock.latency_s = 0.01
+        aws.bedrock.chunk_latency_s = 0.005
+        response = chatbot.lambda_handler(chat_event(), None)
+
+        assert response['statusCode'] == 200
+        assert response['headers']['Content-Type'] == 'text/event-stream'
+        ttft = float(response['headers']['X-Bedrock-TTFT'])
+        assert 0.01 <= ttft < float(response['headers']['X-Bedrock-Time'])
+        assert parse_frames(response['body'])[-1][0] == 'done'
+        assert aws.bedrock.calls[-1]['stream'] is True
+
+    def test_model_failures_map_like_buffered_replies(self, chatbot, aws):
+        """An open circuit is a 503 with Retry-After and a model error a 500, as without streaming"""
+        for _ in range(chatbot.bedrock_invoker.breaker.failure_threshold):
+            chatbot.bedrock_invoker.breaker.record_failure()
+
+        response = chatbot.lambda_handler(chat_event(), None)
+
+        assert response['statusCode'] == 503
+        assert int(response['headers']['Retry-After']) >= 1
+        assert not aws.bedrock.calls
+
+        chatbot.bedrock_invoker.breaker.record_success()
+        aws.bedrock.stream_error = client_error('ModelStreamErrorException', 'stream broke',
+                                                'InvokeModelWithResponseStream')
+        assert chatbot.lambda_handler(chat_event(), None)['statusCode'] == 500
+
+    def test_accept_header_selects_streaming(self, chatbot):
+        """Accept: text/event-stream works without a body flag"""
+        event = chat_event(stream=False)
+        event['headers']['accept'] = 'text/event-stream'
+
+        assert chatbot.lambda_handler(event, None)['headers']['Content-Type'] == 'text/event-stream'
+
+    def test_buffered_reply_reports_ttft(self, chatbot):
+        """Non-streamed replies keep their JSON body and report TTFT equal to Bedrock time"""
+        response = chatbot.lambda_handler(chat_event(stream=False), None)
+
+        assert response['headers']['Content-Type'] == 'application/json'
+        assert response['headers']['X-Bedrock-TTFT'] == response['headers']['X-Bedrock-Time']
+        assert json.loads(response['body'])['reply']
@@ -0,0 +1,146 @@
+"""
+Unit tests for cold-start profiling and startup budgets
+"""
+
+import json
+import os
+
+import pytest
+
+from benchmarks import cold_start
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+cold_start phase: import
+import time:       900 |        900 |   botocore.exceptions
+import time:      2100 |       3000 | botocore
+import time:       500 |       3500 | cold_analytics
+cold_start phase: setup
+import time:      7000 |       7000 | local.fakes
+cold_start phase: invoke
+import time:     40000 |      41000 |   numpy.core
+import time:      1000 |      41000 | numpy
+"""
+
+
+def handler_path(name):
+    from local.handlers import HANDLER_PATHS
+    return os.path.join(cold_start.REPO_ROOT, HANDLER_PATHS[name])
+
+
+class TestProfileParsing:
+    """Test splitting -X importtime output by phase and package"""
+
+    def test_self_time_is_summed_per_package_and_phase(self):
+        """Submodules roll up into their top-level package, per phase"""
+        phases = cold_start.parse_importtime(IMPORTTIME)
+
+        assert phases['import'] == {'botocore': 3.0, 'cold_analytics': 0.5}
+        assert phases['setup'] == {'local': 7.0}
+        assert phases['invoke'] == {'numpy': 41.0}
+
+    def test_top_packages(self):
+        """Packages are ranked by self time and trivial ones dropped"""
+        assert cold_start.top_packages({'a': 1.0, 'b': 5.0, 'c': 0.01}, 5) == ['b 5.0', 'a 1.0']
+
+
+class TestBudgets:
+    """Test startup budgets"""
+
+    def test_metrics_over_budget_are_reported(self):
+        """Each metric past its budget is a violation; handlers without budgets pass"""
+        results = {
+            'analytics': {'import_ms': 150.0, 'first_invoke_ms': 90.0, 'clients_ms': 50.0, 'cold_start_ms': 290.0},
+            'chatbot': {'import_ms': 900.0, 'first_invoke_ms': 1.0, 'clients_ms': 1.0, 'cold_start_ms': 902.0},
+        }
+        budgets = {'analytics': {'import_ms': 175.0, 'first_invoke_ms': 70.0, 'cold_start_ms': 300.0}}
+
+        assert cold_start.check_budgets(results, budgets) == [
+            {'handler': 'analytics', 'metric': 'first_invoke_ms', 'budget': 70.0, 'current': 90.0}]
+
+    def test_import_rules_are_checked_by_phase(self):
+        """A package expected at init but imported lazily, or never expected at all, is a violation"""
+        results = {
+            'analytics': {'packages': {'import': {'boto3': 8.0}, 'invoke': {'numpy': 60.0}}},
+            'input_analyzer': {'packages': {'import': {'timing': 2.0}, 'clients': {'botocore': 50.0}}},
+            'chatbot': {'packages': {'import': {'boto3': 8.0}, 'setup': {'numpy': 60.0}}},
+        }
+        rules = {
+            'analytics': {'init': ['boto3', 'numpy']},
+            'input_analyzer': {'never': ['boto3', 'botocore']},
+            'chatbot': {'init': ['boto3'], 'never': ['numpy']},
+        }
+
+        assert cold_start.check_imports(results, rules) == [
+            {'handler': 'analytics', 'package': 'numpy', 'rule': 'init', 'phase': 'invoke'},
+            {'handler': 'input_analyzer', 'package': 'botocore', 'rule': 'never', 'phase': 'clients'}]
+
+    def test_saved_budgets_add_the_margin_and_keep_other_handlers(self, tmp_path):
+        """Saving budgets for one handler leaves the others and the import rules in the file"""
+        path = str(tmp_path / 'budgets.json')
+        (tmp_path / 'budgets.json').write_text(json.dumps({'imports': {'results': {'init': ['boto3']}}}))
+        metrics = {'import_ms': 100.0, 'first_invoke_ms': 10.0, 'clients_ms': 20.0, 'cold_start_ms': 130.0}
+        cold_start.save_budgets(path, {'results': metrics}, runs=3, margin=0.5)
+        cold_start.save_budgets(path, {'chatbot': metrics}, runs=3, margin=0.2)
+
+        budgets = cold_start.load_budgets(path)
+        assert budgets['results']['import_ms'] == 151.0
+        assert budgets['chatbot']['cold_start_ms'] == 157.0
+        assert cold_start.load_import_rules(path) == {'results': {'init': ['boto3']}}
+
+    def test_checked_in_budgets_cover_every_handler(self):
+        """Every handler has a budget for every metric and import rules"""
+        from local.handlers import HANDLER_PATHS
+        budgets = cold_start.load_budgets(cold_start.DEFAULT_BUDGETS)
+
+        assert set(budgets) == set(HANDLER_PATHS)
+        assert all(set(budget) == set(cold_start.METRICS) for budget in budgets.values())
+        assert set(cold_start.load_import_rules(cold_start.DEFAULT_BUDGETS)) == set(HANDLER_PATHS)
+
+
+class TestColdStarts:
+    """Test profiling handlers in fresh interpreters"""
+
+    def test_a_fresh_interpreter_is_profiled_by_phase(self):
+        """A cold start times each phase and builds the handler's real clients"""
+        result = cold_start.profile_handler('results', handler_path('results'))
+
+        assert result['clients'] == 2
+        assert result['import_ms'] > 0 and result['clients_ms'] > 0
+        assert result['cold_start_ms'] == pytest.approx(result['import_ms'] + result['first_invoke_ms']
+                                                        + result['clients_ms'], abs=0.01)
+        assert 'botocore' in result['packages']['import']
+
+    def test_numpy_is_imported_at_init(self):
+        """Analytics pays for NumPy during init, not on its first request"""
+        result = cold_start.profile_handler('analytics', handler_path('analytics'))
+
+        assert 'numpy' in result['packages']['import']
+        assert 'numpy' not in result['packages'].get('invoke', {})
+
+    def test_pure_python_steps_stay_off_boto3(self):
+        """The analyzer and enhancer steps import no AWS SDK"""
+        for name in ('input_analyzer', 'response_enhancer'):
+            result = cold_start.profile_handler(name, handler_path(name))
+            assert not {'boto3', 'botocore'} & set(result['packages']['import'])
+            assert result['clients'] == 0
+
+    def test_timing_budgets_only_fail_a_strict_run(self, tmp_path, capsys):
+        """A handler over its timing budget is reported, and fails the run only with --strict"""
+        path = tmp_path / 'budgets.json'
+        path.write_text(json.dumps({'budgets': {'input_analyzer': {'import_ms': 0.001}}}))
+        argv = ['--only', 'input_analyzer', '--runs', '1', '--budgets', str(path)]
+
+        assert cold_start.main(argv) == 0
+        assert 'OVER BUDGET input_analyzer import_ms' in capsys.readouterr().out
+        assert cold_start.main(argv + ['--strict']) == 1
+
+    def test_cli_fails_on_import_rules(self, tmp_path, capsys):
+        """A handler that breaks an import rule makes the run exit 1"""
+        path = tmp_path / 'budgets.json'
+        path.write_text(json.dumps({'imports': {'input_analyzer': {'init': ['numpy']}}}))
+
+        code = cold_start.main(['--only', 'input_analyzer', '--runs', '1', '--budgets', str(path)])
+
+        assert code == 1
+        assert 'IMPORT input_analyzer numpy: not imported, expected at init' in capsys.readouterr().out
@@ -0,0 +1,173 @@
+"""
+Unit tests for persistent chat conversations and the write-through cache
+"""
+
+import json
+import sys
+import time
+from decimal import Decimal
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def chatbot(aws):
+    return load_handler('chatbot', aws)
+
+
+@pytest.fixture()
+def store(chatbot):
+    # conversation_store is importable once the chatbot's CodeUri is on sys.path
+    return sys.modules[chatbot.ConversationConflict.__module__].InMemoryConversationStore()
+
+
+def message(chatbot, content, role='user'):
+    return chatbot.ChatMessage(role, content, time.time())
+
+
+def chat_event(text, source_ip='10.0.0.1'):
+    return {
+        'body': json.dumps({'message': text}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': source_ip}}
+    }
+
+
+class TestStores:
+    """Test the compare-and-swap semantics of both backends"""
+
+    def test_in_memory_store_rejects_stale_version(self, chatbot, store):
+        """A save against an outdated version raises a conflict"""
+        assert store.save('c', [{'role': 'user', 'content': 'a'}], 0) == 1
+        with pytest.raises(chatbot.ConversationConflict):
+            store.save('c', [], 0)
+        assert store.load('c') == (1, [{'role': 'user', 'content': 'a'}])
+
+    def test_dynamodb_store_round_trip(self, chatbot, aws):
+        """Messages, versions and expiry are written with a conditional update"""
+        store = chatbot.DynamoDBConversationStore(aws.table('ChatConversations'), ttl_seconds=60)
+        record = chatbot.message_to_record(message(chatbot, 'hello'))
+
+        assert store.load('c') == (0, [])
+        assert store.save('c', [record], 0) == 1
+        assert store.save('c', [record, record], 1) == 2
+        with pytest.raises(chatbot.ConversationConflict):
+            store.save('c', [], 1)
+
+        version, records = store.load('c')
+        assert version == 2
+        assert isinstance(records[0]['timestamp'], Decimal)
+        assert chatbot.record_to_message(records[0]).content == 'hello'
+        item = aws.table('ChatConversations').get_item(Key={'conversation_id': 'c'})['Item']
+        assert item['expires_at'] > int(time.time())
+
+
+class TestWriteThroughCache:
+    """Test ConversationManager backed by a store"""
+
+    def test_containers_share_history(self, chatbot, store):
+        """A conversation written by one container is read by another"""
+        first = chatbot.ConversationManager(store=store)
+        second = chatbot.ConversationManager(store=store)
+
+        first.add_messages('c', [message(chatbot, 'hi'), message(chatbot, 'hello', 'assistant')])
+
+        assert [m['content'] for m in second.get_history('c')] == ['hi', 'hello']
+
+    def test_concurrent_appends_are_not_lost(self, chatbot, store):
+        """A write from a stale cache reloads and retries instead of overwriting"""
+        first = chatbot.ConversationManager(store=store)
+        second = chatbot.ConversationManager(store=store)
+        first.get_history('c')
+        second.get_history('c')
+
+        first.add_message('c', message(chatbot, 'from first'))
+        second.add_message('c', message(chatbot, 'from second'))
+
+        assert [m['content'] for m in store.load('c')[1]] == ['from first', 'from second']
+        assert second.stats()['conflicts'] == 1
+        assert len(first.get_history('c')) == 1  # still within its revalidation window
+
+    def test_repeat_reads_skip_the_store(self, chatbot, store):
+        """Within the revalidation window reads are served from memory"""
+        clock = [0.0]
+        manager = chatbot.ConversationManager(store=store, revalidate_after_seconds=5,
+                                              clock=lambda: clock[0])
+        manager.add_message('c', message(chatbot, 'hi'))
+        reads = store.read_count
+
+        for _ in range(10):
+            assert len(manager.get_history('c')) == 1
+        assert store.read_count == reads
+
+        clock[0] = 10.0
+        manager.get_history('c')
+        assert store.read_count == reads + 1
+        assert manager.stats()['hits'] == 11
+
+    def test_stale_cache_picks_up_new_version(self, chatbot, store):
+        """Revalidation replaces the cached history when another writer moved on"""
+        clock = [0.0]
+        manager = chatbot.ConversationManager(store=store, revalidate_after_seconds=1,
+                                              clock=lambda: clock[0])
+        other = chatbot.ConversationManager(store=store)
+        manager.add_message('c', message(chatbot, 'one'))
+        other.add_message('c', message(chatbot, 'two'))
+
+        clock[0] = 2.0
+        assert [m['content'] for m in manager.get_history('c')] == ['one', 'two']
+        assert manager.stats()['messages'] == 2
+
+    def test_history_stays_bounded_in_store(self, chatbot, store):
+        """The stored history keeps only the last max_history messages"""
+        manager = chatbot.ConversationManager(max_history=3, store=store)
+        for i in range(5):
+            manager.add_message('c', message(chatbot, f"m{i}"))
+
+        assert [r['content'] for r in store.load('c')[1]] == ['m2', 'm3', 'm4']
+
+
+class TestHandlerPersistence:
+    """Test /chat with the conversation table configured"""
+
+    def test_conversation_continues_across_containers(self, aws, monkeypatch):
+        """A second container sends the first container's turns to the model"""
+        monkeypatch.setenv('CONVERSATION_TABLE', 'ChatConversations')
+        first = load_handler('chatbot', aws)
+        second = load_handler('chatbot', aws)
+
+        assert first.lambda_handler(chat_event('What is DynamoDB?'), None)['statusCode'] == 200
+        assert second.lambda_handler(chat_event('And its pricing?'), None)['statusCode'] == 200
+
+        sent = json.loads(aws.bedrock.calls[-1]['body'])['messages']
+        assert [m['content'] for m in sent] == ['What is DynamoDB?', 'This is a local reply.', 'And its pricing?']
+        table = aws.table('ChatConversations')
+        assert len(table.get_item(Key={'conversation_id': first.generate_conversation_id(chat_event(''))})
+                   ['Item']['messages']) == 4
+
+    def test_one_write_per_request(self, aws, monkeypatch):
+        """Each request makes at most one read and exactly one write"""
+        monkeypatch.setenv('CONVERSATION_TABLE', 'ChatConversations')
+        chatbot = load_handler('chatbot', aws)
+        table = aws.table('ChatConversations')
+
+        chatbot.lambda_handler(chat_event('first'), None)
+        chatbot.lambda_handler(chat_event('second'), None)
+
+        assert table.write_count == 2
+        assert table.read_count <= 2
+
+    def test_memory_only_without_table(self, chatbot, aws):
+        """Without CONVERSATION_TABLE nothing is written to DynamoDB"""
+        chatbot.lambda_handler(chat_event('hello'), None)
+
+        assert chatbot.conversation_manager.store is None
+        assert aws.table('ChatConversations').write_count == 0
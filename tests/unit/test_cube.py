@@ -0,0 +1,298 @@
+"""
+Unit tests for the pre-aggregated cube and /analytics/cube
+"""
+
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+CATEGORIES = ('technical', 'creative', 'general')
+COMPLEXITIES = ('simple', 'medium', 'complex')
+ERROR_TYPES = ('timeout', 'throttling', 'validation')
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def analytics(aws):
+    return load_handler('analytics', aws)
+
+
+@pytest.fixture()
+def live(aws):
+    return load_handler('live_metrics', aws)
+
+
+@pytest.fixture()
+def cube(analytics):
+    # cube is importable once the analytics CodeUri is on sys.path
+    return sys.modules[analytics.DynamoDBCubeStore.__module__]
+
+
+def log_items(count, hours=48, end=None, seed=11):
+    rng = random.Random(seed)
+    end = end or datetime.utcnow()
+    items = []
+    for i in range(count):
+        timestamp = end - timedelta(seconds=rng.uniform(0, hours * 3600 - 1))
+        success = rng.random() > 0.2
+        items.append({
+            'execution_id': f"exec_{i}",
+            'timestamp': timestamp.isoformat(),
+            'hour': timestamp.strftime('%Y-%m-%dT%H'),
+            'category': rng.choice(CATEGORIES),
+            'complexity': rng.choice(COMPLEXITIES),
+            'success': success,
+            'error_type': None if success else rng.choice(ERROR_TYPES),
+            'total_processing_time_ms': Decimal(rng.choice([0, rng.randint(10, 3000)])),
+            'quality_score': Decimal(str(round(rng.random(), 2))) if success else Decimal('0.0')
+        })
+    return items
+
+
+def brute_force(items, group_by, filters=None):
+    """The same group-by computed straight from raw items"""
+    groups = {}
+    for item in items:
+        values = {
+            'category': item['category'],
+            'complexity': item['complexity'],
+            'error_type': item['error_type'] or 'none',
+            'hour': item['hour']
+        }
+        if any(values[name] not in allowed for name, allowed in (filters or {}).items()):
+            continue
+        groups.setdefault(tuple(values[name] for name in group_by), []).append(item)
+
+    rows = {}
+    for key, members in groups.items():
+        timed = [float(item['total_processing_time_ms']) for item in members if item['total_processing_time_ms'] > 0]
+        scored = [float(item['quality_score']) for item in members if item['quality_score'] > 0]
+        rows[key] = {
+            'executions': len(members),
+            'failures': sum(1 for item in members if not item['success']),
+            'average_processing_time': sum(timed) / len(timed) if timed else 0.0,
+            'average_quality_score': sum(scored) / len(scored) if scored else 0.0
+        }
+    return rows
+
+
+def assert_rows_match(rows, group_by, expected):
+    """Cube rows equal the brute-force groups, up to the rounding of averages"""
+    assert {tuple(row[name] for name in group_by) for row in rows} == set(expected)
+    for row in rows:
+        want = expected[tuple(row[name] for name in group_by)]
+        assert (row['executions'], row['failures']) == (want['executions'], want['failures'])
+        assert row['average_processing_time'] == pytest.approx(want['average_processing_time'], abs=0.006)
+        assert row['average_quality_score'] == pytest.approx(want['average_quality_score'], abs=0.0006)
+
+
+def get_cube(analytics, **query):
+    response = analytics.lambda_handler({'path': '/analytics/cube',
+                                         'queryStringParameters': {k: str(v) for k, v in query.items()}}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+class TestCube:
+    """Test roll-ups over the in-memory cube"""
+
+    @pytest.mark.parametrize('group_by, filters', [
+        ((), None),
+        (('category',), None),
+        (('category', 'complexity'), None),
+        (('complexity', 'error_type', 'hour'), None),
+        (('category',), {'error_type': ['timeout', 'none']}),
+        (('hour',), {'category': ['technical'], 'complexity': ['complex', 'medium']}),
+    ])
+    def test_rollups_match_a_brute_force_group_by(self, cube, group_by, filters):
+        """Every group-by and filter gives what a scan of raw items would"""
+        items = log_items(2000)
+        rows = cube.Cube.from_items(items).query(group_by, filters)
+
+        assert_rows_match(rows, group_by, brute_force(items, group_by, filters))
+        assert [row['executions'] for row in rows] == sorted((row['executions'] for row in rows), reverse=True)
+
+    def test_rollups_stay_current_as_cells_are_added(self, cube):
+        """A roll-up built by one query is kept up to date by later adds"""
+        items = log_items(600)
+        live_cube = cube.Cube.from_items(items[:300])
+        live_cube.query(['category', 'error_type'])
+        for item in items[300:]:
+            live_cube.add_item(item)
+
+        assert live_cube.query(['category', 'error_type']) == cube.Cube.from_items(items).query(['category', 'error_type'])
+        assert live_cube.query(['error_type']) == cube.Cube.from_items(items).query(['error_type'])
+
+    def test_updates_and_deletes_net_out(self, cube):
+        """Subtracting an item's old image leaves exactly the current items' cells"""
+        items = log_items(50)
+        updated = dict(items[0], success=False, error_type='timeout', quality_score=Decimal('0.0'))
+        netted = cube.Cube.from_items(items)
+        netted.add_item(items[0], -1)
+        netted.add_item(updated)
+        netted.add_item(items[1], -1)
+
+        expected = cube.Cube.from_items([updated] + items[2:])
+        assert netted.cells.keys() == expected.cells.keys()
+        for key, measures in expected.cells.items():
+            assert netted.cells[key] == pytest.approx(measures)
+        for item in [updated] + items[2:]:
+            netted.add_item(item, -1)
+        assert netted.cells == {}
+
+    def test_unknown_dimensions_are_rejected(self, cube):
+        """A dimension the cube does not have raises ValueError"""
+        with pytest.raises(ValueError, match='Unknown dimension: region'):
+            cube.Cube().query(['category'], {'region': ['eu']})
+
+    def test_queries_need_well_under_a_millisecond(self, cube):
+        """A warm drill-down over 30 days of cells costs sub-millisecond CPU"""
+        warm = cube.Cube.from_items(log_items(20000, hours=720))
+        group_by, filters = ['category', 'complexity'], {'error_type': ['timeout', 'none']}
+        warm.query(group_by, filters)
+
+        timings = []
+        for _ in range(20):
+            start = time.process_time()
+            warm.query(group_by, filters)
+            timings.append(time.process_time() - start)
+
+        assert min(timings) < 0.001
+
+
+class TestCubeStore:
+    """Test cube maintenance from the log table stream and the /analytics/cube API"""
+
+    def test_stream_batches_keep_the_table_current(self, aws, live, analytics):
+        """Inserts, updates and deletes reach the cube table and the API answers from it"""
+        records = []
+        log_table = aws.table(analytics.table_name)
+        log_table.add_stream_listener(records.append)
+        items = log_items(300, hours=20)
+        for item in items:
+            log_table.put_item(Item=item)
+        live.lambda_handler({'Records': records}, None)
+
+        records.clear()
+        failed = dict(items[0], success=False, error_type='throttling', quality_score=Decimal('0.0'))
+        log_table.put_item(Item=failed)
+        log_table.delete_item(Key={'execution_id': items[1]['execution_id']})
+        result = live.lambda_handler({'Records': records}, None)
+
+        current = [failed] + items[2:]
+        assert result['cells'] <= 3
+        for group_by in (['category'], ['complexity', 'error_type']):
+            status, body = get_cube(analytics, group_by=','.join(group_by), hours=24)
+            assert status == 200
+            assert_rows_match(body['rows'], group_by, brute_force(current, group_by))
+        status, body = get_cube(analytics, filter='error_type:throttling|timeout')
+        assert body['rows'][0]['executions'] == sum(1 for item in current if item['error_type'] in ('throttling', 'timeout'))
+
+    def test_retried_and_bisected_batches_count_once(self, aws, live, analytics, monkeypatch):
+        """A batch that failed part-way, then was retried and bisected, adds each record once"""
+        records = []
+        log_table = aws.table(analytics.table_name)
+        log_table.add_stream_listener(records.append)
+        items = log_items(200, hours=20)
+        for item in items:
+            log_table.put_item(Item=item)
+
+        transact = aws.dynamodb_client.transact_write_items
+        writes = []
+
+        def failing_transact(**kwargs):
+            if len(writes) == 10:
+                raise live.ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}},
+                                       'TransactWriteItems')
+            writes.append(1)
+            return transact(**kwargs)
+
+        monkeypatch.setattr(aws.dynamodb_client, 'transact_write_items', failing_transact)
+        with pytest.raises(live.ClientError):
+            live.lambda_handler({'Records': records}, None)
+        monkeypatch.setattr(aws.dynamodb_client, 'transact_write_items', transact)
+        live.lambda_handler({'Records': records[:80]}, None)
+        live.lambda_handler({'Records': records[80:]}, None)
+        live.lambda_handler({'Records': records[80:]}, None)
+
+        for group_by in (['category'], ['complexity', 'error_type']):
+            status, body = get_cube(analytics, group_by=','.join(group_by), hours=24)
+            assert_rows_match(body['rows'], group_by, brute_force(items, group_by))
+
+    def test_a_busy_cell_stays_small(self, aws, live, analytics, cube):
+        """A cell written by thousands of records, in retried and bisected batches, holds its measures only"""
+        records = []
+        log_table = aws.table(analytics.table_name)
+        log_table.add_stream_listener(records.append)
+        hour = datetime.utcnow().strftime('%Y-%m-%dT%H')
+        items = [dict(item, hour=hour, category='technical', complexity='simple', success=True, error_type=None)
+                 for item in log_items(3000, hours=1)]
+        for item in items:
+            log_table.put_item(Item=item)
+
+        # Batches larger than one transaction, each retried whole and then in halves
+        for start in range(0, len(records), 150):
+            batch = records[start:start + 150]
+            for retry in (batch, batch[:75], batch[75:], batch):
+                live.lambda_handler({'Records': retry}, None)
+
+        cube_items = aws.table(live.cube_table_name).items()
+        [cell] = [item for item in cube_items if not item['cell'].startswith('~')]
+        markers = [item for item in cube_items if item['cell'].startswith('~')]
+        assert cell['executions'] == 3000
+        assert set(cell) <= {'day', 'cell'} | set(cube.DIMENSIONS) | set(cube.MEASURES)
+        assert len(markers) == 3000
+        assert all(marker['expires_at'] > time.time() for marker in markers)
+
+    def test_dynamodb_store_loads_what_was_added(self, aws, cube):
+        """Cells written with ADD load back for a window spanning days"""
+        items = log_items(500, hours=72, end=datetime(2026, 3, 4, 12))
+        cells = cube.Cube.from_items(items).cells
+        store = cube.DynamoDBCubeStore(aws.table('PipelineCube'))
+        reference = cube.InMemoryCubeStore()
+        store.add_cells(cells)
+        store.add_cells(cells)
+        reference.add_cells(cells)
+        reference.add_cells(cells)
+
+        loaded = store.load('2026-03-02T18', '2026-03-04T06')
+        expected = reference.load('2026-03-02T18', '2026-03-04T06')
+
+        assert loaded.cells.keys() == expected.cells.keys()
+        assert len(loaded.cells) < len(cells)
+        for key, measures in expected.cells.items():
+            assert loaded.cells[key] == pytest.approx(measures)
+
+    def test_loaded_window_is_reused(self, aws, analytics):
+        """Repeated drill-downs on a warm container read the table once"""
+        cube_table = aws.table(analytics.cube_table_name)
+        get_cube(analytics, group_by='category')
+        reads = cube_table.read_count
+        get_cube(analytics, group_by='complexity,hour')
+        get_cube(analytics, filter='category:technical')
+
+        assert cube_table.read_count == reads
+
+    @pytest.mark.parametrize('query, error', [
+        ({'group_by': 'region'}, 'Unknown dimension: region (expected one of category, complexity, error_type, hour)'),
+        ({'filter': 'category'}, 'filter must be dimension:value|value,...'),
+        ({'filter': 'model:haiku'}, 'Unknown dimension: model (expected one of category, complexity, error_type, hour)'),
+        ({'hours': 0}, 'hours must be between 1 and 720'),
+    ])
+    def test_bad_queries(self, analytics, query, error):
+        """Unknown dimensions, malformed filters and bad windows are rejected with 400"""
+        status, body = get_cube(analytics, **query)
+
+        assert status == 400
+        assert body['error'] == error
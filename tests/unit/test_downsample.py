@@ -0,0 +1,192 @@
+"""
+Unit tests for analytics time series downsampling
+"""
+
+import json
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def analytics(aws):
+    return load_handler('analytics', aws)
+
+
+@pytest.fixture()
+def downsample(analytics):
+    # downsample is importable once the analytics CodeUri is on sys.path
+    return sys.modules[analytics.downsample_timeseries.__module__]
+
+
+def log_items(count, hours, end=None, seed=7):
+    rng = np.random.default_rng(seed)
+    end = end or datetime.utcnow()
+    offsets = np.sort(rng.uniform(0, hours * 3600 - 1, count))
+    return [{
+        'execution_id': f"exec_{i}",
+        'timestamp': (end - timedelta(seconds=float(offset))).isoformat(),
+        'complexity': 'simple',
+        'category': 'general',
+        'success': bool(i % 10),
+        'total_processing_time_ms': Decimal(int(rng.integers(1, 500)))
+    } for i, offset in enumerate(offsets)]
+
+
+def get_analytics(analytics, **query):
+    response = analytics.lambda_handler({'queryStringParameters': {k: str(v) for k, v in query.items()}}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+class TestLTTB:
+    """Test Largest-Triangle-Three-Buckets point selection"""
+
+    def test_keeps_the_endpoints_and_the_threshold(self, downsample):
+        """Exactly `threshold` ascending indices, first and last included"""
+        x = np.arange(10000, dtype=float)
+        y = np.sin(x / 100)
+        kept = downsample.lttb(x, y, 100)
+
+        assert len(kept) == 100
+        assert kept[0] == 0 and kept[-1] == 9999
+        assert np.all(np.diff(kept) > 0)
+
+    @pytest.mark.parametrize('count, threshold', [(1000, 500), (20000, 100)])
+    def test_matches_the_reference_algorithm(self, downsample, count, threshold):
+        """Small-bucket and vectorized paths pick the textbook LTTB points"""
+        rng = np.random.default_rng(count)
+        x = np.sort(rng.uniform(0, 1e6, count))
+        y = rng.normal(100, 20, count)
+        edges = np.linspace(0, count - 2, threshold - 1).astype(int) + 1
+        expected, previous = [0], 0
+        for bucket in range(threshold - 2):
+            lo, hi = edges[bucket], edges[bucket + 1]
+            if bucket + 2 < len(edges):
+                cx, cy = x[hi:edges[bucket + 2]].mean(), y[hi:edges[bucket + 2]].mean()
+            else:
+                cx, cy = x[-1], y[-1]
+            areas = [abs((x[previous] - cx) * (y[p] - y[previous]) - (x[previous] - x[p]) * (cy - y[previous]))
+                     for p in range(lo, hi)]
+            previous = lo + int(np.argmax(areas))
+            expected.append(previous)
+
+        assert downsample.lttb(x, y, threshold).tolist() == expected + [count - 1]
+
+    def test_spikes_survive(self, downsample):
+        """An isolated spike is kept where bucket averaging would flatten it"""
+        x = np.arange(5000, dtype=float)
+        y = np.random.default_rng(1).normal(100, 1, 5000)
+        y[3217] = 900
+        y[1234] = -500
+
+        kept = downsample.lttb(x, y, 50)
+
+        assert 3217 in kept and 1234 in kept
+
+    def test_short_series_are_untouched(self, downsample):
+        """A series within the threshold is returned whole"""
+        assert downsample.lttb(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+class TestCountBuckets:
+    """Test exact re-bucketing of counts"""
+
+    def test_counts_are_preserved(self, downsample):
+        """Every point lands in exactly one aligned bucket"""
+        times = np.random.default_rng(3).uniform(1_000_000, 1_086_400, 20000)
+        starts, counts, width = downsample.bucket_counts(times, 1_000_000, 1_086_400, 100)
+
+        assert counts.sum() == 20000
+        assert len(counts) <= 100
+        assert width == 900
+        assert all(start % width == 0 for start in starts)
+
+    @pytest.mark.parametrize('hours, width', [(1, 60), (24, 300), (24 * 7, 1800), (720, 7200)])
+    def test_width_is_round_and_fits(self, downsample, hours, width):
+        """The smallest round width that fits the window in 500 buckets is chosen"""
+        assert downsample.bucket_width(1_700_000_123, 1_700_000_123 + hours * 3600, 500) == width
+
+
+class TestAnalyticsTimeseries:
+    """Test the downsampled time series in /analytics responses"""
+
+    def test_payload_does_not_grow_with_the_window(self, aws, analytics):
+        """A 30-day window of many executions returns at most max_points per series"""
+        sizes = {}
+        for count in (200, 5000):
+            table = aws.table(analytics.table_name)
+            table.clear()
+            for item in log_items(count, 720):
+                table.put_item(Item=item)
+
+            status, body = get_analytics(analytics, hours=720, max_points=200)
+
+            assert status == 200
+            series = body['timeseries']
+            assert len(series['counts']['timestamps']) <= 200
+            assert len(series['latency']['timestamps']) == min(200, count)
+            assert sum(series['counts']['executions']) == body['summary']['total_executions'] == count
+            assert sum(series['counts']['failures']) == body['summary']['failed_executions']
+            sizes[count] = len(json.dumps(series))
+
+        assert sizes[5000] < 1.2 * sizes[200]
+
+    def test_empty_window_has_zero_buckets(self, analytics):
+        """With no executions the counts series is all zeros"""
+        status, body = get_analytics(analytics, hours=24, max_points=100)
+
+        assert status == 200
+        assert set(body['timeseries']['counts']['executions']) == {0}
+        assert body['timeseries']['latency']['timestamps'] == []
+
+    def test_window_without_executions_keeps_the_shape(self, aws, analytics):
+        """Executions only outside the window still give an empty series and window"""
+        table = aws.table(analytics.table_name)
+        for item in log_items(20, 24, end=datetime.utcnow() - timedelta(days=5)):
+            table.put_item(Item=item)
+
+        status, body = get_analytics(analytics, hours=24, max_points=100)
+
+        assert status == 200
+        assert body['message'] == 'No data in time window'
+        assert set(body['timeseries']['counts']['executions']) == {0}
+        assert body['time_window']['hours'] == 24
+        assert body['recent_executions'] == []
+
+    def test_large_tables_are_read_page_by_page(self, aws, analytics):
+        """Executions past the first scan page are counted"""
+        table = aws.table(analytics.table_name)
+        table.scan_page_size = 100
+        for item in log_items(450, 24):
+            table.put_item(Item=item)
+
+        status, body = get_analytics(analytics, hours=24, max_points=100)
+
+        assert status == 200
+        assert body['summary']['total_executions'] == 450
+        assert table.read_count == 5
+
+    @pytest.mark.parametrize('query, error', [
+        ({'hours': 721}, 'hours must be between 1 and 720'),
+        ({'hours': 0}, 'hours must be between 1 and 720'),
+        ({'hours': 'week'}, 'hours and max_points must be integers'),
+        ({'max_points': 2}, 'max_points must be between 3 and 2000'),
+        ({'max_points': 5000}, 'max_points must be between 3 and 2000'),
+    ])
+    def test_window_limits(self, analytics, query, error):
+        """Out-of-range windows and point counts are rejected with 400"""
+        status, body = get_analytics(analytics, **query)
+
+        assert status == 400
+        assert body['error'] == error
@@ -1,8 +1,15 @@
 import json
+import threading
 
 import pytest
 
-from hello_world import app
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
 
 
 @pytest.fixture()
@@ -62,11 +69,141 @@ def apigw_event():
     }
 
 
-def test_lambda_handler(apigw_event):
+def test_trigger_starts_execution(apigw_event, aws):
+    trigger = load_handler("trigger", aws)
+    apigw_event["body"] = json.dumps({"input": "Explain machine learning concepts", "mode": "async"})
+
+    ret = trigger.lambda_handler(apigw_event, FakeContext())
+    data = json.loads(ret["body"])
+
+    assert ret["statusCode"] == 200
+    assert data["status"] == "RUNNING"
+    assert data["execution_arn"] in aws.stepfunctions.executions
+
+
+def test_trigger_runs_light_input_fused(apigw_event, aws):
+    trigger = load_handler("trigger", aws)
+    apigw_event["body"] = json.dumps({"input": "Write a short poem"})
+
+    ret = trigger.lambda_handler(apigw_event, FakeContext())
+    data = json.loads(ret["body"])
+
+    # The log is written before the handler returns, not on a later invocation
+    assert not trigger.fused._pending_logs
+    assert ret["statusCode"] == 200
+    assert data["status"] == "SUCCEEDED"
+    assert data["mode"] == "fused"
+    assert "I hope this helps" in data["enhanced_response"]["content"]
+    assert not aws.stepfunctions.executions
+    logged = aws.table("PipelineLogs").items()[0]
+    assert logged["category"] == "creative"
+    assert logged["output_length"] == len(data["enhanced_response"]["content"])
+
+
+def test_concurrent_fused_requests_are_logged_separately(apigw_event, aws):
+    trigger = load_handler("trigger", aws)
+    apigw_event["body"] = json.dumps({"input": "Write a short poem"})
+
+    threads = [threading.Thread(target=trigger.lambda_handler, args=(dict(apigw_event), FakeContext()))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Requests logged in the same second keep their own rows
+    logged = aws.table("PipelineLogs").items()
+    assert len(logged) == 20
+    assert len({item["execution_id"] for item in logged}) == 20
+
+
+def test_trigger_bounds_the_fused_log_wait(apigw_event, aws, monkeypatch):
+    trigger = load_handler("trigger", aws)
+    release = threading.Event()
+    write_log = trigger.fused.pipeline_logger.lambda_handler
+    monkeypatch.setattr(trigger.fused.pipeline_logger, "lambda_handler",
+                        lambda event, context: release.wait(5) and write_log(event, context))
+    monkeypatch.setattr(trigger.fused, "FUSED_LOG_FLUSH_SECONDS", 0.05)
+    apigw_event["body"] = json.dumps({"input": "Write a short poem"})
+
+    ret = trigger.lambda_handler(apigw_event, FakeContext())
+
+    # A stalled write delays the response by the flush wait, not indefinitely
+    assert ret["statusCode"] == 200
+    assert len(trigger.fused._pending_logs) == 1
+    release.set()
+    assert trigger.fused.flush_pending_logs(timeout=5) == 0
+    assert len(aws.table("PipelineLogs").items()) == 1
+
+
+def test_trigger_routes_heavy_input_to_state_machine(apigw_event, aws):
+    trigger = load_handler("trigger", aws)
+    heavy_input = "Compare and evaluate these algorithm designs? Why? How? " * 30
+    apigw_event["body"] = json.dumps({"input": heavy_input})
 
-    ret = app.lambda_handler(apigw_event, "")
+    ret = trigger.lambda_handler(apigw_event, FakeContext())
+    data = json.loads(ret["body"])
+
+    assert data["status"] == "RUNNING"
+    assert data["execution_arn"] in aws.stepfunctions.executions
+
+
+def test_trigger_rejects_empty_input(apigw_event, aws):
+    trigger = load_handler("trigger", aws)
+
+    ret = trigger.lambda_handler(apigw_event, FakeContext())
+
+    assert ret["statusCode"] == 400
+    assert not aws.stepfunctions.executions
+
+
+def test_input_analyzer_classifies_input():
+    analyzer = load_handler("input_analyzer")
+
+    ret = analyzer.lambda_handler({"input": "Write a story about a dragon"}, None)
+
+    assert ret["statusCode"] == 200
+    assert ret["analysis"]["category"] == "creative"
+    assert ret["input_length"] == len("Write a story about a dragon")
+
+
+def test_pipeline_logger_records_failure(aws):
+    logger = load_handler("pipeline_logger", aws)
+
+    ret = logger.lambda_handler({"input": "hello", "error": "Task timeout"}, None)
+    items = aws.table(logger.table_name).items()
+
+    assert ret["statusCode"] == 200
+    assert items[0]["success"] is False
+    assert items[0]["error_type"] == "timeout"
+    assert aws.cloudwatch.metric_data[0]["Namespace"] == "AIPipeline"
+
+
+def test_analytics_reports_logged_executions(aws):
+    logger = load_handler("pipeline_logger", aws)
+    analytics = load_handler("analytics", aws)
+    logger.lambda_handler({
+        "input": "hello",
+        "analysis": {"complexity": "low", "category": "general", "processing_time_ms": 1.5},
+        "enhanced_response": {"content": "hi", "quality_score": 0.8, "processing_time_ms": 2.0},
+    }, None)
+
+    ret = analytics.lambda_handler({"queryStringParameters": {"hours": "1"}}, None)
     data = json.loads(ret["body"])
 
     assert ret["statusCode"] == 200
-    assert "message" in ret["body"]
-    assert data["message"] == "hello world"
+    assert data["summary"]["total_executions"] == 1
+    assert data["complexity_breakdown"] == {"low": 1}
+
+
+def test_pipeline_logger_unwraps_step_functions_error(aws):
+    logger = load_handler("pipeline_logger", aws)
+    error = {
+        "Error": "ValueError",
+        "Cause": json.dumps({"errorMessage": "No input provided", "errorType": "ValueError"}),
+    }
+
+    data = logger.extract_execution_data({"input": "", "error": error})
+
+    assert data["error_message"] == "ValueError: No input provided"
+    assert data["error_type"] == "unknown"
@@ -0,0 +1,58 @@
+"""
+Unit tests for token-budgeted chat prompts
+"""
+
+import json
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS(bedrock_reply="A fairly short reply.")
+
+
+def chat_event(text):
+    return {
+        'body': json.dumps({'message': text}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}
+    }
+
+
+class TestPromptBudget:
+    """Test that prompts sent to Bedrock stay within the history budget"""
+
+    def test_prompt_size_is_bounded(self, aws, monkeypatch):
+        """However long the conversation, history tokens stay within budget"""
+        monkeypatch.setenv('CHAT_HISTORY_TOKEN_BUDGET', '300')
+        monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '100')
+        chatbot = load_handler('chatbot', aws)
+
+        for i in range(15):
+            response = chatbot.lambda_handler(chat_event(f"Question {i}: " + "words " * 150), None)
+            assert response['statusCode'] == 200
+
+        prompt_tokens = json.loads(response['body'])['metadata']['estimated_tokens']['prompt']
+        sent = json.loads(aws.bedrock.calls[-1]['body'])['messages']
+        history_tokens = sum(chatbot.token_counter.estimate_tokens(m['content']) for m in sent[:-1])
+        assert history_tokens <= 300
+        assert sent[0]['role'] == 'user'
+        assert prompt_tokens == history_tokens + chatbot.token_counter.estimate_tokens(sent[-1]['content'])
+
+    def test_summary_goes_to_system_prompt(self, aws, monkeypatch):
+        """Compacted older turns are sent as the system prompt"""
+        monkeypatch.setenv('CHAT_HISTORY_TOKEN_BUDGET', '300')
+        monkeypatch.setenv('CHAT_SUMMARY_MAX_TOKENS', '100')
+        monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '100')
+        chatbot = load_handler('chatbot', aws)
+
+        for i in range(6):
+            chatbot.lambda_handler(chat_event(f"Question {i}: " + "words " * 150), None)
+
+        request = json.loads(aws.bedrock.calls[-1]['body'])
+        assert request['system'].startswith('Summary of earlier turns')
+        assert 'user: Question 0' in request['system']
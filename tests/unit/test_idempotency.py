@@ -0,0 +1,204 @@
+"""
+Unit tests for idempotent, deduplicating /trigger submissions
+"""
+
+import json
+import threading
+
+import pytest
+
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def trigger(aws):
+    return load_handler('trigger', aws)
+
+
+@pytest.fixture()
+def logger(aws):
+    return load_handler('pipeline_logger', aws)
+
+
+def trigger_event(text, key=None):
+    event = {'body': json.dumps({'input': text, 'mode': 'async'})}
+    if key:
+        event['headers'] = {'Idempotency-Key': key}
+    return event
+
+
+def submit(trigger, text, key=None):
+    response = trigger.lambda_handler(trigger_event(text, key), FakeContext())
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+class TestKeys:
+    """Test how requests map to idempotency keys"""
+
+    def test_normalized_inputs_share_a_key(self, trigger):
+        """Whitespace and case differences hash to the same key"""
+        assert (trigger.build_idempotency_key("Explain  the CAP theorem\n")
+                == trigger.build_idempotency_key("explain the cap theorem"))
+        assert trigger.build_idempotency_key("a") != trigger.build_idempotency_key("b")
+
+    def test_client_key_wins(self, trigger):
+        """A client-supplied key replaces the input hash"""
+        assert trigger.build_idempotency_key("a", "k1") == trigger.build_idempotency_key("b", "k1")
+
+    def test_key_from_header_or_body(self, trigger):
+        """The key is read case-insensitively from headers, else from the body"""
+        assert trigger.extract_idempotency_key({'headers': {'idempotency-key': 'h'}}) == 'h'
+        assert trigger.extract_idempotency_key({'body': json.dumps({'idempotency_key': 'b'})}) == 'b'
+        assert trigger.extract_idempotency_key({'body': '{}'}) is None
+
+
+class TestDeduplication:
+    """Test that duplicates reuse the first execution"""
+
+    def test_duplicate_attaches_to_in_flight_execution(self, trigger, aws):
+        """A resubmission while running returns the original execution"""
+        first = submit(trigger, "Explain the CAP theorem")
+        second = submit(trigger, "explain   the CAP theorem")
+
+        assert second['deduplicated'] is True
+        assert second['request_id'] == first['request_id']
+        assert second['execution_arn'] == first['execution_arn']
+        assert second['status'] == 'RUNNING'
+        assert len(aws.stepfunctions.executions) == 1
+
+    def test_duplicate_of_completed_request_gets_cached_result(self, trigger, logger, aws):
+        """Once the logger stores the result, duplicates receive it directly"""
+        first = submit(trigger, "Explain the CAP theorem")
+        logger.lambda_handler({
+            'input': 'Explain the CAP theorem',
+            'request_id': first['request_id'],
+            'enhanced_response': {'enhanced_response': {'content': 'Cached answer', 'quality_score': 0.9}}
+        }, None)
+
+        second = submit(trigger, "Explain the CAP theorem")
+
+        assert second['status'] == 'SUCCEEDED'
+        assert second['result']['content'] == 'Cached answer'
+        assert len(aws.stepfunctions.executions) == 1
+
+    def test_failed_request_is_retried(self, trigger, logger, aws):
+        """A duplicate of a failed request takes over the key and runs again"""
+        first = submit(trigger, "Explain the CAP theorem")
+        logger.lambda_handler({'input': 'x', 'request_id': first['request_id'], 'error': 'boom'}, None)
+
+        second = submit(trigger, "Explain the CAP theorem")
+
+        assert 'deduplicated' not in second
+        assert second['request_id'] != first['request_id']
+        assert len(aws.stepfunctions.executions) == 2
+
+    def test_distinct_client_keys_do_not_collide(self, trigger, aws):
+        """The same input under different client keys runs twice"""
+        submit(trigger, "Explain the CAP theorem", key='k1')
+        submit(trigger, "Explain the CAP theorem", key='k2')
+
+        assert len(aws.stepfunctions.executions) == 2
+
+    def test_expired_claim_is_reclaimed(self, trigger, aws):
+        """Claims past their TTL are replaced even before DynamoDB deletes them"""
+        first = submit(trigger, "Explain the CAP theorem")
+        table = aws.table('PipelineIdempotency')
+        for item in table.items():
+            table.put_item(Item={**item, 'expires_at': 0})
+
+        second = submit(trigger, "Explain the CAP theorem")
+
+        assert second['request_id'] != first['request_id']
+        assert len(aws.stepfunctions.executions) == 2
+
+    def test_abandoned_claim_is_taken_over_after_its_lease(self, trigger, aws):
+        """A claim whose owner died before starting an execution only blocks duplicates for the lease"""
+        store = trigger.get_idempotency_store()
+        key = trigger.build_idempotency_key("Explain the CAP theorem")
+        assert store.claim(key, 'req-dead') is None
+        claim = store.get(key)
+        assert claim['expires_at'] - claim['created_at'] == trigger.IDEMPOTENCY_LEASE_SECONDS
+        aws.table('PipelineIdempotency').put_item(Item={**claim, 'expires_at': 0})
+
+        second = submit(trigger, "Explain the CAP theorem")
+
+        assert 'deduplicated' not in second
+        assert second['request_id'] != 'req-dead'
+        assert store.get(key)['execution_arn'] == second['execution_arn']
+
+    def test_claim_retries_are_bounded(self, trigger):
+        """A key that keeps vanishing between write and read fails after a few attempts"""
+        from botocore.exceptions import ClientError
+
+        class VanishingTable:
+            puts = 0
+
+            def put_item(self, **kwargs):
+                self.puts += 1
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+
+            def get_item(self, **kwargs):
+                return {}
+
+        table = VanishingTable()
+        with pytest.raises(RuntimeError):
+            trigger.IdempotencyStore(table, max_claim_attempts=3).claim('k', 'req')
+        assert table.puts == 3
+
+    def test_started_execution_holds_the_key_for_the_ttl(self, trigger, aws):
+        """Starting the execution extends the claim from the lease to the full TTL"""
+        first = submit(trigger, "Explain the CAP theorem")
+        record = trigger.get_idempotency_store().get(trigger.build_idempotency_key("Explain the CAP theorem"))
+
+        assert record['status'] == 'STARTED'
+        assert record['request_id'] == first['request_id']
+        assert record['expires_at'] - record['created_at'] >= trigger.IDEMPOTENCY_TTL_SECONDS
+
+    def test_failed_start_releases_claim(self, trigger, aws):
+        """If StartExecution fails, the claim is dropped so a retry can run"""
+        aws.stepfunctions.throttle_rate = 1.0
+        with pytest.raises(Exception):
+            trigger.lambda_handler(trigger_event("Explain the CAP theorem"), FakeContext())
+        aws.stepfunctions.throttle_rate = 0.0
+
+        second = submit(trigger, "Explain the CAP theorem")
+
+        assert 'deduplicated' not in second
+        assert len(aws.stepfunctions.executions) == 1
+
+    def test_concurrent_duplicates_start_one_execution(self, trigger, aws):
+        """Simultaneous submissions from many containers coalesce onto one execution"""
+        aws.stepfunctions.latency_s = 0.05
+        responses = []
+        barrier = threading.Barrier(16)
+
+        def worker():
+            barrier.wait()
+            responses.append(submit(trigger, "Explain the CAP theorem"))
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(aws.stepfunctions.executions) == 1
+        assert len({r['request_id'] for r in responses}) == 1
+        assert len({r['execution_arn'] for r in responses}) == 1
+        assert sum(1 for r in responses if r.get('deduplicated')) == 15
+
+    def test_disabled_with_zero_ttl(self, trigger, aws, monkeypatch):
+        """IDEMPOTENCY_TTL_SECONDS=0 turns deduplication off"""
+        monkeypatch.setattr(trigger, 'IDEMPOTENCY_TTL_SECONDS', 0)
+
+        submit(trigger, "Explain the CAP theorem")
+        submit(trigger, "Explain the CAP theorem")
+
+        assert len(aws.stepfunctions.executions) == 2
@@ -0,0 +1,268 @@
+"""
+Unit tests for the live metrics feed: stream deltas, the hub and the local server
+"""
+
+import http.client
+import json
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+from local.server import LiveServer
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def live(aws):
+    return load_handler('live_metrics', aws)
+
+
+@pytest.fixture()
+def analytics(aws):
+    return load_handler('analytics', aws)
+
+
+def log_item(i, success=True, complexity='simple', processing_ms=100):
+    return {
+        'execution_id': f"exec_{i}",
+        'timestamp': (datetime(2026, 1, 1) + timedelta(seconds=i)).isoformat(),
+        'complexity': complexity,
+        'category': 'technical' if i % 2 else 'general',
+        'success': success,
+        'total_processing_time_ms': Decimal(processing_ms),
+        'input_length': 10,
+        'output_length': 20
+    }
+
+
+def recorded_stream(aws, analytics):
+    records = []
+    aws.table(analytics.table_name).add_stream_listener(records.append)
+    return records
+
+
+def full_recompute(analytics, aws):
+    items = aws.table(analytics.table_name).items()
+    return analytics.analyze_pipeline_data(items, datetime(2026, 1, 1), datetime(2026, 1, 2))
+
+
+def assert_matches_recompute(metrics, expected):
+    snapshot = metrics.snapshot()
+    for field in ('total_executions', 'successful_executions', 'failed_executions', 'timed_executions',
+                  'success_rate', 'average_processing_time'):
+        assert snapshot['summary'][field] == expected['summary'][field]
+    assert snapshot['complexity_breakdown'] == expected['complexity_breakdown']
+    assert snapshot['category_breakdown'] == expected['category_breakdown']
+    assert snapshot['recent_executions'] == expected['recent_executions']
+
+
+class TestDeltas:
+    """Test that stream deltas reproduce the full /analytics computation"""
+
+    def test_inserts_match_a_full_recompute(self, aws, live, analytics):
+        """Summing per-record deltas gives the same metrics as scanning the table"""
+        records = recorded_stream(aws, analytics)
+        table = aws.table(analytics.table_name)
+        for i in range(25):
+            table.put_item(Item=log_item(i, success=i % 5 != 0, complexity=['simple', 'complex'][i % 2],
+                                         processing_ms=0 if i == 3 else 50 + i))
+
+        metrics = live.LiveMetrics()
+        for record in records:
+            metrics.apply(live.stream_delta([record])[0])
+
+        assert_matches_recompute(metrics, full_recompute(analytics, aws))
+
+    def test_updates_and_deletes_are_netted_out(self, aws, live, analytics):
+        """A MODIFY replaces the old contribution and a REMOVE takes it away"""
+        table = aws.table(analytics.table_name)
+        for i in range(5):
+            table.put_item(Item=log_item(i))
+        metrics = live.LiveMetrics(full_recompute(analytics, aws))
+        records = recorded_stream(aws, analytics)
+
+        table.put_item(Item=log_item(1, success=False, complexity='complex'))
+        table.update_item(Key={'execution_id': 'exec_2'}, UpdateExpression='SET success = :f',
+                          ExpressionAttributeValues={':f': False})
+        table.delete_item(Key={'execution_id': 'exec_4'})
+        metrics.apply(live.stream_delta(records)[0])
+
+        assert [record['eventName'] for record in records] == ['MODIFY', 'MODIFY', 'REMOVE']
+        assert_matches_recompute(metrics, full_recompute(analytics, aws))
+
+    def test_merged_batch_equals_one_at_a_time(self, aws, live, analytics):
+        """A batch merged into one delta lands where applying each record would"""
+        records = recorded_stream(aws, analytics)
+        table = aws.table(analytics.table_name)
+        for i in range(15):
+            table.put_item(Item=log_item(i))
+        table.delete_item(Key={'execution_id': 'exec_14'})
+
+        one_at_a_time = live.LiveMetrics()
+        for record in records:
+            one_at_a_time.apply(live.stream_delta([record])[0])
+        batched = live.LiveMetrics()
+        batched.apply(live.stream_delta(records)[0])
+
+        assert batched.snapshot() == one_at_a_time.snapshot()
+        recent = [row['execution_id'] for row in batched.snapshot()['recent_executions']]
+        assert recent == [f"exec_{i}" for i in range(13, 4, -1)]
+
+
+class TestMetricsHub:
+    """Test fan-out, replay and slow viewers"""
+
+    def delta(self, live, i):
+        return live.execution_delta(log_item(i), None)
+
+    def test_one_frame_is_shared_by_every_viewer(self, live):
+        """A delta is encoded once and the same frame is queued for each viewer"""
+        hub = live.MetricsHub()
+        viewers = [hub.subscribe() for _ in range(50)]
+        for viewer in viewers:
+            assert b'"type":"snapshot"' in viewer.get(timeout=1)
+
+        hub.publish(self.delta(live, 1))
+
+        frames = [viewer.get(timeout=1) for viewer in viewers]
+        assert all(frame is frames[0] for frame in frames)
+        assert frames[0].startswith(b'id: 1\ndata: {"type":"delta"')
+
+    def test_reconnect_replays_missed_frames(self, live):
+        """A viewer resuming from Last-Event-ID gets only what it missed"""
+        hub = live.MetricsHub()
+        for i in range(5):
+            hub.publish(self.delta(live, i))
+
+        viewer = hub.subscribe(last_event_id='3')
+
+        assert viewer.get(timeout=1).startswith(b'id: 4\n')
+        assert viewer.get(timeout=1).startswith(b'id: 5\n')
+        assert viewer.get(timeout=0.01) is None
+
+    def test_stale_reconnect_gets_a_snapshot(self, live):
+        """When the missed frames have left the history a snapshot is sent instead"""
+        hub = live.MetricsHub(history=2)
+        for i in range(5):
+            hub.publish(self.delta(live, i))
+
+        message = json.loads(hub.subscribe(last_event_id='1').get(timeout=1).split(b'data: ')[1])
+
+        assert message['type'] == 'snapshot'
+        assert message['snapshot']['summary']['total_executions'] == 5
+
+    def test_slow_viewer_is_reset_without_holding_others(self, live):
+        """A viewer that stops reading is collapsed to one snapshot"""
+        hub = live.MetricsHub(queue_size=4)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        fast.get(timeout=1)
+        received = []
+        for i in range(20):
+            hub.publish(self.delta(live, i))
+            received.append(fast.get(timeout=1))
+
+        assert len(received) == 20
+        assert slow.resets > 0
+        message = json.loads(slow.get(timeout=1).split(b'data: ')[1])
+        assert message['type'] == 'snapshot'
+        assert message['snapshot']['summary']['total_executions'] >= 16
+        assert hub.stats()['subscribers'] == 2
+
+
+class TestLiveMetricsFunction:
+    """Test the WebSocket routes and the stream fan-out Lambda"""
+
+    def connect(self, live, connection_id):
+        return live.lambda_handler({'requestContext': {'routeKey': '$connect', 'connectionId': connection_id}}, None)
+
+    def test_connections_are_tracked(self, aws, live):
+        """$connect stores the connection and $disconnect removes it"""
+        assert self.connect(live, 'a')['statusCode'] == 200
+        self.connect(live, 'b')
+        live.lambda_handler({'requestContext': {'routeKey': '$disconnect', 'connectionId': 'a'}}, None)
+
+        assert [item['connection_id'] for item in aws.table(live.connections_table_name).items()] == ['b']
+
+    def test_batch_is_pushed_once_to_every_viewer(self, aws, live, analytics):
+        """One delta per batch reaches each connection and gone viewers are pruned"""
+        for connection_id in ('a', 'b', 'c'):
+            self.connect(live, connection_id)
+        aws.apigateway_management.gone.add('c')
+        records = recorded_stream(aws, analytics)
+        for i in range(3):
+            aws.table(analytics.table_name).put_item(Item=log_item(i))
+
+        result = live.lambda_handler({'Records': records}, None)
+
+        assert result == {'records': 3, 'cells': 2, 'anomalies': 0, 'connections': 3, 'delivered': 2, 'gone': 1, 'failed': 0}
+        [message] = aws.apigateway_management.messages['a']
+        assert message == aws.apigateway_management.messages['b'][0]
+        assert json.loads(message)['delta']['summary']['total_executions'] == 3
+        assert sorted(item['connection_id'] for item in aws.table(live.connections_table_name).items()) == ['a', 'b']
+
+
+    def test_delivery_failures_do_not_fail_the_batch(self, aws, live, analytics, monkeypatch):
+        """Once the cube is written, a failing delta is logged rather than retried"""
+        records = recorded_stream(aws, analytics)
+        for i in range(3):
+            aws.table(analytics.table_name).put_item(Item=log_item(i))
+
+        def unavailable():
+            raise live.ClientError({'Error': {'Code': 'InternalServerError'}}, 'Scan')
+
+        monkeypatch.setattr(live, 'list_connections', unavailable)
+        result = live.lambda_handler({'Records': records}, None)
+
+        assert result['cells'] == 2 and 'InternalServerError' in result['error']
+        assert sum(item.get('executions', 0) for item in aws.table(live.cube_table_name).items()) == 3
+
+
+class TestLocalServer:
+    """Test the local dashboard server's event stream"""
+
+    def test_viewers_receive_logged_executions(self, aws):
+        """A viewer gets a snapshot and then a delta for each logged execution"""
+        server = LiveServer(aws, port=0, keepalive_seconds=0.1).start()
+        try:
+            host, port = server.httpd.server_address[:2]
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request('GET', '/live')
+            response = connection.getresponse()
+            assert response.getheader('Content-Type') == 'text/event-stream'
+
+            def next_message():
+                while True:
+                    line = response.readline()
+                    if line.startswith(b'data: '):
+                        return json.loads(line[6:])
+
+            assert next_message()['type'] == 'snapshot'
+            threading.Thread(target=aws.table(server.analytics.table_name).put_item,
+                             kwargs={'Item': log_item(1)}).start()
+            message = next_message()
+            connection.close()
+        finally:
+            server.stop()
+
+        assert message['type'] == 'delta'
+        assert message['seq'] == 1
+        assert message['delta']['recent_executions'][0]['execution_id'] == 'exec_1'
+
+    def test_dashboard_points_at_local_endpoints(self, aws):
+        """The served dashboard uses the local /analytics and /live paths"""
+        server = LiveServer(aws, port=0)
+        try:
+            html = server.dashboard().decode()
+        finally:
+            server.httpd.server_close()
+
+        assert "const API_ENDPOINT = '/analytics';" in html
+        assert "const LIVE_ENDPOINT = '/live';" in html
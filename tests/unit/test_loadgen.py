@@ -0,0 +1,180 @@
+"""
+Unit tests for the open-loop load generator
+"""
+
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from benchmarks import loadgen
+from local.fakes import LocalAWS
+from local.server import LiveServer
+
+
+class StallingTarget:
+    """Answers in a millisecond, except for one long stall"""
+
+    def __init__(self, stall_at=10, stall_s=0.5):
+        self.calls = 0
+        self.stall_at = stall_at
+        self.stall_s = stall_s
+        self.lock = threading.Lock()
+
+    def send(self, request):
+        with self.lock:
+            self.calls += 1
+            stall = self.calls == self.stall_at
+        time.sleep(self.stall_s if stall else 0.001)
+        return 200
+
+
+class TestLatencyHistogram:
+    """Test the log-linear latency histogram"""
+
+    def test_percentiles_are_within_bucket_precision(self):
+        """Percentiles agree with exact ones to within 1/64"""
+        rng = random.Random(4)
+        values = sorted(int(rng.lognormvariate(9, 1.2)) for _ in range(20000))
+        histogram = loadgen.LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        for pct in (50, 90, 99, 99.9):
+            exact = values[max(0, int(pct / 100 * len(values) + 0.5) - 1)]
+            assert histogram.percentile(pct) == pytest.approx(exact, rel=1 / 64)
+        assert histogram.percentile(100) == histogram.max == values[-1]
+        assert histogram.min == values[0]
+        assert len(histogram.counts) < 1000
+
+    def test_bucket_bounds_cover_every_value(self):
+        """Each value falls inside the bounds of its own bucket"""
+        histogram = loadgen.LatencyHistogram()
+        for value in list(range(300)) + [1000, 4095, 4096, 123456789]:
+            low, high = histogram.bucket_bounds(histogram._index(value))
+            assert low <= value <= high
+
+    def test_merge_equals_recording_everything_once(self):
+        """Merged histograms equal one histogram of all the values"""
+        rng = random.Random(8)
+        values = [rng.randint(0, 10 ** 7) for _ in range(3000)]
+        left, right, both = loadgen.LatencyHistogram(), loadgen.LatencyHistogram(), loadgen.LatencyHistogram()
+        for i, value in enumerate(values):
+            (left if i % 2 else right).record(value)
+            both.record(value)
+        left.merge(right)
+
+        assert (left.counts, left.total, left.min, left.max, left.sum) == (
+            both.counts, both.total, both.min, both.max, both.sum)
+
+    def test_percentile_distribution_format(self):
+        """The .hgrm output has the HdrHistogram columns and ends at the max"""
+        histogram = loadgen.LatencyHistogram()
+        for value in range(1000, 101000, 100):
+            histogram.record(value)
+
+        lines = histogram.percentile_distribution().splitlines()
+        rows = [line.split() for line in lines[2:] if line and not line.startswith('#')]
+
+        assert lines[0].split() == ['Value', 'Percentile', 'TotalCount', '1/(1-Percentile)']
+        assert float(rows[0][1]) == 0.0
+        assert [float(row[1]) for row in rows] == sorted(float(row[1]) for row in rows)
+        assert float(rows[-1][0]) == pytest.approx(histogram.max / 1000)
+        assert int(rows[-1][2]) == histogram.total
+        assert lines[-2].startswith('#[Mean')
+
+
+class TestSchedule:
+    """Test open-loop arrival schedules"""
+
+    def test_constant_and_poisson_rates(self):
+        """Both schedules offer the requested rate for the duration"""
+        constant = list(loadgen.arrival_offsets(50, 4))
+        poisson = list(loadgen.arrival_offsets(500, 20, 'poisson', seed=3))
+
+        assert len(constant) == 200
+        assert constant[1] - constant[0] == pytest.approx(0.02)
+        assert len(poisson) == pytest.approx(10000, rel=0.05)
+        assert all(0 <= offset < 20 for offset in poisson)
+
+    def test_recorded_timing_is_replayed_with_speed(self):
+        """A log's own offsets are scaled by the speed and cut at the duration"""
+        log = [{'method': 'GET', 'path': '/analytics', 'at': at} for at in (0, 1, 2, 3, 40)]
+
+        offsets = [offset for offset, _ in loadgen.schedule(log, None, duration=10, speed=2)]
+
+        assert offsets == [0, 0.5, 1, 1.5]
+
+    def test_coordinated_omission_is_corrected(self):
+        """A stall shows in the latency of every request queued behind it"""
+        report = loadgen.run_load(StallingTarget(), ((i * 0.01, {'method': 'GET', 'path': '/analytics'})
+                                                     for i in range(100)), concurrency=1)
+        endpoint = report['endpoints']['GET /analytics']
+
+        # Only one request is slow to serve, but about 50 were scheduled
+        # during the stall and waited for it
+        assert endpoint['service_ms']['p90'] < 50
+        assert endpoint['latency_ms']['p50'] > 20
+        assert endpoint['latency_ms']['p90'] > 200
+        assert endpoint['requests'] == report['scheduled'] == 100
+
+
+class TestTargets:
+    """Test driving the handlers in-process and over HTTP"""
+
+    def test_in_process_run_across_endpoints(self):
+        """A synthetic mix reaches every handler without server errors"""
+        target = loadgen.InProcessTarget(log_items=200)
+        source = loadgen.SyntheticRequests({'trigger': 1, 'chat': 1, 'analytics': 1, 'cube': 1}, seed=5)
+
+        report = loadgen.run_load(target, loadgen.schedule(source, 200, 0.5), concurrency=8)
+
+        assert set(report['endpoints']) == {'POST /trigger', 'POST /chat', 'GET /analytics', 'GET /analytics/cube'}
+        assert report['overall']['requests'] == 100
+        assert report['overall']['error_rate'] == 0
+        assert all(row['statuses'] == {'200': row['requests']} for row in report['endpoints'].values())
+
+    def test_recorded_requests_replay_in_process(self, tmp_path):
+        """Logged requests in both forms replay, and unknown routes count as 404"""
+        path = tmp_path / 'requests.jsonl'
+        path.write_text('\n'.join(json.dumps(line) for line in [
+            {'method': 'POST', 'path': '/chat', 'body': {'message': 'What is DynamoDB?'}, 'at': 0},
+            {'httpMethod': 'GET', 'path': '/analytics/cube', 'queryStringParameters': {'group_by': 'region'},
+             'at': 0.05},
+            {'method': 'GET', 'path': '/result/missing', 'query': {'wait': '0'}, 'at': 0.1},
+            {'method': 'GET', 'path': '/nowhere', 'at': 0.15},
+        ]) + '\n')
+
+        report = loadgen.run_load(loadgen.InProcessTarget(log_items=0),
+                                  loadgen.schedule(loadgen.load_requests(str(path)), None, 10), concurrency=2)
+        endpoints = report['endpoints']
+
+        assert endpoints['POST /chat']['statuses'] == {'200': 1}
+        assert endpoints['GET /analytics/cube']['statuses'] == {'400': 1}
+        assert endpoints['GET /result/{request_id}']['client_error_rate'] == 1
+        assert endpoints['GET /nowhere']['statuses'] == {'404': 1}
+        assert report['overall']['error_rate'] == 0
+
+    def test_url_target(self):
+        """Requests against a base URL reuse connections and record statuses"""
+        server = LiveServer(LocalAWS(), port=0).start()
+        try:
+            target = loadgen.UrlTarget(server.url + '/')
+            log = [{'method': 'GET', 'path': '/analytics', 'query': {'hours': '24'}}]
+            report = loadgen.run_load(target, loadgen.schedule(log, 100, 0.2), concurrency=2)
+        finally:
+            server.stop()
+
+        assert report['endpoints']['GET /analytics']['statuses'] == {'200': 20}
+
+    def test_cli_writes_histograms(self, tmp_path, capsys):
+        """--json prints the report and --hgrm-dir writes one file per endpoint"""
+        code = loadgen.main(['--rps', '100', '--duration', '0.3', '--mix', 'analytics=1,cube=1',
+                             '--hgrm-dir', str(tmp_path), '--json'])
+        report = json.loads(capsys.readouterr().out)
+
+        assert code == 0
+        assert report['overall']['requests'] == 30
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['GET_analytics.hgrm', 'GET_analytics_cube.hgrm']
@@ -0,0 +1,108 @@
+"""
+Unit tests for the distributed chat rate limiter
+"""
+
+import json
+import sys
+
+import pytest
+
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def chatbot(aws):
+    return load_handler('chatbot', aws)
+
+
+@pytest.fixture()
+def stores(chatbot):
+    # rate_limit_store is importable once the chatbot's CodeUri is on sys.path
+    return sys.modules[chatbot.DynamoDBRateLimitStore.__module__]
+
+
+def chat_event(text='hello', source_ip='10.0.0.1'):
+    return {
+        'body': json.dumps({'message': text}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': source_ip}}
+    }
+
+
+class TestDynamoDBRateLimitStore:
+    """Test atomic GCRA admission against the table"""
+
+    def test_burst_then_limit(self, chatbot, aws):
+        """A new key admits a full burst, then is limited until its TAT passes"""
+        store = chatbot.DynamoDBRateLimitStore(aws.table('ChatRateLimits'))
+
+        results = [store.acquire('k', 0, 1000, 2000) for _ in range(4)]
+
+        assert [allowed for allowed, _ in results] == [True, True, True, False]
+        assert results[2][1] == 3000
+        assert results[3] == (False, 3000)
+        assert store.acquire('k', 1000, 1000, 2000) == (True, 4000)
+
+    def test_idle_key_restarts_from_now(self, chatbot, aws):
+        """A key whose TAT has passed starts again as a new key"""
+        store = chatbot.DynamoDBRateLimitStore(aws.table('ChatRateLimits'))
+        store.acquire('k', 0, 1000, 0)
+
+        assert store.acquire('k', 60000, 1000, 0) == (True, 61000)
+        item = aws.table('ChatRateLimits').get_item(Key={'limiter_key': 'k'})['Item']
+        assert item['expires_at'] == 62
+
+    def test_admission_needs_no_read(self, chatbot, aws):
+        """Admitted requests cost one conditional write and no read"""
+        table = aws.table('ChatRateLimits')
+        store = chatbot.DynamoDBRateLimitStore(table)
+
+        for now in range(0, 5000, 1000):
+            assert store.acquire('k', now, 1000, 0)[0]
+
+        assert table.read_count == 0
+
+
+class TestDistributedRateLimiter:
+    """Test RateLimiter with a shared store"""
+
+    def test_limit_holds_across_containers(self, chatbot, stores):
+        """Two containers sharing a store admit max_requests between them"""
+        store = stores.InMemoryRateLimitStore()
+        clock = lambda: 100.0
+        containers = [chatbot.RateLimiter(max_requests=5, window_seconds=60, store=store, clock=clock)
+                      for _ in range(2)]
+
+        admitted = sum(containers[i % 2].is_allowed('client') for i in range(20))
+
+        assert admitted == 5
+
+    def test_limited_client_skips_round_trip(self, chatbot, stores):
+        """Once denied, repeat requests are refused from the local TAT"""
+        store = stores.InMemoryRateLimitStore()
+        limiter = chatbot.RateLimiter(max_requests=2, window_seconds=60, store=store, clock=lambda: 0.0)
+
+        for _ in range(10):
+            limiter.is_allowed('client')
+
+        assert store.call_count == 2
+
+    def test_handler_uses_shared_table(self, aws, monkeypatch):
+        """With RATE_LIMIT_TABLE set, a second container sees the first container's usage"""
+        monkeypatch.setenv('RATE_LIMIT_TABLE', 'ChatRateLimits')
+        monkeypatch.setenv('CHAT_RATE_LIMIT_REQUESTS', '2')
+        first = load_handler('chatbot', aws)
+        second = load_handler('chatbot', aws)
+
+        statuses = [first.lambda_handler(chat_event(), None)['statusCode'],
+                    second.lambda_handler(chat_event(), None)['statusCode'],
+                    second.lambda_handler(chat_event(), None)['statusCode']]
+
+        assert statuses == [200, 200, 429]
+        assert second.rate_limiter.store is not None
@@ -0,0 +1,241 @@
+"""
+Unit tests for the chatbot's exact-match response cache
+"""
+
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+from local.fakes import LocalAWS, client_error
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def chatbot(aws):
+    return load_handler('chatbot', aws)
+
+
+@pytest.fixture()
+def cache_module(chatbot):
+    # response_cache is importable once the chatbot's CodeUri is on sys.path
+    return sys.modules[chatbot.ResponseCache.__module__]
+
+
+def chat_event(text='What are your opening hours?', source_ip='10.0.0.1', stream=False):
+    return {
+        'body': json.dumps({'message': text, 'stream': stream}),
+        'headers': {'User-Agent': 'pytest'},
+        'requestContext': {'identity': {'sourceIp': source_ip}}
+    }
+
+
+class TestResponseCache:
+    """Test TTL, eviction, coalescing and the shared tier"""
+
+    def test_key_ignores_key_order(self, chatbot):
+        """Equivalent payloads hash to the same key; different models do not"""
+        first = chatbot.cache_key('model-a', {'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 10})
+        second = chatbot.cache_key('model-a', {'max_tokens': 10, 'messages': [{'content': 'hi', 'role': 'user'}]})
+
+        assert first == second
+        assert chatbot.cache_key('model-b', {'max_tokens': 10}) != chatbot.cache_key('model-a', {'max_tokens': 10})
+
+    def test_entries_expire(self, chatbot):
+        """An entry is served until its TTL passes"""
+        clock = [0.0]
+        cache = chatbot.ResponseCache(ttl_seconds=60, clock=lambda: clock[0])
+        cache.put('k', {'reply': 'cached'})
+
+        clock[0] = 59.0
+        assert cache.get('k') == ({'reply': 'cached'}, 'memory')
+        clock[0] = 61.0
+        assert cache.get('k') == (None, None)
+
+    def test_size_bounded_lru(self, chatbot):
+        """The least recently used entry is evicted first"""
+        cache = chatbot.ResponseCache(max_entries=2)
+        cache.put('a', {'reply': 'a'})
+        cache.put('b', {'reply': 'b'})
+        cache.get('a')
+        cache.put('c', {'reply': 'c'})
+
+        assert cache.get('b') == (None, None)
+        assert cache.get('a')[0] == {'reply': 'a'}
+        assert cache.stats()['evictions'] == 1
+
+    def test_concurrent_misses_share_one_call(self, chatbot):
+        """Requests arriving while the first is in flight wait for its result"""
+        cache = chatbot.ResponseCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'reply': 'answer'}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert sorted(source for _, source in results) == ['coalesced'] * 7 + ['model']
+        assert all(value == {'reply': 'answer'} for value, _ in results)
+
+    def test_failed_call_is_not_cached(self, chatbot):
+        """Errors propagate and the next request tries again"""
+        cache = chatbot.ResponseCache()
+
+        def fail():
+            raise RuntimeError('model down')
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute('k', fail)
+        assert cache.get_or_compute('k', lambda: {'reply': 'ok'}) == ({'reply': 'ok'}, 'model')
+
+    def test_counters_add_up_across_threads(self, chatbot):
+        """Every lookup from concurrent request threads is counted once"""
+        cache = chatbot.ResponseCache()
+        cache.put('hit', {'reply': 'cached'})
+
+        def lookups():
+            for _ in range(500):
+                cache.get('hit')
+                cache.get('miss')
+
+        threads = [threading.Thread(target=lookups) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['hit_rate']) == (4000, 4000, 0.5)
+
+    def test_abandoned_call_releases_waiters(self, chatbot):
+        """A caller that finishes without a value lets waiting callers make their own call"""
+        cache = chatbot.ResponseCache()
+        _, _, pending = cache.begin('k')
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(cache.begin('k')))
+        waiter.start()
+        time.sleep(0.05)
+        cache.finish('k', pending)
+        waiter.join()
+
+        value, source, own = results[0]
+        assert (value, source) == (None, None) and own is not pending
+        assert cache.get('k') == (None, None)
+
+    def test_shared_tier_survives_cold_start(self, chatbot, cache_module):
+        """A new container finds replies written by another one"""
+        shared = cache_module.InMemoryResponseCacheStore()
+        chatbot.ResponseCache(shared=shared).put('k', {'reply': 'shared reply'})
+
+        cold = chatbot.ResponseCache(shared=shared)
+        assert cold.get('k') == ({'reply': 'shared reply'}, 'shared')
+        assert cold.get('k')[1] == 'memory'
+
+    def test_dynamodb_tier_ignores_expired_items(self, chatbot, aws):
+        """Items past expires_at are misses even before TTL deletion"""
+        store = chatbot.DynamoDBResponseCacheStore(aws.table('ChatResponseCache'))
+        store.put('k', {'reply': 'hi', 'output_tokens': 1}, expires_at=100)
+
+        assert store.get('k', now=50) == {'reply': 'hi', 'output_tokens': 1}
+        assert store.get('k', now=150) is None
+
+    def test_shared_tier_errors_are_not_fatal(self, chatbot):
+        """A failing shared tier degrades to the local cache"""
+        class BrokenStore:
+            def get(self, key, now):
+                raise client_error('ProvisionedThroughputExceededException', 'slow down', 'GetItem')
+
+            def put(self, key, value, expires_at):
+                raise client_error('ProvisionedThroughputExceededException', 'slow down', 'PutItem')
+
+        cache = chatbot.ResponseCache(shared=BrokenStore())
+        assert cache.get_or_compute('k', lambda: {'reply': 'ok'}) == ({'reply': 'ok'}, 'model')
+        assert cache.get('k') == ({'reply': 'ok'}, 'memory')
+        assert cache.stats()['shared_errors'] == 2
+
+
+class TestHandlerCaching:
+    """Test the cache in front of Bedrock"""
+
+    def test_repeated_prompt_skips_the_model(self, chatbot, aws):
+        """A second identical first message is answered from cache"""
+        first = chatbot.lambda_handler(chat_event(source_ip='10.0.0.1'), None)
+        second = chatbot.lambda_handler(chat_event(source_ip='10.0.0.2'), None)
+
+        assert len(aws.bedrock.calls) == 1
+        assert first['headers']['X-Cache'] == 'MISS'
+        assert second['headers']['X-Cache'] == 'HIT'
+        metadata = json.loads(second['body'])['metadata']
+        assert metadata['cache'] == {'hit': True, 'source': 'memory', 'hit_rate': 0.5}
+        assert json.loads(second['body'])['reply'] == json.loads(first['body'])['reply']
+
+    def test_history_is_part_of_the_key(self, chatbot, aws):
+        """The same message later in a conversation goes to the model"""
+        chatbot.lambda_handler(chat_event(), None)
+        chatbot.lambda_handler(chat_event(), None)
+
+        assert len(aws.bedrock.calls) == 2
+
+    def test_streamed_requests_share_the_cache(self, chatbot, aws):
+        """A streamed miss fills the cache and a streamed hit arrives as one delta"""
+        chatbot.lambda_handler(chat_event(source_ip='10.0.0.1', stream=True), None)
+        response = chatbot.lambda_handler(chat_event(source_ip='10.0.0.2', stream=True), None)
+        buffered = chatbot.lambda_handler(chat_event(source_ip='10.0.0.3'), None)
+
+        assert len(aws.bedrock.calls) == 1
+        assert response['headers']['X-Cache'] == 'HIT'
+        assert response['body'].count('event: delta') == 1
+        assert json.loads(buffered['body'])['reply'] == aws.bedrock.reply
+
+    def test_concurrent_identical_streams_share_one_call(self, chatbot, aws):
+        """Streams arriving while the first is generating wait for its reply"""
+        aws.bedrock.chunk_latency_s = 0.01
+        responses = []
+        threads = [threading.Thread(target=lambda ip=ip: responses.append(
+                       chatbot.lambda_handler(chat_event(source_ip=ip, stream=True), None)))
+                   for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(aws.bedrock.calls) == 1
+        assert sorted(r['headers']['X-Cache'] for r in responses) == ['HIT', 'HIT', 'HIT', 'MISS']
+        hits = [r['body'] for r in responses if r['headers']['X-Cache'] == 'HIT']
+        assert all(body.count('event: delta') == 1 and json.dumps(aws.bedrock.reply) in body for body in hits)
+
+    def test_shared_table_serves_a_cold_container(self, aws, monkeypatch):
+        """A reply cached by one container is served to a freshly loaded one"""
+        monkeypatch.setenv('RESPONSE_CACHE_TABLE', 'ChatResponseCache')
+        warm = load_handler('chatbot', aws)
+        warm.lambda_handler(chat_event(source_ip='10.0.0.1'), None)
+        cold = load_handler('chatbot', aws)
+        response = cold.lambda_handler(chat_event(source_ip='10.0.0.2'), None)
+
+        assert len(aws.bedrock.calls) == 1
+        assert json.loads(response['body'])['metadata']['cache']['source'] == 'shared'
+
+    def test_cache_can_be_disabled(self, aws, monkeypatch):
+        """A TTL of 0 sends every request to the model"""
+        monkeypatch.setenv('RESPONSE_CACHE_TTL_SECONDS', '0')
+        chatbot = load_handler('chatbot', aws)
+        chatbot.lambda_handler(chat_event(source_ip='10.0.0.1'), None)
+        chatbot.lambda_handler(chat_event(source_ip='10.0.0.2'), None)
+
+        assert len(aws.bedrock.calls) == 2
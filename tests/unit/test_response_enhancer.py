@@ -0,0 +1,116 @@
+"""
+Unit tests for the chunked response enhancer
+"""
+
+import importlib.util
+import itertools
+import os
+
+import pytest
+
+ENHANCER_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'pipeline', 'response_enhancer', 'app.py'
+)
+
+spec = importlib.util.spec_from_file_location('response_enhancer_app', ENHANCER_PATH)
+enhancer = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(enhancer)
+
+
+def reference_content(input_text, analysis, base_response):
+    """Compose the response by repeated concatenation, as the enhancer used to"""
+    complexity = analysis.get('complexity', 'medium')
+    category = analysis.get('category', 'general')
+    features = analysis.get('features', {})
+    content = base_response or enhancer.generate_mock_response(input_text, complexity, category)
+
+    example = enhancer.EXAMPLE_SECTIONS.get(category, enhancer.EXAMPLE_SECTIONS['general'])
+
+    if complexity == 'high':
+        content = content + enhancer.DETAILED_EXPLANATION_SECTION + example
+        content = enhancer.STRUCTURED_FORMAT_PREFIX + content + enhancer.STRUCTURED_FORMAT_SUFFIX
+    elif complexity == 'medium':
+        content = content + enhancer.MODERATE_DETAIL_SECTION
+        if category in ['technical', 'research']:
+            content = content + example
+
+    if category == 'technical':
+        content = content + enhancer.TECHNICAL_FORMATTING_SECTION
+    elif category == 'creative':
+        content = content + enhancer.CREATIVE_ELEMENTS_SECTION
+    elif category == 'research':
+        content = content + enhancer.RESEARCH_STRUCTURE_SECTION
+
+    if features.get('has_questions'):
+        content = content + enhancer.QA_STRUCTURE_SECTION
+    if features.get('multi_part'):
+        content = enhancer.SECTION_HEADERS_PREFIX + content + enhancer.SECTION_HEADERS_SUFFIX
+
+    return content + enhancer.FINAL_POLISH_SECTIONS.get(complexity, enhancer.FINAL_POLISH_SECTIONS['medium'])
+
+
+ANALYSES = [
+    {
+        'complexity': complexity,
+        'category': category,
+        'features': {'has_questions': has_questions, 'multi_part': multi_part}
+    }
+    for complexity, category, has_questions, multi_part in itertools.product(
+        ['high', 'medium', 'low'],
+        ['technical', 'creative', 'research', 'general'],
+        [False, True],
+        [False, True]
+    )
+]
+
+
+class TestChunkedEnhancement:
+    """Test that streaming and non-streaming output agree"""
+
+    @pytest.mark.parametrize('analysis', ANALYSES)
+    def test_chunks_match_reference(self, analysis):
+        """Joined chunks equal the concatenation-based composition"""
+        chunks = list(enhancer.stream_enhanced_response("Explain caching", analysis, "Base answer."))
+        assert ''.join(chunks) == reference_content("Explain caching", analysis, "Base answer.")
+
+    @pytest.mark.parametrize('analysis', ANALYSES)
+    def test_lengths_computed_without_content(self, analysis):
+        """Plan lengths match the materialized content"""
+        result = enhancer.enhance_response("Explain caching", analysis, "")
+        assert result['enhanced_length'] == len(result['content'])
+        assert result['quality_score'] == enhancer.calculate_quality_score(
+            result['content'][:-len(enhancer.FINAL_POLISH_SECTIONS[analysis['complexity']])],
+            result['enhancements'][:-1],
+            analysis['complexity']
+        )
+
+    def test_base_response_is_single_chunk(self):
+        """The base response is yielded as-is, never copied into a larger string"""
+        base = "x" * 100000
+        plan = enhancer.plan_enhancement("input", ANALYSES[0], base)
+        chunks = list(enhancer.iter_response_chunks(plan))
+        assert chunks[len(plan['prefixes'])] is base
+
+    def test_first_chunk_is_prefix_section(self):
+        """Wrapped responses start with the outermost section header"""
+        analysis = {'complexity': 'high', 'category': 'general', 'features': {'multi_part': True}}
+        first = next(enhancer.stream_enhanced_response("input", analysis, "y" * 100000))
+        assert first == enhancer.SECTION_HEADERS_PREFIX
+
+
+class TestHandlers:
+    """Test that the Step Functions contract is unchanged"""
+
+    def test_lambda_handler_returns_content(self):
+        """lambda_handler still returns one materialized content string"""
+        event = {'input': 'Write a story', 'analysis': ANALYSES[4], 'base_response': 'Once upon a time.'}
+        result = enhancer.lambda_handler(event, None)
+        assert result['statusCode'] == 200
+        assert result['enhanced_response']['content'] == reference_content(
+            event['input'], event['analysis'], event['base_response']
+        )
+
+    def test_stream_handler_validates_input(self):
+        """stream_handler rejects events missing input or analysis"""
+        with pytest.raises(ValueError):
+            enhancer.stream_handler({'input': 'text'}, None)
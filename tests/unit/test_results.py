@@ -0,0 +1,224 @@
+"""
+Unit tests for the GET /result/{request_id} long-poll endpoint
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from local.expressions import apply_update, evaluate_condition
+from local.fakes import FakeContext, LocalAWS
+from local.handlers import load_handler
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def trigger(aws):
+    return load_handler('trigger', aws)
+
+
+@pytest.fixture()
+def logger(aws):
+    return load_handler('pipeline_logger', aws)
+
+
+@pytest.fixture()
+def results(aws):
+    return load_handler('results', aws)
+
+
+def result_event(request_id, wait=None):
+    return {
+        'pathParameters': {'request_id': request_id},
+        'queryStringParameters': {'wait': str(wait)} if wait is not None else None
+    }
+
+
+def start_async(trigger, text='Explain the CAP theorem'):
+    event = {'body': json.dumps({'input': text, 'mode': 'async'})}
+    return json.loads(trigger.lambda_handler(event, FakeContext())['body'])
+
+
+def logger_event(request_id):
+    return {
+        'input': 'Explain the CAP theorem',
+        'request_id': request_id,
+        'analysis': {'analysis': {'complexity': 'medium', 'category': 'explanation'}, 'processing_time_ms': 1.5},
+        'enhanced_response': {'enhanced_response': {'content': 'Partition tolerance...', 'quality_score': 0.82},
+                              'processing_time_ms': 2.5}
+    }
+
+
+class TestResultEndpoint:
+    """Test status codes and sources of /result responses"""
+
+    def test_running_execution_returns_202(self, trigger, results):
+        """A started but unfinished execution is reported as RUNNING"""
+        started = start_async(trigger)
+
+        response = results.lambda_handler(result_event(started['request_id'], wait=0), None)
+        body = json.loads(response['body'])
+
+        assert response['statusCode'] == 202
+        assert response['headers']['Retry-After'] == '1'
+        assert body['status'] == 'RUNNING'
+        assert body['execution_arn'] == started['execution_arn']
+
+    def test_logged_result_is_served_from_table_then_memory(self, trigger, logger, results, aws):
+        """The logger's cached result is returned, then served from the warm cache"""
+        started = start_async(trigger)
+        logger.lambda_handler(logger_event(started['request_id']), None)
+
+        first = results.lambda_handler(result_event(started['request_id'], wait=0), None)
+        reads = aws.table('PipelineResults').read_count
+        second = results.lambda_handler(result_event(started['request_id'], wait=0), None)
+
+        body = json.loads(first['body'])
+        assert first['statusCode'] == 200
+        assert body['status'] == 'SUCCEEDED'
+        assert body['source'] == 'table'
+        assert body['result']['content'] == 'Partition tolerance...'
+        assert body['result']['quality_score'] == 0.82
+        assert body['execution_arn'] == started['execution_arn']
+        assert json.loads(second['body'])['source'] == 'memory'
+        assert aws.table('PipelineResults').read_count == reads
+
+    def test_failed_result(self, logger, results):
+        """A logged failure is terminal and carries the error"""
+        event = {'input': 'x', 'request_id': 'req-failed',
+                 'error': {'Error': 'ValueError', 'Cause': 'Invalid input provided'}}
+        logger.lambda_handler(event, None)
+
+        body = json.loads(results.lambda_handler(result_event('req-failed', wait=0), None)['body'])
+
+        assert body['status'] == 'FAILED'
+        assert 'Invalid input provided' in body['error']['error_message']
+
+    def test_describe_fallback_writes_back(self, trigger, logger, results, aws):
+        """A finished execution with no cached result is read from Step Functions"""
+        started = start_async(trigger)
+        # The logger's return value is the execution output; no request_id, so nothing is cached
+        output = logger.lambda_handler({**logger_event(started['request_id']), 'request_id': None}, None)
+        aws.stepfunctions.complete_execution(started['execution_arn'], json.loads(json.dumps(output)))
+
+        response = results.lambda_handler(result_event(started['request_id'], wait=0), None)
+        body = json.loads(response['body'])
+
+        assert response['statusCode'] == 200
+        assert body['source'] == 'step_functions'
+        assert body['result'] == {'content': 'Partition tolerance...', 'quality_score': 0.82,
+                                  'complexity': 'medium', 'category': 'explanation',
+                                  'processing_time_ms': 4.0}
+        stored = aws.table('PipelineResults').get_item(Key={'request_id': started['request_id']})['Item']
+        assert stored['status'] == 'SUCCEEDED'
+
+    def test_describe_fallback_reports_caught_failures(self, trigger, logger, results, aws):
+        """A failure the state machine caught and logged is FAILED, not the execution's SUCCEEDED"""
+        started = start_async(trigger)
+        output = logger.lambda_handler({'input': 'x', 'error': {'Error': 'ValueError', 'Cause': 'bad input'}}, None)
+        aws.stepfunctions.complete_execution(started['execution_arn'], output)
+
+        body = json.loads(results.lambda_handler(result_event(started['request_id'], wait=0), None)['body'])
+
+        assert body['status'] == 'FAILED'
+        assert 'result' not in body
+        assert body['error']['error_message'] == 'ValueError: bad input'
+
+    def test_state_machine_run_populates_cache(self, aws):
+        """A full local execution leaves the enhanced response in the result table"""
+        pytest.importorskip('yaml')
+        from local.state_machine import LocalStateMachine
+
+        machine = LocalStateMachine.from_template(aws=aws)
+        machine.execute({'input': 'Explain database indexing', 'request_id': 'req-sfn'})
+        results = machine.functions.get('PipelineResultFunction') or load_handler('results', aws).lambda_handler
+
+        body = json.loads(results(result_event('req-sfn', wait=0), None)['body'])
+
+        assert body['status'] == 'SUCCEEDED'
+        assert body['result']['complexity'] in ('low', 'medium', 'high')
+        assert 'database indexing' in body['result']['content'].lower()
+
+    def test_unknown_request_returns_404(self, results):
+        """Request IDs that were never triggered are not found"""
+        response = results.lambda_handler(result_event('missing', wait=0), None)
+        assert response['statusCode'] == 404
+
+    def test_missing_request_id_returns_400(self, results):
+        """The request_id path parameter is required"""
+        assert results.lambda_handler({'pathParameters': None}, None)['statusCode'] == 400
+
+    def test_invalid_wait_returns_400(self, results):
+        """A non-numeric wait is a client error"""
+        assert results.lambda_handler(result_event('r', wait='soon'), None)['statusCode'] == 400
+
+
+class TestLongPolling:
+    """Test waiting for results that complete during the request"""
+
+    def test_returns_when_result_arrives(self, trigger, logger, results):
+        """The poll returns as soon as the logger writes, well before the wait expires"""
+        started = start_async(trigger)
+        writer = threading.Timer(0.2, logger.lambda_handler, args=(logger_event(started['request_id']), None))
+        writer.start()
+
+        began = time.monotonic()
+        response = results.lambda_handler(result_event(started['request_id'], wait=5), None)
+        elapsed = time.monotonic() - began
+        writer.join()
+
+        assert response['statusCode'] == 200
+        assert elapsed < 2
+
+    def test_wait_is_clamped(self, results):
+        """Waits are capped by the configured maximum and the remaining Lambda time"""
+        assert results.extract_wait_seconds(result_event('r', wait=600), None) == results.RESULT_MAX_WAIT_SECONDS
+        assert results.extract_wait_seconds(result_event('r', wait=-3), None) == 0.0
+        assert results.extract_wait_seconds(result_event('r', wait=20), FakeContext(timeout_ms=3000)) <= 2.0
+
+    def test_pending_record_never_overwrites_result(self, trigger, logger, results, aws):
+        """A late RUNNING registration does not clobber a completed result"""
+        logger.lambda_handler(logger_event('req-late'), None)
+        trigger.record_pending_result('req-late', 'arn:late')
+
+        stored = aws.table('PipelineResults').get_item(Key={'request_id': 'req-late'})['Item']
+        assert stored['status'] == 'SUCCEEDED'
+
+
+class TestExpressions:
+    """Test the DynamoDB expression subset the fake table evaluates"""
+
+    def test_conditions(self):
+        """Functions, comparisons and boolean operators evaluate like DynamoDB"""
+        item = {'request_id': 'r', 'status': 'RUNNING', 'count': 3}
+        names = {'#s': 'status'}
+
+        assert evaluate_condition('attribute_exists(request_id)', item)
+        assert evaluate_condition('attribute_not_exists(missing) AND #s = :s', item, names, {':s': 'RUNNING'})
+        assert not evaluate_condition('NOT (#s = :s OR #s = :t)', item, names, {':s': 'RUNNING', ':t': 'X'})
+        assert evaluate_condition('count BETWEEN :a AND :b', item, None, {':a': 1, ':b': 3})
+
+    def test_updates(self):
+        """SET, ADD and REMOVE clauses apply in one expression"""
+        item = {'id': 'a', 'count': 1, 'old': True}
+
+        updated = apply_update('SET tags = list_append(if_not_exists(tags, :empty), :t), count = count + :one '
+                               'REMOVE old', item, None, {':empty': [], ':t': ['x'], ':one': 1})
+
+        assert updated == {'id': 'a', 'count': 2, 'tags': ['x']}
+        assert apply_update('ADD hits :n', {'id': 'a'}, None, {':n': 5})['hits'] == 5
+
+    def test_conditional_put_raises(self, aws):
+        """Failed conditions surface as ConditionalCheckFailedException"""
+        table = aws.table('PipelineResults')
+        table.put_item(Item={'request_id': 'r'}, ConditionExpression='attribute_not_exists(request_id)')
+
+        with pytest.raises(Exception) as error:
+            table.put_item(Item={'request_id': 'r'}, ConditionExpression='attribute_not_exists(request_id)')
+        assert error.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
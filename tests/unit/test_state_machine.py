@@ -0,0 +1,125 @@
+"""
+Unit tests for the local Step Functions executor
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip('yaml')
+
+from local.fakes import LocalAWS
+from local.state_machine import LocalStateMachine, StatesError, get_path, set_path
+
+
+@pytest.fixture()
+def aws():
+    return LocalAWS()
+
+
+@pytest.fixture()
+def machine(aws):
+    return LocalStateMachine.from_template(aws=aws)
+
+
+class TestTemplateExecution:
+    """Test the AIPipeline definition parsed from pipeline-template.yaml"""
+
+    def test_success_path(self, machine, aws):
+        """A valid input runs InputAnalysis, ResponseEnhancement and LogSuccess"""
+        record = machine.execute({'input': 'Explain database indexing', 'request_id': 'r1'})
+
+        assert record['status'] == 'SUCCEEDED'
+        assert [s['name'] for s in record['states']] == ['InputAnalysis', 'ResponseEnhancement', 'LogSuccess']
+        assert record['output']['statusCode'] == 200
+        assert len(aws.cloudwatch.metric_data) == 1
+
+    def test_result_paths_accumulate_state(self, machine):
+        """ResultPath merges each task result into the execution state"""
+        seen = {}
+        logger = machine.functions['PipelineLoggerFunction']
+        machine.functions['PipelineLoggerFunction'] = lambda event, context: seen.update(event) or logger(event, context)
+
+        machine.execute({'input': 'Write a poem', 'request_id': 'r2'})
+
+        assert seen['input'] == 'Write a poem'
+        assert seen['analysis']['analysis']['category'] == 'creative'
+        assert 'enhanced_response' in seen['enhanced_response']
+
+    def test_catch_routes_to_log_error(self, machine, aws):
+        """An analyzer exception is caught into $.error and logged"""
+        record = machine.execute({'input': '', 'request_id': 'r3'})
+
+        assert record['status'] == 'SUCCEEDED'
+        assert [s['status'] for s in record['states']] == ['CAUGHT', 'SUCCEEDED']
+        assert record['states'][1]['name'] == 'LogError'
+        logged = aws.table('PipelineLogs').items()[0]
+        assert logged['success'] is False
+
+    def test_run_many_summary(self, machine):
+        """Concurrent executions are all accounted for with per-state timings"""
+        inputs = [{'input': f"Question {i} about api design?", 'request_id': str(i)} for i in range(50)]
+
+        result = machine.run_many(inputs, workers=8)
+        summary = result['summary']
+
+        assert summary['executions'] == 50
+        assert summary['succeeded'] == 50
+        assert summary['states']['InputAnalysis']['count'] == 50
+        assert summary['throughput_per_sec'] > 0
+
+
+class TestSemantics:
+    """Test path, Retry and Catch handling on small definitions"""
+
+    def test_set_path(self):
+        """ResultPath replaces, discards or merges without mutating input"""
+        data = {'a': {'b': 1}}
+        assert set_path(data, '$', 5) == 5
+        assert set_path(data, None, 5) is data
+        assert set_path(data, '$.a.c', 2) == {'a': {'b': 1, 'c': 2}}
+        assert data == {'a': {'b': 1}}
+        assert get_path({'a': {'b': 1}}, '$.a.b') == 1
+
+    def test_retry_then_uncaught_failure(self):
+        """Retriers rerun the task, and unmatched errors fail the execution"""
+        calls = []
+
+        def flaky(event, context):
+            calls.append(event)
+            raise TimeoutError('upstream timeout')
+
+        definition = {
+            'StartAt': 'Work',
+            'States': {
+                'Work': {
+                    'Type': 'Task', 'Resource': 'local:function:Flaky', 'End': True,
+                    'Retry': [{'ErrorEquals': ['TimeoutError'], 'MaxAttempts': 2, 'IntervalSeconds': 1}]
+                }
+            }
+        }
+        machine = LocalStateMachine(definition, {'Flaky': flaky}, retry_time_scale=0)
+
+        record = machine.execute({'x': 1})
+
+        assert len(calls) == 3
+        assert record['status'] == 'FAILED'
+        assert record['error']['Error'] == 'TimeoutError'
+        assert json.loads(record['error']['Cause'])['errorMessage'] == 'upstream timeout'
+
+    def test_fail_state(self):
+        """Fail states stop the execution with their error and cause"""
+        definition = {
+            'StartAt': 'Stop',
+            'States': {'Stop': {'Type': 'Fail', 'Error': 'Custom', 'Cause': 'input rejected'}}
+        }
+        machine = LocalStateMachine(definition, {})
+
+        with pytest.raises(StatesError) as raised:
+            machine._run_state('Stop', definition['States']['Stop'], {}, {})
+        assert (raised.value.error, raised.value.cause) == ('Custom', 'input rejected')
+
+        record = machine.execute({})
+        assert record['status'] == 'FAILED'
+        assert record['error'] == {'Error': 'Custom', 'Cause': 'input rejected'}
+        assert record['output'] is None
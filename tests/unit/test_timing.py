@@ -0,0 +1,165 @@
+"""
+Unit tests for the shared phase timing instrumentation
+"""
+
+import json
+import time
+
+import pytest
+
+import timing
+from local.fakes import LocalAWS
+from local.handlers import load_handler
+
+
+def timing_lines(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{"timing"')]
+
+
+class TestPhaseTimer:
+    """Test phase recording and the Server-Timing format"""
+
+    def test_phases_record_in_first_run_order(self):
+        """Phases keep their order and repeated phases accumulate"""
+        timer = timing.PhaseTimer('test')
+        timer.record('query', 2_000_000)
+        timer.record('render', 500_000)
+        timer.record('query', 1_000_000)
+
+        assert timer.phases_ms() == {'query': 3.0, 'render': 0.5}
+        header = timer.server_timing()
+        assert header.startswith('query;dur=3.000, render;dur=0.500, total;dur=')
+
+    def test_handler_gets_server_timing(self, capsys):
+        """Phases inside an instrumented handler reach the header and the log"""
+        @timing.instrument_handler('demo')
+        def handler(event, context):
+            with timing.phase('work'):
+                time.sleep(0.01)
+            return {'statusCode': 200, 'headers': {'Access-Control-Allow-Origin': '*'}, 'body': '{}'}
+
+        response = handler({}, None)
+
+        work = float(response['headers']['Server-Timing'].split(',')[0].split('dur=')[1])
+        assert work >= 10
+        assert response['headers']['Timing-Allow-Origin'] == '*'
+        [line] = timing_lines(capsys.readouterr().out)
+        assert line['timing'] == 'demo'
+        assert line['status'] == 200
+        assert line['phases']['work'] >= 10
+
+    def test_timed_decorator_records_calls(self, capsys):
+        """A decorated helper is recorded under its phase name"""
+        @timing.timed('helper')
+        def helper():
+            return 'done'
+
+        @timing.instrument_handler('demo')
+        def handler(event, context):
+            helper()
+            helper()
+            return {'statusCode': 200}
+
+        handler({}, None)
+
+        assert 'helper' in timing_lines(capsys.readouterr().out)[0]['phases']
+
+    def test_phase_measures_outside_a_request(self):
+        """Without a current timer a phase still reports its duration"""
+        with timing.phase('alone') as measured:
+            time.sleep(0.005)
+
+        assert timing.current_timer() is None
+        assert measured.duration_ms >= 5
+
+    def test_errors_are_logged_and_raised(self, capsys):
+        """A failing handler still logs its phases before re-raising"""
+        @timing.instrument_handler('demo')
+        def handler(event, context):
+            with timing.phase('before_failure'):
+                raise KeyError('missing')
+
+        with pytest.raises(KeyError):
+            handler({}, None)
+        [line] = timing_lines(capsys.readouterr().out)
+        assert line['error'] == 'KeyError'
+        assert 'before_failure' in line['phases']
+        assert timing.current_timer() is None
+
+    def test_disabled_returns_functions_unchanged(self, monkeypatch):
+        """With timing off the decorators add no wrapper at all"""
+        monkeypatch.setattr(timing, 'ENABLED', False)
+
+        def handler(event, context):
+            return {'statusCode': 200, 'headers': {}}
+
+        assert timing.instrument_handler('demo')(handler) is handler
+        assert timing.timed('x')(handler) is handler
+        assert 'Server-Timing' not in handler({}, None)['headers']
+
+
+    def test_pool_workers_record_into_the_request(self):
+        """Phases timed on pool threads submitted through in_context reach the request's timer"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        @timing.instrument_handler('demo')
+        def handler(event, context):
+            def work(i):
+                with timing.phase('work'):
+                    time.sleep(0.005)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(timing.in_context(work), range(8)))
+                list(pool.map(work, range(8)))
+            return {'statusCode': 200, 'headers': {}, 'body': '{}'}
+
+        header = handler({}, None)['headers']['Server-Timing']
+
+        work = float(header.split(',')[0].split('dur=')[1])
+        assert header.startswith('work;dur=')
+        assert 40 <= work < 80
+
+
+class TestHandlers:
+    """Test the instrumented handlers"""
+
+    def test_chatbot_reports_its_phases(self):
+        """A chat reply breaks down into rate limit, history, model and record"""
+        chatbot = load_handler('chatbot', LocalAWS())
+        response = chatbot.lambda_handler({
+            'body': json.dumps({'message': 'Hello'}),
+            'headers': {'User-Agent': 'pytest'},
+            'requestContext': {'identity': {'sourceIp': '10.0.0.1'}}
+        }, None)
+
+        names = [entry.split(';')[0] for entry in response['headers']['Server-Timing'].split(', ')]
+        assert names == ['rate_limit', 'history', 'model', 'record', 'total']
+
+    def test_analytics_reports_its_scan(self):
+        """The analytics API times its table scan"""
+        aws = LocalAWS()
+        analytics = load_handler('analytics', aws)
+        response = analytics.lambda_handler({'queryStringParameters': {'hours': '1'}}, None)
+
+        assert response['headers']['Server-Timing'].startswith('scan;dur=')
+
+    def test_batch_trigger_times_starts_on_its_workers(self):
+        """Executions started on the batch pool are timed as start_execution"""
+        trigger = load_handler('trigger', LocalAWS())
+        response = trigger.lambda_handler({
+            'resource': '/trigger/batch',
+            'httpMethod': 'POST',
+            'body': json.dumps({'inputs': ['First question', 'Second question']})
+        }, None)
+
+        names = [entry.split(';')[0] for entry in response['headers']['Server-Timing'].split(', ')]
+        assert 'start_execution' in names and 'record_pending' in names
+
+    def test_step_function_tasks_log_without_headers(self, capsys):
+        """Task handlers log their phases and return their usual payload"""
+        analyzer = load_handler('input_analyzer', LocalAWS())
+        result = analyzer.lambda_handler({'input': 'Explain neural networks briefly'}, None)
+
+        assert 'headers' not in result
+        line = timing_lines(capsys.readouterr().out)[-1]
+        assert line['timing'] == 'input_analyzer'
+        assert result['processing_time_ms'] == pytest.approx(line['phases']['analyze'], abs=0.01)
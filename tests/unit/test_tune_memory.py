@@ -0,0 +1,144 @@
+"""
+Unit tests for the memory-size tuning harness
+"""
+
+import json
+
+import pytest
+
+from benchmarks import tune_memory
+
+
+def measurement(cpu_ms, calls=None, rss_mb=40.0, alloc_mb=1.0, count=100):
+    return {
+        'cpu_ms': [cpu_ms] * count,
+        'wall_ms': [cpu_ms] * count,
+        'calls': [calls or {}] * count,
+        'rss_loaded_mb': rss_mb,
+        'alloc_peak_mb': alloc_mb,
+        'rss_peak_mb': rss_mb + alloc_mb,
+    }
+
+
+def tier(model, memory_mb):
+    return next(row for row in model['tiers'] if row['memory_mb'] == memory_mb)
+
+
+class TestModel:
+    """Test the duration and cost model across memory tiers"""
+
+    def test_cpu_time_scales_until_one_vcpu(self):
+        """CPU-bound work speeds up with memory up to 1,769 MB and no further"""
+        model = tune_memory.model_tiers(measurement(100.0))
+
+        assert tier(model, 128)['mean_ms'] == pytest.approx(100 * 1769 / 128)
+        assert tier(model, 512)['mean_ms'] == pytest.approx(100 * 1769 / 512)
+        assert tier(model, 1769)['mean_ms'] == tier(model, 3008)['mean_ms'] == pytest.approx(100)
+        assert tier(model, 3008)['cost_per_million'] > tier(model, 1769)['cost_per_million']
+
+    def test_aws_call_time_does_not_scale(self):
+        """Waiting on AWS takes as long at any size, so more memory only costs more"""
+        model = tune_memory.model_tiers(measurement(0.2, {'bedrock': 1, 'dynamodb': 3}))
+        costs = [row['cost_per_million'] for row in model['tiers']]
+
+        assert model['io_ms'] == pytest.approx(818)
+        assert all(row['mean_ms'] == pytest.approx(818, abs=3) for row in model['tiers'])
+        assert costs == sorted(costs)
+        assert tune_memory.recommend(model['tiers'])['memory_mb'] == 128
+
+    def test_billing_rounds_each_invocation_up(self):
+        """A sub-millisecond invocation bills a whole millisecond plus the request"""
+        model = tune_memory.model_tiers(measurement(0.1), tiers=(1024,))
+
+        row = model['tiers'][0]
+        assert row['billed_ms'] == 1
+        assert row['cost_per_million'] == pytest.approx(
+            (0.001 * 1 * tune_memory.PRICE_PER_GB_SECOND['x86_64'] + tune_memory.PRICE_PER_REQUEST) * 1e6, rel=1e-3)
+
+    def test_arm_is_cheaper_per_gb_second(self):
+        """The same durations cost less on arm64"""
+        x86 = tune_memory.model_tiers(measurement(50.0), architecture='x86_64')
+        arm = tune_memory.model_tiers(measurement(50.0), architecture='arm64')
+
+        assert tier(arm, 512)['cost_per_million'] < tier(x86, 512)['cost_per_million']
+
+    def test_tiers_must_hold_the_working_set_and_finish_in_time(self):
+        """Sizes below the working set plus headroom, or past the timeout, do not fit"""
+        model = tune_memory.model_tiers(measurement(10.0, rss_mb=150, alloc_mb=10), headroom=0.25)
+        slow = tune_memory.model_tiers(measurement(1000.0), timeout_s=3)
+
+        assert model['required_mb'] == 200
+        assert [row['memory_mb'] for row in model['tiers'] if row['fits']][0] == 256
+        assert not tier(slow, 512)['fits'] and tier(slow, 768)['fits']
+        assert tune_memory.recommend(slow['tiers'])['memory_mb'] >= 768
+
+
+class TestRecommendation:
+    """Test choosing a tier by strategy"""
+
+    def test_cost_prefers_more_memory_only_for_whole_milliseconds(self):
+        """Within the tolerance, a bigger tier must save billed milliseconds"""
+        trivial = tune_memory.model_tiers(measurement(0.05))
+        heavy = tune_memory.model_tiers(measurement(60.0, {'dynamodb': 2}))
+
+        assert tune_memory.recommend(trivial['tiers'])['memory_mb'] == 128
+        chosen = tune_memory.recommend(heavy['tiers'], tolerance=0.05)
+        cheapest = min(row['cost_per_million'] for row in heavy['tiers'])
+        assert chosen['memory_mb'] > 128
+        assert chosen['cost_per_million'] <= cheapest * 1.05
+        assert tune_memory.recommend(heavy['tiers'], tolerance=0)['cost_per_million'] == cheapest
+
+    def test_speed_and_balanced_strategies(self):
+        """Speed takes the cheapest of the fastest tiers; balanced sits in between"""
+        model = tune_memory.model_tiers(measurement(60.0, {'dynamodb': 2}))
+
+        assert tune_memory.recommend(model['tiers'], 'speed')['memory_mb'] == 1769
+        balanced = tune_memory.recommend(model['tiers'], 'balanced')['memory_mb']
+        assert tune_memory.recommend(model['tiers'], 'cost')['memory_mb'] <= balanced <= 1769
+
+    def test_nothing_fits(self):
+        """No recommendation when no tier holds the working set"""
+        model = tune_memory.model_tiers(measurement(1.0, rss_mb=5000))
+
+        assert tune_memory.recommend(model['tiers']) is None
+
+
+class TestHarness:
+    """Test measuring the real handlers"""
+
+    def test_template_settings(self):
+        """Each function's MemorySize and Timeout come from the template, with Globals"""
+        functions = tune_memory.template_functions(tune_memory.load_template())
+
+        assert set(tune_memory.WORKLOADS) <= set(functions)
+        assert functions['ChatbotFunction'] == {'memory_mb': 512, 'timeout_s': 30.0, 'architecture': 'x86_64'}
+
+    def test_measurement_counts_aws_calls(self):
+        """Every chat invocation makes one model call, recorded per invocation"""
+        result = tune_memory.measure_function('ChatbotFunction', iterations=10)
+
+        assert result['invocations'] == 10
+        assert all(calls.get('bedrock') == 1 for calls in result['calls'])
+        assert all(cpu >= 0 for cpu in result['cpu_ms'])
+        assert result['alloc_peak_mb'] > 0
+
+    def test_isolated_measurement(self):
+        """A fresh interpreter reports its own resident memory"""
+        result = tune_memory.measure_isolated('InputAnalyzerFunction', iterations=5)
+
+        assert result['isolated']
+        assert result['invocations'] == 5
+        assert 0 < result['rss_start_mb'] <= result['rss_loaded_mb'] <= result['rss_peak_mb']
+
+    def test_cli_reports_every_selected_function(self, capsys):
+        """--json prints a recommendation per function with the current size's model"""
+        code = tune_memory.main(['--only', 'PipelineResultFunction', '--only', 'ChatbotFunction',
+                                 '--iterations', '10', '--in-process', '--json'])
+        report = json.loads(capsys.readouterr().out)
+
+        assert code == 0
+        rows = {row['function']: row for row in report['functions']}
+        assert set(rows) == {'PipelineResultFunction', 'ChatbotFunction'}
+        assert rows['ChatbotFunction']['current']['memory_mb'] == 512
+        assert rows['ChatbotFunction']['recommended']['cost_per_million'] < rows['ChatbotFunction']['current']['cost_per_million']
+        assert rows['ChatbotFunction']['io_ms'] == pytest.approx(800)